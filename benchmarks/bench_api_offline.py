@@ -0,0 +1,82 @@
+"""
+Offline API benchmark: the real routers against the in-memory backend.
+
+    python benchmarks/bench_api_offline.py
+    python benchmarks/bench_api_offline.py --entries 2000 --latency-ms 8 --iterations 30
+
+--latency-ms simulates the PostgREST round trip per query, so endpoints that
+issue many small queries (N+1 loops, per-line writes) show up the way they do
+against a real Supabase project. Each row reports latency and the number of
+database calls per request (from the Server-Timing header).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.offline import offline_client, db_calls  # noqa: E402
+
+
+def _journal_payload(ctx, n):
+    amount = 100 + n
+    return {
+        "entry_date": date.today().isoformat(),
+        "memo": f"Benchmark entry {n}",
+        "lines": [
+            {"account_id": ctx["accounts"]["6100"], "debit": amount, "credit": 0, "description": "Subscription"},
+            {"account_id": ctx["accounts"]["1010"], "debit": 0, "credit": amount, "description": "Paid from checking"},
+        ],
+    }
+
+
+def _scenarios(ctx):
+    cid = ctx["company_id"]
+    counter = iter(range(10**9))
+    return [
+        ("GET  /accounts/", lambda c: c.get("/accounts/")),
+        ("GET  /journals/", lambda c: c.get("/journals/")),
+        ("POST /journals/", lambda c: c.post("/journals/", json=_journal_payload(ctx, next(counter)))),
+        ("GET  /dashboard/stats", lambda c: c.get(f"/dashboard/stats/{cid}")),
+        ("GET  /dashboard/monthly-trend", lambda c: c.get(f"/dashboard/monthly-trend/{cid}")),
+        ("GET  /dashboard/recent-transactions", lambda c: c.get(f"/dashboard/recent-transactions/{cid}")),
+        ("GET  /reports/profit-loss", lambda c: c.get("/reports/profit-loss")),
+        ("GET  /reports/balance-sheet", lambda c: c.get("/reports/balance-sheet")),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=500, help="seeded journal entries")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated round trip per query")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    client, ctx = offline_client(entries=args.entries, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    print(f"in-memory backend: {args.entries} entries, {args.latency_ms} ms (+/- {args.jitter_ms}) per query, "
+          f"{args.iterations} iterations\n")
+    print(f"{'endpoint':36s} {'mean ms':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'db calls':>9s}")
+
+    for name, call in _scenarios(ctx):
+        call(client)  # warm up (route compilation, lazy indexes)
+        timings, calls = [], []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            response = call(client)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                sys.exit(f"{name} failed: {response.status_code} {response.text[:300]}")
+            calls.append(db_calls(response) or 0)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{name:36s} {statistics.mean(timings):9.2f} {statistics.median(timings):9.2f} {p95:9.2f} "
+              f"{statistics.mean(calls):9.1f}")
+
+
+if __name__ == "__main__":
+    main()
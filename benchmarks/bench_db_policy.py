@@ -0,0 +1,100 @@
+"""
+Database request policy benchmark: retries, hedged reads and deadlines
+against the in-memory backend with injected faults.
+
+    python benchmarks/bench_db_policy.py
+    python benchmarks/bench_db_policy.py --requests 400 --slow-rate 0.05 --slow-ms 250
+
+Three phases, each run with the policy off and on:
+  errors    MEMORY_BACKEND_ERROR_RATE-style 503s; share of requests that fail
+            (no read retries vs DB_READ_RETRIES)
+  tail      a fraction of calls stall for --slow-ms; p50/p95/p99 latency
+            (no hedging vs DB_HEDGE_READS=1)
+  deadline  stalls longer than the client's budget; worst-case latency
+            (no budget vs X-Request-Timeout)
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.offline import offline_client  # noqa: E402
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _run(client, n, headers=None):
+    timings, statuses = [], []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = client.get("/accounts/", headers=headers or {})
+        timings.append((time.perf_counter() - start) * 1000)
+        statuses.append(response.status_code)
+    return timings, statuses
+
+
+def _report(label, timings, statuses):
+    failed = sum(1 for s in statuses if s >= 400)
+    print(f"  {label:28s} p50 {statistics.median(timings):8.1f}  p95 {_percentile(timings, 0.95):8.1f}  "
+          f"p99 {_percentile(timings, 0.99):8.1f}  max {max(timings):8.1f} ms   failed {failed}/{len(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="normal round trip per query")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=200.0)
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="X-Request-Timeout for the deadline phase")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    client, ctx = offline_client(latency_ms=args.latency_ms)
+    import database
+    from lib import db_trace
+    db = ctx["db"]
+
+    # Warm the per-table latency histograms the hedge delay is derived from
+    _run(client, max(database.DB_HEDGE_MIN_SAMPLES, 30))
+    print(f"GET /accounts/ x {args.requests}, {args.latency_ms} ms per query\n")
+
+    print(f"errors: {args.error_rate:.0%} of calls fail with 503")
+    for label, retries in (("no retries", 0), (f"{database.DB_READ_RETRIES} read retries", database.DB_READ_RETRIES)):
+        database.DB_READ_RETRIES = retries
+        db.set_faults(error_rate=args.error_rate, seed=args.seed)
+        _report(label, *_run(client, args.requests))
+    db.set_faults()
+
+    print(f"\ntail: {args.slow_rate:.0%} of calls take +{args.slow_ms:.0f} ms")
+    for label, hedge in (("no hedging", False), ("hedged reads", True)):
+        database.DB_HEDGE_READS = hedge
+        db.set_faults(slow_rate=args.slow_rate, slow_ms=args.slow_ms, seed=args.seed)
+        _report(label, *_run(client, args.requests))
+        if hedge:
+            print(f"  {'':28s} hedge delay {database._hedge_delay('accounts') * 1000:.1f} ms (accounts select p95)")
+    database.DB_HEDGE_READS = False
+
+    print(f"\ndeadline: {args.slow_rate:.0%} of calls take +{args.slow_ms * 5:.0f} ms")
+    for label, headers in (("no budget", None), (f"X-Request-Timeout {args.budget_ms:.0f}", {"X-Request-Timeout": str(args.budget_ms)})):
+        db.set_faults(slow_rate=args.slow_rate, slow_ms=args.slow_ms * 5, seed=args.seed)
+        _report(label, *_run(client, args.requests, headers))
+    db.set_faults()
+
+    tables = db_trace.stats.snapshot()["tables"]
+    print("\npolicy events:")
+    for key, t in tables.items():
+        if t["retries"] or t["hedges"] or t["timeouts"]:
+            print(f"  {key:24s} retries {t['retries']:4d}  hedges {t['hedges']:4d} (won {t['hedge_wins']:4d})  "
+                  f"timeouts {t['timeouts']:4d}")
+
+
+if __name__ == "__main__":
+    main()
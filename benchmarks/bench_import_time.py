@@ -0,0 +1,84 @@
+"""
+Measure cold import time of the app (what a new uvicorn worker or test
+collection pays before serving anything).
+
+    python benchmarks/bench_import_time.py                 # import main
+    python benchmarks/bench_import_time.py --module database --runs 10
+    python benchmarks/bench_import_time.py --top 25        # slowest modules
+
+Each run is a fresh interpreter (`python -X importtime -c "import <module>"`),
+so nothing is cached in-process. Dummy Supabase credentials are injected when
+none are set; no network calls are made during import.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_once(module: str, env: dict):
+    """Return (wall_ms, {module: (cumulative_us, depth)}) for one cold import."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        sys.exit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    # "import time: <self us> | <cumulative us> | <two spaces per nesting level><module>"
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        parts = line.split("|", 2)
+        if len(parts) != 3:
+            continue
+        name = parts[2][1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        cumulative[name.strip()] = (int(parts[1]), depth)
+    return wall_ms, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+    env.setdefault("SUPABASE_KEY", "dummy-service-role-key")
+
+    walls, last = [], {}
+    for _ in range(args.runs):
+        wall_ms, last = _run_once(args.module, env)
+        walls.append(wall_ms)
+
+    print(f"import {args.module}: {args.runs} cold runs")
+    print(f"  wall  mean {statistics.mean(walls):8.1f} ms   min {min(walls):8.1f} ms   max {max(walls):8.1f} ms")
+    if args.module in last:
+        print(f"  -X importtime cumulative for {args.module}: {last[args.module][0] / 1000:.1f} ms")
+
+    # Direct imports of the measured module (depth 1 in the importtime tree)
+    top_level = sorted(
+        ((name, us) for name, (us, depth) in last.items() if depth <= 1 and name != args.module),
+        key=lambda kv: -kv[1],
+    )[: args.top]
+    print(f"\n  slowest imports (last run):")
+    for name, us in top_level:
+        print(f"    {us / 1000:8.1f} ms  {name}")
+
+    heavy = [m for m in ("easyocr", "torch", "pandas", "pdfminer", "pdf2image", "openai", "supabase") if m in last]
+    print(f"\n  heavy modules loaded at import: {', '.join(heavy) if heavy else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
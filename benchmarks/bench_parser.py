@@ -0,0 +1,266 @@
+"""
+Parser benchmark (smart_parser.smart_extract): throughput, time per stage
+and field accuracy on the synthetic corpus (benchmarks/corpus.py), compared
+with a saved baseline.
+
+    python benchmarks/bench_parser.py --save-baseline       # before a change
+    python benchmarks/bench_parser.py                       # after it: prints regressions, exit code 1 if any
+    python benchmarks/bench_parser.py --kinds text_pdf,csv --per-kind 10
+
+For each kind of document it reports pages per second, median and p95 time
+per document, the mean time per document spent in each stage (render,
+preprocess, OCR, text layer, CSV, field extraction; from smart_parser.stage_hook)
+and how often vendor, date and total match the ground truth.
+
+Runs offline on CPU. Photos and scanned PDFs need EasyOCR with its models
+already downloaded (~/.EasyOCR/model, or EASYOCR_MODULE_PATH), plus poppler
+for scanned PDFs; without them those kinds are skipped (or use --no-ocr).
+OCR_GPU is forced off. Reader load time is measured separately and not
+counted against the documents.
+
+A regression is a stage, median document time or pages per second worse than
+the baseline by more than --tolerance (default 25%) and by at least 5 ms per
+document, or any drop in accuracy. Baselines are only comparable on the same machine, seed and
+corpus size.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+os.environ["OCR_GPU"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import corpus  # noqa: E402
+
+STAGES = ("render", "preprocess", "ocr", "text_layer", "csv", "fields")
+FIELDS = ("vendor", "date", "total")
+OCR_KINDS = ("photo", "scanned_pdf")
+DEFAULT_BASELINE = os.path.join("data", "benchmarks", "parser_baseline.json")
+MIN_REGRESSION_MS = 5.0
+
+
+def _ocr_unavailable():
+    """Why OCR can't run offline here, or None."""
+    try:
+        import easyocr  # noqa: F401
+    except ImportError:
+        return "EasyOCR is not installed (pip install -r requirements-ocr.txt)"
+    models = os.path.join(os.getenv("EASYOCR_MODULE_PATH", os.path.expanduser("~/.EasyOCR")), "model")
+    if not glob.glob(os.path.join(models, "*.pth")):
+        return f"no EasyOCR models in {models} (run one OCR parse online first)"
+    return None
+
+
+def _normalize(field, value):
+    if value is None:
+        return None
+    if field == "total":
+        try:
+            return round(float(str(value).replace(",", "")), 2)
+        except ValueError:
+            return None
+    if field == "vendor":
+        return " ".join("".join(c for c in str(value).lower() if c.isalnum() or c.isspace()).split())
+    return str(value)
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _parse(smart_parser, doc, spent):
+    """(fields, error, seconds) of one parse, with its stage times in `spent`."""
+    from lib import pdf_text
+    pdf_text.cache = pdf_text.PageCache()  # every document is read cold
+    spent.clear()
+    error = None
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # the parser's progress prints
+            fields = smart_parser.smart_extract(doc["data"], doc["filename"])["parsed_fields"]
+    except Exception as exc:
+        fields, error = {}, f"{type(exc).__name__}: {exc}"
+    return fields, error, time.perf_counter() - started
+
+
+def run(docs, repeat: int = 1):
+    """Parse every document (the fastest of `repeat` runs counts); per-kind results (see module docstring)."""
+    import smart_parser
+
+    spent = {}
+
+    def hook(stage, seconds):
+        spent[stage] = spent.get(stage, 0.0) + seconds
+
+    smart_parser.stage_hook = hook
+    results = {}
+    try:
+        for doc in docs:
+            fastest = None
+            for _ in range(max(1, repeat)):
+                fields, error, elapsed = _parse(smart_parser, doc, spent)
+                if fastest is None or elapsed < fastest[2]:
+                    fastest = (fields, error, elapsed, dict(spent))
+            fields, error, elapsed, stages = fastest
+
+            kind = results.setdefault(doc["kind"], {
+                "docs": 0, "pages": 0, "seconds": [], "stages": {}, "checked": {}, "correct": {}, "errors": [],
+            })
+            kind["docs"] += 1
+            kind["pages"] += doc["pages"]
+            kind["seconds"].append(elapsed)
+            for stage, seconds in stages.items():
+                kind["stages"][stage] = kind["stages"].get(stage, 0.0) + seconds
+            if error:
+                kind["errors"].append(f"{doc['filename']}: {error}")
+            for field in FIELDS:
+                expected = _normalize(field, doc["truth"].get(field))
+                if expected is None:
+                    continue
+                kind["checked"][field] = kind["checked"].get(field, 0) + 1
+                if _normalize(field, fields.get(field)) == expected:
+                    kind["correct"][field] = kind["correct"].get(field, 0) + 1
+    finally:
+        smart_parser.stage_hook = None
+
+    summary = {}
+    for name, kind in results.items():
+        total_s = sum(kind["seconds"])
+        summary[name] = {
+            "docs": kind["docs"],
+            "pages": kind["pages"],
+            "pages_per_s": round(kind["pages"] / total_s, 2) if total_s else None,
+            "doc_ms_p50": round(statistics.median(kind["seconds"]) * 1000, 1),
+            "doc_ms_p95": round(_percentile(kind["seconds"], 0.95) * 1000, 1),
+            "stages_ms": {stage: round(kind["stages"][stage] / kind["docs"] * 1000, 1)
+                          for stage in STAGES if stage in kind["stages"]},
+            "accuracy": {field: round(kind["correct"].get(field, 0) / kind["checked"][field], 3)
+                         for field in FIELDS if kind["checked"].get(field)},
+            "errors": kind["errors"],
+        }
+    return summary
+
+
+def regressions(current, baseline, tolerance):
+    """Human-readable lines for everything that got worse than the baseline."""
+    found = []
+
+    def slower(label, now, before):
+        if now is not None and before and now > before * (1 + tolerance) and now - before >= MIN_REGRESSION_MS:
+            found.append(f"{label}: {before:.1f} -> {now:.1f} ms (+{(now / before - 1) * 100:.0f}%)")
+
+    for name, now in current.items():
+        before = baseline.get("kinds", {}).get(name)
+        if not before:
+            continue
+        if before.get("pages_per_s") and now["pages_per_s"] \
+                and now["pages_per_s"] < before["pages_per_s"] / (1 + tolerance):
+            # pages/s of tiny documents is noisy: also require the mean document to take 5 ms longer
+            mean_now = now["pages"] / now["pages_per_s"] / now["docs"] * 1000
+            mean_before = before["pages"] / before["pages_per_s"] / before["docs"] * 1000
+            if mean_now - mean_before >= MIN_REGRESSION_MS:
+                found.append(f"{name} pages/s: {before['pages_per_s']} -> {now['pages_per_s']}")
+        slower(f"{name} median per document", now["doc_ms_p50"], before.get("doc_ms_p50"))
+        for stage, ms in now["stages_ms"].items():
+            slower(f"{name} {stage}", ms, before.get("stages_ms", {}).get(stage))
+        for field, accuracy in now["accuracy"].items():
+            old = before.get("accuracy", {}).get(field)
+            if old is not None and accuracy < old:
+                found.append(f"{name} {field} accuracy: {old:.3f} -> {accuracy:.3f}")
+    return found
+
+
+def _print(summary):
+    print(f"  {'kind':12s} {'docs':>5s} {'pages':>6s} {'pages/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s}   "
+          + " ".join(f"{field:>7s}" for field in FIELDS))
+    for name, kind in summary.items():
+        accuracy = " ".join(f"{kind['accuracy'][f]:7.2f}" if f in kind["accuracy"] else f"{'-':>7s}" for f in FIELDS)
+        print(f"  {name:12s} {kind['docs']:5d} {kind['pages']:6d} {kind['pages_per_s'] or 0:8.1f} "
+              f"{kind['doc_ms_p50']:8.1f} {kind['doc_ms_p95']:8.1f}   {accuracy}")
+    print("\n  mean ms per document in each stage")
+    print(f"  {'kind':12s} " + " ".join(f"{stage:>10s}" for stage in STAGES))
+    for name, kind in summary.items():
+        print(f"  {name:12s} " + " ".join(
+            f"{kind['stages_ms'][s]:10.1f}" if s in kind["stages_ms"] else f"{'-':>10s}" for s in STAGES))
+    for name, kind in summary.items():
+        for error in kind["errors"][:3]:
+            print(f"  ⚠️ {name} {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--per-kind", type=int, default=5, help="documents of each kind")
+    parser.add_argument("--kinds", default=",".join(corpus.KINDS), help="comma-separated subset of " + ", ".join(corpus.KINDS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="parse each document this often, keep the fastest")
+    parser.add_argument("--no-ocr", action="store_true", help="skip photos and scanned PDFs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"baseline file (default {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before it counts (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = set(kinds) - set(corpus.KINDS)
+    if unknown:
+        sys.exit(f"unknown kinds: {', '.join(sorted(unknown))}")
+    reason = "--no-ocr" if args.no_ocr else (_ocr_unavailable() if set(kinds) & set(OCR_KINDS) else None)
+    if reason:
+        skipped = [kind for kind in kinds if kind in OCR_KINDS]
+        kinds = [kind for kind in kinds if kind not in OCR_KINDS]
+        if skipped:
+            print(f"skipping {', '.join(skipped)}: {reason}")
+    if not kinds:
+        sys.exit("nothing to run")
+
+    started = time.perf_counter()
+    docs = corpus.build(seed=args.seed, per_kind=args.per_kind, kinds=kinds)
+    print(f"corpus: {len(docs)} documents, {sum(d['pages'] for d in docs)} pages "
+          f"(seed {args.seed}, built in {time.perf_counter() - started:.1f}s)")
+
+    if set(kinds) & set(OCR_KINDS):
+        from lib import ocr_pool
+        started = time.perf_counter()
+        ocr_pool.pool.warm()
+        print(f"EasyOCR reader loaded in {time.perf_counter() - started:.1f}s (not counted)")
+    # One document of each kind first, so imports and first-call costs aren't counted either
+    run([next(d for d in docs if d["kind"] == kind) for kind in kinds])
+
+    summary = run(docs, repeat=args.repeat)
+    print()
+    _print(summary)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"created": datetime.now(timezone.utc).isoformat(timespec="seconds"), "seed": args.seed,
+                       "per_kind": args.per_kind, "kinds": summary}, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline.get("seed"), baseline.get("per_kind")) != (args.seed, args.per_kind):
+        print(f"\n⚠️ baseline was run with seed {baseline.get('seed')} and --per-kind {baseline.get('per_kind')}; "
+              "numbers may not be comparable")
+    found = regressions(summary, baseline, args.tolerance)
+    if found:
+        print(f"\n❌ {len(found)} regression(s) against the baseline of {baseline.get('created')}:")
+        for line in found:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\n✅ no regressions against the baseline of {baseline.get('created')}")
+
+
+if __name__ == "__main__":
+    main()
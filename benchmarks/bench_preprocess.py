@@ -0,0 +1,114 @@
+"""
+Image preprocessing benchmark (lib/image_prep.py): time and pixels saved
+before OCR, and OCR time/accuracy with and without it when EasyOCR is
+installed.
+
+    python benchmarks/bench_preprocess.py                  # synthetic phone photos
+    python benchmarks/bench_preprocess.py --images 20 --ocr
+    python benchmarks/bench_preprocess.py --dir ~/receipts --ocr
+
+The synthetic corpus is receipts drawn at phone-camera resolution on a dark
+table, turned a few degrees, some stored sideways with an EXIF orientation
+tag (JPEG, like a phone upload). For those the recovered skew is checked
+against the one applied, and OCR accuracy is the similarity of the OCR text
+to the printed text. --dir takes real photos (*.jpg, *.jpeg, *.png) instead.
+"""
+
+import argparse
+import difflib
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import synthetic_photo  # noqa: E402
+from lib import image_prep  # noqa: E402
+
+
+def _corpus(args):
+    if args.dir:
+        names = sorted(n for n in os.listdir(args.dir) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+        for name in names[:args.images or None]:
+            with open(os.path.join(args.dir, name), "rb") as f:
+                yield name, f.read(), None, None
+        return
+    rng = random.Random(args.seed)
+    for i in range(args.images):
+        data, text, skew = synthetic_photo(rng)
+        yield f"synthetic-{i}.jpg", data, text, skew
+
+
+def _similarity(a, b):
+    return difflib.SequenceMatcher(None, " ".join(a.split()), " ".join(b.split())).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=8, help="synthetic photos (or max files from --dir)")
+    parser.add_argument("--dir", help="directory of receipt photos instead of the synthetic corpus")
+    parser.add_argument("--ocr", action="store_true", help="also OCR each image raw and preprocessed (EasyOCR)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    reader = None
+    if args.ocr:
+        try:
+            import easyocr
+        except ImportError:
+            sys.exit("--ocr needs EasyOCR (pip install -r requirements-ocr.txt)")
+        from lib import ocr_pool
+        reader = easyocr.Reader(ocr_pool.OCR_LANGS, gpu=False)
+
+    from PIL import Image
+
+    print(f"target text height {image_prep.OCR_TARGET_TEXT_PX}px, max side {image_prep.OCR_MAX_SIDE}px, "
+          f"deskew within {image_prep.OCR_DESKEW_MAX_DEG}°\n")
+    print(f"  {'image':22s} {'pixels in':>10s} {'out':>9s} {'prep ms':>8s} {'skew':>6s} {'expected':>9s}"
+          + (f" {'ocr raw ms':>10s} {'ocr prep ms':>11s} {'acc raw':>8s} {'acc prep':>8s}" if reader else ""))
+    prep_ms, ratios, skew_errors, raw_ms, ocr_ms, raw_acc, prep_acc = [], [], [], [], [], [], []
+    for name, data, text, applied in _corpus(args):
+        with Image.open(io.BytesIO(data)) as image:
+            pixels_in = image.width * image.height
+        plan = {}
+        start = time.perf_counter()
+        array = image_prep.prepare(data, stats=plan)
+        elapsed = (time.perf_counter() - start) * 1000
+        prep_ms.append(elapsed)
+        ratios.append(pixels_in / array.size)
+        if applied is not None:
+            skew_errors.append(abs(plan["angle"] + applied))
+        row = (f"  {name[:22]:22s} {pixels_in / 1e6:8.1f}MP {array.size / 1e6:7.2f}MP {elapsed:8.1f} "
+               f"{plan['angle']:6.2f} {'' if applied is None else f'{-applied:9.2f}'}")
+        if reader:
+            start = time.perf_counter()
+            raw_text = "\n".join(reader.readtext(data, detail=0))
+            raw_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            prep_text = "\n".join(reader.readtext(array, detail=0))
+            ocr_ms.append((time.perf_counter() - start) * 1000 + elapsed)
+            if text is not None:
+                raw_acc.append(_similarity(raw_text, text))
+                prep_acc.append(_similarity(prep_text, text))
+            row += f" {raw_ms[-1]:10.0f} {ocr_ms[-1]:11.0f}"
+            if text is not None:
+                row += f" {raw_acc[-1]:8.2f} {prep_acc[-1]:8.2f}"
+        print(row)
+
+    print(f"\npreprocess: median {statistics.median(prep_ms):.1f} ms, "
+          f"{statistics.median(ratios):.1f}x fewer pixels for OCR")
+    if skew_errors:
+        print(f"deskew: median error {statistics.median(skew_errors):.2f}°, max {max(skew_errors):.2f}°")
+    if reader:
+        print(f"OCR per image: raw median {statistics.median(raw_ms):.0f} ms, preprocessed median "
+              f"{statistics.median(ocr_ms):.0f} ms (incl. preprocessing), "
+              f"{statistics.median(raw_ms) / statistics.median(ocr_ms):.1f}x faster")
+        if raw_acc:
+            print(f"OCR text similarity: raw {statistics.mean(raw_acc):.2f}, preprocessed {statistics.mean(prep_acc):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Synthetic parser corpus with ground truth, generated from a seed (nothing to
+download, no fixture files to keep in the repo):
+
+    from benchmarks import corpus
+    for doc in corpus.build(seed=7, per_kind=4):
+        doc["kind"], doc["filename"], doc["data"], doc["pages"]
+        doc["truth"]        # {"vendor": ..., "date": "YYYY-MM-DD", "total": "12.34"}; None = not printed
+
+Kinds:
+  photo        receipt photographed on a table at 12 MP, a few degrees off,
+               half of them stored sideways with an EXIF orientation (JPEG)
+  scanned_pdf  receipt or invoice scanned at 150 dpi, 1-2 pages, no text layer
+  text_pdf     vendor statement with a text layer, 1 to 150 pages, header on
+               the first page and the amount due on the last
+  csv          itemised receipt export (date, description, amount), TOTAL row last
+
+Needs Pillow (photo, scanned_pdf). The same seed always gives the same documents.
+"""
+
+import io
+import random
+from datetime import date
+from typing import Any, Dict, List
+
+KINDS = ("photo", "scanned_pdf", "text_pdf", "csv")
+
+_VENDORS = ["TRADER JOE'S", "ACME HARDWARE", "BLUE BOTTLE COFFEE", "CITY PARKING", "OFFICE DEPOT"]
+_ITEMS = ["BANANAS", "COFFEE BEANS", "PRINTER PAPER", "HAMMER", "LATTE", "BAGEL", "USB CABLE", "NOTEBOOK"]
+_SUPPLIERS = ["Northwind Traders", "Globex Supply Co", "Initech Office Services", "Umbrella Logistics"]
+_STATEMENT_PAGES = [1, 3, 12, 60, 150]
+
+
+def _font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1: fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def receipt(rng):
+    """(printed lines, ground truth) of a shop receipt."""
+    items = [(rng.choice(_ITEMS), rng.randint(100, 5000) / 100) for _ in range(rng.randint(3, 8))]
+    subtotal = round(sum(price for _, price in items), 2)
+    tax = round(subtotal * 0.08, 2)
+    total = round(subtotal + tax, 2)
+    vendor = rng.choice(_VENDORS)
+    day = date(2024, rng.randint(1, 12), rng.randint(1, 28))
+    lines = [vendor, "123 MAIN STREET", f"{day:%m/%d/%Y} {rng.randint(7, 21)}:{rng.randint(0, 59):02d}", ""]
+    lines += [f"{name:<18}{price:>8.2f}" for name, price in items]
+    lines += ["", f"{'SUBTOTAL':<18}{subtotal:>8.2f}", f"{'TAX':<18}{tax:>8.2f}", f"{'TOTAL':<18}{total:>8.2f}"]
+    return lines, {"vendor": vendor, "date": day.isoformat(), "total": f"{total:.2f}"}
+
+
+def _draw(lines, font_px, width, height=None, background=245):
+    """Grayscale image of `lines` in the default font."""
+    from PIL import Image, ImageDraw
+    step = int(font_px * 1.6)
+    height = height or 2 * font_px + len(lines) * step
+    image = Image.new("L", (width, height), background)
+    draw = ImageDraw.Draw(image)
+    font = _font(font_px)
+    for i, line in enumerate(lines):
+        draw.text((font_px, font_px + i * step), line, fill=20, font=font)
+    return image
+
+
+def photo(rng, lines):
+    """JPEG phone photo of a receipt: (bytes, applied skew in degrees)."""
+    from PIL import Image
+
+    font_px = rng.randint(40, 72)
+    paper = _draw(lines, font_px, font_px * 17)
+    skew = rng.uniform(-5, 5)
+    paper = paper.convert("RGB").rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=(70, 55, 45))
+    image = Image.new("RGB", (3024, 4032), (70, 55, 45))
+    image.paste(paper, ((image.width - paper.width) // 2 + rng.randint(-100, 100),
+                        (image.height - paper.height) // 2 + rng.randint(-100, 100)))
+
+    exif = Image.Exif()
+    if rng.random() < 0.5:
+        # Stored sideways, as phones do; orientation 6 = rotate 90° clockwise to display
+        image = image.transpose(Image.ROTATE_90)
+        exif[0x0112] = 6
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=90, exif=exif)
+    return out.getvalue(), skew
+
+
+def synthetic_photo(rng):
+    """(jpeg bytes, printed text, applied skew in degrees)"""
+    lines, _ = receipt(rng)
+    data, skew = photo(rng, lines)
+    return data, "\n".join(line for line in lines if line), skew
+
+
+def scanned_pdf(rng, lines, pages: int = 1) -> bytes:
+    """Image-only PDF of `lines` on letter pages at 150 dpi, slightly skewed, split over `pages` pages."""
+    from PIL import Image
+
+    per_page = -(-len(lines) // pages)
+    images = []
+    for start in range(0, len(lines), per_page):
+        page = _draw(lines[start:start + per_page], 28, 1275, 1650, background=250)
+        page = page.rotate(rng.uniform(-1.5, 1.5), resample=Image.BICUBIC, fillcolor=250)
+        images.append(page)
+    out = io.BytesIO()
+    images[0].save(out, "PDF", resolution=150, save_all=True, append_images=images[1:])
+    return out.getvalue()
+
+
+def text_pdf(pages: List[List[str]]) -> bytes:
+    """PDF with a text layer: one list of lines per page, Helvetica 10pt, uncompressed."""
+    objects: List[bytes] = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    pages_ref = 1 + 2 * len(pages) + 1  # font, then a content stream and a page per page, then /Pages
+    kids = []
+    for lines in pages:
+        ops = [b"BT /F1 10 Tf 14 TL 50 760 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(b"(" + escaped.encode("latin-1", "replace") + b") Tj T*")
+        ops.append(b"ET")
+        stream = b"\n".join(ops)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 1 0 R >> >> >>" % (pages_ref, len(objects)))
+        kids.append(len(objects))
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>"
+                   % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_ref)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    return bytes(out)
+
+
+def statement(rng, pages: int):
+    """(page lines, ground truth) of a vendor statement: header on page 1, amount due on the last page."""
+    vendor = rng.choice(_SUPPLIERS)
+    issued = date(2024, rng.randint(1, 12), rng.randint(1, 28))
+    lines_per_page = 48
+    header = [vendor, "400 Commerce Way, Springfield", f"Statement date: {issued:%B} {issued.day}, {issued.year}",
+              "Account: 0042-118", ""]
+    body, balance = [], 0.0
+    for n in range(pages * lines_per_page - len(header)):
+        amount = rng.randint(500, 250000) / 100
+        balance += amount
+        body.append(f"INV-{10000 + n}  {date(2024, rng.randint(1, 12), rng.randint(1, 28)):%m/%d/%Y}  "
+                    f"Services rendered  {amount:,.2f}")
+    total = round(balance, 2)
+    result, start = [], 0
+    for page in range(pages):
+        room = lines_per_page - (len(header) if page == 0 else 0)
+        lines = (header if page == 0 else []) + body[start:start + room]
+        start += room
+        lines.append(f"Page {page + 1} of {pages}")
+        result.append(lines)
+    result[-1] += ["", f"Total amount due  {total:,.2f}"]
+    return result, {"vendor": vendor, "date": issued.isoformat(), "total": f"{total:.2f}"}
+
+
+def receipt_csv(rng):
+    """(csv bytes, ground truth) of an itemised receipt export; the vendor is not in the file."""
+    day = date(2024, rng.randint(1, 12), rng.randint(1, 28))
+    items = [(rng.choice(_ITEMS).title(), rng.randint(100, 5000) / 100) for _ in range(rng.randint(3, 12))]
+    total = round(sum(price for _, price in items), 2)
+    rows = ["Date,Description,Amount"] + [f"{day.isoformat()},{name},{price:.2f}" for name, price in items]
+    rows.append(f"{day.isoformat()},TOTAL,{total:.2f}")
+    return ("\n".join(rows) + "\n").encode(), {"vendor": None, "date": day.isoformat(), "total": f"{total:.2f}"}
+
+
+def build(seed: int = 7, per_kind: int = 4, kinds=KINDS) -> List[Dict[str, Any]]:
+    """`per_kind` documents of each kind (see module docstring)."""
+    docs = []
+    for kind in kinds:
+        rng = random.Random(f"{seed}-{kind}")  # adding a kind doesn't change the others
+        for i in range(per_kind):
+            if kind == "photo":
+                lines, truth = receipt(rng)
+                data, _ = photo(rng, lines)
+                doc = {"filename": f"photo-{i}.jpg", "data": data, "pages": 1}
+            elif kind == "scanned_pdf":
+                lines, truth = receipt(rng)
+                pages = 1 + i % 2
+                doc = {"filename": f"scan-{i}.pdf", "data": scanned_pdf(rng, lines, pages), "pages": pages}
+            elif kind == "text_pdf":
+                pages = _STATEMENT_PAGES[i % len(_STATEMENT_PAGES)]
+                page_lines, truth = statement(rng, pages)
+                doc = {"filename": f"statement-{i}.pdf", "data": text_pdf(page_lines), "pages": pages}
+            elif kind == "csv":
+                data, truth = receipt_csv(rng)
+                doc = {"filename": f"receipt-{i}.csv", "data": data, "pages": 1}
+            else:
+                raise ValueError(f"Unknown corpus kind: {kind}")
+            doc.update(kind=kind, truth=truth)
+            docs.append(doc)
+    return docs
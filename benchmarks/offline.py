@@ -0,0 +1,135 @@
+"""
+Run the real FastAPI app offline: in-memory database (DB_BACKEND=memory),
+a locally signed JWT, and a seeded demo company.
+
+    from benchmarks.offline import offline_client
+    client, ctx = offline_client(entries=200, latency_ms=5)
+    client.get("/journals/")            # authenticated as ctx["user_id"]
+
+Must be called before `database`/`main` are imported anywhere in the process:
+the backend and the JWT secret are read from the environment at import time.
+"""
+
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+OFFLINE_JWT_SECRET = "offline-benchmark-secret"
+
+DEMO_ACCOUNTS = [
+    ("1000", "Cash", "asset", "cash"),
+    ("1010", "Business Checking", "asset", "bank"),
+    ("1200", "Accounts Receivable", "asset", "accounts_receivable"),
+    ("2000", "Accounts Payable", "liability", "accounts_payable"),
+    ("2100", "Credit Card", "liability", "credit_card"),
+    ("3000", "Owner's Equity", "equity", "owner_equity"),
+    ("4000", "Sales Revenue", "revenue", "income"),
+    ("4100", "Service Revenue", "revenue", "income"),
+    ("5000", "Cost of Goods Sold", "expense", "cost_of_goods_sold"),
+    ("6000", "Rent Expense", "expense", "operating_expense"),
+    ("6100", "Software & Services", "expense", "operating_expense"),
+    ("6200", "Meals & Entertainment", "expense", "operating_expense"),
+]
+
+
+def _configure_env(latency_ms: float, jitter_ms: float):
+    for module in ("database", "middleware.auth"):
+        if module in sys.modules and os.environ.get("DB_BACKEND") != "memory":
+            raise RuntimeError(f"offline_client() must run before `{module}` is imported")
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["SUPABASE_JWT_SECRET"] = OFFLINE_JWT_SECRET
+    os.environ["MEMORY_BACKEND_LATENCY_MS"] = str(latency_ms)
+    os.environ["MEMORY_BACKEND_JITTER_MS"] = str(jitter_ms)
+    os.environ.setdefault("DB_NPLUS1_THRESHOLD", "1000000")  # keep benchmark output quiet
+
+
+def make_token(user_id: str, email: str) -> str:
+    from jose import jwt
+    return jwt.encode(
+        {"sub": user_id, "email": email, "aud": "authenticated", "exp": int(time.time()) + 24 * 3600},
+        OFFLINE_JWT_SECRET,
+        algorithm="HS256",
+    )
+
+
+def seed_demo_company(db, entries: int = 0, seed: int = 7) -> Dict[str, Any]:
+    """Company, admin user, a small chart of accounts and `entries` balanced journal entries."""
+    rng = random.Random(seed)
+    company_id, user_id = str(uuid.uuid4()), str(uuid.uuid4())
+    email = "owner@offline.test"
+    accounts = {
+        code: {"id": str(uuid.uuid4()), "company_id": company_id, "account_code": code, "account_name": name,
+               "account_type": account_type, "account_subtype": subtype, "current_balance": 0.0}
+        for code, name, account_type, subtype in DEMO_ACCOUNTS
+    }
+
+    # Revenue and expense activity spread over the last 6 months
+    headers, lines = [], []
+    start = date.today() - timedelta(days=180)
+    for n in range(entries):
+        if rng.random() < 0.4:
+            debit_code, credit_code = "1010", rng.choice(["4000", "4100"])
+        else:
+            debit_code, credit_code = rng.choice(["5000", "6000", "6100", "6200"]), rng.choice(["1010", "2100"])
+        amount = round(rng.uniform(20, 2500), 2)
+        entry_date = start + timedelta(days=rng.randrange(180))
+        entry_id = str(uuid.uuid4())
+        headers.append({
+            "id": entry_id, "company_id": company_id, "journal_number": f"JE-{entry_date.year}-{n + 1:04d}",
+            "entry_date": entry_date.isoformat(), "memo": f"Demo entry {n + 1}", "source": "manual",
+            "status": "posted", "total_debit": amount, "total_credit": amount,
+        })
+        lines.append({"journal_entry_id": entry_id, "account_id": accounts[debit_code]["id"], "line_number": 1, "debit": amount, "credit": 0})
+        lines.append({"journal_entry_id": entry_id, "account_id": accounts[credit_code]["id"], "line_number": 2, "debit": 0, "credit": amount})
+        for code, debit, credit in ((debit_code, amount, 0), (credit_code, 0, amount)):
+            normal_debit = accounts[code]["account_type"] in ("asset", "expense")
+            accounts[code]["current_balance"] += (debit - credit) if normal_debit else (credit - debit)
+
+    for account in accounts.values():
+        account["current_balance"] = round(account["current_balance"], 2)
+    db.load({
+        "companies": [{"id": company_id, "name": "Offline Demo Co", "industry": "Services", "onboarding_completed": True}],
+        "users": [{"id": user_id, "company_id": company_id, "full_name": "Offline Owner", "email": email, "role": "admin"}],
+        "accounts": list(accounts.values()),
+        "journal_entries": headers,
+        "journal_lines": lines,
+    })
+
+    return {
+        "company_id": company_id,
+        "user_id": user_id,
+        "email": email,
+        "accounts": {code: a["id"] for code, a in accounts.items()},
+    }
+
+
+def offline_client(entries: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                   seed: int = 7) -> Tuple[Any, Dict[str, Any]]:
+    """Return (TestClient authenticated as the demo owner, seeded ids)."""
+    _configure_env(latency_ms, jitter_ms)
+    import database
+    from fastapi.testclient import TestClient
+    import main
+
+    db = database.get_client().db
+    db.set_latency(latency_ms, jitter_ms)
+    ctx = seed_demo_company(db, entries=entries, seed=seed)
+    ctx["db"] = db
+    client = TestClient(main.app, headers={"Authorization": f"Bearer {make_token(ctx['user_id'], ctx['email'])}"})
+    return client, ctx
+
+
+def db_calls(response) -> Optional[int]:
+    """Number of database calls from the Server-Timing header (see middleware/db_trace.py)."""
+    header = response.headers.get("server-timing", "")
+    if 'desc="' not in header:
+        return None
+    return int(header.split('desc="', 1)[1].split(" ", 1)[0])
@@ -1,14 +1,21 @@
-"""Check account balances after journal entries"""
-import requests
-
-API_BASE = "http://localhost:8000"
+"""Check account balances after journal entries (pass --offline to run against the in-memory backend)"""
+import sys
+
+if "--offline" in sys.argv:
+    # Real app + in-memory database with seeded demo activity (benchmarks/offline.py)
+    from benchmarks.offline import offline_client
+    http, _ = offline_client(entries=50)
+    API_BASE = ""
+else:
+    import requests as http
+    API_BASE = "http://localhost:8000"
 
 # Get company
-companies = requests.get(f"{API_BASE}/companies/").json()
+companies = http.get(f"{API_BASE}/companies/").json()
 company_id = companies["data"][0]["id"]
 
 # Get accounts with balances
-accounts_resp = requests.get(f"{API_BASE}/accounts/company/{company_id}").json()
+accounts_resp = http.get(f"{API_BASE}/accounts/company/{company_id}").json()
 
 print("\nAccounts with balances:")
 print("=" * 80)
@@ -1,20 +1,754 @@
-from supabase import create_client
 import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from lib import db_trace
 
 load_dotenv()
 
+logger = logging.getLogger("database")
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("❌ Missing Supabase credentials. Check your .env file.")
+# "supabase" (default) or "memory": an in-process PostgREST-compatible backend
+# loaded from newschema.sql (lib/memory_backend.py) for offline benchmarks,
+# scripts and tests. No credentials or network needed.
+DB_BACKEND = os.getenv("DB_BACKEND", "supabase").lower()
+
+# Seconds before a single PostgREST call is abandoned by the HTTP client
+# (supabase-py defaults to 120).
+DB_CALL_TIMEOUT_S = float(os.getenv("DB_CALL_TIMEOUT_S", "10"))
+
+# The Supabase client (and the supabase/httpx/gotrue/realtime import chain
+# behind it) is built on first use rather than at import time, so workers,
+# scripts and test collection that never touch the database start fast.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared Supabase client, creating it on first call."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None and DB_BACKEND == "memory":
+            from lib.memory_backend import MemoryClient
+            _client = MemoryClient()
+            logger.info("Using in-memory database backend (DB_BACKEND=memory).")
+        elif _client is None:
+            url = SUPABASE_URL or os.getenv("SUPABASE_URL")
+            key = SUPABASE_KEY or os.getenv("SUPABASE_KEY")
+            if not url or not key:
+                raise ValueError("❌ Missing Supabase credentials. Check your .env file.")
+            from supabase import ClientOptions, create_client
+            # Hard cap per PostgREST call; the request deadline below is usually tighter
+            _client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=DB_CALL_TIMEOUT_S))
+            logger.info("Supabase connection initialized (using service_role key).")
+    return _client
+
+
+# ==========================================
+# Call tracing (see lib/db_trace.py)
+# ==========================================
+# Every builder returned by table() is wrapped so execute() records the table,
+# operation, filter shape and latency for the current request.
+
+_OPERATIONS = {"select", "insert", "update", "upsert", "delete"}
+_BARE_MODIFIERS = {"limit", "offset", "range", "single", "maybe_single", "csv", "explain"}
+
+
+class _TracedQuery:
+    """
+    Proxy for a postgrest query builder that times execute() and tracks the query shape.
+    A select() may be routed to a read replica (see "Read replicas" below); the
+    primary builder is then kept in step as `_fallback` in case the replica fails.
+    """
+
+    __slots__ = ("_builder", "_table", "_op", "_shape", "_fallback", "_replica")
+
+    def __init__(self, builder, table_name: str, op: str = "", shape: Tuple[str, ...] = (),
+                 fallback=None, replica: Optional[int] = None):
+        self._builder = builder
+        self._table = table_name
+        self._op = op
+        self._shape = shape
+        self._fallback = fallback
+        self._replica = replica
+
+    def _wrap(self, result, op: str, shape: Tuple[str, ...], fallback=None, replica: Optional[int] = None):
+        if hasattr(result, "execute"):
+            return _TracedQuery(result, self._table, op, shape, fallback, replica)
+        return result
+
+    def __getattr__(self, attr):
+        builder, fallback, replica = self._builder, self._fallback, self._replica
+        if attr == "select" and not self._op:
+            replica = _pick_replica(self._table)
+            if replica is not None:
+                fallback, builder = builder, _replica_clients()[replica].table(self._table)
+
+        target = getattr(builder, attr)
+        if not callable(target):
+            # e.g. the `not_` property returns a negated builder
+            return self._wrap(target, self._op, self._shape + (attr,),
+                              getattr(fallback, attr) if fallback is not None else None, replica)
 
-# Connect to Supabase
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        def call(*args, **kwargs):
+            op, shape = self._op, self._shape
+            if attr in _OPERATIONS:
+                op = attr
+            elif attr in _BARE_MODIFIERS:
+                shape = shape + (attr,)
+            elif args and isinstance(args[0], str):
+                shape = shape + (f"{attr}:{args[0]}",)
+            else:
+                shape = shape + (attr,)
+            result = target(*args, **kwargs)
+            fallback_result = getattr(fallback, attr)(*args, **kwargs) if fallback is not None else None
+            return self._wrap(result, op, shape, fallback_result, replica)
+
+        return call
+
+    def execute(self):
+        op = self._op or "select"
+        start = time.perf_counter()
+        failed = True
+        try:
+            if self._replica is None:
+                result = _execute_with_policy(self._builder, self._table, op)
+            else:
+                result = self._execute_on_replica()
+            failed = False
+            if op != "select":
+                _note_write()
+            return result
+        finally:
+            db_trace.record_call(
+                self._table,
+                op,
+                " ".join((op,) + self._shape),
+                (time.perf_counter() - start) * 1000,
+                failed,
+            )
+
+    def _execute_on_replica(self):
+        db_trace.stats.add_event(self._table, "select", "replica_reads")
+        try:
+            # No retries on the replica: a transient failure goes straight to the primary
+            return _execute_with_policy(self._builder, self._table, "select", retries=0)
+        except DatabaseUnavailable as exc:
+            _mark_replica_down(self._replica, exc)
+            db_trace.stats.add_event(self._table, "select", "replica_fallbacks")
+            return _execute_with_policy(self._fallback, self._table, "select")
+
+
+class _TracedClient:
+    """
+    Stand-in for the Supabase client: .table() goes through table(); auth, rpc,
+    storage etc. pass through to the real client, which is created on first use.
+    """
+
+    def table(self, name: str):
+        return table(name)
+
+    from_ = table
+
+    def __getattr__(self, attr):
+        return getattr(get_client(), attr)
+
+
+supabase = _TracedClient()
 
 # Access the PUBLIC schema (works with Supabase API)
 def table(name: str):
-    return supabase.table(name)
+    return _TracedQuery(get_client().table(name), name)
+
+
+# ==========================================
+# Request policy: deadlines, read retries, hedged reads
+# ==========================================
+# Every execute() goes through _execute_with_policy():
+# - Deadline: the request's remaining budget (X-Request-Timeout header or
+#   DB_REQUEST_BUDGET_MS, set by middleware/deadline.py) bounds each read;
+#   writes only check it before starting. Out of budget raises
+#   DatabaseTimeout (-> 504).
+# - Retries: reads (select) that fail with a transient error are retried up to
+#   DB_READ_RETRIES times with full-jitter backoff, within the deadline.
+#   Writes are never retried here (not idempotent); see lib/bulk_writer.py.
+# - Hedging (DB_HEDGE_READS=1): a read still running after the table's p95
+#   select latency gets a duplicate request; the first success wins.
+# Transient failures that survive the retries raise DatabaseUnavailable (-> 503).
+
+DB_REQUEST_BUDGET_MS = float(os.getenv("DB_REQUEST_BUDGET_MS", "0"))  # 0 = no deadline unless the client sends one
+DB_READ_RETRIES = int(os.getenv("DB_READ_RETRIES", "2"))
+DB_RETRY_BASE_MS = float(os.getenv("DB_RETRY_BASE_MS", "25"))
+DB_RETRY_MAX_MS = float(os.getenv("DB_RETRY_MAX_MS", "500"))
+DB_HEDGE_READS = os.getenv("DB_HEDGE_READS", "0").lower() in ("1", "true", "yes")
+DB_HEDGE_MIN_MS = float(os.getenv("DB_HEDGE_MIN_MS", "10"))
+DB_HEDGE_MIN_SAMPLES = int(os.getenv("DB_HEDGE_MIN_SAMPLES", "20"))
+DB_POLICY_WORKERS = int(os.getenv("DB_POLICY_WORKERS", "32"))
+
+
+class DatabaseTimeout(TimeoutError):
+    """The request's database budget ran out before a call completed."""
+
+
+class DatabaseUnavailable(Exception):
+    """A transient database failure (5xx, overload, network) that outlasted the retries."""
+
+    def __init__(self, exc: BaseException):
+        self.code = getattr(exc, "code", None)
+        self.message = getattr(exc, "message", None) or str(exc)
+        super().__init__(self.message)
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("db_deadline", default=None)
+
+
+def set_request_deadline(budget_ms: Optional[float]):
+    """Start a deadline `budget_ms` from now for the current request (None/0 = none). Returns a reset token."""
+    return _deadline.set(time.monotonic() + budget_ms / 1000 if budget_ms else None)
+
+
+def reset_request_deadline(token):
+    _deadline.reset(token)
+
+
+def deadline_remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None when there is no deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+# Calls that must be waited on with a timeout (deadline or hedge) run here, so
+# the caller can give up on them; the abandoned call still ends at DB_CALL_TIMEOUT_S.
+_policy_pool: Optional[ThreadPoolExecutor] = None
+_policy_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _policy_pool
+    if _policy_pool is None:
+        with _policy_pool_lock:
+            if _policy_pool is None:
+                _policy_pool = ThreadPoolExecutor(max_workers=DB_POLICY_WORKERS, thread_name_prefix="db-policy")
+    return _policy_pool
+
+
+def _check_deadline(table_name: str, op: str) -> Optional[float]:
+    remaining = deadline_remaining()
+    if remaining is not None and remaining <= 0:
+        db_trace.stats.add_event(table_name, op, "timeouts")
+        raise DatabaseTimeout(f"Database budget exhausted before {op} on {table_name}")
+    return remaining
+
+
+def _hedge_delay(table_name: str) -> Optional[float]:
+    """Seconds to wait before hedging a read on this table (None = don't hedge yet)."""
+    if not DB_HEDGE_READS:
+        return None
+    p95 = db_trace.stats.quantile_ms(table_name, "select", 0.95, min_samples=DB_HEDGE_MIN_SAMPLES)
+    if p95 is None or p95 == float("inf"):
+        return None
+    return max(DB_HEDGE_MIN_MS, p95) / 1000
+
+
+def _attempt(builder, table_name: str, op: str):
+    """One logical call: direct, or through the pool when it needs a timeout or a hedge."""
+    remaining = _check_deadline(table_name, op)
+    if op != "select":
+        # Writes aren't abandoned mid-flight (the outcome would be unknown); a
+        # write that starts inside the budget runs to completion or DB_CALL_TIMEOUT_S.
+        return builder.execute()
+    hedge_after = _hedge_delay(table_name)
+    if remaining is None and hedge_after is None:
+        return builder.execute()
+
+    futures = [_pool().submit(contextvars.copy_context().run, builder.execute)]
+    if hedge_after is not None and (remaining is None or hedge_after < remaining):
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            db_trace.stats.add_event(table_name, op, "hedges")
+            futures.append(_pool().submit(contextvars.copy_context().run, builder.execute))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        timeout = deadline_remaining()
+        if timeout is not None and timeout <= 0:
+            break
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                if len(futures) > 1 and future is futures[1]:
+                    db_trace.stats.add_event(table_name, op, "hedge_wins")
+                return future.result()
+            error = error or future.exception()
+    if pending:
+        db_trace.stats.add_event(table_name, op, "timeouts")
+        raise DatabaseTimeout(f"Database budget exhausted waiting for {op} on {table_name}")
+    raise error
+
+
+def _execute_with_policy(builder, table_name: str, op: str, retries: Optional[int] = None):
+    retries = DB_READ_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            return _attempt(builder, table_name, op)
+        except DatabaseTimeout:
+            raise
+        except Exception as exc:
+            if not is_transient_error(exc):
+                raise
+            if op != "select" or attempt >= retries:
+                raise DatabaseUnavailable(exc) from exc
+            # Full jitter: sleep uniformly in [0, base * 2^attempt], capped, and never past the deadline
+            backoff = random.uniform(0, min(DB_RETRY_MAX_MS, DB_RETRY_BASE_MS * (2 ** attempt))) / 1000
+            remaining = deadline_remaining()
+            if remaining is not None and backoff >= remaining:
+                raise DatabaseUnavailable(exc) from exc
+            attempt += 1
+            db_trace.stats.add_event(table_name, op, "retries")
+            time.sleep(backoff)
+
+
+# ==========================================
+# Read replicas
+# ==========================================
+# Routers that only read (dashboard, reports, AI context) opt in with the
+# middleware.read_routing.replica_reads dependency. Their select()s then go to
+# one of SUPABASE_REPLICA_URLS (round robin), except:
+# - read-your-writes: for REPLICA_STICKY_SECONDS after a company writes
+#   anything (journal posted, bill paid, ...) its reads stay on the primary,
+#   so a dashboard opened right after posting never shows replica lag.
+#   Tracked per process; the auth dependency binds the company per request.
+# - a replica that fails with a transient error is skipped for
+#   REPLICA_DOWN_SECONDS and the read is re-run on the primary.
+# Writes, and reads in every other router, always use the primary.
+# DATABASE_REPLICA_URL does the same for the direct asyncpg hot reads.
+
+SUPABASE_REPLICA_URLS = [u.strip() for u in os.getenv("SUPABASE_REPLICA_URLS", "").split(",") if u.strip()]
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+REPLICA_DOWN_SECONDS = float(os.getenv("REPLICA_DOWN_SECONDS", "30"))
+
+_prefer_replica: contextvars.ContextVar[bool] = contextvars.ContextVar("db_prefer_replica", default=False)
+_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("db_session", default=None)
+_last_write: Dict[str, float] = {}  # session -> time.monotonic() of its last write
+_last_write_lock = threading.Lock()
+_replicas: Optional[List[Any]] = None
+_replica_down_until: List[float] = []
+_replica_turn = 0
+
+
+def prefer_replica_reads():
+    """Route this request's reads to a replica when one is configured (see replica_reads dependency)."""
+    _prefer_replica.set(True)
+
+
+def bind_session(key: Optional[str]):
+    """Set the read-your-writes key (company id) for the current request."""
+    _session.set(key)
+
+
+def _note_write():
+    key = _session.get()
+    if key is None or not (SUPABASE_REPLICA_URLS or DATABASE_REPLICA_URL):
+        return
+    now = time.monotonic()
+    with _last_write_lock:
+        _last_write[key] = now
+        if len(_last_write) > 10000:
+            for k in [k for k, t in _last_write.items() if now - t > REPLICA_STICKY_SECONDS]:
+                del _last_write[k]
+
+
+def _replica_reads_allowed(table_name: str) -> bool:
+    if not _prefer_replica.get():
+        return False
+    key = _session.get()
+    if key is not None:
+        wrote_at = _last_write.get(key)
+        if wrote_at is not None and time.monotonic() - wrote_at < REPLICA_STICKY_SECONDS:
+            db_trace.stats.add_event(table_name, "select", "sticky_primary")
+            return False
+    return True
+
+
+def _replica_clients() -> List[Any]:
+    """Clients for SUPABASE_REPLICA_URLS, created on first use (same key as the primary)."""
+    global _replicas, _replica_down_until
+    if _replicas is None:
+        primary = get_client()
+        with _client_lock:
+            if _replicas is None:
+                if DB_BACKEND == "memory":
+                    # Offline: replicas share the primary's data (no lag), so routing can be exercised
+                    from lib.memory_backend import MemoryClient
+                    clients = [MemoryClient(primary.db) for _ in SUPABASE_REPLICA_URLS]
+                else:
+                    from supabase import ClientOptions, create_client
+                    key = os.getenv("SUPABASE_REPLICA_KEY") or SUPABASE_KEY or os.getenv("SUPABASE_KEY")
+                    options = ClientOptions(postgrest_client_timeout=DB_CALL_TIMEOUT_S)
+                    clients = [create_client(url, key, options=options) for url in SUPABASE_REPLICA_URLS]
+                _replica_down_until = [0.0] * len(clients)
+                _replicas = clients
+    return _replicas
+
+
+def _pick_replica(table_name: str) -> Optional[int]:
+    """Index of the replica to read from, or None for the primary."""
+    global _replica_turn
+    if not SUPABASE_REPLICA_URLS or not _replica_reads_allowed(table_name):
+        return None
+    clients = _replica_clients()
+    now = time.monotonic()
+    for _ in range(len(clients)):
+        _replica_turn = (_replica_turn + 1) % len(clients)
+        if _replica_down_until[_replica_turn] <= now:
+            return _replica_turn
+    return None
+
+
+def _mark_replica_down(index: int, exc: BaseException):
+    _replica_down_until[index] = time.monotonic() + REPLICA_DOWN_SECONDS
+    logger.warning("Read replica %d failed (%s); using the primary for %.0fs", index, exc, REPLICA_DOWN_SECONDS)
+
+
+# PostgREST/Postgres error codes worth retrying: HTTP timeouts/overload,
+# PostgREST connection-pool errors, serialization failures and deadlocks.
+_TRANSIENT_CODES = {
+    "408", "429", "500", "502", "503", "504",
+    "PGRST000", "PGRST001", "PGRST002", "PGRST003",
+    "40001", "40P01", "57P01", "53300",
+}
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """True for failures where the same request may succeed if retried (network, overload, deadlock)."""
+    if isinstance(exc, DatabaseTimeout):
+        return False  # out of budget: retrying can't help this request
+    if isinstance(exc, DatabaseUnavailable):
+        return True  # only raised for failures already classified as transient (wrapped ConnectError etc.)
+    code = getattr(exc, "code", None)
+    if code is not None:
+        return str(code) in _TRANSIENT_CODES
+    # httpx transport errors (timeouts, connection resets) carry no code
+    return any(cls.__name__ in ("TimeoutException", "TransportError", "NetworkError", "RemoteProtocolError")
+               for cls in type(exc).__mro__) or isinstance(exc, (TimeoutError, ConnectionError))
+
+
+# Failures after which a write certainly changed nothing: the request never
+# reached Postgres (connect errors, PostgREST unable to connect or to get a
+# pool slot, too many connections) or the statement was rolled back
+# (serialization failure, deadlock). Timeouts and other 5xx don't qualify:
+# the write may have committed before its response was lost.
+_UNAPPLIED_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "40001", "40P01", "53300"}
+
+
+def is_unapplied_error(exc: BaseException) -> bool:
+    """True when a failed write is known not to have been applied, so sending it again can't apply it twice."""
+    if isinstance(exc, DatabaseUnavailable) and exc.__cause__ is not None:
+        exc = exc.__cause__
+    if isinstance(exc, DatabaseTimeout):
+        return False
+    code = getattr(exc, "code", None)
+    if code is not None:
+        return str(code) in _UNAPPLIED_CODES
+    return any(cls.__name__ in ("ConnectError", "ConnectTimeout", "PoolTimeout")
+               for cls in type(exc).__mro__) or isinstance(exc, ConnectionRefusedError)
+
+
+# ==========================================
+# Optional direct Postgres path (asyncpg)
+# ==========================================
+# When DATABASE_URL is set and asyncpg is installed (requirements-pg.txt), the
+# queries declared in HOT_QUERIES run over a pooled asyncpg connection instead
+# of PostgREST. asyncpg prepares each statement once per connection and reuses
+# it, so hot paths skip both the HTTP/JSON hop and repeated parse/plan work.
+# Everything else keeps using table(), and callers must fall back to table()
+# whenever pg_enabled() is False.
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+# Use 0 behind a transaction-mode pooler (Supavisor/pgbouncer on :6543), which
+# cannot keep named prepared statements across transactions.
+PG_STATEMENT_CACHE_SIZE = int(os.getenv("PG_STATEMENT_CACHE_SIZE", "100"))
+PG_COMMAND_TIMEOUT = float(os.getenv("PG_COMMAND_TIMEOUT", "10"))
+
+HOT_QUERIES: Dict[str, str] = {
+    # Journal posting
+    "journal_entry_count": """
+        SELECT count(*) FROM journal_entries WHERE company_id = $1
+    """,
+    "insert_journal_entry": """
+        INSERT INTO journal_entries
+            (company_id, journal_number, entry_date, memo, reference_number,
+             source, status, total_debit, total_credit)
+        VALUES ($1, $2, $3::text::date, $4, $5, $6::journal_source, $7::journal_status, $8, $9)
+        RETURNING id
+    """,
+    "insert_journal_line": """
+        INSERT INTO journal_lines
+            (journal_entry_id, account_id, line_number, debit, credit,
+             description, contact_id, tags)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    """,
+    # Debit increases assets/expenses, credit increases liabilities/equity/revenue.
+    # Pass (credit, debit) swapped to reverse a line.
+    "apply_line_to_account": """
+        UPDATE accounts
+        SET current_balance = COALESCE(current_balance, 0) + CASE
+            WHEN account_type IN ('asset', 'expense') THEN $2::numeric - $3::numeric
+            ELSE $3::numeric - $2::numeric
+        END
+        WHERE id = $1
+        RETURNING current_balance
+    """,
+    # Dashboard / reports aggregations
+    "account_totals_by_type": """
+        SELECT account_type::text AS account_type,
+               COALESCE(SUM(current_balance), 0) AS total
+        FROM accounts
+        WHERE company_id = $1
+        GROUP BY account_type
+    """,
+    "monthly_income_expense": """
+        SELECT to_char(je.entry_date, 'Mon') AS month,
+               COALESCE(SUM(jl.credit) FILTER (WHERE a.account_type = 'revenue'), 0) AS income,
+               COALESCE(SUM(jl.debit) FILTER (WHERE a.account_type = 'expense'), 0) AS expenses
+        FROM journal_entries je
+        JOIN journal_lines jl ON jl.journal_entry_id = je.id
+        JOIN accounts a ON a.id = jl.account_id
+        WHERE je.company_id = $1 AND je.entry_date >= $2::text::date
+        GROUP BY 1
+    """,
+    # AI financial summary (lib/financial_summary.py)
+    "summary_account_balances": """
+        SELECT account_code, account_name, account_type::text AS account_type, current_balance
+        FROM accounts
+        WHERE company_id = $1
+    """,
+    "summary_monthly_income_expense": """
+        SELECT to_char(je.entry_date, 'YYYY-MM') AS month,
+               COALESCE(SUM(jl.credit) FILTER (WHERE a.account_type = 'revenue'), 0) AS income,
+               COALESCE(SUM(jl.debit) FILTER (WHERE a.account_type = 'expense'), 0) AS expenses
+        FROM journal_entries je
+        JOIN journal_lines jl ON jl.journal_entry_id = je.id
+        JOIN accounts a ON a.id = jl.account_id
+        WHERE je.company_id = $1 AND je.entry_date >= $2::text::date
+        GROUP BY 1
+        ORDER BY 1
+    """,
+    "summary_top_vendors": """
+        SELECT c.display_name AS vendor, SUM(jl.debit) AS spend
+        FROM journal_entries je
+        JOIN journal_lines jl ON jl.journal_entry_id = je.id
+        JOIN accounts a ON a.id = jl.account_id
+        JOIN contacts c ON c.id = jl.contact_id
+        WHERE je.company_id = $1 AND je.entry_date >= $2::text::date AND a.account_type = 'expense'
+        GROUP BY c.display_name
+        ORDER BY spend DESC
+        LIMIT $3
+    """,
+    "summary_recent_entries": """
+        SELECT entry_date::text AS entry_date, memo
+        FROM journal_entries
+        WHERE company_id = $1
+        ORDER BY entry_date DESC, created_at DESC
+        LIMIT $2
+    """,
+}
+
+_pg_pool = None
+_pg_replica_pool = None  # DATABASE_REPLICA_URL, for hot reads from replica_reads routers
+_pg_loop: Optional[asyncio.AbstractEventLoop] = None  # the app's event loop, which owns the pools
+
+
+def pg_enabled() -> bool:
+    """True when the direct asyncpg pool is up and hot queries can bypass PostgREST."""
+    return _pg_pool is not None
+
+
+async def init_pg_pool():
+    """Create the asyncpg pool (app startup). No-op without DATABASE_URL or asyncpg."""
+    global _pg_pool, _pg_loop
+    if _pg_pool is not None or not DATABASE_URL or DB_BACKEND == "memory":
+        return
+    try:
+        import asyncpg
+    except ImportError:
+        logger.warning("DATABASE_URL is set but asyncpg is not installed; using PostgREST only.")
+        return
+    try:
+        pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=PG_POOL_MIN_SIZE,
+            max_size=PG_POOL_MAX_SIZE,
+            statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+            command_timeout=PG_COMMAND_TIMEOUT,
+        )
+        # Fail fast on schema drift: every declared hot query must prepare.
+        async with pool.acquire() as conn:
+            for sql in HOT_QUERIES.values():
+                await conn.prepare(sql)
+    except Exception as e:
+        logger.warning("Direct Postgres pool unavailable (%s); using PostgREST only.", e)
+        return
+    _pg_pool = pool
+    _pg_loop = asyncio.get_running_loop()
+    logger.info("Direct Postgres pool ready (%d hot queries).", len(HOT_QUERIES))
+
+    if DATABASE_REPLICA_URL:
+        global _pg_replica_pool
+        try:
+            replica = await asyncpg.create_pool(
+                DATABASE_REPLICA_URL,
+                min_size=PG_POOL_MIN_SIZE,
+                max_size=PG_POOL_MAX_SIZE,
+                statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+                command_timeout=PG_COMMAND_TIMEOUT,
+            )
+            async with replica.acquire() as conn:
+                for sql in HOT_QUERIES.values():
+                    if sql.lstrip().upper().startswith("SELECT"):
+                        await conn.prepare(sql)
+        except Exception as e:
+            logger.warning("Direct Postgres replica pool unavailable (%s); hot reads use the primary.", e)
+            return
+        _pg_replica_pool = replica
+        logger.info("Direct Postgres replica pool ready.")
+
+
+async def close_pg_pool():
+    """Close the asyncpg pools (app shutdown)."""
+    global _pg_pool, _pg_replica_pool, _pg_loop
+    pools = (_pg_pool, _pg_replica_pool)
+    _pg_pool = _pg_replica_pool = _pg_loop = None
+    for pool in pools:
+        if pool is not None:
+            await pool.close()
+
+
+def _to_python(value: Any) -> Any:
+    # asyncpg returns NUMERIC as Decimal; routers and JSON responses expect floats.
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _record_to_dict(record) -> Dict[str, Any]:
+    return {k: _to_python(v) for k, v in record.items()}
+
+
+@asynccontextmanager
+async def pg_transaction():
+    """Yield a pooled connection inside a transaction, for multi-statement hot paths."""
+    if _pg_pool is None:
+        raise RuntimeError("Direct Postgres pool is not initialized")
+    async with _pg_pool.acquire() as conn:
+        async with conn.transaction():
+            yield conn
+    _note_write()
+
+
+async def _run_hot(name: str, method: str, args: tuple, conn=None):
+    """Execute a hot query on `conn` (or a pooled connection) and trace it like a table() call."""
+    sql = HOT_QUERIES[name]
+    kwargs = {}
+    remaining = _check_deadline(f"pg:{name}", "hot")
+    if remaining is not None:
+        kwargs["timeout"] = remaining  # request deadline instead of PG_COMMAND_TIMEOUT
+    is_read = sql.lstrip().upper().startswith("SELECT")
+    start = time.perf_counter()
+    failed = True
+    try:
+        if conn is not None:
+            result = await getattr(conn, method)(sql, *args, **kwargs)
+        elif is_read and _pg_replica_pool is not None and _replica_reads_allowed(f"pg:{name}"):
+            db_trace.stats.add_event(f"pg:{name}", "hot", "replica_reads")
+            try:
+                async with _pg_replica_pool.acquire() as c:
+                    result = await getattr(c, method)(sql, *args, **kwargs)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as exc:
+                logger.warning("Replica hot read %s failed (%s); using the primary", name, exc)
+                db_trace.stats.add_event(f"pg:{name}", "hot", "replica_fallbacks")
+                async with _pg_pool.acquire() as c:
+                    result = await getattr(c, method)(sql, *args, **kwargs)
+        else:
+            async with _pg_pool.acquire() as c:
+                result = await getattr(c, method)(sql, *args, **kwargs)
+            if not is_read:
+                _note_write()
+        failed = False
+        return result
+    except asyncio.TimeoutError as exc:
+        db_trace.stats.add_event(f"pg:{name}", "hot", "timeouts")
+        raise DatabaseTimeout(f"Database budget exhausted running {name}") from exc
+    finally:
+        db_trace.record_call(f"pg:{name}", "hot", f"hot {name}", (time.perf_counter() - start) * 1000, failed)
+
+
+async def hot_fetch(name: str, *args, conn=None) -> List[Dict[str, Any]]:
+    """Run a declared hot query and return all rows as dicts."""
+    return [_record_to_dict(r) for r in await _run_hot(name, "fetch", args, conn)]
+
+
+async def hot_fetchrow(name: str, *args, conn=None) -> Optional[Dict[str, Any]]:
+    """Run a declared hot query and return the first row (or None)."""
+    rows = await hot_fetch(name, *args, conn=conn)
+    return rows[0] if rows else None
+
+
+async def hot_fetchval(name: str, *args, conn=None) -> Any:
+    """Run a declared hot query and return the first column of the first row."""
+    return _to_python(await _run_hot(name, "fetchval", args, conn))
+
+
+async def hot_executemany(name: str, rows: List[tuple], conn=None) -> None:
+    """Run a declared hot statement once per argument tuple (single prepared statement)."""
+    await _run_hot(name, "executemany", (rows,), conn)
+
+
+def run_pg(async_fn, *args):
+    """
+    Call a direct-Postgres coroutine from sync code running in a thread: a
+    sync (`def`) endpoint in FastAPI's worker threads, or the write queue's
+    replay thread. The pool lives on the app's event loop, so the coroutine
+    is handed to that loop and awaited from the thread. The caller's context
+    (request trace, etc.) is carried over to the loop.
+    """
+    loop = _pg_loop
+    if loop is None or loop.is_closed():
+        raise RuntimeError("Direct Postgres pool is not initialized")
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_pg() blocks; await the coroutine directly on the event loop")
+    ctx = contextvars.copy_context()
+
+    async def _in_caller_context():
+        return await asyncio.get_running_loop().create_task(async_fn(*args), context=ctx)
+
+    return asyncio.run_coroutine_threadsafe(_in_caller_context(), loop).result()
+
 
-print("Supabase connection initialized successfully (using service_role key).")
+def pg_numeric(value: Optional[float]) -> Decimal:
+    """Convert a float amount to Decimal for NUMERIC parameters without float noise."""
+    return Decimal(str(value or 0))
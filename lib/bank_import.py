@@ -0,0 +1,331 @@
+"""
+Bank statement CSV import into bank_transactions (POST /bank/accounts/{id}/import).
+
+    result = bank_import.import_csv(source, company_id, bank_account_id, profile="auto")
+
+The statement is read BANK_IMPORT_CHUNK_ROWS rows at a time (pandas chunksize,
+every column as text), so memory stays bounded however long it is. Dates and
+amounts of a chunk are normalized with column operations rather than row by
+row, and each chunk goes out as one bulk upsert (lib/bulk_writer.py).
+
+Banks lay their exports out differently, so a profile (PROFILES) says which
+columns hold the date, the description, the amount (signed, or separate
+debit/credit columns) and optionally a bank reference. profile="auto" tries
+the bank-specific profiles, then "generic", then exports without a header row,
+against the first lines of the file (summary lines above the header are
+skipped).
+
+Each row gets provider_transaction_id = "csv:" + a hash of the bank account,
+date, amount, description, reference and how many identical rows came before
+it in the file. Re-importing a statement therefore never duplicates a
+transaction: the upsert on (company_id, provider_transaction_id) skips rows
+that are already there.
+
+pandas is imported on first use, like in smart_parser.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+
+from lib.bulk_writer import bulk_upsert
+
+BANK_IMPORT_CHUNK_ROWS = int(os.getenv("BANK_IMPORT_CHUNK_ROWS", "5000"))
+_MAX_REJECTED = 50  # rejected rows listed in the response
+_SNIFF_LINES = 30  # lines searched for the header row
+_SNIFF_BYTES = 64 * 1024
+
+# Column spec: header names (matched case-insensitively, first one present
+# wins) or, for exports without a header row, column positions.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "chase": {
+        "columns": {"date": "Posting Date", "description": "Description", "amount": "Amount",
+                    "reference": "Check or Slip #"},
+        "require": ("Details",),
+        "date_format": "%m/%d/%Y",
+    },
+    "chase_card": {
+        "columns": {"date": "Transaction Date", "description": "Description", "amount": "Amount"},
+        "require": ("Post Date", "Category", "Type"),
+        "date_format": "%m/%d/%Y",
+    },
+    "bank_of_america": {
+        "columns": {"date": "Date", "description": "Description", "amount": "Amount"},
+        "require": ("Running Bal.",),
+        "date_format": "%m/%d/%Y",
+    },
+    "bank_of_america_card": {
+        "columns": {"date": "Posted Date", "description": "Payee", "amount": "Amount",
+                    "reference": "Reference Number"},
+        "date_format": "%m/%d/%Y",
+    },
+    "capital_one": {
+        "columns": {"date": "Transaction Date", "description": "Description", "debit": "Debit",
+                    "credit": "Credit"},
+        "require": ("Card No.",),
+        "date_format": "%Y-%m-%d",
+    },
+    "amex": {
+        # Charges are positive in Amex exports
+        "columns": {"date": "Date", "description": "Description", "amount": "Amount", "reference": "Reference"},
+        "require": ("Card Member",),
+        "date_format": "%m/%d/%Y",
+        "negate": True,
+    },
+    "generic": {
+        "columns": {
+            "date": ("Date", "Posted Date", "Posting Date", "Transaction Date", "Trans Date", "Booking Date",
+                     "Value Date"),
+            "description": ("Description", "Details", "Payee", "Name", "Narrative", "Transaction Description",
+                            "Memo"),
+            "amount": ("Amount", "Transaction Amount"),
+            "debit": ("Debit", "Withdrawal", "Withdrawals", "Money Out", "Paid Out"),
+            "credit": ("Credit", "Deposit", "Deposits", "Money In", "Paid In"),
+            "reference": ("Reference", "Transaction ID", "Ref", "Check Number"),
+        },
+    },
+    "wells_fargo": {
+        # No header row: date, amount, *, check number, description
+        "columns": {"date": 0, "amount": 1, "reference": 3, "description": 4},
+        "date_format": "%m/%d/%Y",
+    },
+}
+
+
+def _candidates(spec: Any) -> tuple:
+    return spec if isinstance(spec, tuple) else (spec,)
+
+
+def _resolve(profile: Dict[str, Any], row: List[str]) -> Optional[Dict[str, int]]:
+    """Map the profile's fields to column positions for this header row (or first data row), or None."""
+    columns = profile["columns"]
+    if all(isinstance(spec, int) for spec in columns.values()):
+        # Headerless: the row must already look like a transaction
+        if len(row) <= max(columns.values()):
+            return None
+        try:
+            datetime.strptime(row[columns["date"]].strip(), profile["date_format"])
+            float(row[columns["amount"]].strip().replace(",", ""))
+        except ValueError:
+            return None
+        return dict(columns)
+
+    headers = {cell.strip().lower(): i for i, cell in reversed(list(enumerate(row)))}
+    if not all(name.lower() in headers for name in profile.get("require", ())):
+        return None
+    positions = {}
+    for field, spec in columns.items():
+        for name in _candidates(spec):
+            if name.lower() in headers:
+                positions[field] = headers[name.lower()]
+                break
+    has_amount = "amount" in positions or ("debit" in positions and "credit" in positions)
+    if "date" not in positions or "description" not in positions or not has_amount:
+        return None
+    if "amount" in positions:
+        positions.pop("debit", None)
+        positions.pop("credit", None)
+    return positions
+
+
+def _head_rows(source: Union[bytes, str]) -> List[List[str]]:
+    if isinstance(source, (bytes, bytearray)):
+        head = bytes(source[:_SNIFF_BYTES])
+    else:
+        with open(source, "rb") as f:
+            head = f.read(_SNIFF_BYTES)
+    lines = head.decode("utf-8-sig", errors="replace").splitlines()[:_SNIFF_LINES]
+    return list(csv.reader(lines))
+
+
+def detect(source: Union[bytes, str], profile: str = "auto") -> Tuple[str, int, Dict[str, int], bool]:
+    """(profile name, line index of the header/first row, field -> column position, has header row)"""
+    if profile != "auto" and profile not in PROFILES:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown profile '{profile}'; expected auto or one of {', '.join(PROFILES)}"
+        )
+    names = list(PROFILES) if profile == "auto" else [profile]
+    rows = _head_rows(source)
+    for name in names:
+        spec = PROFILES[name]
+        for index, row in enumerate(rows):
+            positions = _resolve(spec, row) if row else None
+            if positions is not None:
+                has_header = not all(isinstance(s, int) for s in spec["columns"].values())
+                return name, index, positions, has_header
+    raise HTTPException(
+        status_code=400,
+        detail="Could not find the date, description and amount columns"
+               + ("" if profile != "auto" else f"; pass profile= one of {', '.join(PROFILES)}"),
+    )
+
+
+def _amounts(values):
+    """Text amounts -> floats: currency symbols, thousands separators, (12.34) and 12.34- negatives."""
+    import pandas as pd
+
+    text = values.fillna("").astype(str).str.strip()
+    negative = (text.str.startswith("(") & text.str.endswith(")")) | text.str.endswith("-")
+    text = text.str.replace(r"[^\d.\-]", "", regex=True).str.replace(r"(?<=.)-$", "", regex=True)
+    amount = pd.to_numeric(text, errors="coerce")
+    return amount.where(~negative, -amount.abs())
+
+
+def _dates(values, date_format: Optional[str] = None):
+    import pandas as pd
+
+    text = values.fillna("").astype(str).str.strip()
+    parsed = pd.to_datetime(text, format=date_format or "mixed", errors="coerce")
+    if date_format:
+        # Some exports mix formats (e.g. a footer in ISO); retry what didn't parse
+        retry = parsed.isna() & (text != "")
+        if retry.any():
+            parsed[retry] = pd.to_datetime(text[retry], format="mixed", errors="coerce")
+    return parsed
+
+
+def _normalize(chunk, spec: Dict[str, Any]):
+    """One chunk (columns named by field) -> frame of date, name, amount, reference, error."""
+    import pandas as pd
+
+    out = pd.DataFrame(index=chunk.index)
+    out["date"] = _dates(chunk["date"], spec.get("date_format"))
+    if "amount" in chunk:
+        amount = _amounts(chunk["amount"])
+    else:
+        debit = _amounts(chunk["debit"]).abs()
+        credit = _amounts(chunk["credit"]).abs()
+        amount = credit.fillna(0) - debit.fillna(0)
+        amount[debit.isna() & credit.isna()] = float("nan")
+    if spec.get("negate"):
+        amount = -amount
+    out["amount"] = amount.round(2)
+    out["name"] = (
+        chunk["description"].fillna("").astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+    ).replace("", "(no description)")
+    out["reference"] = chunk["reference"].fillna("").astype(str).str.strip() if "reference" in chunk else ""
+    out["error"] = None
+    out.loc[out["amount"].isna(), "error"] = "Invalid amount"
+    out.loc[out["date"].isna(), "error"] = "Invalid date"
+    return out
+
+
+class _Deduper:
+    """Stable provider_transaction_id per row; identical rows in one file are told apart by their count."""
+
+    def __init__(self, bank_account_id: str):
+        self.bank_account_id = bank_account_id
+        self.seen: Dict[str, int] = {}
+
+    def ids(self, frame) -> List[str]:
+        key = (
+            self.bank_account_id + "|" + frame["date"].dt.strftime("%Y-%m-%d") + "|"
+            + (frame["amount"] * 100).round().astype("int64").astype(str) + "|"
+            + frame["name"].str.lower() + "|" + frame["reference"]
+        )
+        occurrence = key.groupby(key).cumcount() + key.map(self.seen).fillna(0).astype("int64")
+        for value, count in key.value_counts().items():
+            self.seen[value] = self.seen.get(value, 0) + int(count)
+        return [
+            "csv:" + hashlib.sha256(f"{k}|{n}".encode("utf-8")).hexdigest()[:32]
+            for k, n in zip(key, occurrence)
+        ]
+
+
+def import_csv(source: Union[bytes, str], company_id: str, bank_account_id: str, profile: str = "auto",
+               currency: Optional[str] = None) -> Dict[str, Any]:
+    """Import a statement (file path or bytes) into bank_transactions; returns counts and rejected rows."""
+    import pandas as pd
+
+    started = time.perf_counter()
+    name, header_index, positions, has_header = detect(source, profile)
+    spec = PROFILES[name]
+    fields = {position: field for field, position in positions.items()}
+    deduper = _Deduper(bank_account_id)
+    stats = {"rows": 0, "imported": 0, "duplicates": 0, "rejected": 0}
+    rejected: List[Dict[str, Any]] = []
+    failed: List[Dict[str, Any]] = []
+
+    reader = pd.read_csv(
+        io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source,
+        header=None,
+        skiprows=header_index + (1 if has_header else 0),
+        usecols=sorted(fields),
+        dtype=str,
+        keep_default_na=False,
+        skip_blank_lines=True,
+        encoding="utf-8-sig",
+        encoding_errors="replace",
+        chunksize=BANK_IMPORT_CHUNK_ROWS,
+    )
+    try:
+        with reader:
+            for chunk in reader:
+                chunk = chunk.rename(columns=fields)
+                frame = _normalize(chunk, spec)
+                first_row = stats["rows"] + 1  # 1-based data row number of this chunk's first row
+                stats["rows"] += len(frame)
+
+                bad = frame["error"].notna()
+                if bad.any():
+                    stats["rejected"] += int(bad.sum())
+                    for position in bad.to_numpy().nonzero()[0][:max(0, _MAX_REJECTED - len(rejected))]:
+                        rejected.append({"row": first_row + int(position), "error": frame["error"].iloc[position]})
+                    row_numbers = [first_row + int(p) for p in (~bad).to_numpy().nonzero()[0]]
+                    frame = frame[~bad]
+                else:
+                    row_numbers = list(range(first_row, first_row + len(frame)))
+                if frame.empty:
+                    continue
+
+                ids = deduper.ids(frame)
+                dates = frame["date"].dt.strftime("%Y-%m-%d").tolist()
+                rows = []
+                for i, (date, txn_name, amount, reference) in enumerate(
+                    zip(dates, frame["name"], frame["amount"].tolist(), frame["reference"])
+                ):
+                    raw = {"import": "csv", "profile": name, "row": row_numbers[i]}
+                    if reference:
+                        raw["reference"] = reference
+                    row = {
+                        "company_id": company_id,
+                        "bank_account_id": bank_account_id,
+                        "provider_transaction_id": ids[i],
+                        "posted_date": date,
+                        "name": txn_name,
+                        "amount": amount,
+                        "status": "unreviewed",
+                        "raw": raw,
+                    }
+                    if currency:
+                        row["currency"] = currency
+                    rows.append(row)
+
+                # ignore_duplicates: rows already imported are skipped and not returned
+                result = bulk_upsert(
+                    "bank_transactions", rows, on_conflict="company_id,provider_transaction_id",
+                    ignore_duplicates=True,
+                )
+                stats["imported"] += len(result.rows)
+                stats["duplicates"] += result.written - len(result.rows)
+                failed.extend({"row": row_numbers[f.index], "error": f.error} for f in result.failures)
+    except (pd.errors.ParserError, UnicodeDecodeError) as exc:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Could not read the statement after row {stats['rows']}: {exc}. "
+                   "Rows before it were imported; importing the file again is safe.",
+        )
+
+    return {
+        "profile": name,
+        **stats,
+        "failed": failed,
+        "rejected_rows": rejected,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,220 @@
+"""
+Chunked multi-row inserts/upserts through database.table().
+
+    from lib.bulk_writer import bulk_insert, bulk_upsert
+
+    result = bulk_insert("invoice_lines", rows)
+    if not result.ok:
+        raise HTTPException(status_code=400, detail=result.summary())
+    created = result.rows
+
+Rows are split into chunks of BULK_CHUNK_SIZE and each chunk is sent as one
+multi-row request (one round trip instead of one per row). Chunks run
+concurrently, at most BULK_CONCURRENCY at a time. Failed chunks are retried up
+to BULK_RETRIES times with backoff when sending them again is safe: upserts
+after any transient error (see database.is_transient_error), inserts only
+when the error shows nothing was written (connect errors, deadlocks, see
+database.is_unapplied_error). An insert that timed out or got a 5xx may have
+committed, so it is reported as failed rather than risk duplicate rows. A
+chunk rejected for its data
+(constraint violation, bad value) is bisected until the offending rows are
+isolated, so every good row is still written and each bad row is reported
+with its index in the input list.
+
+Each chunk is one statement, so a chunk is all-or-nothing, but the write as a
+whole is not. Callers that need all-or-nothing semantics (lines of one invoice)
+check `result.ok` and compensate:
+
+    if not lines.ok:
+        delete_parent("invoices", invoice["id"])   # lines cascade
+        lines.raise_if_unavailable()               # database trouble: 503, worth retrying
+        raise HTTPException(status_code=400, detail=lines.summary())
+"""
+
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from database import table, is_transient_error, is_unapplied_error, DatabaseUnavailable
+
+logger = logging.getLogger("bulk_writer")
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "4"))
+BULK_RETRIES = int(os.getenv("BULK_RETRIES", "2"))
+BULK_RETRY_BACKOFF_S = float(os.getenv("BULK_RETRY_BACKOFF_S", "0.2"))
+
+
+class RowFailure:
+    __slots__ = ("index", "row", "error", "exc")
+
+    def __init__(self, index: int, row: Dict[str, Any], error: str, exc: Optional[BaseException] = None):
+        self.index = index  # position in the rows passed to bulk_insert/bulk_upsert
+        self.row = row
+        self.error = error
+        self.exc = exc
+
+    @property
+    def transient(self) -> bool:
+        """Failed because of the database (outage, timeout), not because of the row's data."""
+        return self.exc is not None and is_transient_error(self.exc)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index": self.index, "error": self.error}
+
+
+class BulkResult:
+    """Outcome of a bulk write: returned rows (input order), per-row failures and request stats."""
+
+    def __init__(self, table_name: str, total: int):
+        self.table = table_name
+        self.total = total
+        self.rows: List[Dict[str, Any]] = []
+        self.failures: List[RowFailure] = []
+        self.requests = 0
+        self.retries = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    @property
+    def written(self) -> int:
+        return self.total - len(self.failures)
+
+    @property
+    def unavailable(self) -> bool:
+        """True when some rows failed because of the database rather than their data."""
+        return any(f.transient for f in self.failures)
+
+    def raise_if_unavailable(self) -> None:
+        """Raise DatabaseUnavailable (-> 503 with Retry-After) when any row failed because of the database."""
+        for failure in self.failures:
+            if not failure.transient:
+                continue
+            if isinstance(failure.exc, DatabaseUnavailable):
+                raise failure.exc
+            raise DatabaseUnavailable(failure.exc) from failure.exc
+
+    def summary(self) -> str:
+        if self.ok:
+            return f"{self.total} {self.table} rows written"
+        shown = "; ".join(f"#{f.index + 1}: {f.error}" for f in self.failures[:10])
+        more = f" (+{len(self.failures) - 10} more)" if len(self.failures) > 10 else ""
+        return f"{len(self.failures)} of {self.total} {self.table} rows failed: {shown}{more}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "total": self.total,
+            "written": self.written,
+            "failed": [f.to_dict() for f in self.failures],
+        }
+
+
+def _error_message(exc: BaseException) -> str:
+    return getattr(exc, "message", None) or str(exc)
+
+
+class _BulkWrite:
+    def __init__(self, table_name: str, rows: Sequence[Dict[str, Any]], mode: str, options: Dict[str, Any],
+                 chunk_size: int, retries: int):
+        self.table_name = table_name
+        self.rows = list(rows)
+        self.mode = mode
+        self.options = options
+        self.chunk_size = max(1, chunk_size)
+        self.retries = retries
+        self.result = BulkResult(table_name, len(self.rows))
+        self._lock = threading.Lock()  # counters are updated from worker threads
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self.result, field, getattr(self.result, field) + 1)
+
+    def _send(self, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """One multi-row request, retried with jittered backoff when that is safe (see module docstring)."""
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                query = table(self.table_name)
+                # default_to_null=False: keys missing from some rows take the column DEFAULT
+                if self.mode == "upsert":
+                    response = query.upsert(chunk, default_to_null=False, **self.options).execute()
+                else:
+                    response = query.insert(chunk, default_to_null=False, **self.options).execute()
+                return response.data or []
+            except Exception as exc:
+                # Re-sending an insert that may have committed would duplicate its rows
+                safe = is_transient_error(exc) if self.mode == "upsert" else is_unapplied_error(exc)
+                if attempt >= self.retries or not safe:
+                    raise
+                attempt += 1
+                self._count("retries")
+                time.sleep(BULK_RETRY_BACKOFF_S * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    def _write(self, start: int, chunk: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[RowFailure]]:
+        """Write rows[start:start+len(chunk)]; bisect on data errors to isolate the failing rows."""
+        try:
+            return self._send(chunk), []
+        except Exception as exc:
+            if len(chunk) == 1 or is_transient_error(exc):
+                return [], [RowFailure(start + i, row, _error_message(exc), exc) for i, row in enumerate(chunk)]
+            mid = len(chunk) // 2
+            left_rows, left_failures = self._write(start, chunk[:mid])
+            right_rows, right_failures = self._write(start + mid, chunk[mid:])
+            return left_rows + right_rows, left_failures + right_failures
+
+    def run(self, concurrency: int) -> BulkResult:
+        chunks = [(i, self.rows[i:i + self.chunk_size]) for i in range(0, len(self.rows), self.chunk_size)]
+        if len(chunks) <= 1 or concurrency <= 1:
+            outcomes = [self._write(start, chunk) for start, chunk in chunks]
+        else:
+            # Copy the caller's context per chunk so request tracing/deadlines follow the work
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._write, start, chunk)
+                    for start, chunk in chunks
+                ]
+                outcomes = [f.result() for f in futures]
+        for rows, failures in outcomes:
+            self.result.rows.extend(rows)
+            self.result.failures.extend(failures)
+        return self.result
+
+
+def bulk_insert(table_name: str, rows: Sequence[Dict[str, Any]], *, chunk_size: Optional[int] = None,
+                concurrency: Optional[int] = None, retries: Optional[int] = None) -> BulkResult:
+    """Insert rows in chunked multi-row requests; see module docstring."""
+    return _BulkWrite(
+        table_name, rows, "insert", {},
+        chunk_size or BULK_CHUNK_SIZE, BULK_RETRIES if retries is None else retries,
+    ).run(concurrency or BULK_CONCURRENCY)
+
+
+def bulk_upsert(table_name: str, rows: Sequence[Dict[str, Any]], *, on_conflict: str = "",
+                ignore_duplicates: bool = False, chunk_size: Optional[int] = None,
+                concurrency: Optional[int] = None, retries: Optional[int] = None) -> BulkResult:
+    """Upsert rows in chunked multi-row requests (ON CONFLICT on `on_conflict` columns, default primary key)."""
+    return _BulkWrite(
+        table_name, rows, "upsert", {"on_conflict": on_conflict, "ignore_duplicates": ignore_duplicates},
+        chunk_size or BULK_CHUNK_SIZE, BULK_RETRIES if retries is None else retries,
+    ).run(concurrency or BULK_CONCURRENCY)
+
+
+def delete_parent(table_name: str, row_id: str) -> None:
+    """
+    Compensate for child rows that failed: delete their parent (written children cascade).
+    Best effort: when the database is down this delete can fail too; it is logged with the
+    id for cleanup, and the caller goes on to raise the original failure.
+    """
+    try:
+        table(table_name).delete().eq("id", row_id).execute()
+    except Exception as exc:
+        logger.error("Could not remove %s %s after its lines failed: %s", table_name, row_id, exc)
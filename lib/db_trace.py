@@ -0,0 +1,240 @@
+"""
+Per-request database call tracing and N+1 detection.
+
+database.table() wraps every query builder so that execute() reports
+(table, operation, filter shape, latency) here. The HTTP middleware in
+middleware/db_trace.py opens a RequestTrace per request, turns it into a
+Server-Timing header, and folds it into the process-wide stats served by
+GET /debug/db-stats.
+
+A "filter shape" is the operation plus the filtered column names, without
+values: `select eq:id eq:company_id single`. The same shape repeating inside
+one request is the signature of a query issued from a loop (N+1).
+
+Per table/operation latencies also go into a LatencyHistogram; database.py
+reads its p95 to decide when to hedge a slow read.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("db.trace")
+
+# Warn when one table/filter shape is issued more than this many times in a request
+NPLUS1_THRESHOLD = int(os.getenv("DB_NPLUS1_THRESHOLD", "5"))
+
+
+# Bucket upper bounds in ms (roughly log-spaced); the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750,
+                       1000, 1500, 2000, 3000, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; quantiles are bucket upper bounds (cheap, mergeable)."""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.total = 0
+
+    def observe(self, duration_ms: float):
+        i = 0
+        while i < len(HISTOGRAM_BOUNDS_MS) and duration_ms > HISTOGRAM_BOUNDS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound (ms) of the bucket holding the q-th quantile; None when empty."""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return HISTOGRAM_BOUNDS_MS[i] if i < len(HISTOGRAM_BOUNDS_MS) else float("inf")
+        return float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = {}
+        for i, n in enumerate(self.counts):
+            if n:
+                buckets[f"le_{HISTOGRAM_BOUNDS_MS[i]}" if i < len(HISTOGRAM_BOUNDS_MS) else "inf"] = n
+        return {
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class RequestTrace:
+    """Database calls made while serving one HTTP request."""
+
+    __slots__ = ("calls", "_lock")
+
+    def __init__(self):
+        # (table, operation, shape, duration_ms, failed)
+        self.calls: List[Tuple[str, str, str, float, bool]] = []
+        self._lock = threading.Lock()
+
+    def add(self, table: str, operation: str, shape: str, duration_ms: float, failed: bool):
+        with self._lock:
+            self.calls.append((table, operation, shape, duration_ms, failed))
+
+    @property
+    def total_ms(self) -> float:
+        return sum(c[3] for c in self.calls)
+
+    def repeated_shapes(self, threshold: int = NPLUS1_THRESHOLD) -> List[Dict[str, Any]]:
+        """Table/shape pairs issued more than `threshold` times (likely N+1 loops)."""
+        counts = Counter((c[0], c[2]) for c in self.calls)
+        return [
+            {"table": table, "shape": shape, "count": n}
+            for (table, shape), n in counts.most_common()
+            if n > threshold
+        ]
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. `db;dur=41.2;desc="9 queries"`."""
+        return f'db;dur={self.total_ms:.1f};desc="{len(self.calls)} queries"'
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("db_request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+def start_request_trace():
+    """Begin tracing for the current request; returns a token for end_request_trace()."""
+    return _current.set(RequestTrace())
+
+
+def end_request_trace(token, route: str) -> Optional[RequestTrace]:
+    """Stop tracing, warn about repeated shapes and fold the trace into the global stats."""
+    trace = _current.get()
+    _current.reset(token)
+    if trace is None:
+        return None
+    repeated = trace.repeated_shapes()
+    for item in repeated:
+        logger.warning(
+            "Possible N+1 on %s: %s `%s` issued %d times in one request",
+            route, item["table"], item["shape"], item["count"],
+        )
+    stats.add_request(route, trace, repeated)
+    return trace
+
+
+def record_call(table: str, operation: str, shape: str, duration_ms: float, failed: bool = False):
+    """Called by database.py after every execute()."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(table, operation, shape, duration_ms, failed)
+    stats.add_call(table, operation, duration_ms, failed)
+
+
+class DbStats:
+    """Process-wide aggregates (per route and per table/operation) since start or last reset."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.routes: Dict[str, Dict[str, Any]] = {}
+            self.tables: Dict[str, Dict[str, Any]] = {}
+            self.histograms: Dict[str, LatencyHistogram] = {}
+            self.nplus1: deque = deque(maxlen=50)
+
+    def _table(self, key: str) -> Dict[str, Any]:
+        t = self.tables.get(key)
+        if t is None:
+            t = self.tables[key] = {
+                "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0,
+                "replica_reads": 0, "replica_fallbacks": 0, "sticky_primary": 0,
+            }
+            self.histograms[key] = LatencyHistogram()
+        return t
+
+    def add_call(self, table: str, operation: str, duration_ms: float, failed: bool):
+        key = f"{table} {operation}"
+        with self._lock:
+            t = self._table(key)
+            t["calls"] += 1
+            t["errors"] += 1 if failed else 0
+            t["total_ms"] += duration_ms
+            t["max_ms"] = max(t["max_ms"], duration_ms)
+            if not failed:
+                self.histograms[key].observe(duration_ms)
+
+    def add_event(self, table: str, operation: str, event: str):
+        """Count a policy event (retries, hedges, timeouts, replica_reads, ...) for a table/operation."""
+        with self._lock:
+            self._table(f"{table} {operation}")[event] += 1
+
+    def quantile_ms(self, table: str, operation: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Latency quantile for a table/operation, or None with fewer than min_samples successful calls."""
+        with self._lock:
+            h = self.histograms.get(f"{table} {operation}")
+            if h is None or h.total < min_samples:
+                return None
+            return h.quantile(q)
+
+    def add_request(self, route: str, trace: RequestTrace, repeated: List[Dict[str, Any]]):
+        calls = len(trace.calls)
+        with self._lock:
+            r = self.routes.setdefault(route, {
+                "requests": 0, "db_calls": 0, "db_ms": 0.0, "max_calls": 0, "nplus1_requests": 0,
+            })
+            r["requests"] += 1
+            r["db_calls"] += calls
+            r["db_ms"] += trace.total_ms
+            r["max_calls"] = max(r["max_calls"], calls)
+            if repeated:
+                r["nplus1_requests"] += 1
+                self.nplus1.append({"route": route, "at": time.time(), "repeated": repeated})
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {
+                route: {
+                    **r,
+                    "db_ms": round(r["db_ms"], 2),
+                    "avg_calls": round(r["db_calls"] / r["requests"], 2),
+                    "avg_db_ms": round(r["db_ms"] / r["requests"], 2),
+                }
+                for route, r in self.routes.items()
+            }
+            tables = {
+                key: {
+                    **t,
+                    "total_ms": round(t["total_ms"], 2),
+                    "max_ms": round(t["max_ms"], 2),
+                    "avg_ms": round(t["total_ms"] / t["calls"], 2) if t["calls"] else 0.0,
+                    **self.histograms[key].to_dict(),
+                }
+                for key, t in self.tables.items()
+            }
+            return {
+                "since": self.started_at,
+                "nplus1_threshold": NPLUS1_THRESHOLD,
+                "routes": dict(sorted(routes.items(), key=lambda kv: -kv[1]["db_calls"])),
+                "tables": dict(sorted(tables.items(), key=lambda kv: -kv[1]["total_ms"])),
+                "recent_nplus1": list(self.nplus1),
+            }
+
+
+stats = DbStats()
@@ -0,0 +1,287 @@
+"""
+Compact financial summary per company, for AI context (FINANCIAL_SUMMARY_ENABLED, on by default).
+
+/ai/query read every account and every journal entry with all its lines on
+each question, to put a few totals and the latest entries into the prompt.
+get() returns a small precomputed summary instead:
+
+    summary = await financial_summary.get(company_id)
+    text = financial_summary.to_prompt(summary)
+
+- totals by account type and the largest accounts of each type
+- revenue and expenses per month for the last FINANCIAL_SUMMARY_MONTHS months
+- top vendors by expense spend over the same months (contacts on expense lines)
+- account and journal entry counts and the latest entries
+
+Summaries are keyed by ledger_versions.version, which the triggers of
+migrations/007_financial_summaries.sql bump on every write to accounts,
+journal_entries or journal_lines. After reading that one small row:
+
+- this process's copy is at least that version: no other read
+- otherwise one read of financial_summaries (one row per company, written by
+  whichever worker built it last)
+- only when that row is behind the ledger, the summary is rebuilt
+  (aggregated in Postgres over the direct pool when DATABASE_URL is set,
+  otherwise from PostgREST reads limited to the trend window) and stored
+
+Versions only grow, and a copy is never replaced by an older one: the
+version may come from a lagging read replica (REPLICA_READS), so a worker
+can build for a version that another worker has already passed, and
+_save() then leaves the newer stored summary alone. A summary built while
+the ledger changes is tagged with the older version, so it is rebuilt on
+the next question. Without the migration (no ledger_versions table)
+summaries are kept for FINANCIAL_SUMMARY_TTL_S.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("financial_summary")
+
+FINANCIAL_SUMMARY_ENABLED = os.getenv("FINANCIAL_SUMMARY_ENABLED", "1").lower() in ("1", "true", "yes")
+FINANCIAL_SUMMARY_MONTHS = int(os.getenv("FINANCIAL_SUMMARY_MONTHS", "12"))
+FINANCIAL_SUMMARY_TOP = int(os.getenv("FINANCIAL_SUMMARY_TOP", "5"))
+FINANCIAL_SUMMARY_TTL_S = float(os.getenv("FINANCIAL_SUMMARY_TTL_S", "300"))
+FINANCIAL_SUMMARY_MAX_COMPANIES = int(os.getenv("FINANCIAL_SUMMARY_MAX_COMPANIES", "1000"))
+
+_ACCOUNTS_PER_TYPE = 3
+_RECENT_ENTRIES = 5
+
+_entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # company_id -> {"version", "summary", "at"}
+_lock = threading.Lock()
+counts = {"memory_hits": 0, "db_hits": 0, "rebuilds": 0}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        counts[name] += 1
+
+
+def _window_start(months: int = FINANCIAL_SUMMARY_MONTHS) -> str:
+    """First day of the month `months - 1` months back (the current month counts as one)."""
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1).isoformat()
+
+
+# ---------- building ----------
+
+def _summarize(accounts: List[Dict[str, Any]], journal_count: int, monthly: List[Dict[str, Any]],
+               vendors: List[Dict[str, Any]], recent: List[Dict[str, Any]]) -> Dict[str, Any]:
+    by_type: Dict[str, Dict[str, Any]] = {}
+    for acc in accounts:
+        entry = by_type.setdefault(acc.get("account_type") or "Unknown", {"count": 0, "total": 0.0, "top": []})
+        balance = float(acc.get("current_balance") or 0)
+        entry["count"] += 1
+        entry["total"] += balance
+        entry["top"].append({"code": acc.get("account_code", ""), "name": acc.get("account_name", ""),
+                             "balance": balance})
+    for entry in by_type.values():
+        entry["total"] = round(entry["total"], 2)
+        entry["top"] = sorted(entry["top"], key=lambda a: abs(a["balance"]), reverse=True)[:_ACCOUNTS_PER_TYPE]
+    return {
+        "account_count": len(accounts),
+        "journal_count": journal_count,
+        "by_type": by_type,
+        "monthly": [{"month": m["month"], "income": round(float(m["income"]), 2),
+                     "expenses": round(float(m["expenses"]), 2)} for m in monthly],
+        "top_vendors": [{"vendor": v["vendor"], "spend": round(float(v["spend"]), 2)} for v in vendors],
+        "recent": [{"entry_date": r.get("entry_date"), "memo": r.get("memo")} for r in recent],
+        "since": _window_start(),
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+async def _build_direct(company_id: str) -> Dict[str, Any]:
+    """Aggregated in Postgres: a handful of small result sets, whatever the ledger size."""
+    from database import hot_fetch, hot_fetchval
+    since = _window_start()
+    accounts = await hot_fetch("summary_account_balances", company_id)
+    journal_count = await hot_fetchval("journal_entry_count", company_id)
+    monthly = await hot_fetch("summary_monthly_income_expense", company_id, since)
+    vendors = await hot_fetch("summary_top_vendors", company_id, since, FINANCIAL_SUMMARY_TOP)
+    recent = await hot_fetch("summary_recent_entries", company_id, _RECENT_ENTRIES)
+    return _summarize(accounts, journal_count or 0, monthly, vendors, recent)
+
+
+def _build_rest(company_id: str) -> Dict[str, Any]:
+    """From PostgREST: the chart of accounts plus the journal lines of the trend window only."""
+    from database import table
+    since = _window_start()
+    accounts = table("accounts").select("id, account_code, account_name, account_type, current_balance")\
+        .eq("company_id", company_id).execute().data or []
+    journal_count = table("journal_entries").select("id", count="exact").eq("company_id", company_id)\
+        .limit(1).execute().count or 0
+    recent = table("journal_entries").select("entry_date, memo").eq("company_id", company_id)\
+        .order("entry_date", desc=True).order("created_at", desc=True).limit(_RECENT_ENTRIES).execute().data or []
+    window = table("journal_entries").select("entry_date, journal_lines(debit, credit, account_id, contact_id)")\
+        .eq("company_id", company_id).gte("entry_date", since).execute().data or []
+
+    types = {acc["id"]: acc["account_type"] for acc in accounts}
+    months: Dict[str, Dict[str, Any]] = {}
+    spend: Dict[str, float] = {}
+    for entry in window:
+        month = months.setdefault(str(entry["entry_date"])[:7], {"income": 0.0, "expenses": 0.0})
+        for line in entry.get("journal_lines") or []:
+            account_type = types.get(line.get("account_id"))
+            if account_type == "revenue":
+                month["income"] += line.get("credit") or 0
+            elif account_type == "expense":
+                month["expenses"] += line.get("debit") or 0
+                if line.get("contact_id"):
+                    spend[line["contact_id"]] = spend.get(line["contact_id"], 0.0) + (line.get("debit") or 0)
+
+    top = sorted(spend.items(), key=lambda item: item[1], reverse=True)[:FINANCIAL_SUMMARY_TOP]
+    names = {}
+    if top:
+        rows = table("contacts").select("id, display_name").in_("id", [contact_id for contact_id, _ in top])\
+            .execute().data or []
+        names = {row["id"]: row["display_name"] for row in rows}
+    vendors = [{"vendor": names.get(contact_id, "Unknown"), "spend": amount} for contact_id, amount in top]
+    monthly = [{"month": month, **totals} for month, totals in sorted(months.items())]
+    return _summarize(accounts, journal_count, monthly, vendors, recent)
+
+
+async def build(company_id: str) -> Dict[str, Any]:
+    from database import pg_enabled
+    if pg_enabled():
+        return await _build_direct(company_id)
+    return await asyncio.to_thread(_build_rest, company_id)
+
+
+# ---------- financial_summaries ----------
+
+def _version(company_id: str) -> Optional[int]:
+    """ledger_versions.version: 0 before the first ledger write, None without migration 007."""
+    from database import table
+    try:
+        rows = table("ledger_versions").select("version").eq("company_id", company_id).limit(1).execute().data
+    except Exception as exc:
+        logger.debug("Ledger version lookup failed: %s", exc)
+        return None
+    return rows[0]["version"] if rows else 0
+
+
+def _load(company_id: str) -> Optional[Dict[str, Any]]:
+    from database import table
+    try:
+        rows = table("financial_summaries").select("ledger_version, summary").eq("company_id", company_id)\
+            .limit(1).execute().data
+    except Exception as exc:
+        logger.warning("Financial summary lookup failed: %s", exc)
+        return None
+    return rows[0] if rows else None
+
+
+def _save(company_id: str, version: int, summary: Dict[str, Any]) -> None:
+    """Store the summary unless the stored one is as new: a conditional update, or an insert for the first one."""
+    from database import supabase
+    from postgrest.exceptions import APIError
+    row = {"company_id": company_id, "ledger_version": version, "summary": summary, "built_at": summary["built_at"]}
+    try:
+        for _ in range(2):
+            updated = supabase.table("financial_summaries").update(row).eq("company_id", company_id)\
+                .lt("ledger_version", version).execute().data
+            if updated:
+                return
+            try:
+                supabase.table("financial_summaries").insert(row).execute()
+                return
+            except APIError as exc:
+                # A row exists: newer (leave it) or inserted by another worker meanwhile (compare again)
+                if exc.code != "23505":
+                    raise
+    except Exception as exc:
+        logger.warning("Financial summary write failed: %s", exc)
+
+
+def _remember(company_id: str, version: Optional[int], summary: Dict[str, Any]) -> None:
+    with _lock:
+        current = _entries.get(company_id)
+        if current is not None and version is not None and (current["version"] or 0) > version:
+            return
+        _entries[company_id] = {"version": version, "summary": summary, "at": time.time()}
+        _entries.move_to_end(company_id)
+        while len(_entries) > FINANCIAL_SUMMARY_MAX_COMPANIES:
+            _entries.popitem(last=False)
+
+
+# ---------- lookup ----------
+
+async def get(company_id: str) -> Dict[str, Any]:
+    """The company's summary, built only when the ledger changed (see module docstring)."""
+    if not FINANCIAL_SUMMARY_ENABLED:
+        return await build(company_id)
+
+    version = await asyncio.to_thread(_version, company_id)
+
+    with _lock:
+        cached = _entries.get(company_id)
+        if cached is not None:
+            _entries.move_to_end(company_id)
+    if cached is not None:
+        if version is not None:
+            fresh = cached["version"] is not None and cached["version"] >= version
+        else:
+            fresh = time.time() - cached["at"] < FINANCIAL_SUMMARY_TTL_S
+        if fresh:
+            _count("memory_hits")
+            return cached["summary"]
+
+    if version is None:
+        summary = await build(company_id)
+        _count("rebuilds")
+        _remember(company_id, None, summary)
+        return summary
+
+    stored = await asyncio.to_thread(_load, company_id)
+    if stored is not None and stored["ledger_version"] >= version:
+        _count("db_hits")
+        _remember(company_id, stored["ledger_version"], stored["summary"])
+        return stored["summary"]
+
+    summary = await build(company_id)
+    _count("rebuilds")
+    _remember(company_id, version, summary)
+    await asyncio.to_thread(_save, company_id, version, summary)
+    return summary
+
+
+def to_prompt(summary: Dict[str, Any]) -> str:
+    """The financial part of the AI prompt."""
+    text = f"\nFinancial Data: {summary['account_count']} accounts, {summary['journal_count']} journal entries\n\n"
+    if summary["by_type"]:
+        text += "ACCOUNTS BY TYPE:\n"
+        for acc_type, data in summary["by_type"].items():
+            text += f"  {acc_type}: {data['count']} accounts, Total: ${data['total']:,.2f}\n"
+            for acc in data["top"]:
+                text += f"    - {acc['code']}: {acc['name']} = ${acc['balance']:,.2f}\n"
+    if summary["monthly"]:
+        text += f"\nMONTHLY REVENUE / EXPENSES (since {summary['since']}):\n"
+        for month in summary["monthly"]:
+            text += f"  - {month['month']}: ${month['income']:,.2f} / ${month['expenses']:,.2f}\n"
+    if summary["top_vendors"]:
+        text += "\nTOP VENDORS BY SPEND:\n"
+        for vendor in summary["top_vendors"]:
+            text += f"  - {vendor['vendor']}: ${vendor['spend']:,.2f}\n"
+    if summary["recent"]:
+        text += f"\nRECENT TRANSACTIONS ({len(summary['recent'])}):\n"
+        for entry in summary["recent"]:
+            text += f"  - {entry.get('entry_date') or 'N/A'}: {entry.get('memo') or 'No memo'}\n"
+    return text
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {"enabled": FINANCIAL_SUMMARY_ENABLED, "companies": len(_entries), **counts}
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
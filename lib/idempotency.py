@@ -0,0 +1,158 @@
+"""
+Idempotency keys: apply a write once per key and hand back the stored result
+for every repeat.
+
+Rows live in idempotency_keys (migrations/004 and 005), unique per
+(company_id, key):
+
+    status       processing -> completed | failed
+    response     the stored result (JSON)
+    status_code  HTTP status of the stored response
+    request_hash fingerprint of the original request (a key reused for a
+                 different request is rejected)
+    expires_at   created + IDEMPOTENCY_TTL_HOURS; expired keys are free again
+
+Used by the Idempotency-Key support on create endpoints
+(middleware/idempotency.py) and by lib/write_queue.py replays (keys prefixed
+"queue:" so they never collide with client keys).
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from database import table
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# A 'processing' row older than this is from a crashed/abandoned attempt and may be taken over
+IDEMPOTENCY_STALE_S = float(os.getenv("IDEMPOTENCY_STALE_S", "60"))
+_PURGE_EVERY_S = 3600
+
+_last_purge = 0.0
+
+
+class IdempotentReplay(Exception):
+    """Raised instead of running an endpoint whose key already has a stored response."""
+
+    def __init__(self, row: Dict[str, Any]):
+        self.status_code = row.get("status_code") or 200
+        self.response = row.get("response")
+        super().__init__(f"Idempotent replay ({self.status_code})")
+
+
+def request_fingerprint(method: str, path: str, query: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query.encode(), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _fetch(company_id: str, key: str) -> Optional[Dict[str, Any]]:
+    r = table("idempotency_keys")\
+        .select("status, response, status_code, request_hash, created_at, expires_at")\
+        .eq("company_id", company_id)\
+        .eq("key", key)\
+        .maybe_single()\
+        .execute()
+    return r.data if r else None
+
+
+def lookup(company_id: str, key: str) -> Optional[Dict[str, Any]]:
+    """The unexpired row for `key`, if any."""
+    row = _fetch(company_id, key)
+    if row is None:
+        return None
+    expires_at = _parse_ts(row.get("expires_at"))
+    if expires_at is not None and expires_at <= datetime.now(timezone.utc):
+        return None
+    return row
+
+
+def _reclaimable(row: Dict[str, Any]) -> bool:
+    """Expired rows, and 'processing' rows nobody has finished within IDEMPOTENCY_STALE_S."""
+    now = datetime.now(timezone.utc)
+    expires_at = _parse_ts(row.get("expires_at"))
+    if expires_at is not None and expires_at <= now:
+        return True
+    created_at = _parse_ts(row.get("created_at"))
+    return (row["status"] == "processing" and created_at is not None
+            and (now - created_at).total_seconds() > IDEMPOTENCY_STALE_S)
+
+
+def claim(company_id: str, key: str, operation: str, request_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Claim `key` for a write about to run. Returns None when the caller now owns
+    it, otherwise the existing row (completed/failed: replay it; processing:
+    another attempt is running).
+    """
+    _maybe_purge()
+    for _ in range(2):
+        try:
+            table("idempotency_keys").insert({
+                "company_id": company_id,
+                "key": key,
+                "operation": operation,
+                "status": "processing",
+                "request_hash": request_hash,
+                "expires_at": (datetime.now(timezone.utc) + timedelta(hours=IDEMPOTENCY_TTL_HOURS)).isoformat(),
+            }).execute()
+            return None
+        except Exception as exc:
+            if getattr(exc, "code", None) != "23505":
+                raise
+        row = _fetch(company_id, key)
+        if row is None:
+            continue  # deleted in between; try again
+        if not _reclaimable(row):
+            return row
+        table("idempotency_keys").delete().eq("company_id", company_id).eq("key", key).execute()
+    return _fetch(company_id, key)
+
+
+def finish(company_id: str, key: str, status: str, response: Any, status_code: Optional[int] = None):
+    """Store the outcome (status 'completed' or 'failed') for replays."""
+    table("idempotency_keys")\
+        .update({"status": status, "response": response, "status_code": status_code})\
+        .eq("company_id", company_id)\
+        .eq("key", key)\
+        .execute()
+
+
+def release(company_id: str, key: str):
+    """Give up a claim whose write didn't run, so a retry can claim the key again (best effort)."""
+    try:
+        table("idempotency_keys")\
+            .delete()\
+            .eq("company_id", company_id)\
+            .eq("key", key)\
+            .eq("status", "processing")\
+            .execute()
+    except Exception:
+        pass  # left 'processing'; reclaimable after IDEMPOTENCY_STALE_S
+
+
+def _maybe_purge():
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < _PURGE_EVERY_S:
+        return
+    _last_purge = now
+    try:
+        table("idempotency_keys").delete().lt("expires_at", datetime.now(timezone.utc).isoformat()).execute()
+    except Exception:
+        pass  # purge is housekeeping only
@@ -0,0 +1,174 @@
+"""
+Image preprocessing before OCR (OCR_PREPROCESS, on by default).
+
+Phone photos of receipts arrive at 12+ megapixels, often sideways (EXIF
+orientation), a few degrees off and with the table around the paper.
+EasyOCR's time grows with the pixel count, and skew and background clutter
+cost accuracy. prepare() fixes that in memory, without temp files:
+
+    array = image_prep.prepare(source)      # bytes, path or PIL image -> uint8 grayscale array for readtext
+
+1. EXIF rotation
+2. grayscale
+3. crop to the receipt: the bright paper region against a darker background
+4. deskew: the angle (within OCR_DESKEW_MAX_DEG) at which the text rows line up best
+5. downscale so text lines are about OCR_TARGET_TEXT_PX high (never upscaled),
+   with the long side at most OCR_MAX_SIDE
+
+The crop box, angle and text height are measured on a small thumbnail. The
+full image is then cropped, scaled and rotated once. Time it with
+python benchmarks/bench_preprocess.py.
+"""
+
+import io
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1").lower() in ("1", "true", "yes")
+OCR_TARGET_TEXT_PX = int(os.getenv("OCR_TARGET_TEXT_PX", "28"))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2000"))
+OCR_DESKEW_MAX_DEG = float(os.getenv("OCR_DESKEW_MAX_DEG", "8"))
+
+_THUMB_SIDE = 1000  # crop and text height are measured at this size
+_SKEW_SIDE = 500  # the skew search runs on an even smaller copy
+
+
+def _open(source):
+    from PIL import Image
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(bytes(source)))
+    return Image.open(source)
+
+
+def _otsu(pixels) -> int:
+    """Threshold between ink and paper (Otsu's method on the histogram)."""
+    import numpy as np
+    hist = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean[-1] * weight / total - mean) ** 2 / (weight * (total - weight))
+    return int(np.nanargmax(between))
+
+
+def _paper_box(pixels, threshold: int) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box of the bright paper, or None when it fills (nearly) the whole picture."""
+    import numpy as np
+    bright = pixels > threshold
+    row_share, col_share = bright.mean(axis=1), bright.mean(axis=0)
+    # Rows/columns that cross the paper for at least half its width/height
+    rows = np.flatnonzero(row_share >= max(0.05, 0.5 * row_share.max()))
+    cols = np.flatnonzero(col_share >= max(0.05, 0.5 * col_share.max()))
+    if not len(rows) or not len(cols):
+        return None
+    height, width = pixels.shape
+    pad_y, pad_x = int(height * 0.01), int(width * 0.01)
+    box = (max(0, cols[0] - pad_x), max(0, rows[0] - pad_y),
+           min(width, cols[-1] + 1 + pad_x), min(height, rows[-1] + 1 + pad_y))
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    if area > 0.9 * width * height or area < 0.05 * width * height:
+        return None
+    return box
+
+
+def _row_sharpness(ink_image, angle: float) -> float:
+    import numpy as np
+    rows = np.asarray(ink_image.rotate(angle, expand=False, fillcolor=0), dtype=np.float64).sum(axis=1)
+    return float(np.square(np.diff(rows)).sum())
+
+
+def _skew_angle(ink_image) -> float:
+    """Rotation (degrees, counter-clockwise) at which the text rows give the sharpest row profile."""
+    if OCR_DESKEW_MAX_DEG <= 0:
+        return 0.0
+    limit = OCR_DESKEW_MAX_DEG
+    steps = [-limit + i for i in range(int(2 * limit) + 1)]
+    best = max(steps, key=lambda a: _row_sharpness(ink_image, a))
+    fine = [best + d / 4 for d in range(-3, 4) if abs(best + d / 4) <= limit]
+    best = max(fine, key=lambda a: _row_sharpness(ink_image, a))
+    return best if abs(best) >= 0.25 else 0.0
+
+
+def _text_height(ink) -> Optional[float]:
+    """Median height (pixels) of the runs of rows that contain ink, i.e. of the text lines."""
+    import numpy as np
+    width = ink.shape[1]
+    # Central columns only, and rows that are mostly dark are background left around the paper
+    share = ink[:, width // 10: width - width // 10].mean(axis=1)
+    has_ink = (share > 0.01) & (share < 0.5)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], has_ink.astype(np.int8), [0]))))
+    heights = edges[1::2] - edges[::2]
+    heights = heights[heights >= 2]
+    return float(np.median(heights)) if len(heights) >= 3 else None
+
+
+def analyze(image) -> Dict[str, Any]:
+    """Crop box, skew angle and scale factor for a grayscale PIL image (measured on thumbnails)."""
+    import numpy as np
+    from PIL import Image
+
+    width, height = image.size
+    step = max(1, max(width, height) // _THUMB_SIDE)
+    thumb = image.reduce(step) if step > 1 else image
+    shrink = width / thumb.width
+    pixels = np.asarray(thumb)
+    threshold = _otsu(pixels)
+
+    box = _paper_box(pixels, threshold)
+    if box:
+        thumb = thumb.crop(box)
+        pixels = np.asarray(thumb)
+        threshold = _otsu(pixels)
+
+    ink = Image.fromarray(((pixels < threshold) * 255).astype(np.uint8))
+    skew_shrink = max(1.0, max(ink.size) / _SKEW_SIDE)
+    small = ink.resize((max(1, round(ink.width / skew_shrink)), max(1, round(ink.height / skew_shrink))),
+                       Image.BILINEAR)
+    angle = _skew_angle(small)
+    if angle:
+        ink = ink.rotate(angle, expand=True, fillcolor=0)
+
+    full_box = tuple(round(v * shrink) for v in box) if box else (0, 0, width, height)
+    crop_w, crop_h = full_box[2] - full_box[0], full_box[3] - full_box[1]
+    # Deskewing (expand=True) grows the picture, so the cap applies to the rotated size
+    # (less 2 px for the rounding of the expanded canvas)
+    turn = math.radians(abs(angle))
+    rotated_side = max(crop_w * math.cos(turn) + crop_h * math.sin(turn),
+                       crop_h * math.cos(turn) + crop_w * math.sin(turn))
+    factor = min(1.0, (OCR_MAX_SIDE - 2 if angle else OCR_MAX_SIDE) / rotated_side)
+    text_px = _text_height(np.asarray(ink) > 127)
+    if text_px:
+        factor = min(factor, OCR_TARGET_TEXT_PX / (text_px * shrink))
+    return {"box": full_box if box else None, "angle": angle, "scale": factor, "text_px": text_px and text_px * shrink}
+
+
+def prepare(source, exif: bool = True, stats: Optional[Dict[str, Any]] = None):
+    """
+    OCR-ready grayscale array of an image (bytes, path or PIL image); see module docstring.
+    stats, if given, is filled with what analyze() measured.
+    """
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    image = _open(source)
+    if image.format == "JPEG":
+        image.draft("L", image.size)  # decode straight to grayscale
+    if exif:
+        image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+    plan = analyze(image)
+    if stats is not None:
+        stats.update(plan)
+    if plan["box"]:
+        image = image.crop(plan["box"])
+    if plan["scale"] < 1.0:
+        size = (max(1, round(image.width * plan["scale"])), max(1, round(image.height * plan["scale"])))
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    if plan["angle"]:
+        image = image.rotate(plan["angle"], resample=Image.BILINEAR, expand=True, fillcolor=255)
+    return np.asarray(image)
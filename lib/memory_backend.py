@@ -0,0 +1,1017 @@
+"""
+In-memory, PostgREST-compatible stand-in for the Supabase client (DB_BACKEND=memory).
+
+Tables, column types, defaults, unique constraints and foreign keys are loaded
+from newschema.sql plus migrations/*.sql, so benchmarks, scripts and tests can
+run the real routers offline. It implements the subset of the postgrest-py
+query builder the routers use:
+
+    select("*, journal_lines(*, accounts(account_code))", count="exact")
+    eq / neq / gt / gte / lt / lte / in_ / is_ / like / ilike / match
+    order(col, desc=...) / limit / offset / range / single / maybe_single
+    insert / upsert(on_conflict=..., ignore_duplicates=...) / update / delete
+
+Embeds follow foreign keys in either direction (many-to-one -> object,
+one-to-many -> list), like PostgREST. Deletes honour ON DELETE CASCADE /
+SET NULL / RESTRICT. Errors are raised as postgrest APIError with the same
+codes Postgres/PostgREST use (23505 unique, 23503 foreign key, 23502 not null,
+PGRST116 for single()).
+
+Generic triggers are emulated (updated_at on UPDATE, generated `a = b`
+columns, the ledger_versions bump of migration 007). The accounting triggers in newschema.sql (journal totals,
+posting effects, period locks) are NOT; routers that rely on them behave as
+they would with those triggers disabled.
+
+Rows live in dicts keyed by an internal row id. Unique constraints have their
+own key -> row id maps, and equality filters use per-column hash indexes that
+are built on first use and maintained on every write.
+
+Each execute() sleeps MEMORY_BACKEND_LATENCY_MS (+/- MEMORY_BACKEND_JITTER_MS)
+to simulate the network round trip to PostgREST. For resilience testing,
+MEMORY_BACKEND_SLOW_RATE makes that fraction of calls take an extra
+MEMORY_BACKEND_SLOW_MS, and MEMORY_BACKEND_ERROR_RATE makes that fraction fail
+with a 503 before touching any data (see MemoryDatabase.set_faults).
+"""
+
+import copy
+import glob
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from postgrest.exceptions import APIError
+except ImportError:  # keep the backend usable without the supabase stack
+    class APIError(Exception):
+        def __init__(self, error: Dict[str, str]):
+            self.message = error.get("message")
+            self.code = error.get("code")
+            self.hint = error.get("hint")
+            self.details = error.get("details")
+            Exception.__init__(self, str(error))
+
+        def json(self) -> Dict[str, str]:
+            return {"message": self.message, "code": self.code, "hint": self.hint, "details": self.details}
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_FILES = [os.path.join(ROOT, "newschema.sql")] + sorted(glob.glob(os.path.join(ROOT, "migrations", "*.sql")))
+
+LATENCY_MS = float(os.getenv("MEMORY_BACKEND_LATENCY_MS", "0"))
+JITTER_MS = float(os.getenv("MEMORY_BACKEND_JITTER_MS", "0"))
+ERROR_RATE = float(os.getenv("MEMORY_BACKEND_ERROR_RATE", "0"))
+SLOW_RATE = float(os.getenv("MEMORY_BACKEND_SLOW_RATE", "0"))
+SLOW_MS = float(os.getenv("MEMORY_BACKEND_SLOW_MS", "0"))
+
+# Writes to these bump ledger_versions (migrations/007_financial_summaries.sql)
+_LEDGER_TABLES = ("accounts", "journal_entries", "journal_lines")
+
+
+def _error(code: str, message: str, details: Optional[str] = None, hint: Optional[str] = None) -> APIError:
+    return APIError({"code": code, "message": message, "details": details, "hint": hint})
+
+
+# ==========================================
+# Schema (parsed from the SQL files)
+# ==========================================
+
+_KEYWORDS = ("PRIMARY", "NOT", "NULL", "DEFAULT", "REFERENCES", "UNIQUE", "CHECK", "GENERATED", "CONSTRAINT")
+
+
+class Column:
+    __slots__ = ("name", "kind", "nullable", "default", "generated")
+
+    def __init__(self, name: str, kind: str, nullable: bool = True, default: Optional[str] = None,
+                 generated: Optional[Tuple[str, str]] = None):
+        self.name = name
+        self.kind = kind            # uuid/text/int/numeric/bool/date/timestamp/json/array
+        self.nullable = nullable
+        self.default = default      # raw SQL default expression
+        self.generated = generated  # (left, right) for `GENERATED ALWAYS AS (left = right)`
+
+
+class ForeignKey:
+    __slots__ = ("table", "column", "ref_table", "ref_column", "on_delete")
+
+    def __init__(self, table, column, ref_table, ref_column, on_delete):
+        self.table = table
+        self.column = column
+        self.ref_table = ref_table
+        self.ref_column = ref_column
+        self.on_delete = on_delete  # CASCADE / SET NULL / RESTRICT / NO ACTION
+
+
+def _kind(sql_type: str) -> str:
+    t = sql_type.strip().lower()
+    if t.endswith("[]"):
+        return "array"
+    base = t.split("(")[0].strip()
+    if base == "uuid":
+        return "uuid"
+    if base in ("integer", "int", "int4", "int8", "bigint", "smallint", "serial", "bigserial"):
+        return "int"
+    if base in ("numeric", "decimal", "real", "float", "float8", "double precision"):
+        return "numeric"
+    if base in ("boolean", "bool"):
+        return "bool"
+    if base == "date":
+        return "date"
+    if base.startswith("timestamp"):
+        return "timestamp"
+    if base in ("json", "jsonb"):
+        return "json"
+    return "text"  # text, varchar, inet, enum types
+
+
+def _split_top_level(body: str) -> List[str]:
+    """Split on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in body:
+        if ch == "'":
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _strip_comments(sql: str) -> str:
+    return re.sub(r"--[^\n]*", "", sql)
+
+
+_REFERENCES = re.compile(r"REFERENCES\s+(?:public\.)?([\w.]+)\s*\((\w+)\)(?:\s+ON\s+DELETE\s+(CASCADE|SET\s+NULL|RESTRICT|NO\s+ACTION|SET\s+DEFAULT))?", re.I)
+_DEFAULT = re.compile(r"DEFAULT\s+('(?:[^']|'')*'(?:::[\w\[\]]+)?|[\w.]+\(\)|[-\w.]+)", re.I)
+_GENERATED = re.compile(r"GENERATED\s+ALWAYS\s+AS\s*\(\s*(\w+)\s*=\s*(\w+)\s*\)", re.I)
+
+
+def _parse_column(table: str, definition: str):
+    """Return (Column, [ForeignKey], is_primary_key, is_unique) for one column definition."""
+    name, rest = definition.split(None, 1)
+    upper = rest.upper()
+    cut = min([m.start() for kw in _KEYWORDS for m in [re.search(r"\b%s\b" % kw, upper)] if m] or [len(rest)])
+    column = Column(name, _kind(rest[:cut]))
+    primary = "PRIMARY KEY" in upper
+    column.nullable = not (primary or "NOT NULL" in upper)
+    default = _DEFAULT.search(rest)
+    if default:
+        column.default = default.group(1)
+    generated = _GENERATED.search(rest)
+    if generated:
+        column.generated = (generated.group(1), generated.group(2))
+    fks = []
+    ref = _REFERENCES.search(rest)
+    if ref:
+        on_delete = re.sub(r"\s+", " ", (ref.group(3) or "NO ACTION").upper())
+        fks.append(ForeignKey(table, name, ref.group(1), ref.group(2), on_delete))
+    return column, fks, primary, bool(re.search(r"\bUNIQUE\b", upper))
+
+
+class TableSchema:
+    def __init__(self, name: str):
+        self.name = name
+        self.columns: Dict[str, Column] = {}
+        self.primary_key: Tuple[str, ...] = ()
+        self.uniques: List[Tuple[str, ...]] = []
+        self.foreign_keys: List[ForeignKey] = []
+
+    def add_definition(self, definition: str):
+        upper = definition.upper()
+        if upper.startswith("CONSTRAINT "):
+            definition = definition.split(None, 2)[2]
+            upper = definition.upper()
+        if upper.startswith("PRIMARY KEY"):
+            self.primary_key = tuple(c.strip() for c in re.search(r"\((.*?)\)", definition).group(1).split(","))
+            self.uniques.append(self.primary_key)
+        elif upper.startswith("UNIQUE"):
+            self.uniques.append(tuple(c.strip() for c in re.search(r"\((.*?)\)", definition).group(1).split(",")))
+        elif upper.startswith("FOREIGN KEY"):
+            column = re.search(r"\((\w+)\)", definition).group(1)
+            ref = _REFERENCES.search(definition)
+            if ref:
+                on_delete = re.sub(r"\s+", " ", (ref.group(3) or "NO ACTION").upper())
+                self.foreign_keys.append(ForeignKey(self.name, column, ref.group(1), ref.group(2), on_delete))
+        elif upper.startswith(("CHECK", "EXCLUDE")):
+            return
+        else:
+            column, fks, primary, unique = _parse_column(self.name, definition)
+            self.columns[column.name] = column
+            self.foreign_keys.extend(fks)
+            if primary:
+                self.primary_key = (column.name,)
+                self.uniques.append(self.primary_key)
+            elif unique:
+                self.uniques.append((column.name,))
+
+
+def load_schema(paths: Iterable[str] = SCHEMA_FILES) -> Dict[str, TableSchema]:
+    """Parse CREATE TABLE and ALTER TABLE ... ADD COLUMN statements into TableSchema objects."""
+    tables: Dict[str, TableSchema] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            sql = _strip_comments(f.read())
+        for name, body in re.findall(r"CREATE TABLE(?: IF NOT EXISTS)?\s+(?:public\.)?(\w+)\s*\((.*?)\n\s*\);", sql, re.S | re.I):
+            schema = TableSchema(name)
+            for definition in _split_top_level(body):
+                schema.add_definition(definition)
+            tables[name] = schema
+        for name, definition in re.findall(
+            r"ALTER TABLE\s+(?:public\.)?(\w+)\s+ADD COLUMN(?: IF NOT EXISTS)?\s+([^;]+);", sql, re.I
+        ):
+            schema = tables.get(name)
+            if schema is None:
+                continue
+            column, fks, _, unique = _parse_column(name, definition.strip())
+            if column.name not in schema.columns:
+                schema.columns[column.name] = column
+                schema.foreign_keys.extend(fks)
+                if unique:
+                    schema.uniques.append((column.name,))
+    return tables
+
+
+# ==========================================
+# Values
+# ==========================================
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _coerce(kind: str, value: Any) -> Any:
+    """Normalise a Python/JSON value the way Postgres would store and PostgREST return it."""
+    if value is None:
+        return None
+    if kind == "numeric":
+        if isinstance(value, bool):
+            return float(value)
+        return float(value) if isinstance(value, (int, float, str, Decimal)) and value != "" else value
+    if kind == "int":
+        return int(value) if isinstance(value, (int, float, str, Decimal)) and value != "" else value
+    if kind == "bool":
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "t", "1", "yes")
+        return bool(value)
+    if kind == "date":
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()[:10]
+        return str(value)[:10]
+    if kind == "timestamp":
+        return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+    if kind in ("json", "array"):
+        return copy.deepcopy(value)
+    return str(value)
+
+
+def _default_value(column: Column) -> Any:
+    expr = column.default
+    if expr is None:
+        return None
+    lowered = expr.lower()
+    if lowered in ("uuid_generate_v4()", "gen_random_uuid()"):
+        return str(uuid.uuid4())
+    if lowered in ("now()", "current_timestamp"):
+        return _now()
+    if lowered == "current_date":
+        return date.today().isoformat()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if lowered == "null":
+        return None
+    if expr.startswith("'"):
+        literal = expr[1:expr.rindex("'")].replace("''", "'")
+        if column.kind == "json":
+            return {} if literal == "{}" else literal
+        if column.kind == "array":
+            return [] if literal == "{}" else [v.strip() for v in literal.strip("{}").split(",")]
+        return _coerce(column.kind, literal)
+    try:
+        return _coerce(column.kind, expr)
+    except (TypeError, ValueError):
+        return None
+
+
+def _hashable(value: Any) -> bool:
+    return not isinstance(value, (dict, list))
+
+
+def _copy_value(value: Any) -> Any:
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+def _like(pattern: str, case_insensitive: bool):
+    regex = "^" + ".*".join(re.escape(part) for part in pattern.replace("*", "%").split("%")) + "$"
+    return re.compile(regex, re.I if case_insensitive else 0)
+
+
+def _compare(op: str, left: Any, right: Any) -> bool:
+    if op == "is":
+        return left is right if right is None or isinstance(right, bool) else False
+    if left is None:
+        return False
+    if op == "eq":
+        return left == right
+    if op == "neq":
+        return left != right
+    if op == "in":
+        return left in right
+    if op in ("like", "ilike"):
+        return bool(right.match(str(left)))
+    try:
+        if op == "gt":
+            return left > right
+        if op == "gte":
+            return left >= right
+        if op == "lt":
+            return left < right
+        if op == "lte":
+            return left <= right
+    except TypeError:
+        return str(left) > str(right) if op in ("gt", "gte") else str(left) < str(right)
+    raise _error("PGRST100", f"Unsupported operator: {op}")
+
+
+# ==========================================
+# Storage
+# ==========================================
+
+class MemoryTable:
+    """Rows of one table plus its unique-key and hash indexes."""
+
+    def __init__(self, schema: TableSchema):
+        self.schema = schema
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._next_rowid = 1
+        self.unique_indexes: Dict[Tuple[str, ...], Dict[tuple, int]] = {cols: {} for cols in schema.uniques}
+        self.indexes: Dict[str, Dict[Any, set]] = {}
+        for fk in schema.foreign_keys:
+            self.indexes[fk.column] = {}
+
+    # ---- indexes ----
+
+    def ensure_index(self, column: str) -> Optional[Dict[Any, set]]:
+        """Hash index on `column`, built on first use. None for json/array columns."""
+        index = self.indexes.get(column)
+        if index is None:
+            col = self.schema.columns.get(column)
+            if col is None or col.kind in ("json", "array"):
+                return None
+            index = {}
+            for rowid, row in self.rows.items():
+                index.setdefault(row.get(column), set()).add(rowid)
+            self.indexes[column] = index
+        return index
+
+    def _index_add(self, rowid: int, row: Dict[str, Any]):
+        for column, index in self.indexes.items():
+            index.setdefault(row.get(column), set()).add(rowid)
+        for cols, index in self.unique_indexes.items():
+            key = tuple(row.get(c) for c in cols)
+            if None not in key:
+                index[key] = rowid
+
+    def _index_remove(self, rowid: int, row: Dict[str, Any]):
+        for column, index in self.indexes.items():
+            bucket = index.get(row.get(column))
+            if bucket is not None:
+                bucket.discard(rowid)
+                if not bucket:
+                    del index[row.get(column)]
+        for cols, index in self.unique_indexes.items():
+            key = tuple(row.get(c) for c in cols)
+            if index.get(key) == rowid:
+                del index[key]
+
+    def find_unique(self, cols: Tuple[str, ...], row: Dict[str, Any]) -> Optional[int]:
+        index = self.unique_indexes.get(cols)
+        key = tuple(row.get(c) for c in cols)
+        if None in key:
+            return None
+        if index is not None:
+            return index.get(key)
+        for rowid, existing in self.rows.items():
+            if tuple(existing.get(c) for c in cols) == key:
+                return rowid
+        return None
+
+    def lookup(self, column: str, value: Any) -> List[int]:
+        index = self.ensure_index(column)
+        if index is not None:
+            return list(index.get(value, ()))
+        return [rowid for rowid, row in self.rows.items() if row.get(column) == value]
+
+    # ---- writes ----
+
+    def put(self, row: Dict[str, Any]) -> int:
+        rowid = self._next_rowid
+        self._next_rowid += 1
+        self.rows[rowid] = row
+        self._index_add(rowid, row)
+        return rowid
+
+    def replace(self, rowid: int, row: Dict[str, Any]):
+        self._index_remove(rowid, self.rows[rowid])
+        self.rows[rowid] = row
+        self._index_add(rowid, row)
+
+    def remove(self, rowid: int) -> Dict[str, Any]:
+        row = self.rows.pop(rowid)
+        self._index_remove(rowid, row)
+        return row
+
+
+class MemoryDatabase:
+    """All tables, guarded by one re-entrant lock (statements are atomic and serialised)."""
+
+    def __init__(self, schema: Optional[Dict[str, TableSchema]] = None,
+                 latency_ms: float = LATENCY_MS, jitter_ms: float = JITTER_MS):
+        self.schema = schema if schema is not None else load_schema()
+        self.lock = threading.RLock()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = ERROR_RATE
+        self.slow_rate = SLOW_RATE
+        self.slow_ms = SLOW_MS
+        self.rng = random.Random()
+        self.statements = 0
+        self.tables: Dict[str, MemoryTable] = {}
+        self.reset()
+
+    def reset(self):
+        """Drop all rows (schema and settings are kept)."""
+        with self.lock:
+            self.tables = {name: MemoryTable(s) for name, s in self.schema.items()}
+            self.referenced_by: Dict[str, List[ForeignKey]] = {}
+            for s in self.schema.values():
+                for fk in s.foreign_keys:
+                    self.referenced_by.setdefault(fk.ref_table, []).append(fk)
+            self.statements = 0
+
+    def set_latency(self, latency_ms: float, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def set_faults(self, error_rate: float = 0.0, slow_rate: float = 0.0, slow_ms: float = 0.0,
+                   seed: Optional[int] = None):
+        """Inject failures: `error_rate` of calls raise a 503, `slow_rate` take `slow_ms` longer."""
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        if seed is not None:
+            self.rng.seed(seed)
+
+    def simulate_round_trip(self):
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            delay += self.slow_ms
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise _error("503", "Service Unavailable (injected fault)")
+
+    def get(self, name: str) -> MemoryTable:
+        table = self.tables.get(name)
+        if table is None:
+            raise _error("42P01", f'relation "public.{name}" does not exist')
+        return table
+
+    def load(self, data: Dict[str, List[Dict[str, Any]]]):
+        """Bulk-load fixture rows ({table: [row, ...]}), with defaults and constraints applied."""
+        for name, rows in data.items():
+            MemoryQuery(self, name).insert(rows).execute(simulate_latency=False)
+
+    def dump(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self.lock:
+            return {name: [dict(r) for r in t.rows.values()] for name, t in self.tables.items() if t.rows}
+
+
+# ==========================================
+# Select parsing and embeds
+# ==========================================
+
+class _Field:
+    __slots__ = ("name", "alias", "children", "hint", "inner")
+
+    def __init__(self, name, alias=None, children=None, hint=None, inner=False):
+        self.name = name
+        self.alias = alias
+        self.children = children  # None for plain columns, list of _Field for embeds
+        self.hint = hint
+        self.inner = inner
+
+
+def parse_select(columns: str) -> List[_Field]:
+    fields = []
+    for item in _split_top_level(columns or "*"):
+        item = item.strip()
+        if not item:
+            continue
+        alias = None
+        head = item.split("(", 1)[0]
+        if ":" in head and "::" not in head:
+            alias, item = item.split(":", 1)
+            alias = alias.strip()
+            item = item.strip()
+        if "(" in item and item.endswith(")"):
+            target, inner = item.split("(", 1)
+            bits = target.strip().split("!")
+            hints = [b for b in bits[1:] if b not in ("inner", "left")]
+            fields.append(_Field(bits[0], alias, parse_select(inner[:-1]), hints[0] if hints else None, "inner" in bits[1:]))
+        else:
+            fields.append(_Field(item.split("::")[0].strip(), alias))
+    return fields
+
+
+def _resolve_embed(db: MemoryDatabase, parent: str, field: _Field) -> Tuple[str, ForeignKey]:
+    """Find the foreign key joining `parent` to the embedded table, like PostgREST does."""
+    child = field.name
+    candidates = []
+    for fk in db.schema[parent].foreign_keys:
+        if fk.ref_table == child and (field.hint in (None, fk.column)):
+            candidates.append(("one", fk))
+    if child in db.schema:
+        for fk in db.schema[child].foreign_keys:
+            if fk.ref_table == parent and (field.hint in (None, fk.column)):
+                candidates.append(("many", fk))
+    if child not in db.schema or not candidates:
+        raise _error(
+            "PGRST200",
+            f"Could not find a relationship between '{parent}' and '{child}' in the schema cache",
+        )
+    if len(candidates) > 1:
+        raise _error(
+            "PGRST201",
+            f"Could not embed because more than one relationship was found for '{parent}' and '{child}'",
+            hint=f"Try changing '{child}' to one of: " + ", ".join(f"'{child}!{fk.column}'" for _, fk in candidates),
+        )
+    return candidates[0]
+
+
+def compile_select(db: MemoryDatabase, table: str, fields: List[_Field]) -> list:
+    """
+    Resolve columns and embeds once per query (and fail like PostgREST would,
+    even when no rows match) into a plan that _project() applies per row.
+    """
+    schema = db.schema[table]
+    plan = []
+    for field in fields:
+        if field.children is None:
+            if field.name == "*":
+                plan.extend(("col", name, name) for name in schema.columns)
+            elif field.name in schema.columns:
+                plan.append(("col", field.alias or field.name, field.name))
+            else:
+                raise _error("42703", f"column {table}.{field.name} does not exist")
+        else:
+            direction, fk = _resolve_embed(db, table, field)
+            plan.append((direction, field.alias or field.name, fk, field.name,
+                         compile_select(db, field.name, field.children)))
+    return plan
+
+
+def _project(db: MemoryDatabase, plan: list, row: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for step in plan:
+        if step[0] == "col":
+            out[step[1]] = _copy_value(row.get(step[2]))
+            continue
+        direction, key, fk, target_name, subplan = step
+        target = db.tables[target_name]
+        if direction == "one":
+            value = row.get(fk.column)
+            rowids = target.lookup(fk.ref_column, value) if value is not None else []
+            out[key] = _project(db, subplan, target.rows[rowids[0]]) if rowids else None
+        else:
+            value = row.get(fk.ref_column)
+            rowids = sorted(target.lookup(fk.column, value)) if value is not None else []
+            out[key] = [_project(db, subplan, target.rows[rid]) for rid in rowids]
+    return out
+
+
+# ==========================================
+# Query builder
+# ==========================================
+
+class MemoryResponse:
+    """Mirrors postgrest's APIResponse (`.data`, `.count`)."""
+
+    __slots__ = ("data", "count")
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+    def __repr__(self):
+        return f"MemoryResponse(data={self.data!r}, count={self.count!r})"
+
+
+class MemoryQuery:
+    """Chainable builder with the postgrest-py method names; execute() runs it against MemoryDatabase."""
+
+    def __init__(self, db: MemoryDatabase, table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns = "*"
+        self._count: Optional[str] = None
+        self._head = False
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._order: List[Tuple[str, bool, Optional[bool]]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._single = False
+        self._maybe_single = False
+        self._payload: Any = None
+        self._on_conflict: Optional[Tuple[str, ...]] = None
+        self._ignore_duplicates = False
+        self._returning = True
+
+    # ---- operations ----
+
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None):
+        self._op = "select"
+        self._columns = ",".join(columns) if columns else "*"
+        self._count = count
+        self._head = bool(head)
+        return self
+
+    def insert(self, json, *, count=None, returning="representation", upsert=False, default_to_null=True):
+        self._op = "upsert" if upsert else "insert"
+        self._payload = json
+        self._count = count
+        self._returning = returning != "minimal"
+        return self
+
+    def upsert(self, json, *, count=None, returning="representation", ignore_duplicates=False,
+               on_conflict="", default_to_null=True):
+        self._op = "upsert"
+        self._payload = json
+        self._count = count
+        self._returning = returning != "minimal"
+        self._ignore_duplicates = ignore_duplicates
+        self._on_conflict = tuple(c.strip() for c in on_conflict.split(",") if c.strip()) or None
+        return self
+
+    def update(self, json, *, count=None, returning="representation"):
+        self._op = "update"
+        self._payload = json
+        self._count = count
+        self._returning = returning != "minimal"
+        return self
+
+    def delete(self, *, count=None, returning="representation"):
+        self._op = "delete"
+        self._count = count
+        self._returning = returning != "minimal"
+        return self
+
+    # ---- filters / modifiers ----
+
+    def _filter(self, op: str, column: str, value: Any):
+        self._filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def is_(self, column, value):
+        value = {"null": None, "true": True, "false": False}.get(str(value).lower(), value)
+        return self._filter("is", column, value)
+
+    def like(self, column, pattern):
+        return self._filter("like", column, _like(pattern, False))
+
+    def ilike(self, column, pattern):
+        return self._filter("ilike", column, _like(pattern, True))
+
+    def match(self, query: Dict[str, Any]):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def order(self, column, *, desc=False, nullsfirst=None, foreign_table=None):
+        self._order.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        self._limit = size
+        return self
+
+    def offset(self, size):
+        self._offset = size
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._maybe_single = True
+        return self
+
+    # ---- execution ----
+
+    def execute(self, simulate_latency: bool = True):
+        if simulate_latency:
+            self._db.simulate_round_trip()
+        with self._db.lock:
+            self._db.statements += 1
+            table = self._db.get(self._table)
+            if self._op == "select":
+                plan = compile_select(self._db, self._table, parse_select(self._columns))
+                rows = [table.rows[rid] for rid in self._matching(table)]
+                count = len(rows) if self._count else None
+                rows = self._sorted_and_paged(rows)
+                data = [] if self._head else [_project(self._db, plan, r) for r in rows]
+            elif self._op in ("insert", "upsert"):
+                data = self._insert(table)
+                count = len(data) if self._count else None
+            elif self._op == "update":
+                data = self._update(table)
+                count = len(data) if self._count else None
+            else:
+                data = self._delete(table)
+                count = len(data) if self._count else None
+            if self._table in _LEDGER_TABLES:
+                self._bump_ledger_version(data)
+            if not self._returning:
+                data = []
+
+        if self._single or self._maybe_single:
+            if len(data) != 1:
+                if self._maybe_single and not data:
+                    return None
+                raise _error(
+                    "PGRST116",
+                    "JSON object requested, multiple (or no) rows returned",
+                    details=f"The result contains {len(data)} rows",
+                )
+            return MemoryResponse(data[0], count)
+        return MemoryResponse(data, count)
+
+    def _bump_ledger_version(self, rows: List[Dict[str, Any]]):
+        """bump_ledger_version triggers (migrations/007): +1 per write statement for each company it touched."""
+        versions = self._db.tables.get("ledger_versions")
+        if not rows or versions is None:
+            return
+        if self._table == "journal_lines":
+            entries = self._db.tables["journal_entries"]
+            company_ids = {entries.rows[rowid]["company_id"] for row in rows
+                           for rowid in entries.lookup("id", row.get("journal_entry_id"))}
+        else:
+            company_ids = {row.get("company_id") for row in rows} - {None}
+        for company_id in company_ids:
+            rowids = versions.lookup("company_id", company_id)
+            if rowids:
+                row = dict(versions.rows[rowids[0]])
+                row["version"] += 1
+                versions.replace(rowids[0], row)
+            else:
+                versions.put({"company_id": company_id, "version": 1})
+
+    def _column(self, table: MemoryTable, name: str) -> Column:
+        column = table.schema.columns.get(name)
+        if column is None:
+            raise _error("42703", f"column {self._table}.{name} does not exist")
+        return column
+
+    def _matching(self, table: MemoryTable) -> List[int]:
+        """Row ids matching every filter; equality/IN filters are answered from hash indexes."""
+        filters = []
+        for op, name, value in self._filters:
+            kind = self._column(table, name).kind
+            if op == "in":
+                value = [_coerce(kind, v) for v in value]
+            elif op not in ("like", "ilike", "is"):
+                value = _coerce(kind, value)
+            filters.append((op, name, value))
+
+        candidates: Optional[List[int]] = None
+        for op, name, value in filters:
+            if op not in ("eq", "in") or (op == "eq" and not _hashable(value)):
+                continue
+            index = table.ensure_index(name)
+            if index is None:
+                continue
+            if op == "eq":
+                rowids = index.get(value, set())
+            else:
+                rowids = set().union(*(index.get(v, set()) for v in value if _hashable(v))) if value else set()
+            if candidates is None or len(rowids) < len(candidates):
+                candidates = sorted(rowids)
+        source = candidates if candidates is not None else list(table.rows)
+        return [
+            rid for rid in source
+            if all(_compare(op, table.rows[rid].get(name), value) for op, name, value in filters)
+        ]
+
+    def _sorted_and_paged(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for column, desc, nullsfirst in reversed(self._order):
+            nulls_first = desc if nullsfirst is None else nullsfirst
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=desc)
+            rows = missing + present if nulls_first else present + missing
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        return rows
+
+    def _payload_rows(self) -> List[Dict[str, Any]]:
+        payload = self._payload
+        return list(payload) if isinstance(payload, list) else [payload]
+
+    def _complete_row(self, table: MemoryTable, values: Dict[str, Any], base: Optional[Dict[str, Any]] = None):
+        schema = table.schema
+        row = dict(base) if base is not None else {}
+        for name, value in values.items():
+            column = schema.columns.get(name)
+            if column is None:
+                raise _error("PGRST204", f"Could not find the '{name}' column of '{self._table}' in the schema cache")
+            if column.generated:
+                raise _error("428C9", f'column "{name}" can only be updated to DEFAULT')
+            row[name] = _coerce(column.kind, value)
+        if base is None:
+            for name, column in schema.columns.items():
+                if name not in row and not column.generated:
+                    row[name] = _default_value(column)
+        for name, column in schema.columns.items():
+            if column.generated:
+                left, right = column.generated
+                row[name] = row.get(left) == row.get(right)
+            elif row.get(name) is None and not column.nullable:
+                raise _error("23502", f'null value in column "{name}" of relation "{self._table}" violates not-null constraint')
+        return row
+
+    def _check_references(self, table: MemoryTable, row: Dict[str, Any]):
+        for fk in table.schema.foreign_keys:
+            value = row.get(fk.column)
+            if value is None or fk.ref_table not in self._db.tables:
+                continue  # auth.users etc. live outside this schema
+            if not self._db.tables[fk.ref_table].lookup(fk.ref_column, value):
+                raise _error(
+                    "23503",
+                    f'insert or update on table "{self._table}" violates foreign key constraint '
+                    f'"{self._table}_{fk.column}_fkey"',
+                    details=f"Key ({fk.column})=({value}) is not present in table \"{fk.ref_table}\".",
+                )
+
+    def _check_unique(self, table: MemoryTable, row: Dict[str, Any], rowid: Optional[int] = None):
+        for cols in table.schema.uniques:
+            existing = table.find_unique(cols, row)
+            if existing is not None and existing != rowid:
+                raise _error(
+                    "23505",
+                    f'duplicate key value violates unique constraint "{self._table}_{"_".join(cols)}_key"',
+                    details=f"Key ({', '.join(cols)})=({', '.join(str(row.get(c)) for c in cols)}) already exists.",
+                )
+
+    def _insert(self, table: MemoryTable) -> List[Dict[str, Any]]:
+        undo: List[Tuple[str, int, Optional[Dict[str, Any]]]] = []
+        result = []
+        conflict = self._on_conflict or table.schema.primary_key
+        try:
+            for values in self._payload_rows():
+                if self._op == "upsert":
+                    probe = {c: _coerce(self._column(table, c).kind, values.get(c)) for c in conflict}
+                    existing = table.find_unique(conflict, probe)
+                    if existing is not None:
+                        if self._ignore_duplicates:
+                            continue
+                        previous = table.rows[existing]
+                        row = self._complete_row(table, values, base=previous)
+                        self._check_references(table, row)
+                        self._check_unique(table, row, existing)
+                        table.replace(existing, row)
+                        undo.append(("replace", existing, previous))
+                        result.append(dict(row))
+                        continue
+                row = self._complete_row(table, values)
+                self._check_references(table, row)
+                self._check_unique(table, row)
+                undo.append(("put", table.put(row), None))
+                result.append(dict(row))
+        except APIError:
+            # One statement: roll back the rows already written
+            for action, rowid, previous in reversed(undo):
+                if action == "put":
+                    table.remove(rowid)
+                else:
+                    table.replace(rowid, previous)
+            raise
+        return result
+
+    def _update(self, table: MemoryTable) -> List[Dict[str, Any]]:
+        undo, result = [], []
+        try:
+            for rowid in self._matching(table):
+                previous = table.rows[rowid]
+                row = self._complete_row(table, self._payload, base=previous)
+                if "updated_at" in table.schema.columns and "updated_at" not in self._payload:
+                    row["updated_at"] = _now()  # update_*_updated_at triggers
+                self._check_references(table, row)
+                self._check_unique(table, row, rowid)
+                table.replace(rowid, row)
+                undo.append((rowid, previous))
+                result.append(dict(row))
+        except APIError:
+            for rowid, previous in reversed(undo):
+                table.replace(rowid, previous)
+            raise
+        return result
+
+    def _delete(self, table: MemoryTable) -> List[Dict[str, Any]]:
+        rowids = self._matching(table)
+        for rowid in rowids:
+            self._check_restrict(self._table, table.rows[rowid])
+        deleted = []
+        for rowid in rowids:
+            if rowid in table.rows:
+                deleted.append(self._delete_row(self._table, rowid))
+        return deleted
+
+    def _check_restrict(self, name: str, row: Dict[str, Any]):
+        for fk in self._db.referenced_by.get(name, []):
+            if fk.on_delete in ("CASCADE", "SET NULL", "SET DEFAULT"):
+                continue
+            value = row.get(fk.ref_column)
+            if value is not None and self._db.tables[fk.table].lookup(fk.column, value):
+                raise _error(
+                    "23503",
+                    f'update or delete on table "{name}" violates foreign key constraint '
+                    f'"{fk.table}_{fk.column}_fkey" on table "{fk.table}"',
+                    details=f'Key ({fk.ref_column})=({value}) is still referenced from table "{fk.table}".',
+                )
+
+    def _delete_row(self, name: str, rowid: int) -> Dict[str, Any]:
+        table = self._db.tables[name]
+        row = table.remove(rowid)
+        for fk in self._db.referenced_by.get(name, []):
+            value = row.get(fk.ref_column)
+            if value is None:
+                continue
+            child = self._db.tables[fk.table]
+            for child_rowid in child.lookup(fk.column, value):
+                if child_rowid not in child.rows:
+                    continue
+                if fk.on_delete == "CASCADE":
+                    self._check_restrict(fk.table, child.rows[child_rowid])
+                    self._delete_row(fk.table, child_rowid)
+                elif fk.on_delete in ("SET NULL", "SET DEFAULT"):
+                    updated = dict(child.rows[child_rowid])
+                    updated[fk.column] = None
+                    child.replace(child_rowid, updated)
+        return dict(row)
+
+
+class MemoryClient:
+    """Drop-in for the supabase Client as far as the routers are concerned (.table / .from_)."""
+
+    def __init__(self, db: Optional[MemoryDatabase] = None):
+        self.db = db if db is not None else MemoryDatabase()
+
+    def table(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self.db, name)
+
+    from_ = table
+
+    def load(self, data: Dict[str, List[Dict[str, Any]]]):
+        self.db.load(data)
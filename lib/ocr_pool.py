@@ -0,0 +1,154 @@
+"""
+Process-wide pool of EasyOCR readers.
+
+easyocr.Reader loads its detection and recognition models from disk (and
+onto the GPU, if any) when it is constructed, which takes seconds. The pool
+builds readers once, lazily up to OCR_POOL_SIZE, and lends them out one
+request at a time (a Reader is not safe to share between threads), so a
+parse only pays for inference:
+
+    from lib import ocr_pool
+    lines = ocr_pool.readtext(path, detail=0)
+
+OCR runs in the parse worker processes (lib/parse_jobs.py), each with its own
+pool. With OCR_WARM_ON_STARTUP=1 the workers start with the app and load
+their readers right away instead of on the first upload. Load and inference
+timings per worker are served by GET /parse/metrics.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from lib.db_trace import LatencyHistogram
+
+logger = logging.getLogger("ocr_pool")
+
+OCR_LANGS = [lang.strip() for lang in os.getenv("OCR_LANGS", "en").split(",") if lang.strip()]
+OCR_POOL_SIZE = max(1, int(os.getenv("OCR_POOL_SIZE", "1")))
+OCR_GPU = os.getenv("OCR_GPU", "0").lower() in ("1", "true", "yes")
+OCR_WARM_ON_STARTUP = os.getenv("OCR_WARM_ON_STARTUP", "0").lower() in ("1", "true", "yes")
+
+
+class ReaderPool:
+    def __init__(self, size: int = OCR_POOL_SIZE, langs: Optional[List[str]] = None, gpu: bool = OCR_GPU):
+        self.size = size
+        self.langs = langs or OCR_LANGS
+        self.gpu = gpu
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # metrics
+        self.loads: List[float] = []
+        self.load_errors = 0
+        self.inference = LatencyHistogram()
+        self.inference_count = 0
+        self.inference_total_ms = 0.0
+        self.wait = LatencyHistogram()
+
+    def _load(self):
+        import easyocr  # heavy (torch); only imported once OCR is actually used
+        started = time.perf_counter()
+        try:
+            reader = easyocr.Reader(self.langs, gpu=self.gpu)
+        except Exception:
+            with self._lock:
+                self.load_errors += 1
+            raise
+        load_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.loads.append(load_ms)
+        logger.info("EasyOCR reader %s loaded in %.0f ms", self.langs, load_ms)
+        return reader
+
+    def _acquire(self):
+        started = time.perf_counter()
+        try:
+            reader = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            if grow:
+                try:
+                    return self._load()  # counted under load, not wait
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            reader = self._idle.get()  # all readers busy: wait for one
+        self.wait.observe((time.perf_counter() - started) * 1000)
+        return reader
+
+    @contextmanager
+    def reader(self):
+        """Borrow a reader for the duration of the block."""
+        reader = self._acquire()
+        try:
+            yield reader
+        finally:
+            self._idle.put(reader)
+
+    def readtext(self, image, **kwargs):
+        """reader.readtext(image, **kwargs) on a pooled reader, timed."""
+        with self.reader() as reader:
+            started = time.perf_counter()
+            result = reader.readtext(image, **kwargs)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.inference.observe(elapsed_ms)
+            self.inference_count += 1
+            self.inference_total_ms += elapsed_ms
+        return result
+
+    def warm(self):
+        """Load every reader in the pool now."""
+        readers = []
+        try:
+            while len(readers) < self.size:
+                with self._lock:
+                    if self._created >= self.size and self._idle.empty():
+                        break  # the rest are busy, so already loaded
+                readers.append(self._acquire())
+        finally:
+            for reader in readers:
+                self._idle.put(reader)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "langs": self.langs,
+                "gpu": self.gpu,
+                "pool_size": self.size,
+                "readers_loaded": self._created,
+                "readers_idle": self._idle.qsize(),
+                "load": {
+                    "count": len(self.loads),
+                    "errors": self.load_errors,
+                    "total_ms": round(sum(self.loads), 1),
+                    "last_ms": round(self.loads[-1], 1) if self.loads else None,
+                },
+                "inference": {
+                    "count": self.inference_count,
+                    "avg_ms": round(self.inference_total_ms / self.inference_count, 1) if self.inference_count else None,
+                    **self.inference.to_dict(),
+                },
+                "wait_for_reader": self.wait.to_dict(),
+            }
+
+
+pool = ReaderPool()
+
+
+def readtext(image, **kwargs):
+    return pool.readtext(image, **kwargs)
+
+
+def stats() -> Dict[str, Any]:
+    return pool.stats()
+
@@ -0,0 +1,177 @@
+"""
+Shared OpenAI clients with a connection pool, per-call timeouts and a cap on
+concurrent calls.
+
+The AI routes used to create a synchronous OpenAI client for every call, from
+inside async handlers, so each completion held the event loop for its whole
+duration. Routes now await chat() instead:
+
+    response = await openai_client.chat(messages, "format_dashboard", timeout=15, model="gpt-4o-mini")
+    async for text in openai_client.chat_stream(messages, "ai_query", model="gpt-4o-mini"): ...
+
+- One AsyncOpenAI per process on a pooled httpx.AsyncClient (keep-alive, so
+  a repeat call skips the TCP and TLS setup); main.py closes it at shutdown.
+- At most OPENAI_MAX_CONCURRENCY calls in flight; the rest wait their turn
+  instead of piling onto the API and its rate limits.
+- OPENAI_TIMEOUT_S per call unless the caller passes a shorter timeout, and
+  OPENAI_MAX_RETRIES retries of connection errors, 429s and 5xx.
+
+Code that runs outside the event loop (the parser's AI step, in the parse
+workers and batch threads) uses chat_sync(), with the same pool limits,
+timeout and concurrency cap per process. Latency per operation is served by
+GET /ai/openai/metrics (stats()).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from lib.perplexity_client import CallStats
+
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_S = float(os.getenv("OPENAI_KEEPALIVE_S", "60"))
+
+_async = None  # shared AsyncOpenAI
+_sync = None  # shared OpenAI, per process (see sync_client)
+_sync_pid = None
+_sync_lock = threading.Lock()
+_limit: Optional[asyncio.Semaphore] = None
+_sync_limit = threading.BoundedSemaphore(max(1, OPENAI_MAX_CONCURRENCY))
+_in_flight = 0
+
+call_stats = CallStats()
+
+
+def _limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        keepalive_expiry=OPENAI_KEEPALIVE_S,
+    )
+
+
+def async_client():
+    """The shared AsyncOpenAI (created on first use; reads OPENAI_API_KEY and OPENAI_BASE_URL)."""
+    global _async
+    if _async is None or _async.is_closed():
+        import httpx  # deferred: keeps app import/startup light
+        from openai import AsyncOpenAI
+        _async = AsyncOpenAI(
+            timeout=OPENAI_TIMEOUT_S,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(timeout=OPENAI_TIMEOUT_S, limits=_limits()),
+        )
+    return _async
+
+
+def sync_client():
+    """The shared synchronous OpenAI of this process (a forked worker gets its own pool)."""
+    global _sync, _sync_pid
+    with _sync_lock:
+        if _sync is None or _sync_pid != os.getpid():
+            import httpx
+            from openai import OpenAI
+            _sync = OpenAI(
+                timeout=OPENAI_TIMEOUT_S,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.Client(timeout=OPENAI_TIMEOUT_S, limits=_limits()),
+            )
+            _sync_pid = os.getpid()
+        return _sync
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _limit
+    if _limit is None:
+        _limit = asyncio.Semaphore(max(1, OPENAI_MAX_CONCURRENCY))
+    return _limit
+
+
+async def chat(messages: List[Dict[str, str]], operation: str, timeout: Optional[float] = None, **kwargs):
+    """
+    chat.completions.create() on the shared async client, within the concurrency cap.
+    `operation` names the call in the metrics; kwargs (model, temperature, ...) go to the API.
+    """
+    global _in_flight
+    async with _semaphore():
+        _in_flight += 1
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await async_client().chat.completions.create(
+                messages=messages, timeout=timeout or OPENAI_TIMEOUT_S, **kwargs
+            )
+            ok = True
+            return response
+        finally:
+            _in_flight -= 1
+            call_stats.record(operation, (time.perf_counter() - started) * 1000, ok, None)
+
+
+async def chat_stream(messages: List[Dict[str, str]], operation: str, timeout: Optional[float] = None, **kwargs):
+    """chat() with stream=True: yields the answer's text as it arrives (the concurrency slot is held until the end)."""
+    global _in_flight
+    async with _semaphore():
+        _in_flight += 1
+        started = time.perf_counter()
+        ok = False
+        try:
+            stream = await async_client().chat.completions.create(
+                messages=messages, timeout=timeout or OPENAI_TIMEOUT_S, stream=True, **kwargs
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            ok = True
+        finally:
+            _in_flight -= 1
+            call_stats.record(operation, (time.perf_counter() - started) * 1000, ok, None)
+
+
+def chat_sync(messages: List[Dict[str, str]], operation: str, timeout: Optional[float] = None, **kwargs):
+    """chat() for code outside the event loop (parse workers and threads)."""
+    with _sync_limit:
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = sync_client().chat.completions.create(
+                messages=messages, timeout=timeout or OPENAI_TIMEOUT_S, **kwargs
+            )
+            ok = True
+            return response
+        finally:
+            call_stats.record(operation, (time.perf_counter() - started) * 1000, ok, None)
+
+
+async def close():
+    """Close the pooled connections at app shutdown."""
+    global _async, _limit
+    if _async is not None:
+        await _async.close()
+    _async = None
+    _limit = None
+
+
+def stats() -> Dict[str, Any]:
+    snapshot = call_stats.snapshot()
+    return {
+        "pool": {
+            "open": _async is not None and not _async.is_closed(),
+            "max_connections": OPENAI_MAX_CONNECTIONS,
+            "max_keepalive": OPENAI_MAX_KEEPALIVE,
+            "keepalive_s": OPENAI_KEEPALIVE_S,
+        },
+        "max_concurrency": OPENAI_MAX_CONCURRENCY,
+        "in_flight": _in_flight,
+        "timeout_s": OPENAI_TIMEOUT_S,
+        "max_retries": OPENAI_MAX_RETRIES,
+        "calls": snapshot["calls"],
+        "operations": snapshot["operations"],
+    }
@@ -0,0 +1,211 @@
+"""
+Batch parsing for POST /parse/batch: many receipts (or zip archives of them)
+in one request, results streamed back per file as each completes.
+
+Every file becomes an OCR-only parse job (lib/parse_jobs.py), so a batch fans
+out over all PARSE_WORKERS; at most PARSE_BATCH_WINDOW jobs of one batch are
+queued at a time so a month-end upload doesn't fill the shared queue. With
+ai=True the OCR results are cleaned up PARSE_BATCH_AI_SIZE receipts per
+OpenAI call (smart_parser.enhance_batch_with_ai) instead of one call per
+file. Repeats are answered from the parse cache, AI fields included.
+"""
+
+import asyncio
+import io
+import os
+import time
+import zipfile
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from lib import parse_cache, parse_jobs, uploads
+
+PARSE_BATCH_MAX_FILES = int(os.getenv("PARSE_BATCH_MAX_FILES", "100"))
+PARSE_BATCH_MAX_MB = float(os.getenv("PARSE_BATCH_MAX_MB", "100"))
+PARSE_BATCH_AI_SIZE = max(1, int(os.getenv("PARSE_BATCH_AI_SIZE", "8")))
+PARSE_BATCH_WINDOW = max(1, int(os.getenv("PARSE_BATCH_WINDOW", str(2 * parse_jobs.PARSE_WORKERS))))
+
+PARSE_BATCH_MAX_BYTES = int(PARSE_BATCH_MAX_MB * 1024 * 1024)
+_BUSY_WAIT_S = 0.2
+
+
+def _skip_member(info: zipfile.ZipInfo) -> bool:
+    name = os.path.basename(info.filename)
+    return info.is_dir() or info.filename.startswith("__MACOSX/") or not name or name.startswith(".")
+
+
+def expand(files: List[uploads.SpooledUpload]) -> List[uploads.SpooledUpload]:
+    """Replace zip archives by their members (one level deep); 413/400 past the batch limits."""
+    out: List[uploads.SpooledUpload] = []
+    try:
+        for upload in files:
+            if upload.ext != ".zip":
+                out.append(upload)
+                continue
+            source = upload.source
+            with zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source)) as archive:
+                members = [m for m in archive.infolist() if not _skip_member(m)]
+                if sum(m.file_size for m in members) > PARSE_BATCH_MAX_BYTES:
+                    raise uploads.too_large(PARSE_BATCH_MAX_BYTES)
+                for member in members:
+                    with archive.open(member) as f:
+                        out.append(uploads.spool_fileobj(os.path.basename(member.filename), f))
+            upload.discard()
+            if len(out) > PARSE_BATCH_MAX_FILES:
+                break
+    except zipfile.BadZipFile:
+        _discard(out + files)
+        raise HTTPException(status_code=400, detail="Invalid zip archive")
+    except BaseException:
+        _discard(out + files)
+        raise
+    if len(out) > PARSE_BATCH_MAX_FILES:
+        _discard(out + files)
+        raise HTTPException(status_code=400, detail=f"At most {PARSE_BATCH_MAX_FILES} files per batch")
+    return out
+
+
+def _discard(files: List[uploads.SpooledUpload]):
+    for upload in files:
+        upload.discard()
+
+
+def skipped_message(ai_fields: Dict[str, Any]) -> str:
+    """Message of a result whose fields came from OCR (ai_skipped), see smart_parser._without_ai."""
+    if ai_fields.get("category"):
+        return "Fields read with high confidence. AI used for the category only."
+    return "Fields read with high confidence. AI enhancement skipped."
+
+
+def _line(index: int, filename: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None,
+          ai: bool = False, cached: bool = False) -> Dict[str, Any]:
+    if result is None:
+        return {"index": index, "filename": filename, "status": "failed", "error": error}
+    line = {
+        "index": index,
+        "filename": filename,
+        "status": "completed",
+        "parsed_fields": result["parsed_fields"],
+        "sample_text": result["raw_text"][:500],
+        "ai_enhanced": False,
+        "cached": cached,
+    }
+    if ai:
+        if result.get("ai_fields") and result["ai_fields"].get("ai_skipped"):
+            line.update(parsed_fields=result["ai_fields"], ocr_fields=result["parsed_fields"],
+                        message=skipped_message(result["ai_fields"]))
+        elif result.get("ai_fields"):
+            line.update(parsed_fields=result["ai_fields"], ocr_fields=result["parsed_fields"], ai_enhanced=True)
+        elif result.get("ai_error"):
+            line["message"] = f"AI enhancement failed: {result['ai_error']}. Returning OCR-only results."
+        else:
+            line["message"] = "OpenAI not configured. Returning OCR-only results."
+    return line
+
+
+async def _ocr(index: int, upload: uploads.SpooledUpload, cache_key: str):
+    """(index, upload, cache_key, result or None, error or None)"""
+    while not parse_jobs.jobs.has_room():
+        await asyncio.sleep(_BUSY_WAIT_S)
+    try:
+        done = await run_in_threadpool(parse_jobs.run, upload.detach(), upload.filename, cache_key=cache_key)
+    except HTTPException as exc:
+        return index, upload, cache_key, None, exc.detail
+    job = await parse_jobs.wait(done)
+    if job["status"] != "completed":
+        return index, upload, cache_key, None, job["error"]
+    return index, upload, cache_key, job["result"], None
+
+
+async def _enhance(batch: List[tuple]) -> List[Dict[str, Any]]:
+    """One OpenAI call for a batch of (index, upload, result, cache_key); returns their result lines."""
+    from smart_parser import enhance_batch_with_ai
+
+    try:
+        ai_fields = await run_in_threadpool(
+            enhance_batch_with_ai, [(result["raw_text"], result["parsed_fields"]) for _, _, result, _ in batch]
+        )
+        ai_error = None
+    except Exception as exc:
+        ai_fields, ai_error = None, str(exc)
+
+    lines = []
+    for i, (index, upload, result, cache_key) in enumerate(batch):
+        result = dict(result)
+        if ai_error:
+            result["ai_error"] = ai_error
+        elif ai_fields is not None:
+            result["ai_fields"] = ai_fields[i]
+            if ai_fields[i] is None:
+                if os.getenv("OPENAI_API_KEY", ""):
+                    result["ai_error"] = "No result for this receipt in the batch response"
+            else:
+                await run_in_threadpool(parse_cache.put, cache_key, {
+                    "raw_text": result["raw_text"],
+                    "parsed_fields": result["parsed_fields"],
+                    "ai_fields": ai_fields[i],
+                })
+        lines.append(_line(index, upload.filename, result, ai=True))
+    return lines
+
+
+async def run(files: List[uploads.SpooledUpload], ai: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Parse `files`, yielding one result line per file as it completes, then a summary line."""
+    started = time.perf_counter()
+    pending = deque(enumerate(files))
+    ocr_tasks = set()
+    ai_tasks = set()
+    ai_waiting: List[tuple] = []
+    counts = {"completed": 0, "failed": 0}
+
+    def count(line):
+        counts[line["status"]] += 1
+        return line
+
+    try:
+        while pending or ocr_tasks or ai_tasks or ai_waiting:
+            while pending and len(ocr_tasks) < PARSE_BATCH_WINDOW:
+                index, upload = pending.popleft()
+                cache_key = parse_cache.cache_key(upload.sha256, upload.filename)
+                hit = await run_in_threadpool(parse_cache.get, cache_key)
+                if hit is not None and (not ai or hit.get("ai_fields") is not None):
+                    upload.discard()
+                    yield count(_line(index, upload.filename, hit, ai=ai, cached=True))
+                    continue
+                ocr_tasks.add(asyncio.ensure_future(_ocr(index, upload, cache_key)))
+
+            # Send a full AI batch, or whatever is left once OCR has drained
+            while ai_waiting and (len(ai_waiting) >= PARSE_BATCH_AI_SIZE or not (pending or ocr_tasks)):
+                batch, ai_waiting = ai_waiting[:PARSE_BATCH_AI_SIZE], ai_waiting[PARSE_BATCH_AI_SIZE:]
+                ai_tasks.add(asyncio.ensure_future(_enhance(batch)))
+
+            if not (ocr_tasks or ai_tasks):
+                continue
+            done, _ = await asyncio.wait(ocr_tasks | ai_tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in ai_tasks:
+                    ai_tasks.discard(task)
+                    for line in task.result():
+                        yield count(line)
+                    continue
+                ocr_tasks.discard(task)
+                index, upload, cache_key, result, error = task.result()
+                if result is None or not ai:
+                    yield count(_line(index, upload.filename, result, error, cached=bool(result and result.get("cached"))))
+                else:
+                    ai_waiting.append((index, upload, result, cache_key))
+    finally:
+        for task in ocr_tasks | ai_tasks:
+            task.cancel()
+        _discard(files)
+
+    yield {
+        "done": True,
+        "files": len(files),
+        "completed": counts["completed"],
+        "failed": counts["failed"],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
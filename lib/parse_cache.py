@@ -0,0 +1,150 @@
+"""
+Content-addressed cache of parse results (PARSE_CACHE_ENABLED, on by default).
+
+Users re-upload the same receipt or statement (e.g. after a failed save), and
+each upload used to rerun OCR and the OpenAI clean-up. Results are stored
+under the SHA-256 of the file bytes, the file type and
+smart_parser.PARSER_VERSION, so a repeat is answered from disk in
+milliseconds and a parser change never serves stale results:
+
+    entry = {"raw_text": ..., "parsed_fields": {...}, "ai_fields": {...} | absent}
+
+One JSON file per entry under PARSE_CACHE_DIR, least recently used evicted
+once the directory grows past PARSE_CACHE_MAX_MB (a hit touches the file's
+mtime). lib/parse_jobs.py consults the cache before queueing a job.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("parse_cache")
+
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join("data", "parse_cache"))
+PARSE_CACHE_MAX_MB = float(os.getenv("PARSE_CACHE_MAX_MB", "200"))
+
+
+def cache_key(sha256_hex: str, filename: str) -> str:
+    from smart_parser import PARSER_VERSION
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".") or "bin"
+    return f"{sha256_hex}-{ext}-v{PARSER_VERSION}"
+
+
+class ParseCache:
+    def __init__(self, directory: str = PARSE_CACHE_DIR, max_bytes: int = int(PARSE_CACHE_MAX_MB * 1024 * 1024),
+                 enabled: bool = PARSE_CACHE_ENABLED):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # bytes on disk, scanned on first use
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _ensure_size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # most recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        data = json.dumps({**entry, "cached_at": time.time()}).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning("Parse cache write failed for %s: %s", key, exc)
+            return
+        with self._lock:
+            self._ensure_size()
+            self._size += len(data) - previous
+            self.writes += 1
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries down to 90% of the limit (caller holds the lock)."""
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(self._entries(), key=lambda e: e[2]):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.enabled:
+                self._ensure_size()
+            return {
+                "enabled": self.enabled,
+                "dir": self.directory,
+                "size_bytes": self._size or 0,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+cache = ParseCache()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    return cache.get(key)
+
+
+def put(key: str, entry: Dict[str, Any]):
+    cache.put(key, entry)
+
+
+def stats() -> Dict[str, Any]:
+    return cache.stats()
@@ -0,0 +1,436 @@
+"""
+Parse jobs: OCR (and the optional OpenAI clean-up) of uploaded files, run in a
+pool of worker processes.
+
+OCR is CPU-bound and runs for seconds, so doing it inside a request handler
+stalls the event loop for every tenant. Uploads are handed to submit(), which
+returns a job right away; PARSE_WORKERS processes (each with its own warm
+lib/ocr_pool.py readers) work through the queue in order. At most
+PARSE_QUEUE_MAX jobs wait; beyond that submit() answers 503.
+
+    job = parse_jobs.submit(upload.detach(), upload.filename, company_id=cid, ai=True, document_id=doc_id)
+    GET /parse/jobs/{job["id"]}                 # queued / running / completed / failed
+
+    done = parse_jobs.run(upload.detach(), upload.filename, ai=True)
+    job = await parse_jobs.wait(done)           # /parse/ and /parse/ai wait without blocking the loop
+
+Results are cached by file content (lib/parse_cache.py, pass cache_key): a
+repeat upload completes at once without a worker, and a repeat with ai=True
+of a file parsed without AI only runs the AI step. The source is the upload's
+bytes or its temp file (lib/uploads.py); the job owns the temp file and
+deletes it when done. With a document_id,
+documents.ocr_status follows the job (processing -> completed/failed) and the
+extracted fields are saved on the document.
+
+Jobs are kept in memory per app process; the last PARSE_JOBS_KEEP finished
+jobs stay queryable.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+from fastapi import HTTPException
+
+from lib import parse_cache
+from lib.db_trace import LatencyHistogram
+
+logger = logging.getLogger("parse_jobs")
+
+PARSE_WORKERS = max(1, int(os.getenv("PARSE_WORKERS", str(min(2, os.cpu_count() or 1)))))
+PARSE_QUEUE_MAX = int(os.getenv("PARSE_QUEUE_MAX", "50"))
+PARSE_JOBS_KEEP = int(os.getenv("PARSE_JOBS_KEEP", "500"))
+# spawn: workers don't inherit the app's threads/sockets (fork would)
+PARSE_START_METHOD = os.getenv("PARSE_START_METHOD", "spawn")
+
+
+# ==========================================
+# Worker process side
+# ==========================================
+
+def _init_worker():
+    from lib import ocr_pool
+    if ocr_pool.OCR_WARM_ON_STARTUP:
+        try:
+            ocr_pool.pool.warm()
+        except Exception as exc:  # e.g. easyocr not installed (requirements-ocr.txt)
+            logger.warning("OCR warm-up failed in parse worker %s: %s", os.getpid(), exc)
+
+
+def _noop():
+    return os.getpid()
+
+
+def _parse_file(source: Union[bytes, str], filename: str, ai: bool,
+                ocr: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """OCR + field extraction (skipped when `ocr` comes from the parse cache), then the optional AI step."""
+    from smart_parser import smart_extract, enhance_with_ai
+    from lib import ocr_pool
+
+    started = time.perf_counter()
+    if ocr is not None:
+        result = {"raw_text": ocr["raw_text"], "parsed_fields": ocr["parsed_fields"]}
+    else:
+        result = smart_extract(source, filename)
+    result["parse_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if ai:
+        try:
+            result["ai_fields"] = enhance_with_ai(result["raw_text"], result["parsed_fields"])
+        except Exception as exc:
+            result["ai_error"] = str(exc)
+    result["worker"] = {"pid": os.getpid(), "ocr": ocr_pool.stats()}
+    return result
+
+
+# ==========================================
+# Documents (ocr_status + extracted_* columns)
+# ==========================================
+
+_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y", "%d/%m/%Y")
+
+
+def _iso_date(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _amount(value: Any) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return round(float(str(value).replace(",", "").replace("$", "").strip()), 2)
+    except ValueError:
+        return None
+
+
+def _document_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    fields = result["parsed_fields"]
+    ai = result.get("ai_fields") or {}
+    data = {
+        "ocr_status": "completed",
+        "ocr_raw_text": result["raw_text"],
+        "extracted_vendor": ai.get("vendor") or fields.get("vendor"),
+        "extracted_amount": _amount(ai.get("amount") or fields.get("total")),
+        "extracted_date": _iso_date(ai.get("date") or fields.get("date")),
+        "extracted_category": ai.get("category"),
+        "extracted_fields": {"ocr": fields, "ai": ai or None},
+        "processed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if ai and not ai.get("ai_skipped"):
+        data["ai_processed"] = True
+        data["ai_confidence"] = ai.get("confidence")
+    return data
+
+
+def _update_document(job: Dict[str, Any], data: Dict[str, Any]):
+    from database import table
+    try:
+        table("documents").update(data)\
+            .eq("id", job["document_id"])\
+            .eq("company_id", job["company_id"])\
+            .execute()
+    except Exception as exc:
+        logger.warning("Parse job %s: could not update document %s: %s", job["id"], job["document_id"], exc)
+
+
+# ==========================================
+# Job queue (app process)
+# ==========================================
+
+def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: job[k] for k in ("id", "status", "filename", "ai", "document_id",
+                               "created_at", "started_at", "finished_at")}
+    if job["status"] == "completed":
+        result = job["result"]
+        out["result"] = {
+            "parsed_fields": result["parsed_fields"],
+            "sample_text": result["raw_text"][:500],
+            "ai_fields": result.get("ai_fields"),
+            "ai_error": result.get("ai_error"),
+            "parse_ms": result.get("parse_ms"),
+            "cached": result.get("cached", False),
+        }
+    elif job["status"] == "failed":
+        out["error"] = job["error"]
+    return out
+
+
+class ParseJobs:
+    def __init__(self, workers: int = PARSE_WORKERS, queue_max: int = PARSE_QUEUE_MAX):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._waiting: deque = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Bookkeeping and document updates, off the executor's own threads
+        self._side = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parse-jobs")
+        # metrics
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_wait = LatencyHistogram()
+        self.parse_time = LatencyHistogram()
+        self.worker_ocr: Dict[int, Dict[str, Any]] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(PARSE_START_METHOD),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def start(self, prespawn: bool = False):
+        executor = self._get_executor()
+        if prespawn:
+            # One task per worker so they all start (and warm OCR) now, not on the first uploads
+            for _ in range(self.workers):
+                executor.submit(_noop)
+
+    def stop(self):
+        with self._lock:
+            executor = self._executor
+        self._retire(executor)
+
+    def _retire(self, executor: Optional[ProcessPoolExecutor]):
+        """Shut `executor` down, unless it has already been replaced by a fresh pool."""
+        with self._lock:
+            if executor is None or self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, source: Union[bytes, str], filename: str, company_id: Optional[str] = None,
+               ai: bool = False, document_id: Optional[str] = None,
+               cache_key: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a parse (or answer it from the parse cache); returns the job's public view."""
+        return _public(self._submit(source, filename, company_id, ai, document_id, cache_key))
+
+    def run(self, source: Union[bytes, str], filename: str, company_id: Optional[str] = None,
+            ai: bool = False, document_id: Optional[str] = None,
+            cache_key: Optional[str] = None) -> Future:
+        """
+        submit() for a caller that waits for the result: returns a future of the
+        finished (internal) job, which stays valid after the job is trimmed.
+        """
+        return self._submit(source, filename, company_id, ai, document_id, cache_key)["done"]
+
+    def _submit(self, source: Union[bytes, str], filename: str, company_id: Optional[str],
+                ai: bool, document_id: Optional[str], cache_key: Optional[str]) -> Dict[str, Any]:
+        hit = parse_cache.get(cache_key) if cache_key else None
+        ocr = None
+        if hit is not None and ai and hit.get("ai_fields") is None:
+            hit, ocr = None, hit  # OCR is reusable; only the AI step has to run
+        with self._lock:
+            # A complete cache hit needs no worker, so it is never turned away
+            busy = hit is None and len(self._waiting) >= self.queue_max
+            if busy:
+                self.rejected += 1
+            else:
+                job = {
+                    "id": str(uuid.uuid4()),
+                    "status": "queued",
+                    "filename": filename,
+                    "ai": ai,
+                    "company_id": company_id,
+                    "document_id": document_id,
+                    "source": source,
+                    "created_at": time.time(),
+                    "started_at": None,
+                    "finished_at": None,
+                    "result": None,
+                    "error": None,
+                    "cache_key": cache_key,
+                    "ocr": ocr,
+                    "done": Future(),
+                }
+                self.jobs[job["id"]] = job
+                if hit is None:
+                    self._waiting.append(job["id"])
+        if busy:
+            _remove(source)
+            raise HTTPException(status_code=503, detail="Parser is busy, try again shortly",
+                                headers={"Retry-After": "5"})
+        if hit is not None:
+            result = {"raw_text": hit["raw_text"], "parsed_fields": hit["parsed_fields"],
+                      "ai_fields": hit.get("ai_fields") if ai else None, "parse_ms": 0, "cached": True}
+            self._finish(job, None, result=result, ran=False)
+            return job
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if self._running >= self.workers or not self._waiting:
+                    return
+                job = self.jobs[self._waiting.popleft()]
+                self._running += 1
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                self.queue_wait.observe((job["started_at"] - job["created_at"]) * 1000)
+            if job["document_id"]:
+                self._side.submit(_update_document, job, {"ocr_status": "processing"})
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_parse_file, job["source"], job["filename"], job["ai"], job["ocr"])
+            except Exception as exc:
+                self._finish(job, None, exc, executor=executor)
+                continue
+            future.add_done_callback(
+                lambda f, job=job, executor=executor: self._side.submit(self._finish, job, f, executor=executor)
+            )
+
+    def _finish(self, job: Dict[str, Any], future: Optional[Future], error: Optional[BaseException] = None,
+                result: Optional[Dict[str, Any]] = None, ran: bool = True,
+                executor: Optional[ProcessPoolExecutor] = None):
+        if future is not None:
+            try:
+                result = future.result()
+            except BaseException as exc:
+                error = exc
+        if isinstance(error, BrokenProcessPool):
+            # A worker died (e.g. out of memory); start a fresh pool on the next job. The other jobs
+            # of the broken pool fail later, by when that fresh pool may already be running.
+            self._retire(executor)
+        _remove(job["source"])
+        job["source"] = None
+
+        with self._lock:
+            if ran:
+                self._running -= 1
+            job["finished_at"] = time.time()
+            if error is None:
+                job["status"] = "completed"
+                job["result"] = result
+                self.completed += 1
+                if ran:
+                    self.parse_time.observe(result.get("parse_ms") or 0)
+                worker = result.pop("worker", None)
+                if worker:
+                    self.worker_ocr[worker["pid"]] = worker["ocr"]
+            else:
+                job["status"] = "failed"
+                job["error"] = f"{type(error).__name__}: {error}"
+                self.failed += 1
+                logger.warning("Parse job %s (%s) failed: %s", job["id"], job["filename"], job["error"])
+            self._trim()
+
+        if error is None and ran and job["cache_key"]:
+            entry = {"raw_text": result["raw_text"], "parsed_fields": result["parsed_fields"]}
+            if result.get("ai_fields") is not None:
+                entry["ai_fields"] = result["ai_fields"]
+            parse_cache.put(job["cache_key"], entry)
+
+        try:
+            if job["document_id"]:
+                _update_document(job, _document_fields(result) if error is None else {"ocr_status": "failed"})
+        finally:
+            job["done"].set_result(job)
+            self._dispatch()
+
+    def _trim(self):
+        finished = [jid for jid, j in self.jobs.items() if j["status"] in ("completed", "failed")]
+        for jid in finished[:max(0, len(finished) - PARSE_JOBS_KEEP)]:
+            del self.jobs[jid]
+
+    def has_room(self) -> bool:
+        with self._lock:
+            return len(self._waiting) < self.queue_max
+
+    def lookup(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            out = _public(job)
+            out["company_id"] = job["company_id"]
+            if job["status"] == "queued":
+                out["queue_position"] = self._waiting.index(job_id) + 1
+            return out
+
+    async def wait(self, done: Future) -> Dict[str, Any]:
+        """Wait for a job started with run() to finish; returns the internal job (with the full result)."""
+        return await asyncio.wrap_future(done)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._waiting),
+                "queue_max": self.queue_max,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "queue_wait": self.queue_wait.to_dict(),
+                "parse_time": self.parse_time.to_dict(),
+                "ocr_workers": {str(pid): s for pid, s in self.worker_ocr.items()},
+                "cache": parse_cache.stats(),
+            }
+
+
+def _remove(source: Union[bytes, str, None]):
+    if not isinstance(source, str):
+        return  # in-memory upload
+    try:
+        os.remove(source)
+    except OSError:
+        pass
+
+
+jobs = ParseJobs()
+
+
+def start():
+    from lib import ocr_pool
+    jobs.start(prespawn=ocr_pool.OCR_WARM_ON_STARTUP)
+
+
+def stop():
+    jobs.stop()
+
+
+def submit(source: Union[bytes, str], filename: str, company_id: Optional[str] = None,
+           ai: bool = False, document_id: Optional[str] = None,
+           cache_key: Optional[str] = None) -> Dict[str, Any]:
+    return jobs.submit(source, filename, company_id=company_id, ai=ai, document_id=document_id,
+                       cache_key=cache_key)
+
+
+def run(source: Union[bytes, str], filename: str, company_id: Optional[str] = None,
+        ai: bool = False, document_id: Optional[str] = None,
+        cache_key: Optional[str] = None) -> Future:
+    return jobs.run(source, filename, company_id=company_id, ai=ai, document_id=document_id,
+                    cache_key=cache_key)
+
+
+async def wait(done: Future) -> Dict[str, Any]:
+    return await jobs.wait(done)
+
+
+def lookup(job_id: str) -> Optional[Dict[str, Any]]:
+    return jobs.lookup(job_id)
+
+
+def stats() -> Dict[str, Any]:
+    return jobs.stats()
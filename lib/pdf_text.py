@@ -0,0 +1,161 @@
+"""
+Text layer of a PDF, read a page at a time within a page budget.
+
+pdfminer's extract_text() lays out the whole document before returning, so a
+300-page vendor statement was fully parsed just to read the vendor, date and
+total at its top and bottom. read() opens the document once, lays out one
+page at a time and stops as soon as the caller has what it needs:
+
+    pages = pdf_text.read(source, done=lambda text: ...)   # {page index: text}
+
+Pages are read first, last, second, second to last, ... (the header is on
+the first page and the totals on the last), at most PDF_TEXT_MAX_PAGES of
+them (0 = every page). done(text) gets the text read so far, in page order,
+after 1, 2, 4, 8, ... pages, so checking stays linear on long documents.
+
+Page texts are kept in an in-process LRU (PDF_PAGE_CACHE_PAGES pages) keyed
+by the document's SHA-256, so parsing the same PDF again in this process
+does not lay out any page twice.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional
+
+PDF_TEXT_MAX_PAGES = int(os.getenv("PDF_TEXT_MAX_PAGES", "4"))
+PDF_PAGE_CACHE_PAGES = int(os.getenv("PDF_PAGE_CACHE_PAGES", "256"))
+
+
+class PageCache:
+    """LRU of page texts: (document sha256, page index) -> text; (sha256, None) -> page count."""
+
+    def __init__(self, max_entries: int = PDF_PAGE_CACHE_PAGES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+cache = PageCache()
+
+
+def _sha256(source) -> str:
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_order(count: int, budget: int = PDF_TEXT_MAX_PAGES) -> Iterator[int]:
+    """Page indexes from both ends towards the middle: 0, n-1, 1, n-2, ... (at most `budget`, 0 = all)."""
+    low, high = 0, count - 1
+    taken = 0
+    while low <= high and (budget <= 0 or taken < budget):
+        yield low
+        taken += 1
+        low += 1
+        if low <= high and (budget <= 0 or taken < budget):
+            yield high
+            taken += 1
+            high -= 1
+
+
+class _Document:
+    """An open PDF whose pages are laid out on demand (pdfminer, same layout params as extract_text)."""
+
+    def __init__(self, source):
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._file = io.BytesIO(bytes(source))
+        else:
+            self._file = open(source, "rb")
+        try:
+            document = PDFDocument(PDFParser(self._file))
+            # Page objects only; their content streams are parsed when a page is laid out
+            self.pages = list(PDFPage.create_pages(document))
+        except Exception:
+            self._file.close()
+            raise
+        self._out = io.StringIO()
+        resources = PDFResourceManager(caching=True)  # fonts are shared between pages
+        self._device = TextConverter(resources, self._out, laparams=LAParams())
+        self._interpreter = PDFPageInterpreter(resources, self._device)
+
+    def text(self, index: int) -> str:
+        self._out.seek(0)
+        self._out.truncate()
+        self._interpreter.process_page(self.pages[index])
+        return self._out.getvalue()
+
+    def close(self) -> None:
+        self._device.close()
+        self._file.close()
+
+
+def read(source, done: Optional[Callable[[str], bool]] = None,
+         budget: int = PDF_TEXT_MAX_PAGES) -> Dict[int, str]:
+    """
+    {page index: text} for the pages read, in page order (see module docstring).
+    `source` is a path or the PDF's bytes.
+    """
+    key = _sha256(source)
+    document = None
+    texts: Dict[int, str] = {}
+    try:
+        count = cache.get((key, None))
+        if count is None:
+            document = _Document(source)
+            count = len(document.pages)
+            cache.put((key, None), count)
+        for index in page_order(count, budget):
+            text = cache.get((key, index))
+            if text is None:
+                if document is None:
+                    document = _Document(source)
+                text = document.text(index)
+                cache.put((key, index), text)
+            texts[index] = text
+            read_pages = len(texts)
+            if done and read_pages & (read_pages - 1) == 0 and done(join(texts)):
+                break
+    finally:
+        if document is not None:
+            document.close()
+    return dict(sorted(texts.items()))
+
+
+def join(texts: Dict[int, str]) -> str:
+    """Page texts in page order, as extract_text() would run them together."""
+    return "".join(texts[index] for index in sorted(texts))
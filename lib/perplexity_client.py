@@ -1,12 +1,149 @@
 """
 Perplexity AI client for real-time market intelligence and business comparisons.
 Provides industry benchmarks, competitor analysis, and contextual insights.
+
+One client per process: get_client() returns a shared PerplexityClient, and
+all calls go through one httpx.AsyncClient with a keep-alive connection pool
+(HTTP/2 when the h2 package is installed), so a repeat research call skips
+the TCP and TLS setup. main.py opens the pool at startup (start()) and
+closes it at shutdown (close()). Call latency, new connections and HTTP
+versions are served by GET /ai/research/metrics (stats()). Research answers
+are cached by lib/research_cache.py. With on_token, an answer that isn't
+cached is streamed (stream: true) and its text passed to on_token as it
+arrives (the streaming mode of /ai/query).
 """
 
-import os
-import httpx
-from typing import List, Dict, Optional
 import json
+import os
+import threading
+import time
+from typing import Any, Callable, List, Dict, Optional
+
+from lib import research_cache
+from lib.db_trace import LatencyHistogram
+
+PERPLEXITY_TIMEOUT_S = float(os.getenv("PERPLEXITY_TIMEOUT_S", "30"))
+PERPLEXITY_MAX_CONNECTIONS = int(os.getenv("PERPLEXITY_MAX_CONNECTIONS", "20"))
+PERPLEXITY_MAX_KEEPALIVE = int(os.getenv("PERPLEXITY_MAX_KEEPALIVE", "10"))
+PERPLEXITY_KEEPALIVE_S = float(os.getenv("PERPLEXITY_KEEPALIVE_S", "60"))
+PERPLEXITY_HTTP2 = os.getenv("PERPLEXITY_HTTP2", "1").lower() in ("1", "true", "yes")
+
+_http = None  # shared httpx.AsyncClient
+_client: Optional["PerplexityClient"] = None
+
+
+class CallStats:
+    """Latency per operation, plus how many calls had to open a new connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.operations: Dict[str, Dict[str, Any]] = {}
+        self.new_connections = 0
+        self.connect_ms = 0.0
+        self.http_versions: Dict[str, int] = {}
+
+    def record(self, operation: str, elapsed_ms: float, ok: bool, http_version: Optional[str]):
+        with self._lock:
+            entry = self.operations.setdefault(
+                operation, {"calls": 0, "errors": 0, "total_ms": 0.0, "latency": LatencyHistogram()}
+            )
+            entry["calls"] += 1
+            entry["errors"] += 0 if ok else 1
+            entry["total_ms"] += elapsed_ms
+            entry["latency"].observe(elapsed_ms)
+            if http_version:
+                self.http_versions[http_version] = self.http_versions.get(http_version, 0) + 1
+
+    def connected(self, elapsed_ms: float):
+        with self._lock:
+            self.new_connections += 1
+            self.connect_ms += elapsed_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = sum(entry["calls"] for entry in self.operations.values())
+            return {
+                "calls": calls,
+                "new_connections": self.new_connections,
+                "reused_connections": max(0, calls - self.new_connections),
+                "avg_connect_ms": round(self.connect_ms / self.new_connections, 1) if self.new_connections else None,
+                "http_versions": dict(self.http_versions),
+                "operations": {
+                    name: {
+                        "calls": entry["calls"],
+                        "errors": entry["errors"],
+                        "avg_ms": round(entry["total_ms"] / entry["calls"], 1),
+                        **entry["latency"].to_dict(),
+                    }
+                    for name, entry in self.operations.items()
+                },
+            }
+
+
+call_stats = CallStats()
+
+
+def _http2_available() -> bool:
+    import importlib.util
+    return PERPLEXITY_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def http_client():
+    """The shared httpx.AsyncClient (created on first use when start() wasn't called)."""
+    global _http
+    if _http is None or _http.is_closed:
+        import httpx  # deferred: keeps app import/startup light
+        _http = httpx.AsyncClient(
+            timeout=PERPLEXITY_TIMEOUT_S,
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=PERPLEXITY_MAX_CONNECTIONS,
+                max_keepalive_connections=PERPLEXITY_MAX_KEEPALIVE,
+                keepalive_expiry=PERPLEXITY_KEEPALIVE_S,
+            ),
+        )
+    return _http
+
+
+async def start():
+    """Open the connection pool at app startup (no-op without PERPLEXITY_API_KEY)."""
+    if os.getenv("PERPLEXITY_API_KEY"):
+        http_client()
+
+
+async def close():
+    """Close the pooled connections at app shutdown."""
+    global _http, _client
+    if _http is not None:
+        await _http.aclose()
+    _http = None
+    _client = None
+
+
+def get_client() -> "PerplexityClient":
+    """The process-wide PerplexityClient (ValueError when PERPLEXITY_API_KEY is not set)."""
+    global _client
+    if _client is None:
+        _client = PerplexityClient()
+    return _client
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "pool": {
+            "open": _http is not None and not _http.is_closed,
+            "http2": _http2_available(),
+            "max_connections": PERPLEXITY_MAX_CONNECTIONS,
+            "max_keepalive": PERPLEXITY_MAX_KEEPALIVE,
+            "keepalive_s": PERPLEXITY_KEEPALIVE_S,
+        },
+        **call_stats.snapshot(),
+        "cache": research_cache.cache.stats(),
+    }
+
 
 class PerplexityClient:
     """
@@ -29,7 +166,10 @@ class PerplexityClient:
         system_prompt: Optional[str] = None,
         search_domain_filter: Optional[List[str]] = None,
         temperature: float = 0.2,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        operation: str = "query",
+        company_id: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None
     ) -> Dict:
         """
         Query Perplexity with optional domain filtering.
@@ -40,15 +180,16 @@ class PerplexityClient:
             search_domain_filter: List of domains to restrict search to
             temperature: Sampling temperature (0.0-1.0, lower = more factual)
             max_tokens: Maximum response length
+            operation: Name the call is counted under in stats() and cached
+                under (lib/research_cache.py; operations without a TTL are not cached)
+            company_id: Company the answer is stored for when RESEARCH_CACHE_PERSIST is on
+            on_token: Called with each piece of the answer's text as it streams in
+                (not called when the answer comes from the cache)
 
         Returns:
-            Dict with 'answer' and 'citations'
+            Dict with 'answer' and 'citations' (cached operations add
+            'cached', 'stale' and 'fetched_at')
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
         payload = {
             "model": self.model,
             "messages": [
@@ -64,37 +205,96 @@ class PerplexityClient:
         if search_domain_filter:
             payload["search_domain_filter"] = search_domain_filter
 
+        return await research_cache.cache.get_or_fetch(
+            research_cache.cache_key(payload), operation, lambda: self._post(payload, operation, on_token), company_id,
+            # A stale answer is refreshed after this request has returned: nothing to stream to
+            refresh=lambda: self._post(payload, operation),
+        )
+
+    async def _post(self, payload: Dict, operation: str,
+                    on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """One chat/completions call on the shared connection pool, timed into call_stats (streamed with on_token)."""
+        import httpx  # deferred: keeps app import/startup light
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        # Times the TCP connect + TLS handshake when this call opens a new connection
+        connect = {}
+
+        async def trace(event, info):
+            if event == "connection.connect_tcp.started":
+                connect["started"] = time.perf_counter()
+            elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                connect["done"] = time.perf_counter()
+
+        started = time.perf_counter()
+        response = None
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
+            async with http_client().stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json={**payload, "stream": True} if on_token else payload,
+                extensions={"trace": trace}
+            ) as response:
+                if on_token and response.is_success:
+                    return await self._read_stream(response, on_token)
+                await response.aread()
                 response.raise_for_status()
                 result = response.json()
 
-                # Extract answer and citations
-                answer = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                citations = result.get("citations", [])
+            # Extract answer and citations
+            answer = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            citations = result.get("citations", [])
 
-                return {
-                    "answer": answer,
-                    "citations": citations,
-                    "raw_response": result
-                }
+            return {
+                "answer": answer,
+                "citations": citations,
+                "raw_response": result
+            }
 
         except httpx.HTTPStatusError as e:
             error_detail = e.response.text if hasattr(e.response, 'text') else str(e)
             raise Exception(f"Perplexity API error ({e.response.status_code}): {error_detail}")
         except Exception as e:
             raise Exception(f"Failed to query Perplexity: {str(e)}")
+        finally:
+            ok = response is not None and response.is_success
+            call_stats.record(operation, (time.perf_counter() - started) * 1000, ok,
+                              response.http_version if response is not None else None)
+            if "started" in connect:
+                call_stats.connected((connect.get("done", time.perf_counter()) - connect["started"]) * 1000)
+
+    @staticmethod
+    async def _read_stream(response, on_token: Callable[[str], None]) -> Dict:
+        """Answer and citations of a streamed (server-sent events) completion, passing each delta to on_token."""
+        parts: List[str] = []
+        citations: List[str] = []
+        last: Dict = {}
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            last = json.loads(data)
+            citations = last.get("citations") or citations
+            text = ((last.get("choices") or [{}])[0].get("delta") or {}).get("content") or ""
+            if text:
+                parts.append(text)
+                on_token(text)
+        return {"answer": "".join(parts), "citations": citations, "raw_response": last}
 
     async def get_industry_benchmarks(
         self,
         industry: str,
         location: str,
-        metrics: List[str]
+        metrics: List[str],
+        company_id: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None
     ) -> Dict:
         """
         Get real-time industry benchmarks for specific metrics.
@@ -103,6 +303,8 @@ class PerplexityClient:
             industry: Industry name (e.g., "SaaS", "E-commerce")
             location: Geographic location (e.g., "San Francisco, CA")
             metrics: List of metrics to benchmark (e.g., ["revenue growth", "profit margin"])
+            company_id: Company the cached answer is stored for (RESEARCH_CACHE_PERSIST)
+            on_token: Streams the answer's text as it arrives (see query())
 
         Returns:
             Dict with benchmarks and citations
@@ -137,7 +339,10 @@ Always cite your sources with publication dates."""
                 "sba.gov",
                 "forbes.com",
                 "mckinsey.com"
-            ]
+            ],
+            operation="industry_benchmarks",
+            company_id=company_id,
+            on_token=on_token
         )
 
     async def compare_competitors(
@@ -145,7 +350,8 @@ Always cite your sources with publication dates."""
         company_name: str,
         industry: str,
         competitors: List[str],
-        location: str
+        location: str,
+        company_id: Optional[str] = None
     ) -> Dict:
         """
         Compare company to competitors using real-time data.
@@ -155,6 +361,7 @@ Always cite your sources with publication dates."""
             industry: Industry/sector
             competitors: List of competitor names
             location: Geographic location
+            company_id: Company the cached answer is stored for (RESEARCH_CACHE_PERSIST)
 
         Returns:
             Dict with competitive analysis and citations
@@ -182,14 +389,17 @@ Be objective and cite all sources."""
 
         return await self.query(
             prompt,
-            system_prompt=system_prompt
+            system_prompt=system_prompt,
+            operation="compare_competitors",
+            company_id=company_id
         )
 
     async def get_tax_compliance_updates(
         self,
         business_type: str,
         location_state: str,
-        year: int = 2026
+        year: int = 2026,
+        company_id: Optional[str] = None
     ) -> Dict:
         """
         Get latest tax compliance requirements for the business.
@@ -198,6 +408,7 @@ Be objective and cite all sources."""
             business_type: Legal entity type (e.g., "LLC", "S-Corp")
             location_state: State abbreviation (e.g., "CA")
             year: Tax year (default: current year)
+            company_id: Company the cached answer is stored for (RESEARCH_CACHE_PERSIST)
 
         Returns:
             Dict with tax updates and citations
@@ -228,7 +439,9 @@ Include links to official forms and resources."""
                 "irs.gov",
                 f"{location_state.lower()}.gov",
                 "taxpayeradvocate.irs.gov"
-            ]
+            ],
+            operation="tax_compliance_updates",
+            company_id=company_id
         )
 
     async def get_growth_recommendations(
@@ -237,7 +450,9 @@ Include links to official forms and resources."""
         revenue: float,
         employees: int,
         growth_stage: str,
-        location: str
+        location: str,
+        company_id: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None
     ) -> Dict:
         """
         Get personalized growth recommendations based on company profile.
@@ -248,6 +463,8 @@ Include links to official forms and resources."""
             employees: Employee count
             growth_stage: Stage (startup, growth, mature, enterprise)
             location: Geographic location
+            company_id: Company the cached answer is stored for (RESEARCH_CACHE_PERSIST)
+            on_token: Streams the answer's text as it arrives (see query())
 
         Returns:
             Dict with growth recommendations and case studies
@@ -273,14 +490,17 @@ Focus on practical, actionable steps."""
 
         return await self.query(
             prompt,
-            system_prompt=system_prompt
+            system_prompt=system_prompt,
+            operation="growth_recommendations",
+            company_id=company_id,
+            on_token=on_token
         )
 
 
 # Convenience function for quick testing
 async def test_perplexity():
     """Test the Perplexity client with a simple query."""
-    client = PerplexityClient()
+    client = get_client()
 
     result = await client.get_industry_benchmarks(
         industry="SaaS",
@@ -292,6 +512,7 @@ async def test_perplexity():
     print("\nCitations:")
     for citation in result.get("citations", []):
         print(f"- {citation}")
+    await close()
 
 
 if __name__ == "__main__":
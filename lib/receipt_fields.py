@@ -0,0 +1,328 @@
+"""
+Layout-aware receipt field extraction, with a confidence per field.
+
+EasyOCR's readtext(detail=1) returns every piece of text with its bounding
+box. Receipts print labels and amounts in columns ("TOTAL" on the left,
+"23.10" on the right), and joining the pieces with newlines puts a label and
+its amount on different lines. So the boxes are first grouped into printed
+rows. Candidates for the total, date and vendor are then scored by what else
+is on their row and where they sit on the receipt:
+
+    lines = receipt_fields.lines_from_boxes(ocr_pool.readtext(image, detail=1))
+    fields = receipt_fields.extract(lines)
+    fields["field_confidence"]    # {"vendor": 0.9, "date": 0.85, "total": 0.95, "description": 0.4}
+
+Text without boxes (a PDF's text layer, CSV) goes through lines_from_text(),
+which only knows the line order, so its vendor confidence is lower.
+Confidences run from 0 to 1. smart_parser.enhance_with_ai skips OpenAI when
+vendor, date and total all reach PARSE_AI_MIN_CONFIDENCE.
+"""
+
+import re
+from datetime import date
+from statistics import median
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Fields that decide whether the OpenAI step is needed
+KEY_FIELDS = ("vendor", "date", "total")
+
+_AMOUNT = re.compile(r"(?<![\d.,])-?[$€£₹]?\s?(\d{1,3}(?:,\d{3})+|\d+)[.,](\d{2})(?!\d|[.,/-]\d)")
+_TOTAL_STRONG = re.compile(
+    r"(?i)\b(grand\s*total|total\s*due|amount\s*due|balance\s*due|total\s*amount|amount\s*paid|total\s*paid)\b"
+)
+_TOTAL = re.compile(r"(?i)\b(total|amount|balance)\b")
+_NOT_TOTAL = re.compile(
+    r"(?i)(sub\s*-?\s*total|\b(tax|vat|gst|hst|tip|gratuity|change|cash|tendered|discount|sav(ed|ings)|qty|points)\b)"
+)
+
+_MONTHS = {m: i for i, m in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+_DATE_ISO = re.compile(r"\b(\d{4})[/\-.](\d{1,2})[/\-.](\d{1,2})\b")
+_DATE_NUMERIC = re.compile(r"\b(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{4}|\d{2})\b")
+_DATE_DAY_MONTH = re.compile(rf"(?i)\b(\d{{1,2}})(?:st|nd|rd|th)?\s+{_MONTH},?\s+(\d{{4}}|\d{{2}})\b")
+_DATE_MONTH_DAY = re.compile(rf"(?i)\b{_MONTH}\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}}|\d{{2}})\b")
+_DATE_LABEL = re.compile(r"(?i)\b(date|dated|issued)\b")
+_TIME = re.compile(r"\b\d{1,2}:\d{2}(:\d{2})?\b")
+
+_VENDOR_LABEL = re.compile(r"(?i)(?:from|vendor|supplier|merchant|sold\s+by)[:\s]+([A-Za-z0-9& ,.'-]+)")
+_NOT_VENDOR = re.compile(
+    r"(?i)(https?://|www\.|@|\.com\b|\btel\b|\bphone\b|\bfax\b|\breceipt\b|\binvoice\b|\bwelcome\b|\bthank"
+    r"|\border\b|\btable\b|\bserver\b|\bcashier\b|\bterminal\b|\btrans(action)?\b)"
+)
+_ADDRESS = re.compile(
+    r"(?i)^\s*\d+\s+\w.*\b(st|street|ave|avenue|rd|road|blvd|dr|drive|ln|lane|way|hwy|suite|ste)\b"
+)
+_PHONE = re.compile(r"\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}")
+_STORE_NUMBER = re.compile(r"(?i)\s*(store|str|#|no\.?)\s*#?\s*\d+\s*$")
+
+_DESCRIPTION_LABEL = re.compile(r"(?i)(?:description|item|details)[:\s\-]+(.{5,80})")
+
+
+class Line:
+    """One printed row of a receipt; positions are fractions of the page (0 = top/left)."""
+
+    __slots__ = ("text", "top", "bottom", "left", "right", "conf", "height")
+
+    def __init__(self, text: str, top: float, bottom: float, left: float = 0.0, right: float = 1.0,
+                 conf: float = 1.0, height: Optional[float] = None):
+        self.text = text
+        self.top = top
+        self.bottom = bottom
+        self.left = left
+        self.right = right
+        self.conf = conf
+        self.height = height  # text height in pixels; None for text without boxes
+
+    @property
+    def center(self) -> float:
+        return (self.top + self.bottom) / 2
+
+
+def lines_from_boxes(results: Iterable[Sequence[Any]]) -> List[Line]:
+    """Group EasyOCR readtext(detail=1) results, [(box, text, confidence)], into rows, top to bottom."""
+    boxes = []
+    for bbox, text, conf in results:
+        text = str(text).strip()
+        if not text:
+            continue
+        xs = [float(p[0]) for p in bbox]
+        ys = [float(p[1]) for p in bbox]
+        boxes.append((min(ys), max(ys), min(xs), max(xs), text, float(conf)))
+    if not boxes:
+        return []
+    page_width = max(b[3] for b in boxes) or 1.0
+    page_height = max(b[1] for b in boxes) or 1.0
+
+    rows: List[List[tuple]] = []
+    centers: List[float] = []
+    for box in sorted(boxes, key=lambda b: (b[0] + b[1]) / 2):
+        center, height = (box[0] + box[1]) / 2, box[1] - box[0]
+        if rows:
+            row_height = min(b[1] - b[0] for b in rows[-1])
+            # Same printed row: vertical centers within half a text height
+            if abs(center - centers[-1]) <= 0.5 * min(height, row_height):
+                rows[-1].append(box)
+                centers[-1] = sum((b[0] + b[1]) / 2 for b in rows[-1]) / len(rows[-1])
+                continue
+        rows.append([box])
+        centers.append(center)
+
+    lines = []
+    for row in rows:
+        row.sort(key=lambda b: b[2])
+        lines.append(Line(
+            " ".join(b[4] for b in row),
+            top=min(b[0] for b in row) / page_height,
+            bottom=max(b[1] for b in row) / page_height,
+            left=min(b[2] for b in row) / page_width,
+            right=max(b[3] for b in row) / page_width,
+            conf=sum(b[5] for b in row) / len(row),
+            height=max(b[1] - b[0] for b in row),
+        ))
+    return lines
+
+
+def lines_from_text(text: str) -> List[Line]:
+    """Lines of plain text; only their order is known."""
+    rows = [row.strip() for row in text.splitlines() if row.strip()]
+    n = len(rows) or 1
+    return [Line(row, top=i / n, bottom=(i + 1) / n) for i, row in enumerate(rows)]
+
+
+def stack_pages(pages: Sequence[List[Line]]) -> List[Line]:
+    """Lines of several pages as one tall page (page 2 below page 1, ...)."""
+    n = len(pages) or 1
+    out = []
+    for index, lines in enumerate(pages):
+        for line in lines:
+            out.append(Line(line.text, (index + line.top) / n, (index + line.bottom) / n, line.left, line.right,
+                            line.conf, line.height))
+    return out
+
+
+def text_of(lines: Iterable[Line]) -> str:
+    return "\n".join(line.text for line in lines)
+
+
+def _clamp(score: float) -> float:
+    return round(max(0.0, min(1.0, score)), 2)
+
+
+def _ocr_weight(line: Line) -> float:
+    return 0.7 + 0.3 * line.conf
+
+
+def _best(candidates: List[Tuple[float, Any]], margin: float, penalty: float) -> Tuple[Any, float]:
+    """Highest scoring value; its confidence drops when a different value scores almost as high."""
+    if not candidates:
+        return None, 0.0
+    candidates.sort(key=lambda c: -c[0])
+    score, value = candidates[0]
+    for other_score, other in candidates[1:]:
+        if other != value:
+            if score - other_score < margin:
+                score -= penalty
+            break
+    return value, _clamp(score)
+
+
+# ---------- total ----------
+
+def _amounts(text: str) -> List[float]:
+    return [float(m.group(1).replace(",", "") + "." + m.group(2)) for m in _AMOUNT.finditer(text)]
+
+
+def _total(lines: List[Line]) -> Tuple[Optional[str], float]:
+    amounts = [_amounts(line.text) for line in lines]
+    every = [value for values in amounts for value in values]
+    if not every:
+        return None, 0.0
+    largest = max(every)
+
+    candidates = []
+    for i, line in enumerate(lines):
+        for value in amounts[i]:
+            score = 0.0
+            if _TOTAL_STRONG.search(line.text):
+                score += 0.7
+            elif _TOTAL.search(line.text):
+                score += 0.6
+            elif i > 0 and not amounts[i - 1] and _TOTAL.search(lines[i - 1].text):
+                score += 0.4  # label printed above the amount
+            if _NOT_TOTAL.search(line.text):
+                score -= 0.4
+            score += 0.1 * line.center  # totals sit near the bottom
+            if line.right >= 0.6:
+                score += 0.05
+            if value == largest:
+                score += 0.1
+            if sum(values.count(value) for j, values in enumerate(amounts) if j != i):
+                score += 0.05  # repeated, e.g. on the card payment line
+            candidates.append((score * _ocr_weight(line), value))
+    value, confidence = _best(candidates, margin=0.15, penalty=0.2)
+    return f"{value:.2f}", confidence
+
+
+# ---------- date ----------
+
+def _year(text: str) -> int:
+    year = int(text)
+    return year + 2000 if year < 100 else year
+
+
+def _dates(text: str) -> List[Tuple[date, bool]]:
+    """(date, unambiguous) for each date written in `text`; month-first when it could be either."""
+    found = []
+
+    def add(year, month, day, unambiguous):
+        try:
+            value = date(year, month, day)
+        except ValueError:
+            return
+        if 2000 <= value.year <= date.today().year + 1:
+            found.append((value, unambiguous))
+
+    for m in _DATE_ISO.finditer(text):
+        add(int(m.group(1)), int(m.group(2)), int(m.group(3)), True)
+    for m in _DATE_NUMERIC.finditer(text):
+        first, second, year = int(m.group(1)), int(m.group(2)), _year(m.group(3))
+        if first > 12:
+            add(year, second, first, True)
+        else:
+            add(year, first, second, second > 12 or first == second)
+    for m in _DATE_DAY_MONTH.finditer(text):
+        add(_year(m.group(3)), _MONTHS[m.group(2)[:3].lower()], int(m.group(1)), True)
+    for m in _DATE_MONTH_DAY.finditer(text):
+        add(_year(m.group(3)), _MONTHS[m.group(1)[:3].lower()], int(m.group(2)), True)
+    return found
+
+
+def _date(lines: List[Line]) -> Tuple[Optional[str], float]:
+    candidates = []
+    for line in lines:
+        for value, unambiguous in _dates(line.text):
+            score = 0.6
+            if _DATE_LABEL.search(line.text):
+                score += 0.2
+            if _TIME.search(line.text):
+                score += 0.1  # receipts print date and time together
+            if line.center < 0.5:
+                score += 0.05
+            score += 0.1 if unambiguous else -0.05
+            candidates.append((score * _ocr_weight(line), value))
+    value, confidence = _best(candidates, margin=0.2, penalty=0.25)
+    return (value.isoformat() if value else None), confidence
+
+
+# ---------- vendor ----------
+
+def _vendor_candidate(text: str) -> bool:
+    letters = sum(c.isalpha() for c in text)
+    if letters < 3 or letters < 0.5 * len(text.replace(" ", "")):
+        return False
+    if _NOT_VENDOR.search(text) or _ADDRESS.search(text) or _PHONE.search(text) or _AMOUNT.search(text):
+        return False
+    return not _dates(text)
+
+
+def _vendor(lines: List[Line], text: str) -> Tuple[Optional[str], float]:
+    labelled = _VENDOR_LABEL.search(text)
+    if labelled:
+        return labelled.group(1).strip(), 0.9
+
+    top = [line for line in lines if line.top < 0.3][:6] or lines[:3]
+    heights = [line.height for line in lines if line.height]
+    typical = median(heights) if heights else None
+    tallest = max((line.height for line in top if line.height), default=None)
+
+    candidates = []
+    rank = 0
+    for line in top:
+        if not _vendor_candidate(line.text):
+            continue
+        score = 0.45 + max(0.0, 0.2 - 0.1 * rank)  # the first name-like line is usually the store
+        rank += 1
+        if typical and line.height:
+            if line.height >= 1.3 * typical:
+                score += 0.2  # printed larger than the body
+            if line.height == tallest:
+                score += 0.1
+        if line.text.isupper():
+            score += 0.05
+        candidates.append((score * _ocr_weight(line), _STORE_NUMBER.sub("", line.text).strip(" -,.")))
+    return _best(candidates, margin=0.1, penalty=0.15)
+
+
+# ---------- description ----------
+
+def _description(lines: List[Line], text: str) -> Tuple[Optional[str], float]:
+    labelled = _DESCRIPTION_LABEL.search(text)
+    if labelled:
+        return labelled.group(1).strip(), 0.7
+    # Fallback: the line before the totals line, if it has no digits
+    for i, line in enumerate(lines):
+        if _TOTAL.search(line.text):
+            if i > 0 and not re.search(r"\d", lines[i - 1].text):
+                return lines[i - 1].text.strip(), 0.4
+            break
+    return None, 0.0
+
+
+def extract(lines: List[Line]) -> Dict[str, Any]:
+    """vendor, date (YYYY-MM-DD), total and description, plus field_confidence for each."""
+    text = text_of(lines)
+    fields: Dict[str, Any] = {}
+    confidence: Dict[str, float] = {}
+    fields["vendor"], confidence["vendor"] = _vendor(lines, text)
+    fields["date"], confidence["date"] = _date(lines)
+    fields["total"], confidence["total"] = _total(lines)
+    fields["description"], confidence["description"] = _description(lines, text)
+    fields["field_confidence"] = confidence
+    return fields
+
+
+def confident(fields: Dict[str, Any], threshold: float) -> bool:
+    """True when every key field was found with at least `threshold` confidence."""
+    confidence = fields.get("field_confidence") or {}
+    return all(fields.get(name) and confidence.get(name, 0.0) >= threshold for name in KEY_FIELDS)
@@ -0,0 +1,242 @@
+"""
+TTL cache for Perplexity research answers (RESEARCH_CACHE_ENABLED, on by default).
+
+Industry benchmarks, competitor comparisons, tax updates and growth
+recommendations change over days, but every visit to the research page asked
+Perplexity again. PerplexityClient.query() now goes through get_or_fetch():
+
+    key = research_cache.cache_key(payload)      # sha256 of the normalized prompt and parameters
+    result = await research_cache.cache.get_or_fetch(key, "industry_benchmarks", fetch, company_id)
+
+- Fresh (younger than the operation's TTL): answered from memory, no call.
+- Stale (within RESEARCH_CACHE_STALE_HOURS after that): the stored answer is
+  returned right away and refreshed in the background.
+- Older or missing: fetched; concurrent requests for the same key share one call.
+
+The key has no company in it, so companies with the same industry and
+location share the answer (prompts that name the company stay per company).
+TTLs are per operation (RESEARCH_CACHE_TTL_HOURS); operations without a TTL,
+such as free-form query(), are never cached. With RESEARCH_CACHE_PERSIST=1
+answers are also stored in ai_insights (insight_type "research", run
+migrations/006_ai_insights_cache_key.sql), so they survive restarts and are
+shared between workers.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger("research_cache")
+
+RESEARCH_CACHE_ENABLED = os.getenv("RESEARCH_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+RESEARCH_CACHE_TTL_HOURS = os.getenv(
+    "RESEARCH_CACHE_TTL_HOURS",
+    "industry_benchmarks=72,compare_competitors=24,tax_compliance_updates=24,growth_recommendations=72",
+)
+RESEARCH_CACHE_STALE_HOURS = float(os.getenv("RESEARCH_CACHE_STALE_HOURS", "48"))
+RESEARCH_CACHE_MAX_ENTRIES = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "500"))
+RESEARCH_CACHE_PERSIST = os.getenv("RESEARCH_CACHE_PERSIST", "0").lower() in ("1", "true", "yes")
+
+
+def _parse_ttls(spec: str) -> Dict[str, float]:
+    """'industry_benchmarks=72,compare_competitors=24' -> {operation: seconds}"""
+    ttls = {}
+    for item in spec.split(","):
+        name, _, hours = item.partition("=")
+        if name.strip() and hours.strip():
+            ttls[name.strip()] = float(hours) * 3600
+    return ttls
+
+
+def _normalize(text: str) -> str:
+    return " ".join(str(text).split()).casefold()
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """sha256 of a chat/completions payload, ignoring case and whitespace in the messages."""
+    normalized = dict(payload)
+    normalized["messages"] = [
+        {"role": message["role"], "content": _normalize(message["content"])} for message in payload["messages"]
+    ]
+    if normalized.get("search_domain_filter"):
+        normalized["search_domain_filter"] = sorted(_normalize(d) for d in normalized["search_domain_filter"])
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+class ResearchCache:
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, stale_s: float = RESEARCH_CACHE_STALE_HOURS * 3600,
+                 max_entries: int = RESEARCH_CACHE_MAX_ENTRIES, persist: bool = RESEARCH_CACHE_PERSIST,
+                 enabled: bool = RESEARCH_CACHE_ENABLED):
+        self.ttls = _parse_ttls(RESEARCH_CACHE_TTL_HOURS) if ttls is None else ttls
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self.persist = persist
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self.counts = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "shared_fetches": 0,
+                       "refreshes": 0, "refresh_errors": 0, "loaded_from_db": 0}
+
+    def cacheable(self, operation: str) -> bool:
+        return self.enabled and self.ttls.get(operation, 0) > 0
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    # ---------- memory ----------
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # ---------- ai_insights ----------
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        from database import table
+        try:
+            rows = table("ai_insights").select("data").eq("cache_key", key)\
+                .order("created_at", desc=True).limit(1).execute().data
+        except Exception as exc:
+            logger.warning("Research cache lookup failed: %s", exc)
+            return None
+        data = rows[0]["data"] if rows else None
+        return data if data and data.get("fetched_ts") else None
+
+    def _save(self, key: str, operation: str, entry: Dict[str, Any], company_id: Optional[str]) -> None:
+        from database import supabase
+        if not company_id:
+            return  # ai_insights rows belong to a company
+        valid_until = datetime.fromtimestamp(entry["fetched_ts"] + self.ttls[operation] + self.stale_s, timezone.utc)
+        try:
+            supabase.table("ai_insights").delete().eq("company_id", company_id).eq("cache_key", key).execute()
+            supabase.table("ai_insights").insert({
+                "company_id": company_id,
+                "insight_type": "research",
+                "title": operation.replace("_", " ").capitalize(),
+                "description": entry["answer"][:500],
+                "data": entry,
+                "severity": "info",
+                "cache_key": key,
+                "valid_until": valid_until.date().isoformat(),
+            }).execute()
+        except Exception as exc:
+            logger.warning("Research cache write failed for %s: %s", operation, exc)
+
+    # ---------- lookup ----------
+
+    @staticmethod
+    def _answer(entry: Dict[str, Any], cached: bool, stale: bool = False) -> Dict[str, Any]:
+        return {"answer": entry["answer"], "citations": entry["citations"], "fetched_at": entry["fetched_at"],
+                "cached": cached, "stale": stale}
+
+    async def _fetch(self, key: str, operation: str, fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                     company_id: Optional[str]) -> Dict[str, Any]:
+        result = await fetch()
+        now = time.time()
+        entry = {
+            "operation": operation,
+            "answer": result["answer"],
+            "citations": result["citations"],
+            "fetched_at": datetime.fromtimestamp(now, timezone.utc).isoformat(timespec="seconds"),
+            "fetched_ts": now,
+        }
+        self._put(key, entry)
+        if self.persist:
+            await asyncio.to_thread(self._save, key, operation, entry, company_id)
+        return {**self._answer(entry, cached=False), "raw_response": result.get("raw_response")}
+
+    async def _shared_fetch(self, key, operation, fetch, company_id) -> Dict[str, Any]:
+        """One fetch per key at a time; concurrent callers wait for it."""
+        future = self._inflight.get(key)
+        if future is not None and not future.done():
+            self._count("shared_fetches")
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self._fetch(key, operation, fetch, company_id))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def _refresh(self, key, operation, fetch, company_id) -> None:
+        """Refresh a stale entry in the background (at most one refresh per key)."""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self._count("refreshes")
+
+        async def run():
+            try:
+                await self._shared_fetch(key, operation, fetch, company_id)
+            except Exception as exc:
+                self._count("refresh_errors")
+                logger.warning("Research cache refresh of %s failed, keeping the stale answer: %s", operation, exc)
+            finally:
+                self._refreshing.discard(key)
+
+        asyncio.ensure_future(run())
+
+    async def get_or_fetch(self, key: str, operation: str, fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                           company_id: Optional[str] = None,
+                           refresh: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+        """
+        The answer for `key`: fresh from cache, stale (refreshing in the background) or fetched now.
+        `refresh` is the fetch used for the background refresh (default `fetch`); it outlives the
+        request, so it must not report back to the caller (no streaming callbacks).
+        """
+        if not self.cacheable(operation):
+            return await fetch()
+        entry = self._get(key)
+        if entry is None and self.persist:
+            entry = await asyncio.to_thread(self._load, key)
+            if entry is not None:
+                self._count("loaded_from_db")
+                self._put(key, entry)
+        if entry is not None:
+            age = time.time() - entry["fetched_ts"]
+            ttl = self.ttls[operation]
+            if age < ttl:
+                self._count("fresh_hits")
+                return self._answer(entry, cached=True)
+            if age < ttl + self.stale_s:
+                self._count("stale_hits")
+                self._refresh(key, operation, refresh or fetch, company_id)
+                return self._answer(entry, cached=True, stale=True)
+        self._count("misses")
+        return await self._shared_fetch(key, operation, fetch, company_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "persist": self.persist,
+                "entries": len(self._entries),
+                "ttl_hours": {name: round(seconds / 3600, 2) for name, seconds in self.ttls.items()},
+                "stale_hours": round(self.stale_s / 3600, 2),
+                **self.counts,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+cache = ResearchCache()
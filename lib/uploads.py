@@ -0,0 +1,134 @@
+"""
+Uploaded files, streamed in chunks into a per-request spool.
+
+    upload = await uploads.spool(file)       # 413 past UPLOAD_MAX_MB
+    upload.source                             # bytes (small files) or a temp file path
+    upload.sha256, upload.size, upload.filename
+    upload.discard()                          # remove the temp file, if any
+
+Files up to UPLOAD_SPOOL_MB stay in memory; bigger ones continue into a
+uniquely named temp file (UPLOAD_TMP_DIR, default the system temp dir), so
+concurrent uploads with the same filename never collide and a large PDF
+doesn't sit in memory. The size limit is checked while streaming; the whole
+request body is also capped by middleware/upload_limit.py before multipart
+parsing spools it.
+
+smart_parser.smart_extract() accepts either form of `source`.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from typing import Optional, Union
+
+from fastapi import HTTPException, UploadFile
+
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "20"))
+UPLOAD_SPOOL_MB = float(os.getenv("UPLOAD_SPOOL_MB", "1"))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+UPLOAD_MAX_BYTES = int(UPLOAD_MAX_MB * 1024 * 1024)
+UPLOAD_SPOOL_BYTES = int(UPLOAD_SPOOL_MB * 1024 * 1024)
+_CHUNK = 256 * 1024
+
+
+def too_large(max_bytes: int = UPLOAD_MAX_BYTES) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+
+class SpooledUpload:
+    def __init__(self, filename: str):
+        self.filename = filename or ""
+        self.size = 0
+        self.sha256 = ""
+        self.path: Optional[str] = None
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+
+    @property
+    def ext(self) -> str:
+        return os.path.splitext(self.filename)[1].lower()
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """What the parsers take: the bytes of a small upload, or the temp file's path."""
+        return self.path if self.path else self._buffer.getvalue()
+
+    def _write(self, chunk: bytes):
+        if self._file is None and self.size + len(chunk) > UPLOAD_SPOOL_BYTES:
+            # Roll over to disk
+            fd, self.path = tempfile.mkstemp(prefix="upload_", suffix=self.ext, dir=UPLOAD_TMP_DIR)
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+        self.size += len(chunk)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def detach(self) -> Union[bytes, str]:
+        """Hand the source over to its new owner (e.g. a parse job, which removes the file)."""
+        source = self.source
+        self.path = None
+        self._buffer = io.BytesIO()
+        return source
+
+    def discard(self):
+        self._close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+def spool_fileobj(filename: str, fileobj, max_bytes: int = UPLOAD_MAX_BYTES) -> SpooledUpload:
+    """spool() for a plain binary file object (e.g. a zip archive member)."""
+    upload = SpooledUpload(filename)
+    digest = hashlib.sha256()
+    try:
+        while True:
+            chunk = fileobj.read(_CHUNK)
+            if not chunk:
+                break
+            if upload.size + len(chunk) > max_bytes:
+                raise too_large(max_bytes)
+            digest.update(chunk)
+            upload._write(chunk)
+        upload._close()
+    except BaseException:
+        upload.discard()
+        raise
+    upload.sha256 = digest.hexdigest()
+    return upload
+
+
+async def spool(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> SpooledUpload:
+    """Stream `file` into a SpooledUpload, hashing as it goes; 413 once it passes max_bytes."""
+    upload = SpooledUpload(file.filename)
+    digest = hashlib.sha256()
+    try:
+        while True:
+            chunk = await file.read(_CHUNK)
+            if not chunk:
+                break
+            if upload.size + len(chunk) > max_bytes:
+                raise too_large(max_bytes)
+            digest.update(chunk)
+            upload._write(chunk)
+        upload._close()
+    except BaseException:
+        upload.discard()
+        raise
+    finally:
+        await file.close()
+    upload.sha256 = digest.hexdigest()
+    return upload
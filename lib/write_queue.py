@@ -0,0 +1,432 @@
+"""
+Store-and-forward queue for writes during database outages (WRITE_QUEUE_ENABLED=1).
+
+Write endpoints hand their work to submit() instead of calling the database
+directly:
+
+    @router.post("/")
+    def create_document(body: dict, auth=Depends(get_current_user_company),
+                        idempotency_key: Optional[str] = Header(None)):
+        return write_queue.submit("documents.create", auth, body, idempotency_key)
+
+    @write_queue.operation("documents.create")
+    def _create_document(company_id: str, user_id: str, body: dict) -> dict:
+        ...
+
+submit() runs the operation right away. If the backend can't be reached
+(a connect error, see database.is_unapplied_error) before anything was
+written, the write is appended to a local append-only log (fsynced), and the
+client gets a 202 with a queue id instead of an error. A write that timed out
+or got a 5xx may have been applied, so it is not queued: the client gets the
+503 and can retry with its Idempotency-Key. While the queue is not empty, new
+writes are queued without touching the database, so they stay in order and a
+struggling backend isn't hammered by client retries. An operation registered
+with `validate=` has that check run before a write is queued, so a request
+that would be rejected gets its 4xx now rather than a 202.
+
+A background thread replays the log in order (FIFO) once the backend
+answers again, backing off while it doesn't. Each queued write carries an
+idempotency key (the client's Idempotency-Key header, or a generated one)
+claimed in the idempotency_keys table (lib/idempotency.py) before the write runs,
+and the log records when a write was applied, so a restart mid-replay does
+not apply a write twice. Writes rejected for their data (a 4xx, a constraint
+violation) are marked failed and skipped. Any other failure (database still
+down, a 5xx) keeps the write at the head of the queue, retried with backoff;
+/status/write-queue shows the last error.
+
+The log is per process (WRITE_QUEUE_DIR/queue.log, locked while the app
+runs); with several workers, give each its own WRITE_QUEUE_DIR.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from database import is_transient_error, is_unapplied_error, DatabaseTimeout, DatabaseUnavailable
+from lib import db_trace, idempotency
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single worker assumed
+    fcntl = None
+
+logger = logging.getLogger("write_queue")
+
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "0").lower() in ("1", "true", "yes")
+WRITE_QUEUE_DIR = os.getenv("WRITE_QUEUE_DIR", os.path.join("data", "write_queue"))
+WRITE_QUEUE_RETRY_S = float(os.getenv("WRITE_QUEUE_RETRY_S", "2"))
+WRITE_QUEUE_MAX_RETRY_S = float(os.getenv("WRITE_QUEUE_MAX_RETRY_S", "60"))
+# Rewrite the log without finished entries once it is empty and larger than this
+WRITE_QUEUE_COMPACT_BYTES = int(os.getenv("WRITE_QUEUE_COMPACT_BYTES", str(1024 * 1024)))
+
+_operations: Dict[str, Callable[[str, Optional[str], Any], Any]] = {}
+_validators: Dict[str, Callable[[str, Any], None]] = {}
+
+
+def operation(name: str, validate: Optional[Callable[[str, Any], None]] = None):
+    """
+    Register a replayable write: fn(company_id, user_id, payload) -> JSON-serialisable result.
+    validate(company_id, payload) raises HTTPException for a request the write would reject.
+    """
+    def register(fn):
+        _operations[name] = fn
+        if validate is not None:
+            _validators[name] = validate
+        return fn
+    return register
+
+
+def _successful_writes() -> Optional[int]:
+    """Writes that succeeded so far in this request (None outside a traced request)."""
+    trace = db_trace.current_trace()
+    if trace is None:
+        return None
+    # The request's own idempotency claim (middleware/idempotency.py) is bookkeeping, not a write
+    return sum(1 for call in trace.calls
+               if call[1] != "select" and not call[4] and call[0] != "idempotency_keys")
+
+
+# ==========================================
+# Idempotency keys (lib/idempotency.py)
+# ==========================================
+
+def _queue_key(item: Dict[str, Any]) -> str:
+    # Namespaced so a replayed write never collides with the HTTP-level claim on the client's key
+    return "queue:" + item["key"]
+
+
+def _claim_key(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Claim the item's key; returns the stored row when the write was already completed or failed."""
+    row = idempotency.claim(item["company_id"], _queue_key(item), item["op"])
+    if row and row["status"] in ("completed", "failed"):
+        return row
+    return None  # still 'processing': our own earlier attempt that didn't get to run the write
+
+
+def _finish_key(item: Dict[str, Any], status: str, response: Any):
+    idempotency.finish(item["company_id"], _queue_key(item), status, response)
+
+
+def _release_key(item: Dict[str, Any]):
+    """Drop a claim whose write didn't run (transient failure) so the next attempt can claim it."""
+    idempotency.release(item["company_id"], _queue_key(item))
+
+
+# ==========================================
+# Queue
+# ==========================================
+
+class WriteQueue:
+    """Append-only JSONL log of queued writes plus the thread that replays them."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, "queue.log")
+        self.enabled = False
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._lock_file = None
+        self.pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.finished: deque = deque(maxlen=1000)  # recent done/failed items for status lookups
+        self.replayed = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+
+    # ---- lifecycle ----
+
+    def open(self) -> bool:
+        """Lock and load the log; False when another process owns this directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, "queue.lock"), "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                logger.warning("Write queue %s is in use by another process; queueing disabled here.", self.directory)
+                self._lock_file.close()
+                self._lock_file = None
+                return False
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.enabled = True
+        return True
+
+    def start(self):
+        if not self.enabled and not self.open():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._replay_loop, name="write-queue-replay", daemon=True)
+        self._thread.start()
+        if self.pending:
+            logger.info("Write queue: %d pending writes to replay", len(self.pending))
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            self.enabled = False
+
+    # ---- log ----
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-append
+                kind, item_id = record.get("type"), record.get("id")
+                if kind == "enqueue":
+                    self.pending[item_id] = {**record["item"], "attempts": 0}
+                elif kind == "applied" and item_id in self.pending:
+                    self.pending[item_id]["applied"] = {"result": record.get("result")}
+                elif kind in ("done", "failed"):
+                    self.pending.pop(item_id, None)
+        self._compact_if_idle(force=True)
+
+    def _append(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _compact_if_idle(self, force: bool = False):
+        """Rewrite the log with only pending items once it has grown (atomic replace)."""
+        if not os.path.exists(self.path):
+            return
+        if not force and (self.pending or os.path.getsize(self.path) < WRITE_QUEUE_COMPACT_BYTES):
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for item_id, item in self.pending.items():
+                stored = {k: v for k, v in item.items() if k not in ("attempts", "applied")}
+                f.write(json.dumps({"type": "enqueue", "id": item_id, "item": stored}, default=str) + "\n")
+                if "applied" in item:
+                    f.write(json.dumps({"type": "applied", "id": item_id, "result": item["applied"]["result"]}, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        reopen = self._file is not None
+        if reopen:
+            self._file.close()
+        os.replace(tmp, self.path)
+        if reopen:
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    # ---- producer side ----
+
+    def enqueue(self, op: str, company_id: str, user_id: Optional[str], payload: Any,
+                key: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            if key:
+                for existing in self.pending.values():
+                    if existing["key"] == key and existing["company_id"] == company_id:
+                        return existing  # client retried a write that is already queued
+            item = {
+                "id": str(uuid.uuid4()),
+                "key": key or f"wq-{uuid.uuid4()}",
+                "op": op,
+                "company_id": company_id,
+                "user_id": user_id,
+                "payload": payload,
+                "queued_at": time.time(),
+            }
+            self._append({"type": "enqueue", "id": item["id"], "item": item})
+            self.pending[item["id"]] = {**item, "attempts": 0}
+        self._wake.set()
+        return item
+
+    def lookup(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if item_id in self.pending:
+                position = list(self.pending).index(item_id) + 1
+                return {**_public(self.pending[item_id]), "status": "pending", "position": position}
+            for item in self.finished:
+                if item["id"] == item_id:
+                    return item
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = next(iter(self.pending.values()), None)
+            return {
+                "enabled": self.enabled,
+                "depth": len(self.pending),
+                "oldest_age_s": round(time.time() - oldest["queued_at"], 1) if oldest else None,
+                "replayed": self.replayed,
+                "failed": self.failed,
+                "last_error": self.last_error,
+                "last_error_at": self.last_error_at,
+            }
+
+    # ---- replay ----
+
+    def _replay_loop(self):
+        delay = WRITE_QUEUE_RETRY_S
+        while not self._stop.is_set():
+            with self._lock:
+                head = next(iter(self.pending.values()), None)
+            if head is None:
+                self._wake.wait(WRITE_QUEUE_RETRY_S)
+                self._wake.clear()
+                continue
+            if self._replay_one(head):
+                delay = WRITE_QUEUE_RETRY_S
+                continue
+            # Backend still unavailable: keep the order, back off
+            self._stop.wait(delay)
+            delay = min(delay * 2, WRITE_QUEUE_MAX_RETRY_S)
+
+    def _replay_one(self, item: Dict[str, Any]) -> bool:
+        """Apply the head item. False when the backend is still unavailable (retry later)."""
+        item["attempts"] += 1
+        try:
+            if "applied" not in item:
+                stored = _claim_key(item)
+                if stored is not None:
+                    self._finish(item, stored["status"], stored.get("response"), record_key=False)
+                    return True
+                fn = _operations.get(item["op"])
+                if fn is None:
+                    self._finish(item, "failed", {"error": f"Unknown operation {item['op']}"})
+                    return True
+                try:
+                    result = fn(item["company_id"], item["user_id"], item["payload"])
+                except HTTPException as exc:
+                    if exc.status_code >= 500:
+                        _release_key(item)
+                        raise
+                    self._finish(item, "failed", {"status_code": exc.status_code, "error": exc.detail})
+                    return True
+                except Exception as exc:
+                    if _rejected(exc):
+                        self._finish(item, "failed", {"error": getattr(exc, "message", None) or str(exc)})
+                        return True
+                    _release_key(item)
+                    raise
+                with self._lock:
+                    self._append({"type": "applied", "id": item["id"], "result": result})
+                item["applied"] = {"result": result}
+            self._finish(item, "completed", item["applied"]["result"])
+            return True
+        except Exception as exc:
+            with self._lock:
+                self.last_error = getattr(exc, "message", None) or str(exc)
+                self.last_error_at = time.time()
+            logger.warning("Write queue replay of %s (%s) deferred: %s", item["id"], item["op"], self.last_error)
+            return False
+
+    def _finish(self, item: Dict[str, Any], status: str, response: Any, record_key: bool = True):
+        if record_key:
+            _finish_key(item, status, response)
+        with self._lock:
+            self._append({"type": "done" if status == "completed" else "failed", "id": item["id"]})
+            self.pending.pop(item["id"], None)
+            finished = {**_public(item), "status": status, "finished_at": time.time()}
+            finished["result" if status == "completed" else "error"] = response
+            self.finished.append(finished)
+            if status == "completed":
+                self.replayed += 1
+            else:
+                self.failed += 1
+                logger.warning("Queued write %s (%s) failed permanently: %s", item["id"], item["op"], response)
+            self._compact_if_idle()
+
+
+def _rejected(exc: BaseException) -> bool:
+    """The database refused the write's data (constraint, bad value): replaying it again can't succeed."""
+    if isinstance(exc, (DatabaseUnavailable, DatabaseTimeout)) or is_transient_error(exc):
+        return False
+    return getattr(exc, "code", None) is not None
+
+
+def _public(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: item[k] for k in ("id", "key", "op", "company_id", "queued_at")}
+
+
+queue = WriteQueue(WRITE_QUEUE_DIR)
+
+
+def start():
+    """Open the log and start replaying (app startup). No-op unless WRITE_QUEUE_ENABLED."""
+    if WRITE_QUEUE_ENABLED:
+        queue.start()
+
+
+def stop():
+    queue.stop()
+
+
+def stats() -> Dict[str, Any]:
+    return queue.stats()
+
+
+def submit(op: str, auth: Dict[str, str], payload: Any, idempotency_key: Optional[str] = None):
+    """
+    Run a registered write now, or queue it (202) when the backend is unavailable
+    or earlier writes are still queued. See the module docstring.
+    """
+    fn = _operations[op]
+    company_id, user_id = auth["company_id"], auth.get("user_id")
+    if queue.enabled and queue.pending:
+        _validate(op, company_id, payload)
+        return _accepted(queue.enqueue(op, company_id, user_id, payload, idempotency_key))
+    writes_before = _successful_writes()
+    try:
+        if queue.enabled and idempotency_key:
+            # A client retrying a write that was queued earlier gets the replayed result
+            stored = idempotency.lookup(company_id, _queue_key({"key": idempotency_key}))
+            if stored and stored["status"] == "completed":
+                return stored["response"]
+            if stored and stored["status"] == "failed":
+                error = stored.get("response") or {}
+                raise HTTPException(status_code=error.get("status_code", 422), detail=error.get("error"))
+        return fn(company_id, user_id, payload)
+    except DatabaseUnavailable as exc:
+        # Only safe to replay if this attempt wrote nothing: no earlier write in the
+        # request succeeded, and the failed one never reached the database
+        if not queue.enabled or not is_unapplied_error(exc) \
+                or writes_before is None or _successful_writes() != writes_before:
+            raise
+        _validate(op, company_id, payload)
+        return _accepted(queue.enqueue(op, company_id, user_id, payload, idempotency_key))
+
+
+def _validate(op: str, company_id: str, payload: Any) -> None:
+    validate = _validators.get(op)
+    if validate is not None:
+        validate(company_id, payload)
+
+
+def _accepted(item: Dict[str, Any]) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "pending",
+            "queue_id": item["id"],
+            "idempotency_key": item["key"],
+            "detail": "Database temporarily unavailable; the write was queued and will be applied in order.",
+        },
+        headers={"Location": f"/status/write-queue/{item['id']}"},
+    )
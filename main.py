@@ -1,6 +1,15 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from database import table
+from fastapi.responses import JSONResponse
+from database import table, init_pg_pool, close_pg_pool, pg_enabled, DatabaseTimeout, DatabaseUnavailable
+from middleware.db_trace import DbTraceMiddleware
+from middleware.deadline import DeadlineMiddleware
+from middleware.idempotency import IdempotencyMiddleware
+from middleware.upload_limit import UploadLimitMiddleware
+from middleware.auth import get_current_user_company
+from lib import write_queue, parse_batch, parse_jobs, perplexity_client, openai_client, uploads
+from lib.idempotency import IdempotentReplay
 from routes import (
     users,
     companies,
@@ -23,11 +32,31 @@ from routes import (
     reconciliation,
     reports,
     documents,
+    debug,
 )
 
 app = FastAPI(title="AI Financial Companion Backend")
 
-# CORS middleware for frontend
+# Per-request database call tracing: Server-Timing header + /debug/db-stats
+app.add_middleware(DbTraceMiddleware)
+
+# Per-request database budget (X-Request-Timeout / DB_REQUEST_BUDGET_MS)
+app.add_middleware(DeadlineMiddleware)
+
+# Stores responses of create requests sent with an Idempotency-Key (outside the
+# deadline, so the stored response isn't lost to a spent budget)
+app.add_middleware(IdempotencyMiddleware)
+
+# Cap upload request bodies while they stream in (UPLOAD_MAX_MB / PARSE_BATCH_MAX_MB, plus room for multipart framing)
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/parse": uploads.UPLOAD_MAX_BYTES + 64 * 1024,
+    "/parse/batch": parse_batch.PARSE_BATCH_MAX_BYTES + 1024 * 1024,
+    "/bank/accounts/": uploads.UPLOAD_MAX_BYTES + 64 * 1024,
+})
+
+# CORS middleware for frontend. add_middleware() wraps the layers added before it,
+# so this is registered last: it stays outermost and the 413/409/422/504 responses
+# of the middleware above get Access-Control-Allow-Origin too.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -43,8 +72,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+
+@app.exception_handler(DatabaseTimeout)
+async def database_timeout_handler(request: Request, exc: DatabaseTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Database temporarily unavailable: {exc.message}"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(IdempotentReplay)
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=exc.response,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
 # include routers
 app.include_router(users.router)
 app.include_router(companies.router)
@@ -68,6 +121,29 @@ app.include_router(accounting_periods.router)
 app.include_router(reconciliation.router)
 app.include_router(reports.router)
 app.include_router(documents.router)
+app.include_router(debug.router)
+
+
+@app.on_event("startup")
+async def startup():
+    # Optional direct Postgres pool for hot queries (no-op without DATABASE_URL)
+    await init_pg_pool()
+    # Replay writes queued during a database outage (no-op unless WRITE_QUEUE_ENABLED)
+    write_queue.start()
+    # Parse worker processes for OCR (started and warmed now only with OCR_WARM_ON_STARTUP)
+    parse_jobs.start()
+    # Keep-alive connection pool for Perplexity research calls (no-op without PERPLEXITY_API_KEY)
+    await perplexity_client.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # In a thread: a replay in progress may need this loop (run_pg) to finish
+    await asyncio.to_thread(write_queue.stop)
+    parse_jobs.stop()
+    await perplexity_client.close()
+    await openai_client.close()
+    await close_pg_pool()
 
 @app.get("/")
 def read_root():
@@ -100,5 +176,22 @@ def healthz():
         "timestamp": datetime.utcnow().isoformat(),
         "database": db_status,
         "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+        "direct_postgres": pg_enabled(),
+        "write_queue_depth": write_queue.stats()["depth"],
         "version": "1.0.0"
     }
+
+
+@app.get("/status/write-queue")
+def write_queue_status():
+    """Writes queued during a database outage: depth, age of the oldest, replay counters."""
+    return write_queue.stats()
+
+
+@app.get("/status/write-queue/{queue_id}")
+def write_queue_item(queue_id: str, auth: dict = Depends(get_current_user_company)):
+    """Status of one queued write (the 202 response's queue_id): pending, completed (with result) or failed."""
+    item = write_queue.queue.lookup(queue_id)
+    if not item or item["company_id"] != auth["company_id"]:
+        raise HTTPException(status_code=404, detail="Queued write not found")
+    return item
@@ -5,10 +5,12 @@ Supports both Legacy HS256 (JWT Secret) and new ECC signing keys (JWKS).
 
 from fastapi import HTTPException, Header, Depends
 from typing import Optional, Dict, Any
+from collections import OrderedDict
 import os
-import httpx
+import threading
+import time
 from jose import jwt, jwk, JWTError
-from database import supabase
+from database import supabase, bind_session, DatabaseTimeout, DatabaseUnavailable
 
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
@@ -18,6 +20,35 @@ SUPABASE_JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_
 # In-memory cache of JWKS (keyed by kid) to avoid fetching on every request
 _jwks_cache: Dict[str, Any] = {}
 
+# Last known user -> company scoping, used only while the database is unavailable
+# so queued writes (lib/write_queue.py) can still be accepted during an outage.
+# Entries older than AUTH_OUTAGE_TTL_S are not used (a removed or downgraded user
+# keeps the old access for at most that long); at most AUTH_OUTAGE_MAX_USERS are kept.
+AUTH_OUTAGE_TTL_S = float(os.getenv("AUTH_OUTAGE_TTL_S", "300"))
+AUTH_OUTAGE_MAX_USERS = int(os.getenv("AUTH_OUTAGE_MAX_USERS", "10000"))
+_last_known_company: "OrderedDict[str, tuple]" = OrderedDict()  # user_id -> (time.monotonic(), auth)
+_last_known_lock = threading.Lock()
+
+
+def _remember_company(user_id: str, auth: Dict[str, str]) -> None:
+    with _last_known_lock:
+        _last_known_company[user_id] = (time.monotonic(), auth)
+        _last_known_company.move_to_end(user_id)
+        while len(_last_known_company) > AUTH_OUTAGE_MAX_USERS:
+            _last_known_company.popitem(last=False)
+
+
+def _recent_company(user_id: str) -> Optional[Dict[str, str]]:
+    """The user's scoping as last read from the database, if that was within AUTH_OUTAGE_TTL_S."""
+    with _last_known_lock:
+        entry = _last_known_company.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= AUTH_OUTAGE_TTL_S:
+            del _last_known_company[user_id]
+            return None
+        return entry[1]
+
 
 def _get_signing_key_from_jwks(kid: str) -> Optional[Any]:
     """Fetch JWKS and return the key for the given kid, with simple cache."""
@@ -27,6 +58,7 @@ def _get_signing_key_from_jwks(kid: str) -> Optional[Any]:
     if not SUPABASE_JWKS_URL:
         return None
     try:
+        import httpx  # deferred: only needed on a JWKS cache miss
         resp = httpx.get(SUPABASE_JWKS_URL, timeout=10.0)
         resp.raise_for_status()
         data = resp.json()
@@ -211,15 +243,26 @@ async def get_current_user_company(
                 detail="User not assigned to a company. Please complete onboarding."
             )
 
-        return {
+        # Company writes in this request keep its replica-routed reads on the primary briefly
+        bind_session(user_data["company_id"])
+
+        auth = {
             "user_id": user_data["id"],
             "company_id": user_data["company_id"],
             "email": user_data.get("email"),
             "role": user_data.get("role", "user")
         }
-
-    except HTTPException:
-        raise
+        _remember_company(user_id, auth)
+        return auth
+
+    except DatabaseUnavailable:
+        auth = _recent_company(user_id)
+        if auth is not None:
+            bind_session(auth["company_id"])
+            return auth
+        raise  # 503 in main.py
+    except (HTTPException, DatabaseTimeout):
+        raise  # DatabaseTimeout becomes 504 in main.py
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -0,0 +1,39 @@
+"""
+ASGI middleware that traces database calls per request (see lib/db_trace.py).
+Adds a Server-Timing header (`db;dur=<ms>;desc="<n> queries"`) to every response
+with a Content-Length. Streamed responses (the /ai/query SSE stream, /parse/batch
+NDJSON) send their headers before most of their queries run, so they get no header;
+their calls still count in /debug/db-stats.
+"""
+
+from lib import db_trace
+
+
+class DbTraceMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = db_trace.start_request_trace()
+        trace = db_trace.current_trace()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and any(
+                name.lower() == b"content-length" for name, _ in message.get("headers", [])
+            ):
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Route template (/journals/{journal_id}) keeps stats grouped per endpoint
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or scope.get("path", "")
+            db_trace.end_request_trace(token, f"{scope.get('method', '')} {route_path}")
@@ -0,0 +1,41 @@
+"""
+ASGI middleware that gives each request a database time budget (see database.py).
+
+The budget comes from the client's `X-Request-Timeout` header (milliseconds),
+falling back to DB_REQUEST_BUDGET_MS; it is never raised above
+DB_REQUEST_BUDGET_MS when that is set. Database calls made while serving the
+request stop waiting once the budget is spent and raise DatabaseTimeout,
+which main.py turns into a 504.
+"""
+
+import database
+
+
+def _budget_ms(scope) -> float:
+    budget = database.DB_REQUEST_BUDGET_MS
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-timeout":
+            try:
+                requested = float(value.decode("latin-1"))
+            except ValueError:
+                break
+            if requested > 0:
+                budget = min(budget, requested) if budget else requested
+            break
+    return budget
+
+
+class DeadlineMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = database.set_request_deadline(_budget_ms(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            database.reset_request_deadline(token)
@@ -0,0 +1,174 @@
+"""
+Idempotency-Key support for create endpoints (POST /journals/, /invoices/,
+/bills/, /payments/, /bank/transactions).
+
+    @router.post("/", dependencies=[Depends(idempotent)])
+
+A client that sends `Idempotency-Key: <unique value>` can retry a create
+after a timeout or dropped connection without creating it twice:
+
+- The first request claims the key for the company (lib/idempotency.py) and
+  runs normally; IdempotencyMiddleware stores its response.
+- A repeat with the same key gets the stored status and body back (with
+  `Idempotent-Replayed: true`) without touching the ledger.
+- A repeat that arrives while the first is still running waits for it
+  (coalesced in-process, polled across workers) up to IDEMPOTENCY_WAIT_S,
+  then gets a 409.
+- The same key with a different method/path/body is rejected with 422.
+
+Responses that say nothing about the outcome (5xx, 401/403/408/409/429) are
+not stored; the key is released so the client can retry. Keys expire after
+IDEMPOTENCY_TTL_HOURS. If the key can't be claimed because the database is
+down, the request runs without it (queued writes are still deduped by key,
+see lib/write_queue.py).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import Depends, Header, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from database import DatabaseUnavailable
+from lib import idempotency
+from middleware.auth import get_current_user_company
+
+logger = logging.getLogger("idempotency")
+
+IDEMPOTENCY_WAIT_S = float(os.getenv("IDEMPOTENCY_WAIT_S", "10"))
+_POLL_S = 0.1
+_MAX_KEY_LENGTH = 255
+_NOT_STORED = {401, 403, 408, 409, 429}
+
+# (company_id, key) of requests running in this process. Plain set + polling
+# rather than asyncio.Event so it works whichever event loop a request is on.
+_inflight: Set[Tuple[str, str]] = set()
+_inflight_lock = threading.Lock()
+
+
+def _done(slot: Tuple[str, str]):
+    with _inflight_lock:
+        _inflight.discard(slot)
+
+
+async def _enter(slot: Tuple[str, str], deadline: float):
+    """Wait until no other request in this process holds the key, then take it."""
+    while True:
+        with _inflight_lock:
+            if slot not in _inflight:
+                _inflight.add(slot)
+                return
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(_POLL_S)
+
+
+async def idempotent(
+    request: Request,
+    auth: Dict[str, str] = Depends(get_current_user_company),
+    idempotency_key: Optional[str] = Header(None),
+):
+    if not idempotency_key:
+        return
+    if len(idempotency_key) > _MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {_MAX_KEY_LENGTH} characters")
+
+    body = await request.body()
+    fingerprint = idempotency.request_fingerprint(
+        request.method, request.url.path, request.url.query, body
+    )
+    route = request.scope.get("route")
+    operation = f"{request.method} {getattr(route, 'path', request.url.path)}"
+    slot = (auth["company_id"], idempotency_key)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_S
+
+    # Same key already running in this process: wait for it instead of racing for the claim
+    await _enter(slot, deadline)
+
+    try:
+        while True:
+            try:
+                row = await run_in_threadpool(
+                    idempotency.claim, auth["company_id"], idempotency_key, operation, fingerprint
+                )
+            except DatabaseUnavailable as exc:
+                logger.warning("Idempotency-Key not claimed, database unavailable: %s", exc.message)
+                _done(slot)
+                return
+            if row is None or row["status"] != "processing":
+                break
+            # Running in another worker
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(_POLL_S)
+    except BaseException:
+        _done(slot)
+        raise
+
+    if row is not None:
+        _done(slot)
+        if row.get("request_hash") and row["request_hash"] != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used for a different request",
+            )
+        raise idempotency.IdempotentReplay(row)
+
+    # Claimed: IdempotencyMiddleware stores the response and releases the slot
+    request.state.idempotency_claim = slot
+
+
+async def _store(slot: Tuple[str, str], status: Optional[int], body: bytes):
+    company_id, key = slot
+    try:
+        if status is None or status >= 500 or status in _NOT_STORED:
+            await run_in_threadpool(idempotency.release, company_id, key)
+            return
+        try:
+            response = json.loads(body) if body else None
+        except ValueError:
+            response = body.decode("utf-8", "replace")
+        await run_in_threadpool(idempotency.finish, company_id, key, "completed", response, status)
+    except Exception as exc:
+        # Left 'processing'; a retry can take it over after IDEMPOTENCY_STALE_S
+        logger.warning("Could not store response for Idempotency-Key %s: %s", key, exc)
+    finally:
+        _done(slot)
+
+
+class IdempotencyMiddleware:
+    """Captures the response of requests whose Idempotency-Key was claimed by `idempotent`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not any(
+            name == b"idempotency-key" for name, _ in scope.get("headers", [])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})
+        status: Optional[int] = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            slot = scope["state"].get("idempotency_claim")
+            if slot is not None:
+                await _store(slot, status, b"".join(chunks))
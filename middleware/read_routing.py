@@ -0,0 +1,20 @@
+"""
+Read-replica routing for read-only routers (see "Read replicas" in database.py).
+
+    router = APIRouter(dependencies=[Depends(replica_reads)])
+
+Depends on get_current_user_company so the user lookup and the company's
+read-your-writes binding happen (on the primary) before reads are routed.
+"""
+
+from typing import Dict
+from fastapi import Depends
+import database
+from middleware.auth import get_current_user_company
+
+
+async def replica_reads(auth: Dict[str, str] = Depends(get_current_user_company)) -> Dict[str, str]:
+    # async so the ContextVar is set in the request's context, which sync
+    # endpoints (run in the threadpool) inherit
+    database.prefer_replica_reads()
+    return auth
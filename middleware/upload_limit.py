@@ -0,0 +1,66 @@
+"""
+ASGI middleware that caps request bodies on upload endpoints (see lib/uploads.py).
+
+Requests to the given path prefixes are refused with 413 when Content-Length
+is over the limit, and cut off with 413 as soon as a streamed body (chunked,
+or lying about its length) passes it, before multipart parsing has spooled the
+rest to disk.
+"""
+
+import json
+
+from lib.uploads import too_large
+
+
+async def _send_413(send, max_bytes: int):
+    body = json.dumps({"detail": too_large(max_bytes).detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app, limits):
+        """limits: {path prefix: max body bytes}; the longest matching prefix wins."""
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: -len(item[0]))
+
+    def _limit(self, path: str):
+        for prefix, max_bytes in self.limits:
+            if path.startswith(prefix):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self._limit(scope["path"]) if scope["type"] == "http" and scope["method"] in ("POST", "PUT") else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    break
+                if declared > max_bytes:
+                    await _send_413(send, max_bytes)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Surfaces through the multipart parser as a 413 response
+                    raise too_large(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
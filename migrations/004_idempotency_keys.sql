@@ -0,0 +1,21 @@
+-- Migration: Idempotency keys for write replay
+-- Date: 2026-10-19
+-- Purpose: Record which client/queued writes have been applied, so a write replayed
+-- from the local write queue (lib/write_queue.py) or retried by a client is applied once
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  company_id UUID NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+  key TEXT NOT NULL,
+  operation TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'processing' CHECK (status IN ('processing', 'completed', 'failed')),
+  response JSONB,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  UNIQUE(company_id, key)
+);
+
+-- Old keys are only needed for the replay/retry window
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at);
+
+COMMENT ON TABLE idempotency_keys IS 'One row per idempotent write (Idempotency-Key header or queued write); response holds the result once completed';
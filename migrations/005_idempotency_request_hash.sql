@@ -0,0 +1,12 @@
+-- Migration: Idempotency-Key support for create endpoints
+-- Date: 2026-10-19
+-- Purpose: Store the request fingerprint and HTTP status with each key so a client
+-- retry returns the original response, and expire keys after IDEMPOTENCY_TTL_HOURS
+
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS request_hash TEXT;
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS status_code INTEGER;
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+COMMENT ON COLUMN idempotency_keys.request_hash IS 'sha256 of method, path, query and body; a key reused for a different request is rejected';
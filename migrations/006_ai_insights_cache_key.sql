@@ -0,0 +1,12 @@
+-- Migration: Research answer cache in ai_insights
+-- Date: 2026-10-19
+-- Purpose: With RESEARCH_CACHE_PERSIST=1, Perplexity research answers (industry benchmarks,
+-- competitor analysis, tax updates, growth recommendations) are stored as ai_insights rows
+-- (insight_type 'research') under the hash of their normalized prompt, so workers and restarts
+-- reuse them and companies with the same industry and location share one answer
+
+ALTER TABLE ai_insights ADD COLUMN IF NOT EXISTS cache_key TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_ai_insights_cache_key ON ai_insights(cache_key, created_at DESC);
+
+COMMENT ON COLUMN ai_insights.cache_key IS 'sha256 of the normalized research prompt (lib/research_cache.py); NULL for other insights';
@@ -0,0 +1,61 @@
+-- Migration: Ledger version and cached financial summaries for AI context
+-- Date: 2026-10-19
+-- Purpose: /ai/query loaded every account and every journal entry with its lines on each
+-- question. ledger_versions.version is bumped by any write to accounts, journal_entries or
+-- journal_lines, and financial_summaries keeps one compact summary per company (totals by
+-- type, monthly trend, top accounts and vendors) tagged with the version it was built for
+-- (lib/financial_summary.py), so AI context is one small read until the ledger changes.
+-- The counter has its own table rather than a companies column: bumping it must not lock
+-- the company row (which every request reads and settings writes update) or fire the
+-- companies updated_at trigger
+
+CREATE TABLE IF NOT EXISTS ledger_versions (
+  company_id UUID PRIMARY KEY REFERENCES companies(id) ON DELETE CASCADE,
+  version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS financial_summaries (
+  company_id UUID PRIMARY KEY REFERENCES companies(id) ON DELETE CASCADE,
+  ledger_version BIGINT NOT NULL,
+  summary JSONB NOT NULL,
+  built_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Statement-level triggers: a bulk insert of many lines bumps each company once
+CREATE OR REPLACE FUNCTION bump_ledger_version()
+RETURNS TRIGGER AS $$
+BEGIN
+  -- DISTINCT: ON CONFLICT DO UPDATE may touch each row only once per statement
+  IF TG_TABLE_NAME = 'journal_lines' THEN
+    INSERT INTO ledger_versions AS lv (company_id, version)
+    SELECT DISTINCT je.company_id, 1 FROM changed_rows c JOIN journal_entries je ON je.id = c.journal_entry_id
+    ON CONFLICT (company_id) DO UPDATE SET version = lv.version + 1;
+  ELSE
+    INSERT INTO ledger_versions AS lv (company_id, version)
+    SELECT DISTINCT company_id, 1 FROM changed_rows WHERE company_id IS NOT NULL
+    ON CONFLICT (company_id) DO UPDATE SET version = lv.version + 1;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow one event per trigger, hence three triggers per table
+DO $$
+DECLARE
+  t TEXT;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['accounts', 'journal_entries', 'journal_lines'] LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_ledger_version_ins', t);
+    EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION bump_ledger_version()', t || '_ledger_version_ins', t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_ledger_version_upd', t);
+    EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION bump_ledger_version()', t || '_ledger_version_upd', t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_ledger_version_del', t);
+    EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION bump_ledger_version()', t || '_ledger_version_del', t);
+  END LOOP;
+END $$;
+
+COMMENT ON TABLE ledger_versions IS 'Bumped by every write to accounts, journal_entries or journal_lines; keys cached financial summaries';
+COMMENT ON TABLE financial_summaries IS 'Compact financial summary per company for AI context (lib/financial_summary.py), valid while ledger_version matches ledger_versions.version';
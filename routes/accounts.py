@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from database import supabase
+from lib.bulk_writer import bulk_insert, bulk_upsert
 from middleware.auth import get_current_user_company
 
 router = APIRouter()
@@ -70,14 +71,7 @@ def create_account(account: AccountCreate, auth: Dict[str, str] = Depends(get_cu
     try:
         company_id = auth["company_id"]  # Use authenticated company_id
 
-        account_data = {
-            "company_id": company_id,
-            "account_code": account.account_code,
-            "account_name": account.account_name,
-            "account_type": account.type,
-            "account_subtype": account.subtype,
-            "parent_account_id": account.parent_account_id,
-        }
+        account_data = _account_to_db(company_id, account)
 
         response = supabase.table("accounts").insert(account_data).execute()
 
@@ -89,6 +83,36 @@ def create_account(account: AccountCreate, auth: Dict[str, str] = Depends(get_cu
         print(f"Error creating account: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+def _account_to_db(company_id: str, account: AccountCreate) -> dict:
+    return {
+        "company_id": company_id,
+        "account_code": account.account_code,
+        "account_name": account.account_name,
+        "account_type": account.type,
+        "account_subtype": account.subtype,
+        "parent_account_id": account.parent_account_id,
+    }
+
+@router.post("/bulk")
+def create_accounts_bulk(
+    accounts: List[AccountCreate],
+    upsert: bool = False,
+    auth: Dict[str, str] = Depends(get_current_user_company),
+):
+    """
+    Create many accounts in chunked multi-row inserts (chart of accounts setup/import).
+    With ?upsert=true existing account codes are updated instead of reported as failures.
+    """
+    company_id = auth["company_id"]
+    rows = [_account_to_db(company_id, account) for account in accounts]
+    if upsert:
+        result = bulk_upsert("accounts", rows, on_conflict="company_id,account_code")
+    else:
+        result = bulk_insert("accounts", rows)
+    if not result.ok:
+        print(f"Bulk account create: {result.summary()}")
+    return {"created": result.rows, "failed": [f.to_dict() for f in result.failures]}
+
 def _account_update_to_db(account: AccountUpdate) -> dict:
     """Map Pydantic AccountUpdate fields to DB column names."""
     raw = {k: v for k, v in account.dict().items() if v is not None}
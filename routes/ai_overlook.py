@@ -1,13 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
 import os
 from datetime import datetime
 from database import table
 import re
-from typing import Dict
+from typing import Callable, Dict, Optional
 from middleware.auth import get_current_user_company
+from middleware.read_routing import replica_reads
+from lib import financial_summary, openai_client
 
 router = APIRouter(prefix="/ai", tags=["AI Overlook"])
 
+# The formatting stage is optional (clean_ai_response is the fallback), so it gets a shorter timeout
+OPENAI_FORMAT_TIMEOUT_S = float(os.getenv("OPENAI_FORMAT_TIMEOUT_S", "15"))
+
 def build_peer_context(revenue: float, expense: float) -> str:
     revenue = revenue or 0
     expense = expense or 0
@@ -40,22 +48,63 @@ def clean_ai_response(answer: str, peer_context: str = None) -> str:
     return cleaned.strip()
 
 
-async def format_for_dashboard(raw_response: str, context: str, openai_key: str) -> str:
+class StreamCleaner:
+    """
+    clean_ai_response for an answer that arrives in pieces, plus what the dashboard
+    formatting pass removes: markdown, bullets, citation markers ([1]), heading
+    marks and runs of whitespace. feed() returns the cleaned text that is safe to
+    send so far (a possible "[1" or "##" at the end is held back); flush() the rest.
+    """
+
+    _CITATION = re.compile(r"\[\d+\]")
+    _TAIL = re.compile(r"(\[\d*|(?:^|(?<=\s))#+)$")
+
+    def __init__(self):
+        self._pending = ""
+        self._gap = False  # whitespace seen since the last word
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        text = self._pending + text.replace("*", "").replace("•", "-")
+        tail = self._TAIL.search(text)
+        cut = tail.start() if tail else len(text)
+        self._pending = text[cut:]
+        return self._clean(text[:cut])
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return self._clean(text)
+
+    def _clean(self, text: str) -> str:
+        out = []
+        for piece in re.split(r"(\s+)", self._CITATION.sub("", text)):
+            if not piece:
+                continue
+            if piece.isspace():
+                self._gap = True
+            elif (self._gap or not self._started) and re.fullmatch(r"#{1,6}", piece):
+                continue  # markdown heading mark
+            else:
+                if self._gap and self._started:
+                    out.append(" ")
+                out.append(piece)
+                self._gap = False
+                self._started = True
+        return "".join(out)
+
+
+async def format_for_dashboard(raw_response: str, context: str) -> str:
     """
     Two-stage processing: Use OpenAI to format Perplexity's raw data into clean, visual-friendly insights.
 
     Args:
         raw_response: Raw text from Perplexity (may have markdown, citations, etc.)
         context: Context about what type of insight this is
-        openai_key: OpenAI API key
 
     Returns:
         Clean, formatted, concise text suitable for dashboard cards
     """
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=openai_key)
-
         prompt = f"""You are a data visualization expert. Take this raw research data and format it for a business dashboard card.
 
 CONTEXT: {context}
@@ -75,12 +124,14 @@ REQUIREMENTS:
 
 Output clean, dashboard-ready text:"""
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        response = await openai_client.chat(
+            [
                 {"role": "system", "content": "You are a data visualization expert. Extract key insights and format them cleanly."},
                 {"role": "user", "content": prompt}
             ],
+            "format_dashboard",
+            timeout=OPENAI_FORMAT_TIMEOUT_S,
+            model="gpt-4o-mini",
             temperature=0.3,
             max_tokens=300
         )
@@ -94,7 +145,7 @@ Output clean, dashboard-ready text:"""
         return clean_ai_response(raw_response)
 
 
-def get_ai_suggestions(company_id: str, vendor_name: str, amount: float, date: str, category: str = None, memo: str = None):
+async def get_ai_suggestions(company_id: str, vendor_name: str, amount: float, date: str, category: str = None, memo: str = None):
     """
     Use OpenAI to suggest category, memo, and normalized vendor name.
     Falls back to basic rules if OPENAI_API_KEY is not set.
@@ -104,9 +155,6 @@ def get_ai_suggestions(company_id: str, vendor_name: str, amount: float, date: s
     # If OpenAI key is available, use it
     if openai_key:
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=openai_key)
-
             prompt = f"""Analyze this expense and provide suggestions:
 - Vendor: {vendor_name}
 - Amount: ${amount}
@@ -126,12 +174,13 @@ Respond in JSON format:
   "memo": "brief description"
 }}"""
 
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
+            response = await openai_client.chat(
+                [
                     {"role": "system", "content": "You are a financial assistant helping categorize business expenses. Respond only with valid JSON."},
                     {"role": "user", "content": prompt}
                 ],
+                "expense_suggestions",
+                model="gpt-4o-mini",
                 temperature=0.3,
                 response_format={"type": "json_object"}
             )
@@ -172,8 +221,35 @@ Respond in JSON format:
     }
 
 
+async def build_financial_context(company_id: str, company: dict, location: str) -> dict:
+    """The plain-text company and financial context /ai/query gives the model (from lib/financial_summary.py)."""
+    company_name = company.get("name", "your business")
+    industry = company.get("industry", "general business")
+    website = company.get("website", "")
+    business_type = company.get("business_type", "")
+
+    summary = await financial_summary.get(company_id)
+
+    financial_context = f"Company: {company_name}\n"
+    financial_context += f"Industry: {industry}\n"
+    if location:
+        financial_context += f"Location: {location}\n"
+    if website:
+        financial_context += f"Website: {website}\n"
+    if business_type:
+        financial_context += f"Business Type: {business_type}\n"
+    financial_context += financial_summary.to_prompt(summary)
+
+    return {
+        "text": financial_context,
+        "totals": {acc_type: data["total"] for acc_type, data in summary["by_type"].items()},
+        "account_count": summary["account_count"],
+        "journal_count": summary["journal_count"],
+    }
+
+
 @router.post("/overlook_expense")
-def overlook_expense(expense_data: dict):
+async def overlook_expense(expense_data: dict):
     """
     AI-powered expense validation and suggestion.
     Returns issues, suggestions, and a JSON patch for the expense.
@@ -206,7 +282,7 @@ def overlook_expense(expense_data: dict):
         # Get AI suggestions
         suggestions = {}
         if valid:
-            suggestions = get_ai_suggestions(
+            suggestions = await get_ai_suggestions(
                 company_id=company_id,
                 vendor_name=vendor_name,
                 amount=amount,
@@ -226,8 +302,20 @@ def overlook_expense(expense_data: dict):
         raise HTTPException(status_code=500, detail=f"Error processing expense: {str(e)}")
 
 
-@router.post("/query")
-async def ai_query(query_data: dict, auth: Dict[str, str] = Depends(get_current_user_company)):
+@router.get("/openai/metrics")
+def openai_metrics(auth: Dict[str, str] = Depends(get_current_user_company)):
+    """OpenAI calls: latency per operation, calls in flight, concurrency cap, timeout and pool limits."""
+    return openai_client.stats()
+
+
+@router.get("/context/metrics")
+def context_metrics(auth: Dict[str, str] = Depends(get_current_user_company)):
+    """Financial summaries behind /ai/query: companies held in memory, memory and database hits, rebuilds."""
+    return financial_summary.stats()
+
+
+@router.post("/query", dependencies=[Depends(replica_reads)])  # context building only reads
+async def ai_query(query_data: dict, request: Request, auth: Dict[str, str] = Depends(get_current_user_company)):
     """
     AI-powered business intelligence assistant.
 
@@ -240,6 +328,9 @@ async def ai_query(query_data: dict, auth: Dict[str, str] = Depends(get_current_
     - Growth recommendations
     - Financial data analysis (when available)
     - General business advice
+
+    With "stream": true (or Accept: text/event-stream) the answer streams back
+    as server-sent events instead, see stream_answer().
     """
     try:
         company_id = auth["company_id"]
@@ -249,99 +340,142 @@ async def ai_query(query_data: dict, auth: Dict[str, str] = Depends(get_current_
             raise HTTPException(status_code=400, detail="question is required")
 
         # Check for Perplexity key (primary) or OpenAI key (fallback)
-        perplexity_key = os.getenv("PERPLEXITY_API_KEY", "")
-        openai_key = os.getenv("OPENAI_API_KEY", "")
-
-        if not perplexity_key and not openai_key:
+        if not os.getenv("PERPLEXITY_API_KEY", "") and not os.getenv("OPENAI_API_KEY", ""):
             raise HTTPException(
                 status_code=503,
                 detail="AI assistant requires PERPLEXITY_API_KEY or OPENAI_API_KEY to be configured."
             )
 
-        # ========== Fetch company profile ==========
-        company_resp = table("companies").select("*").eq("id", company_id).execute()
-        company = company_resp.data[0] if company_resp.data else {}
-
-        company_name = company.get("name", "your business")
-        industry = company.get("industry", "general business")
-        website = company.get("website", "")
-
-        # Construct full location from city + state
-        location_city = company.get("location_city", "")
-        location_state = company.get("location_state", "")
-        location_country = company.get("location_country", "USA")
-
-        # Build location string: "Phoenix, AZ" or "Phoenix, AZ, USA"
-        location_parts = []
-        if location_city:
-            location_parts.append(location_city)
-        if location_state:
-            location_parts.append(location_state)
-        location = ", ".join(location_parts) if location_parts else ""
-
-        business_type = company.get("business_type", "")
-        revenue = company.get("annual_revenue", 0)
-        employees = company.get("employee_count", 0)
-
-        # ========== Fetch financial data ==========
-        accounts_resp = table("accounts").select("*").eq("company_id", company_id).execute()
-        accounts = accounts_resp.data or []
-        account_count = len(accounts)
-
-        journals_resp = table("journal_entries").select("*, journal_lines(*)").eq("company_id", company_id).execute()
-        journals = journals_resp.data or []
-        journal_count = len(journals)
-
-        # ========== Build financial context ==========
-        financial_context = f"Company: {company_name}\n"
-        financial_context += f"Industry: {industry}\n"
-        if location:
-            financial_context += f"Location: {location}\n"
-        if website:
-            financial_context += f"Website: {website}\n"
-        if business_type:
-            financial_context += f"Business Type: {business_type}\n"
-
-        financial_context += f"\nFinancial Data: {account_count} accounts, {journal_count} journal entries\n\n"
-
-        # Add detailed financial data if available
-        if account_count > 0:
-            account_types = {}
-            for acc in accounts:
-                acc_type = acc.get("account_type", "Unknown")
-                balance = acc.get("current_balance", 0)
-                if acc_type not in account_types:
-                    account_types[acc_type] = {"count": 0, "total": 0, "accounts": []}
-                account_types[acc_type]["count"] += 1
-                account_types[acc_type]["total"] += balance
-                account_types[acc_type]["accounts"].append({
-                    "code": acc.get("account_code", ""),
-                    "name": acc.get("account_name", ""),
-                    "balance": balance
-                })
-
-            financial_context += "ACCOUNTS BY TYPE:\n"
-            for acc_type, data in account_types.items():
-                financial_context += f"  {acc_type}: {data['count']} accounts, Total: ${data['total']:,.2f}\n"
-                # Show top 3 accounts
-                sorted_accs = sorted(data['accounts'], key=lambda x: abs(x['balance']), reverse=True)[:3]
-                for acc in sorted_accs:
-                    financial_context += f"    - {acc['code']}: {acc['name']} = ${acc['balance']:,.2f}\n"
-
-        if journal_count > 0:
-            recent = journals[-5:] if len(journals) > 5 else journals
-            financial_context += f"\nRECENT TRANSACTIONS ({len(recent)}):\n"
-            for j in recent:
-                financial_context += f"  - {j.get('entry_date', 'N/A')}: {j.get('memo', 'No memo')}\n"
+        if query_data.get("stream") or "text/event-stream" in request.headers.get("accept", ""):
+            return StreamingResponse(
+                stream_answer(company_id, question),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        result = await answer_question(company_id, question)
+        return {
+            "answer": result["answer"].strip(),
+            "account_count": result["account_count"],
+            "journal_count": result["journal_count"]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[AI] Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 
+async def stream_answer(company_id: str, question: str):
+    """
+    /ai/query as server-sent events:
+
+        event: token       {"text": "..."}          cleaned answer text, as it arrives
+        event: citations   {"citations": [...]}
+        event: done        {"answer", "account_count", "journal_count", "cached"}
+        event: error       {"detail": "..."}        instead of citations/done when the call fails
+
+    The OpenAI formatting pass needs the whole answer, so streamed answers get
+    StreamCleaner's cleanup instead, applied to each piece. A cached research
+    answer arrives as a single token event.
+    """
+    yield ": stream open\n\n"  # first byte before any database or API work
+    queue: asyncio.Queue = asyncio.Queue()
+    cleaner = StreamCleaner()
+    streamed = []
+    task = asyncio.ensure_future(answer_question(company_id, question, on_token=queue.put_nowait))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (text := await queue.get()) is not None:
+            cleaned = cleaner.feed(text)
+            if cleaned:
+                streamed.append(cleaned)
+                yield _sse("token", {"text": cleaned})
+        result = task.result()
+    except Exception as e:
+        print(f"[AI] Streaming error: {str(e)}")
+        yield _sse("error", {"detail": str(e)})
+        return
+    finally:
+        task.cancel()  # no-op once finished; stops the work when the client goes away
+
+    cleaned = cleaner.flush()
+    if cleaned:
+        streamed.append(cleaned)
+        yield _sse("token", {"text": cleaned})
+    yield _sse("citations", {"citations": result["citations"]})
+    yield _sse("done", {
+        "answer": "".join(streamed).strip(),
+        "account_count": result["account_count"],
+        "journal_count": result["journal_count"],
+        "cached": result["cached"],
+    })
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def answer_question(company_id: str, question: str, on_token: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    The answer to an /ai/query question: {"answer", "citations", "cached", "account_count", "journal_count"}.
+    With on_token the raw answer text is passed to it as it arrives and not formatted (stream_answer cleans it).
+    """
+    perplexity_key = os.getenv("PERPLEXITY_API_KEY", "")
+    openai_key = os.getenv("OPENAI_API_KEY", "")
+    streamed = []
+
+    def emit(text: str):
+        streamed.append(text)
+        on_token(text)
+
+    stream = emit if on_token else None
+
+    # ========== Fetch company profile ==========
+    company_resp = await asyncio.to_thread(table("companies").select("*").eq("id", company_id).execute)
+    company = company_resp.data[0] if company_resp.data else {}
+
+    company_name = company.get("name", "your business")
+    industry = company.get("industry", "general business")
+    website = company.get("website", "")
+
+    # Construct full location from city + state
+    location_city = company.get("location_city", "")
+    location_state = company.get("location_state", "")
+    location_country = company.get("location_country", "USA")
+
+    # Build location string: "Phoenix, AZ" or "Phoenix, AZ, USA"
+    location_parts = []
+    if location_city:
+        location_parts.append(location_city)
+    if location_state:
+        location_parts.append(location_state)
+    location = ", ".join(location_parts) if location_parts else ""
+
+    business_type = company.get("business_type", "")
+    revenue = company.get("annual_revenue", 0)
+    employees = company.get("employee_count", 0)
+
+    # ========== Financial context ==========
+    # Built while the research call below runs; only the financial-analysis
+    # route and the OpenAI fallback wait for it first
+    financial = asyncio.ensure_future(build_financial_context(company_id, company, location))
+    try:
         # ========== Intelligent routing with Perplexity ==========
         answer = ""
+        citations = []
+        cached = False
 
         if perplexity_key:
-            from lib.perplexity_client import PerplexityClient
-            client = PerplexityClient()
+            from lib import perplexity_client
+            client = perplexity_client.get_client()
 
             question_lower = question.lower()
+            format_context = None  # what the OpenAI formatting pass is told the answer is (None: basic cleanup)
+            peer_context = None
 
             # Route 1: Industry benchmarks / "how am I doing?" / comparison
             if any(kw in question_lower for kw in ["benchmark", "industry average", "industry standard", "how am i doing", "compare", "typical", "normal", "peers"]):
@@ -362,19 +496,11 @@ async def ai_query(query_data: dict, auth: Dict[str, str] = Depends(get_current_
                 result = await client.get_industry_benchmarks(
                     industry=working_industry,
                     location=working_location,
-                    metrics=metrics
+                    metrics=metrics,
+                    company_id=company_id,
+                    on_token=stream
                 )
-                raw_answer = result.get("answer", "")
-
-                # Two-stage processing: Format with OpenAI
-                if openai_key:
-                    answer = await format_for_dashboard(
-                        raw_response=raw_answer,
-                        context=f"Industry benchmarks for {working_industry} businesses",
-                        openai_key=openai_key
-                    )
-                else:
-                    answer = clean_ai_response(raw_answer)
+                format_context = f"Industry benchmarks for {working_industry} businesses"
 
             # Route 2: Reviews / online presence / social media / reputation
             elif any(kw in question_lower for kw in ["review", "online", "social media", "reputation", "presence", "find me", "search for"]):
@@ -411,19 +537,10 @@ If you cannot find specific information about {company_name} at {website or loca
                     system_prompt="""You are a business intelligence analyst. Search the web for factual information.
 If you cannot find specific information, say so and provide general guidance for that industry.""",
                     temperature=0.2,
-                    max_tokens=600
+                    max_tokens=600,
+                    on_token=stream
                 )
-                raw_answer = result.get("answer", "")
-
-                # Two-stage processing: Format with OpenAI
-                if openai_key:
-                    answer = await format_for_dashboard(
-                        raw_response=raw_answer,
-                        context=f"Online presence and reviews for {company_name}",
-                        openai_key=openai_key
-                    )
-                else:
-                    answer = clean_ai_response(raw_answer)
+                format_context = f"Online presence and reviews for {company_name}"
 
             # Route 3: Growth / expansion / scaling strategies
             elif any(kw in question_lower for kw in ["grow", "growth", "expand", "scale", "improve", "increase revenue", "get more customers"]):
@@ -446,19 +563,11 @@ If you cannot find specific information, say so and provide general guidance for
                     revenue=working_revenue,
                     employees=working_employees,
                     growth_stage="growth" if working_revenue > 500000 else "startup",
-                    location=working_location
+                    location=working_location,
+                    company_id=company_id,
+                    on_token=stream
                 )
-                raw_answer = result.get("answer", "")
-
-                # Two-stage processing: Format with OpenAI
-                if openai_key:
-                    answer = await format_for_dashboard(
-                        raw_response=raw_answer,
-                        context=f"Growth strategies for {working_industry} business",
-                        openai_key=openai_key
-                    )
-                else:
-                    answer = clean_ai_response(raw_answer)
+                format_context = f"Growth strategies for {working_industry} business"
 
             # Route 4: Competitor analysis
             elif any(kw in question_lower for kw in ["competitor", "competition", "rival", "other businesses"]):
@@ -488,30 +597,23 @@ Provide actionable competitive insights."""
                     prompt=search_prompt,
                     system_prompt="You are a competitive intelligence analyst. Provide factual market analysis from web sources.",
                     temperature=0.2,
-                    max_tokens=600
+                    max_tokens=600,
+                    on_token=stream
                 )
-                raw_answer = result.get("answer", "")
-
-                # Two-stage processing: Format with OpenAI
-                if openai_key:
-                    answer = await format_for_dashboard(
-                        raw_response=raw_answer,
-                        context=f"Competitive analysis for {company_name}",
-                        openai_key=openai_key
-                    )
-                else:
-                    answer = clean_ai_response(raw_answer)
+                format_context = f"Competitive analysis for {company_name}"
 
             # Route 5: Financial data questions (if they have data)
-            elif account_count > 0 and any(kw in question_lower for kw in ["expense", "revenue", "cash", "profit", "loss", "balance", "account", "transaction", "spending"]):
+            elif any(kw in question_lower for kw in ["expense", "revenue", "cash", "profit", "loss", "balance", "account", "transaction", "spending"]) \
+                    and (await financial)["account_count"] > 0:
                 print(f"[AI] Routing to: Financial Data Analysis")
+                context = await financial
+                financial_context = context["text"]
 
                 # Calculate peer context if possible
                 revenue_total = 0
                 expense_total = 0
-                for acc in accounts:
-                    acc_type = acc.get("account_type", "").lower()
-                    balance = acc.get("current_balance", 0)
+                for acc_type, balance in context["totals"].items():
+                    acc_type = acc_type.lower()
                     if "revenue" in acc_type or "income" in acc_type:
                         revenue_total += balance
                     elif "expense" in acc_type or "cost" in acc_type:
@@ -540,10 +642,9 @@ Answer with ONLY information from the data above. If data is insufficient, say s
                     prompt=user_prompt,
                     system_prompt=system_prompt,
                     temperature=0.3,
-                    max_tokens=600
+                    max_tokens=600,
+                    on_token=stream
                 )
-                answer = result.get("answer", "")
-                answer = clean_ai_response(answer, peer_context)
 
             # Route 6: General business questions (catch-all)
             else:
@@ -561,51 +662,56 @@ Answer with ONLY information from the data above. If data is insufficient, say s
                     prompt=context_prompt,
                     system_prompt="You are a business advisor. Provide practical, actionable advice backed by current web information.",
                     temperature=0.2,
-                    max_tokens=600
+                    max_tokens=600,
+                    on_token=stream
                 )
-                raw_answer = result.get("answer", "")
-
-                # Two-stage processing: Format with OpenAI
-                if openai_key:
-                    answer = await format_for_dashboard(
-                        raw_response=raw_answer,
-                        context="General business advice",
-                        openai_key=openai_key
-                    )
-                else:
-                    answer = clean_ai_response(raw_answer)
+                format_context = "General business advice"
+
+            raw_answer = result.get("answer", "")
+            citations = result.get("citations", [])
+            cached = result.get("cached", False)
+            if on_token:
+                if not streamed:  # cached: nothing was streamed
+                    emit(raw_answer)
+                if peer_context and peer_context.lower() not in raw_answer.lower():
+                    emit(f" Peer snapshot: {peer_context}")
+                answer = raw_answer
+            # Two-stage processing: Format with OpenAI
+            elif openai_key and format_context:
+                answer = await format_for_dashboard(raw_response=raw_answer, context=format_context)
+            else:
+                answer = clean_ai_response(raw_answer, peer_context)
 
         else:
             # Fallback to OpenAI (limited - no web search)
             print(f"[AI] Using OpenAI fallback (no web search)")
-            from openai import OpenAI
-            openai_client = OpenAI(api_key=openai_key)
+            financial_context = (await financial)["text"]
 
             system_prompt = "You are a business and financial advisor. Provide clear, actionable advice. Use plain text only."
             user_prompt = f"{financial_context}\n\nQUESTION: {question}\n\nProvide helpful advice even if financial data is limited. Use plain text only."
 
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=600
-            )
-
-            answer = response.choices[0].message.content
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            if on_token:
+                async for text in openai_client.chat_stream(messages, "ai_query", model="gpt-4o-mini",
+                                                            temperature=0.3, max_tokens=600):
+                    emit(text)
+                answer = "".join(streamed)
+            else:
+                response = await openai_client.chat(messages, "ai_query", model="gpt-4o-mini",
+                                                    temperature=0.3, max_tokens=600)
+                answer = response.choices[0].message.content
 
+        context = await financial
         return {
-            "answer": answer.strip(),
-            "account_count": account_count,
-            "journal_count": journal_count
+            "answer": answer,
+            "citations": citations,
+            "cached": cached,
+            "account_count": context["account_count"],
+            "journal_count": context["journal_count"]
         }
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"[AI] Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # No-op once awaited; stops the context reads when the request fails or is cancelled
+        financial.cancel()
@@ -5,9 +5,10 @@ Provides industry benchmarks, competitor analysis, and growth recommendations.
 
 from fastapi import APIRouter, HTTPException, Depends
 from typing import Dict
+from datetime import datetime, timezone
 from database import supabase
 from middleware.auth import get_current_user_company
-from lib.perplexity_client import PerplexityClient
+from lib import perplexity_client
 import os
 
 router = APIRouter(prefix="/ai/research", tags=["AI Research"])
@@ -51,7 +52,7 @@ async def get_industry_benchmarks(auth: Dict[str, str] = Depends(get_current_use
                 detail="Perplexity AI not configured. Please add PERPLEXITY_API_KEY to .env file."
             )
 
-        perplexity = PerplexityClient()
+        perplexity = perplexity_client.get_client()
 
         # Query industry benchmarks
         benchmarks = await perplexity.get_industry_benchmarks(
@@ -64,7 +65,8 @@ async def get_industry_benchmarks(auth: Dict[str, str] = Depends(get_current_use
                 "Customer acquisition cost",
                 "Revenue growth rate",
                 "Employee productivity"
-            ]
+            ],
+            company_id=company_id
         )
 
         return {
@@ -74,7 +76,8 @@ async def get_industry_benchmarks(auth: Dict[str, str] = Depends(get_current_use
             "location": location,
             "benchmarks": benchmarks["answer"],
             "citations": benchmarks["citations"],
-            "generated_at": "2026-02-01"
+            "generated_at": benchmarks.get("fetched_at") or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cached": benchmarks.get("cached", False)
         }
 
     except HTTPException:
@@ -117,12 +120,13 @@ async def analyze_competitors(auth: Dict[str, str] = Depends(get_current_user_co
 
         location = f"{company_data.get('location_city', '')}, {company_data.get('location_state', 'USA')}".strip(", ")
 
-        perplexity = PerplexityClient()
+        perplexity = perplexity_client.get_client()
         analysis = await perplexity.compare_competitors(
             company_name=company_data["name"],
             industry=company_data["industry"],
             competitors=company_data["competitors"],
-            location=location
+            location=location,
+            company_id=company_id
         )
 
         return {
@@ -131,7 +135,8 @@ async def analyze_competitors(auth: Dict[str, str] = Depends(get_current_user_co
             "competitors": company_data["competitors"],
             "analysis": analysis["answer"],
             "citations": analysis["citations"],
-            "generated_at": "2026-02-01"
+            "generated_at": analysis.get("fetched_at") or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cached": analysis.get("cached", False)
         }
 
     except HTTPException:
@@ -150,8 +155,6 @@ async def get_tax_updates(auth: Dict[str, str] = Depends(get_current_user_compan
     Get latest tax compliance updates for the user's jurisdiction and business type.
     """
     try:
-        from datetime import datetime
-
         company_id = auth["company_id"]
         company = supabase.table("companies")\
             .select("business_type, location_state, name")\
@@ -173,11 +176,12 @@ async def get_tax_updates(auth: Dict[str, str] = Depends(get_current_user_compan
                 detail="Please add your business location in the company profile"
             )
 
-        perplexity = PerplexityClient()
+        perplexity = perplexity_client.get_client()
         updates = await perplexity.get_tax_compliance_updates(
             business_type=company_data["business_type"],
             location_state=company_data["location_state"],
-            year=datetime.now().year
+            year=datetime.now().year,
+            company_id=company_id
         )
 
         return {
@@ -187,7 +191,8 @@ async def get_tax_updates(auth: Dict[str, str] = Depends(get_current_user_compan
             "location": company_data["location_state"],
             "updates": updates["answer"],
             "citations": updates["citations"],
-            "generated_at": "2026-02-01"
+            "generated_at": updates.get("fetched_at") or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cached": updates.get("cached", False)
         }
 
     except HTTPException:
@@ -229,13 +234,14 @@ async def get_growth_recommendations(auth: Dict[str, str] = Depends(get_current_
 
         location = f"{company_data.get('location_city', '')}, {company_data.get('location_state', 'USA')}".strip(", ")
 
-        perplexity = PerplexityClient()
+        perplexity = perplexity_client.get_client()
         recommendations = await perplexity.get_growth_recommendations(
             industry=company_data["industry"],
             revenue=company_data["annual_revenue"],
             employees=company_data["employee_count"],
             growth_stage=company_data["growth_stage"],
-            location=location
+            location=location,
+            company_id=company_id
         )
 
         return {
@@ -244,7 +250,8 @@ async def get_growth_recommendations(auth: Dict[str, str] = Depends(get_current_
             "growth_stage": company_data["growth_stage"],
             "recommendations": recommendations["answer"],
             "citations": recommendations["citations"],
-            "generated_at": "2026-02-01"
+            "generated_at": recommendations.get("fetched_at") or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cached": recommendations.get("cached", False)
         }
 
     except HTTPException:
@@ -305,3 +312,9 @@ async def get_research_capabilities(auth: Dict[str, str] = Depends(get_current_u
         "capabilities": capabilities,
         "profile_completeness": sum(1 for c in capabilities.values() if c["available"]) / len(capabilities) * 100
     }
+
+
+@router.get("/metrics")
+def research_metrics(auth: Dict[str, str] = Depends(get_current_user_company)):
+    """Perplexity calls: latency per operation, new vs reused connections, HTTP versions, pool limits and research cache hits."""
+    return perplexity_client.stats()
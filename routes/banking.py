@@ -4,11 +4,15 @@ Schema: bank_connections, bank_accounts, bank_transactions, bank_transaction_spl
         bank_rules, bank_transaction_matches.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, File, Form, UploadFile
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, Dict, List
 from database import supabase
+from lib.bulk_writer import bulk_insert
+from lib import bank_import, uploads, write_queue
 from middleware.auth import get_current_user_company
+from middleware.idempotency import idempotent
 
 router = APIRouter(prefix="/bank", tags=["Banking"])
 
@@ -75,6 +79,35 @@ async def update_bank_account(
     return r.data[0]
 
 
+@router.post("/accounts/{account_id}/import")
+async def import_statement(
+    account_id: str,
+    file: UploadFile = File(...),
+    profile: str = Form("auto"),
+    auth: Dict[str, str] = Depends(get_current_user_company),
+):
+    """
+    Import a bank statement CSV into bank transactions (lib/bank_import.py).
+    profile: auto (detect from the header row) or a bank layout, e.g. chase, bank_of_america, amex, generic.
+    Rows already imported are skipped, so the same statement can be imported again safely.
+    """
+    cid = auth["company_id"]
+    r = supabase.table("bank_accounts")\
+        .select("id, currency")\
+        .eq("id", account_id)\
+        .eq("company_id", cid)\
+        .execute()
+    if not r.data:
+        raise HTTPException(status_code=404, detail="Bank account not found")
+    upload = await uploads.spool(file)
+    try:
+        return await run_in_threadpool(
+            bank_import.import_csv, upload.source, cid, account_id, profile=profile, currency=r.data[0].get("currency")
+        )
+    finally:
+        upload.discard()
+
+
 # ---------- Bank Transactions ----------
 @router.get("/transactions")
 async def list_transactions(
@@ -107,15 +140,20 @@ async def update_transaction(
     transaction_id: str,
     body: CategorizeTransactionBody,
     auth: Dict[str, str] = Depends(get_current_user_company),
+    idempotency_key: Optional[str] = Header(None),
 ):
-    """Categorize a bank transaction (select bucket / approve)."""
-    cid = auth["company_id"]
+    """Categorize a bank transaction (select bucket / approve). Queued (202) during a database outage."""
     data = body.dict(exclude_none=True)
     if not data:
         raise HTTPException(status_code=400, detail="No fields to update")
+    return write_queue.submit("bank.transactions.update", auth, {"id": transaction_id, "data": data}, idempotency_key)
+
+
+@write_queue.operation("bank.transactions.update")
+def _update_transaction(cid: str, user_id: Optional[str], payload: dict) -> dict:
     r = supabase.table("bank_transactions")\
-        .update(data)\
-        .eq("id", transaction_id)\
+        .update(payload["data"])\
+        .eq("id", payload["id"])\
         .eq("company_id", cid)\
         .execute()
     if not r.data:
@@ -132,14 +170,8 @@ class CreateTransactionBody(BaseModel):
     memo: Optional[str] = None
 
 
-@router.post("/transactions")
-async def create_transaction(
-    body: CreateTransactionBody,
-    auth: Dict[str, str] = Depends(get_current_user_company),
-):
-    """Create a bank transaction (manual or after import). For Plaid sync you'd use provider_transaction_id."""
-    cid = auth["company_id"]
-    data = {
+def _transaction_to_db(cid: str, body: CreateTransactionBody) -> dict:
+    return {
         "company_id": cid,
         "bank_account_id": body.bank_account_id,
         "posted_date": body.posted_date,
@@ -149,7 +181,36 @@ async def create_transaction(
         "memo": body.memo,
         "status": "unreviewed",
     }
-    r = supabase.table("bank_transactions").insert(data).execute()
+
+
+@router.post("/transactions", dependencies=[Depends(idempotent)])
+async def create_transaction(
+    body: CreateTransactionBody,
+    auth: Dict[str, str] = Depends(get_current_user_company),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Create a bank transaction (manual or after import). For Plaid sync you'd use provider_transaction_id.
+    Queued (202) during a database outage.
+    """
+    return write_queue.submit("bank.transactions.create", auth, body.dict(), idempotency_key)
+
+
+@write_queue.operation("bank.transactions.create")
+def _create_transaction(cid: str, user_id: Optional[str], payload: dict) -> dict:
+    body = CreateTransactionBody(**payload)
+    r = supabase.table("bank_transactions").insert(_transaction_to_db(cid, body)).execute()
     if not r.data:
         raise HTTPException(status_code=400, detail="Failed to create transaction")
     return r.data[0]
+
+
+@router.post("/transactions/bulk", dependencies=[Depends(idempotent)])
+def create_transactions_bulk(
+    body: List[CreateTransactionBody],
+    auth: Dict[str, str] = Depends(get_current_user_company),
+):
+    """Create many bank transactions in chunked multi-row inserts. Failed rows are reported by index."""
+    cid = auth["company_id"]
+    result = bulk_insert("bank_transactions", [_transaction_to_db(cid, t) for t in body])
+    return {"created": result.rows, "failed": [f.to_dict() for f in result.failures]}
@@ -7,6 +7,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, Dict, List
 from database import supabase
+from lib.bulk_writer import bulk_insert
 from middleware.auth import get_current_user_company
 
 router = APIRouter(prefix="/bill-payments", tags=["Bill Payments"])
@@ -66,21 +67,42 @@ async def apply_to_bills(
     pay_r = supabase.table("bill_payments").select("*").eq("id", payment_id).eq("company_id", cid).single().execute()
     if not pay_r.data:
         raise HTTPException(status_code=404, detail="Bill payment not found")
+    # All referenced bills in one query instead of one per line
+    bill_ids = list({line.bill_id for line in body})
+    bills = {}
+    if bill_ids:
+        bills_r = supabase.table("bills").select("*").in_("id", bill_ids).eq("company_id", cid).execute()
+        bills = {b["id"]: b for b in bills_r.data or []}
     for line in body:
-        bill_r = supabase.table("bills").select("*").eq("id", line.bill_id).eq("company_id", cid).single().execute()
-        if not bill_r.data:
+        if line.bill_id not in bills:
             raise HTTPException(status_code=404, detail=f"Bill {line.bill_id} not found")
-        supabase.table("bill_payment_lines").insert({
+
+    lines = bulk_insert("bill_payment_lines", [
+        {
             "bill_payment_id": payment_id,
             "bill_id": line.bill_id,
             "amount_applied": line.amount_applied,
-        }).execute()
-        bill = bill_r.data
-        new_paid = (bill.get("amount_paid") or 0) + line.amount_applied
+        }
+        for line in body
+    ])
+    applied: Dict[str, float] = {}
+    failed = {f.index for f in lines.failures}
+    for idx, line in enumerate(body):
+        if idx not in failed:
+            applied[line.bill_id] = applied.get(line.bill_id, 0) + line.amount_applied
+
+    # One update per bill (PostgREST can't set different values per row in one request)
+    for bill_id, amount in applied.items():
+        bill = bills[bill_id]
+        new_paid = (bill.get("amount_paid") or 0) + amount
         new_balance = (bill.get("total") or 0) - new_paid
         supabase.table("bills").update({
             "amount_paid": new_paid,
             "balance_due": max(0, new_balance),
             "status": "paid" if new_balance <= 0 else bill.get("status"),
-        }).eq("id", line.bill_id).execute()
-    return {"payment_id": payment_id, "applied": len(body)}
+        }).eq("id", bill_id).execute()
+    return {
+        "payment_id": payment_id,
+        "applied": lines.written,
+        "failed": [f.to_dict() for f in lines.failures],  # index into the request body
+    }
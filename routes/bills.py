@@ -7,7 +7,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, Dict, List
 from database import supabase
+from lib.bulk_writer import bulk_insert, delete_parent
 from middleware.auth import get_current_user_company
+from middleware.idempotency import idempotent
 
 router = APIRouter(prefix="/bills", tags=["Bills"])
 
@@ -59,7 +61,7 @@ async def get_bill(
     return r.data
 
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(idempotent)])
 async def create_bill(
     body: BillCreate,
     auth: Dict[str, str] = Depends(get_current_user_company),
@@ -96,14 +98,21 @@ async def create_bill(
     if not bill_r.data:
         raise HTTPException(status_code=400, detail="Failed to create bill")
     bill = bill_r.data[0]
-    for line in body.lines:
-        supabase.table("bill_lines").insert({
+    lines = bulk_insert("bill_lines", [
+        {
             "bill_id": bill["id"],
             "line_number": line.line_number,
             "description": line.description,
             "amount": line.amount,
             "expense_account_id": line.expense_account_id,
-        }).execute()
+        }
+        for line in body.lines
+    ])
+    if not lines.ok:
+        # Don't leave a header without all of its lines (lines cascade on delete)
+        delete_parent("bills", bill["id"])
+        lines.raise_if_unavailable()
+        raise HTTPException(status_code=400, detail=f"Failed to create bill lines: {lines.summary()}")
     r = supabase.table("bills").select("*, bill_lines(*), contacts(display_name, email)").eq("id", bill["id"]).eq("company_id", cid).single().execute()
     return r.data or bill
 
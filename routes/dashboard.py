@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
-from database import supabase
+from database import supabase, pg_enabled, hot_fetch, hot_fetchval, run_pg
 from datetime import datetime, timedelta
 from collections import defaultdict
 from typing import Dict
 from middleware.auth import get_current_user_company
+from middleware.read_routing import replica_reads
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(replica_reads)])  # read-only: replica when configured
 
 @router.get("/stats/{company_id}")
 def get_dashboard_stats(company_id: str, auth: Dict[str, str] = Depends(get_current_user_company)):
@@ -14,14 +15,6 @@ def get_dashboard_stats(company_id: str, auth: Dict[str, str] = Depends(get_curr
     if auth["company_id"] != company_id:
         raise HTTPException(status_code=403, detail="Cannot access another company's dashboard")
 
-    # Get all accounts with their current balances
-    accounts_response = supabase.table("accounts")\
-        .select("*")\
-        .eq("company_id", company_id)\
-        .execute()
-
-    accounts = accounts_response.data or []
-
     # Calculate totals by account type
     totals = {
         "asset": 0,
@@ -31,22 +24,37 @@ def get_dashboard_stats(company_id: str, auth: Dict[str, str] = Depends(get_curr
         "expense": 0
     }
 
-    for account in accounts:
-        acc_type = account.get("account_type", "")
-        balance = account.get("current_balance", 0) or 0
-        if acc_type in totals:
-            totals[acc_type] += balance
+    if pg_enabled():
+        # Hot path: Postgres sums balances per type instead of returning every account
+        rows, transaction_count = run_pg(_stats_direct, company_id)
+        for row in rows:
+            if row["account_type"] in totals:
+                totals[row["account_type"]] += row["total"]
+    else:
+        # Get all accounts with their current balances
+        accounts_response = supabase.table("accounts")\
+            .select("*")\
+            .eq("company_id", company_id)\
+            .execute()
 
-    # Calculate net position (assets - liabilities)
-    net_position = totals["asset"] - totals["liability"]
+        accounts = accounts_response.data or []
 
-    # Get transaction count
-    journal_entries_response = supabase.table("journal_entries")\
-        .select("id", count="exact")\
-        .eq("company_id", company_id)\
-        .execute()
+        for account in accounts:
+            acc_type = account.get("account_type", "")
+            balance = account.get("current_balance", 0) or 0
+            if acc_type in totals:
+                totals[acc_type] += balance
+
+        # Get transaction count
+        journal_entries_response = supabase.table("journal_entries")\
+            .select("id", count="exact")\
+            .eq("company_id", company_id)\
+            .execute()
+
+        transaction_count = journal_entries_response.count or 0
 
-    transaction_count = journal_entries_response.count or 0
+    # Calculate net position (assets - liabilities)
+    net_position = totals["asset"] - totals["liability"]
 
     # For now, we don't have a top vendor concept since we use journal entries
     # Could be enhanced later by tracking contacts/vendors in journal lines
@@ -70,6 +78,12 @@ def get_dashboard_stats(company_id: str, auth: Dict[str, str] = Depends(get_curr
         "health_score": health_score
     }
 
+async def _stats_direct(company_id: str):
+    """Account totals by type and journal entry count over the direct Postgres pool."""
+    rows = await hot_fetch("account_totals_by_type", company_id)
+    count = await hot_fetchval("journal_entry_count", company_id)
+    return rows, count or 0
+
 @router.get("/monthly-trend/{company_id}")
 def get_monthly_trend(
     company_id: str,
@@ -83,38 +97,44 @@ def get_monthly_trend(
     # Get journal entries from the last N months
     start_date = (datetime.now() - timedelta(days=months * 30)).strftime("%Y-%m-%d")
 
-    journal_entries_response = supabase.table("journal_entries")\
-        .select("id, entry_date, journal_lines(debit, credit, account_id)")\
-        .eq("company_id", company_id)\
-        .gte("entry_date", start_date)\
-        .execute()
-
-    # Get all accounts for this company
-    accounts_response = supabase.table("accounts")\
-        .select("id, account_type")\
-        .eq("company_id", company_id)\
-        .execute()
-
-    # Create account lookup map
-    account_types = {acc["id"]: acc["account_type"] for acc in (accounts_response.data or [])}
-
     # Aggregate by month
     monthly_data = defaultdict(lambda: {"income": 0, "expenses": 0})
 
-    for entry in (journal_entries_response.data or []):
-        entry_date = datetime.strptime(entry["entry_date"], "%Y-%m-%d")
-        month_key = entry_date.strftime("%b")
-
-        for line in entry.get("journal_lines", []):
-            account_id = line.get("account_id")
-            account_type = account_types.get(account_id, "")
-            credit = line.get("credit", 0) or 0
-            debit = line.get("debit", 0) or 0
-
-            if account_type == "revenue":
-                monthly_data[month_key]["income"] += credit
-            elif account_type == "expense":
-                monthly_data[month_key]["expenses"] += debit
+    if pg_enabled():
+        # Hot path: Postgres groups lines by month; one row per month comes back
+        for row in run_pg(hot_fetch, "monthly_income_expense", company_id, start_date):
+            monthly_data[row["month"]]["income"] += row["income"]
+            monthly_data[row["month"]]["expenses"] += row["expenses"]
+    else:
+        journal_entries_response = supabase.table("journal_entries")\
+            .select("id, entry_date, journal_lines(debit, credit, account_id)")\
+            .eq("company_id", company_id)\
+            .gte("entry_date", start_date)\
+            .execute()
+
+        # Get all accounts for this company
+        accounts_response = supabase.table("accounts")\
+            .select("id, account_type")\
+            .eq("company_id", company_id)\
+            .execute()
+
+        # Create account lookup map
+        account_types = {acc["id"]: acc["account_type"] for acc in (accounts_response.data or [])}
+
+        for entry in (journal_entries_response.data or []):
+            entry_date = datetime.strptime(entry["entry_date"], "%Y-%m-%d")
+            month_key = entry_date.strftime("%b")
+
+            for line in entry.get("journal_lines", []):
+                account_id = line.get("account_id")
+                account_type = account_types.get(account_id, "")
+                credit = line.get("credit", 0) or 0
+                debit = line.get("debit", 0) or 0
+
+                if account_type == "revenue":
+                    monthly_data[month_key]["income"] += credit
+                elif account_type == "expense":
+                    monthly_data[month_key]["expenses"] += debit
 
     # Convert to list format
     month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
@@ -0,0 +1,40 @@
+"""
+Debug endpoints: database call statistics collected by lib/db_trace.py.
+"""
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+import database
+from lib import db_trace
+from middleware.auth import verify_token
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+# The counters are process-wide (every tenant's requests), so clearing them is
+# an operator action, off unless DEBUG_STATS_RESET is set
+DEBUG_STATS_RESET = os.getenv("DEBUG_STATS_RESET", "0").lower() in ("1", "true", "yes")
+
+
+@router.get("/db-stats")
+async def get_db_stats(reset: bool = False, _: str = Depends(verify_token)):
+    """
+    Per-route database call counts/latency, per-table/operation totals with
+    latency histograms and retry/hedge/timeout counts, and recent requests
+    that repeated one query shape (N+1). `reset=true` clears the counters
+    after returning them (only with DEBUG_STATS_RESET=1, 403 otherwise).
+    """
+    if reset and not DEBUG_STATS_RESET:
+        raise HTTPException(status_code=403, detail="Resetting database stats is disabled (DEBUG_STATS_RESET)")
+    snapshot = db_trace.stats.snapshot()
+    snapshot["policy"] = {
+        "request_budget_ms": database.DB_REQUEST_BUDGET_MS,
+        "read_retries": database.DB_READ_RETRIES,
+        "hedge_reads": database.DB_HEDGE_READS,
+        "call_timeout_s": database.DB_CALL_TIMEOUT_S,
+        "read_replicas": len(database.SUPABASE_REPLICA_URLS),
+        "replica_sticky_seconds": database.REPLICA_STICKY_SECONDS,
+    }
+    if reset:
+        db_trace.stats.reset()
+    return snapshot
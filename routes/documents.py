@@ -3,9 +3,10 @@ Documents: upload receipts, link to journal (Step 6).
 Schema: documents (document_type, ocr_status, extracted_*).
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from typing import Optional, Dict
 from database import supabase
+from lib import write_queue
 from middleware.auth import get_current_user_company
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
@@ -32,9 +33,17 @@ async def list_documents(
 async def create_document(
     body: dict,
     auth: Dict[str, str] = Depends(get_current_user_company),
+    idempotency_key: Optional[str] = Header(None),
 ):
-    """Create a document record (e.g. after file upload to storage). Links to journal_entry_id if provided."""
-    cid = auth["company_id"]
+    """
+    Create a document record (e.g. after file upload to storage). Links to journal_entry_id if provided.
+    Queued (202) during a database outage.
+    """
+    return write_queue.submit("documents.create", auth, body, idempotency_key)
+
+
+@write_queue.operation("documents.create")
+def _create_document(cid: str, user_id: Optional[str], body: dict) -> dict:
     data = {
         "company_id": cid,
         "document_type": body.get("document_type", "receipt"),
@@ -47,7 +56,7 @@ async def create_document(
         "extracted_date": body.get("extracted_date"),
         "extracted_category": body.get("extracted_category"),
         "extracted_fields": body.get("extracted_fields"),
-        "uploaded_by": auth.get("user_id"),
+        "uploaded_by": user_id,
     }
     r = supabase.table("documents").insert(data).execute()
     if not r.data:
@@ -60,14 +69,19 @@ async def update_document(
     document_id: str,
     body: dict,
     auth: Dict[str, str] = Depends(get_current_user_company),
+    idempotency_key: Optional[str] = Header(None),
 ):
-    """Update document (e.g. link to journal_entry_id after posting)."""
-    cid = auth["company_id"]
+    """Update document (e.g. link to journal_entry_id after posting). Queued (202) during a database outage."""
     allowed = {"journal_entry_id", "ocr_status", "extracted_vendor", "extracted_amount", "extracted_date", "extracted_fields"}
     data = {k: v for k, v in body.items() if k in allowed and v is not None}
     if not data:
         raise HTTPException(status_code=400, detail="No fields to update")
-    r = supabase.table("documents").update(data).eq("id", document_id).eq("company_id", cid).execute()
+    return write_queue.submit("documents.update", auth, {"id": document_id, "data": data}, idempotency_key)
+
+
+@write_queue.operation("documents.update")
+def _update_document(cid: str, user_id: Optional[str], payload: dict) -> dict:
+    r = supabase.table("documents").update(payload["data"]).eq("id", payload["id"]).eq("company_id", cid).execute()
     if not r.data:
         raise HTTPException(status_code=404, detail="Document not found")
     return r.data[0]
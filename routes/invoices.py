@@ -7,7 +7,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, Dict, List
 from database import supabase
+from lib.bulk_writer import bulk_insert, delete_parent
 from middleware.auth import get_current_user_company
+from middleware.idempotency import idempotent
 
 router = APIRouter(prefix="/invoices", tags=["Invoices"])
 
@@ -66,7 +68,7 @@ async def get_invoice(
     return r.data
 
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(idempotent)])
 async def create_invoice(
     body: InvoiceCreate,
     auth: Dict[str, str] = Depends(get_current_user_company),
@@ -107,17 +109,23 @@ async def create_invoice(
     if not inv_r.data:
         raise HTTPException(status_code=400, detail="Failed to create invoice")
     inv = inv_r.data[0]
-    for line in body.lines:
-        amt = line.amount if line.amount is not None else (line.quantity * line.unit_price)
-        supabase.table("invoice_lines").insert({
+    lines = bulk_insert("invoice_lines", [
+        {
             "invoice_id": inv["id"],
             "line_number": line.line_number,
             "description": line.description,
             "quantity": line.quantity,
             "unit_price": line.unit_price,
-            "amount": amt,
+            "amount": line.amount if line.amount is not None else (line.quantity * line.unit_price),
             "revenue_account_id": line.revenue_account_id,
-        }).execute()
+        }
+        for line in body.lines
+    ])
+    if not lines.ok:
+        # Don't leave a header without all of its lines (lines cascade on delete)
+        delete_parent("invoices", inv["id"])
+        lines.raise_if_unavailable()
+        raise HTTPException(status_code=400, detail=f"Failed to create invoice lines: {lines.summary()}")
     r = supabase.table("invoices").select("*, invoice_lines(*), contacts(display_name, email)").eq("id", inv["id"]).eq("company_id", cid).single().execute()
     return r.data or inv
 
@@ -1,9 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-from database import supabase
+from database import (
+    supabase,
+    pg_enabled,
+    pg_transaction,
+    hot_fetchval,
+    hot_executemany,
+    run_pg,
+    pg_numeric,
+    DatabaseTimeout,
+    DatabaseUnavailable,
+)
 from datetime import datetime
+from collections import defaultdict
+from lib.bulk_writer import bulk_insert, delete_parent
+from lib import write_queue
 from middleware.auth import get_current_user_company
+from middleware.idempotency import idempotent
 
 router = APIRouter()
 
@@ -77,97 +91,67 @@ def get_journal_entry(journal_id: str, auth: Dict[str, str] = Depends(get_curren
 
     return response.data
 
-@router.post("/")
-def create_journal_entry(entry: JournalEntryCreate, auth: Dict[str, str] = Depends(get_current_user_company)):
-    """Create a new journal entry with lines"""
+@router.post("/", dependencies=[Depends(idempotent)])
+def create_journal_entry(
+    entry: JournalEntryCreate,
+    auth: Dict[str, str] = Depends(get_current_user_company),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Create a new journal entry with lines (queued with a 202 during a database outage, see lib/write_queue.py)"""
+    return write_queue.submit("journals.create", auth, entry.dict(), idempotency_key)
+
+
+def _check_entry(entry: JournalEntryCreate) -> tuple:
+    """Checks that need no database: debits equal credits and a valid date. Returns (total_debit, total_credit)."""
+    total_debit = sum(line.debit or 0 for line in entry.lines)
+    total_credit = sum(line.credit or 0 for line in entry.lines)
+
+    if abs(total_debit - total_credit) > 0.01:  # Allow for small floating point differences
+        raise HTTPException(
+            status_code=400,
+            detail=f"Debits ({total_debit}) must equal credits ({total_credit})"
+        )
     try:
-        company_id = auth["company_id"]  # Use authenticated company_id
+        datetime.strptime(entry.entry_date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid entry_date: {entry.entry_date}")
+    return total_debit, total_credit
 
-        # Validate that debits equal credits
-        total_debit = sum(line.debit or 0 for line in entry.lines)
-        total_credit = sum(line.credit or 0 for line in entry.lines)
 
-        if abs(total_debit - total_credit) > 0.01:  # Allow for small floating point differences
-            raise HTTPException(
-                status_code=400,
-                detail=f"Debits ({total_debit}) must equal credits ({total_credit})"
-            )
-
-        # Generate journal number
-        # Get the count of journal entries for this company to generate the next number
-        year = datetime.strptime(entry.entry_date, "%Y-%m-%d").year
-        count_response = supabase.table("journal_entries")\
-            .select("id", count="exact")\
+def _validate_journal_entry(company_id: str, payload: dict) -> None:
+    """Run before an entry is queued (write_queue.submit), so a bad entry gets its 400 instead of a 202."""
+    entry = JournalEntryCreate(**payload)
+    _check_entry(entry)
+    account_ids = list({line.account_id for line in entry.lines})
+    try:
+        found = supabase.table("accounts")\
+            .select("id")\
             .eq("company_id", company_id)\
+            .in_("id", account_ids)\
             .execute()
+    except (DatabaseUnavailable, DatabaseTimeout):
+        return  # can't look them up now; the replay still rejects unknown accounts
+    missing = set(account_ids) - {a["id"] for a in found.data or []}
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown account(s): {', '.join(sorted(missing))}")
 
-        next_number = (count_response.count or 0) + 1
-        journal_number = f"JE-{year}-{next_number:04d}"
 
-        # Create journal entry (reference_number, source per newschema; is_balanced from DB)
+@write_queue.operation("journals.create", validate=_validate_journal_entry)
+def _create_journal_entry(company_id: str, user_id: Optional[str], payload: dict) -> dict:
+    entry = JournalEntryCreate(**payload)
+    try:
+        total_debit, total_credit = _check_entry(entry)
+
         source = (entry.source or "manual").lower()
         if source not in ("manual", "ocr", "import", "system", "bank", "invoice", "bill", "payment", "adjustment"):
             source = "manual"
-        journal_data = {
-            "company_id": company_id,
-            "journal_number": journal_number,
-            "entry_date": entry.entry_date,
-            "memo": entry.memo,
-            "reference_number": entry.reference,
-            "source": source,
-            "status": "posted",
-            "total_debit": total_debit,
-            "total_credit": total_credit
-        }
 
-        journal_response = supabase.table("journal_entries")\
-            .insert(journal_data)\
-            .execute()
-
-        if not journal_response.data:
-            raise HTTPException(status_code=400, detail="Failed to create journal entry")
-
-        journal_entry = journal_response.data[0]
-
-        # Create journal lines
-        for idx, line in enumerate(entry.lines, start=1):
-            line_data = {
-                "journal_entry_id": journal_entry["id"],
-                "account_id": line.account_id,
-                "line_number": idx,
-                "debit": line.debit or 0.0,
-                "credit": line.credit or 0.0,
-                "description": line.description,
-                "contact_id": line.contact_id,
-                "tags": line.tags
-            }
-
-            supabase.table("journal_lines").insert(line_data).execute()
-
-            # Update account balance
-            account_response = supabase.table("accounts")\
-                .select("current_balance, account_type")\
-                .eq("id", line.account_id)\
-                .single()\
-                .execute()
-
-            if account_response.data:
-                account = account_response.data
-                current_balance = account.get("current_balance", 0) or 0
-                account_type = account.get("account_type", "")
-
-                # Calculate new balance based on account type
-                # Debit increases: Assets, Expenses
-                # Credit increases: Liabilities, Equity, Revenue
-                if account_type in ["asset", "expense"]:
-                    new_balance = current_balance + (line.debit or 0) - (line.credit or 0)
-                else:  # liability, equity, revenue
-                    new_balance = current_balance + (line.credit or 0) - (line.debit or 0)
-
-                supabase.table("accounts")\
-                    .update({"current_balance": new_balance})\
-                    .eq("id", line.account_id)\
-                    .execute()
+        if pg_enabled():
+            # Hot path: number, header, lines and balances in one Postgres transaction
+            journal_id = run_pg(_post_entry_direct, company_id, entry, source, total_debit, total_credit)
+            journal_entry = {"id": journal_id}
+        else:
+            journal_entry = _post_entry_postgrest(company_id, entry, source, total_debit, total_credit)
 
         # Fetch the complete entry with lines (same shape as GET /journals/{id})
         full = supabase.table("journal_entries")\
@@ -177,7 +161,7 @@ def create_journal_entry(entry: JournalEntryCreate, auth: Dict[str, str] = Depen
             .single()\
             .execute()
         return full.data if full.data else journal_entry
-    except HTTPException:
+    except (HTTPException, DatabaseUnavailable, DatabaseTimeout):
         raise
     except Exception as e:
         print(f"Error creating journal entry: {str(e)}")
@@ -185,6 +169,229 @@ def create_journal_entry(entry: JournalEntryCreate, auth: Dict[str, str] = Depen
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error creating journal entry: {str(e)}")
 
+
+@router.post("/bulk", dependencies=[Depends(idempotent)])
+def create_journal_entries_bulk(entries: List[JournalEntryCreate], auth: Dict[str, str] = Depends(get_current_user_company)):
+    """
+    Create many journal entries at once (imports, demo data). Headers and lines
+    go in chunked multi-row inserts and balances get one update per account.
+    Entries that fail validation or insertion are reported by index; the rest
+    are created.
+    """
+    company_id = auth["company_id"]
+    failed: List[dict] = []
+
+    # Validate up front (same rules as create_journal_entry)
+    valid = []
+    for idx, entry in enumerate(entries):
+        total_debit = sum(line.debit or 0 for line in entry.lines)
+        total_credit = sum(line.credit or 0 for line in entry.lines)
+        if abs(total_debit - total_credit) > 0.01:
+            failed.append({"index": idx, "error": f"Debits ({total_debit}) must equal credits ({total_credit})"})
+            continue
+        try:
+            year = datetime.strptime(entry.entry_date, "%Y-%m-%d").year
+        except ValueError:
+            failed.append({"index": idx, "error": f"Invalid entry_date: {entry.entry_date}"})
+            continue
+        valid.append((idx, entry, year, total_debit, total_credit))
+    if not valid:
+        return {"created": [], "failed": failed}
+
+    # Journal numbers continue from the current count, in request order
+    count_response = supabase.table("journal_entries")\
+        .select("id", count="exact")\
+        .eq("company_id", company_id)\
+        .execute()
+    start_number = (count_response.count or 0) + 1
+    headers = []
+    for n, (idx, entry, year, total_debit, total_credit) in enumerate(valid):
+        source = (entry.source or "manual").lower()
+        if source not in ("manual", "ocr", "import", "system", "bank", "invoice", "bill", "payment", "adjustment"):
+            source = "manual"
+        headers.append({
+            "company_id": company_id,
+            "journal_number": f"JE-{year}-{start_number + n:04d}",
+            "entry_date": entry.entry_date,
+            "memo": entry.memo,
+            "reference_number": entry.reference,
+            "source": source,
+            "status": "posted",
+            "total_debit": total_debit,
+            "total_credit": total_credit
+        })
+    header_result = bulk_insert("journal_entries", headers)
+    header_failed = {f.index: f.error for f in header_result.failures}
+    inserted = iter(header_result.rows)  # successful rows, in request order
+    created = []
+    for pos, (idx, entry, *_rest) in enumerate(valid):
+        if pos in header_failed:
+            failed.append({"index": idx, "error": header_failed[pos]})
+        else:
+            created.append((idx, entry, next(inserted)))
+
+    # All lines of all created entries in one bulk write
+    line_rows, line_owner = [], []
+    for pos, (idx, entry, header) in enumerate(created):
+        rows = _line_rows(header["id"], entry)
+        line_rows.extend(rows)
+        line_owner.extend([pos] * len(rows))
+    line_result = bulk_insert("journal_lines", line_rows)
+    broken = {}
+    for failure in line_result.failures:
+        broken.setdefault(line_owner[failure.index], failure.error)
+    if broken:
+        # Entries with missing lines are removed entirely (their other lines cascade)
+        supabase.table("journal_entries")\
+            .delete()\
+            .in_("id", [created[pos][2]["id"] for pos in broken])\
+            .execute()
+        for pos, error in broken.items():
+            failed.append({"index": created[pos][0], "error": f"Failed to create journal lines: {error}"})
+
+    _apply_to_balances_postgrest([row for row, pos in zip(line_rows, line_owner) if pos not in broken])
+
+    return {
+        "created": [
+            {"index": idx, "id": header["id"], "journal_number": header["journal_number"]}
+            for pos, (idx, entry, header) in enumerate(created) if pos not in broken
+        ],
+        "failed": sorted(failed, key=lambda f: f["index"]),
+    }
+
+
+async def _post_entry_direct(company_id: str, entry: JournalEntryCreate, source: str, total_debit: float, total_credit: float) -> str:
+    """Direct-Postgres version of _post_entry_postgrest: same steps, one connection, one transaction."""
+    year = datetime.strptime(entry.entry_date, "%Y-%m-%d").year
+    async with pg_transaction() as conn:
+        count = await hot_fetchval("journal_entry_count", company_id, conn=conn)
+        journal_number = f"JE-{year}-{(count or 0) + 1:04d}"
+        journal_id = await hot_fetchval(
+            "insert_journal_entry",
+            company_id, journal_number, entry.entry_date, entry.memo, entry.reference,
+            source, "posted", pg_numeric(total_debit), pg_numeric(total_credit),
+            conn=conn,
+        )
+        await hot_executemany("insert_journal_line", [
+            (journal_id, line.account_id, idx, pg_numeric(line.debit), pg_numeric(line.credit),
+             line.description, line.contact_id, line.tags)
+            for idx, line in enumerate(entry.lines, start=1)
+        ], conn=conn)
+        for line in entry.lines:
+            await hot_fetchval("apply_line_to_account", line.account_id, pg_numeric(line.debit), pg_numeric(line.credit), conn=conn)
+    return str(journal_id)
+
+
+async def _reverse_lines_direct(lines: List[dict]) -> None:
+    """Reverse account balances for deleted journal lines in one transaction."""
+    async with pg_transaction() as conn:
+        for line in lines:
+            # Swapping debit/credit reverses the line
+            await hot_fetchval("apply_line_to_account", line["account_id"], pg_numeric(line["credit"]), pg_numeric(line["debit"]), conn=conn)
+
+
+def _line_rows(journal_entry_id: str, entry: JournalEntryCreate) -> List[dict]:
+    return [
+        {
+            "journal_entry_id": journal_entry_id,
+            "account_id": line.account_id,
+            "line_number": idx,
+            "debit": line.debit or 0.0,
+            "credit": line.credit or 0.0,
+            "description": line.description,
+            "contact_id": line.contact_id,
+            "tags": line.tags
+        }
+        for idx, line in enumerate(entry.lines, start=1)
+    ]
+
+
+def _apply_to_balances_postgrest(lines: List[dict], reverse: bool = False) -> None:
+    """
+    Apply (or reverse) journal lines to account balances through PostgREST:
+    one select for all touched accounts, then one update per account.
+    """
+    account_ids = list({line["account_id"] for line in lines})
+    if not account_ids:
+        return
+    accounts_response = supabase.table("accounts")\
+        .select("id, current_balance, account_type")\
+        .in_("id", account_ids)\
+        .execute()
+    accounts = {a["id"]: a for a in accounts_response.data or []}
+
+    deltas = defaultdict(float)
+    for line in lines:
+        account = accounts.get(line["account_id"])
+        if not account:
+            continue
+        debit, credit = line.get("debit") or 0, line.get("credit") or 0
+        if reverse:
+            debit, credit = credit, debit
+        # Debit increases: Assets, Expenses
+        # Credit increases: Liabilities, Equity, Revenue
+        if account.get("account_type") in ["asset", "expense"]:
+            deltas[account["id"]] += debit - credit
+        else:
+            deltas[account["id"]] += credit - debit
+
+    for account_id, delta in deltas.items():
+        current_balance = accounts[account_id].get("current_balance", 0) or 0
+        supabase.table("accounts")\
+            .update({"current_balance": current_balance + delta})\
+            .eq("id", account_id)\
+            .execute()
+
+
+def _post_entry_postgrest(company_id: str, entry: JournalEntryCreate, source: str, total_debit: float, total_credit: float) -> dict:
+    """Insert the journal header and lines and update account balances through PostgREST."""
+    # Generate journal number
+    # Get the count of journal entries for this company to generate the next number
+    year = datetime.strptime(entry.entry_date, "%Y-%m-%d").year
+    count_response = supabase.table("journal_entries")\
+        .select("id", count="exact")\
+        .eq("company_id", company_id)\
+        .execute()
+
+    next_number = (count_response.count or 0) + 1
+    journal_number = f"JE-{year}-{next_number:04d}"
+
+    # Create journal entry (reference_number, source per newschema; is_balanced from DB)
+    journal_data = {
+        "company_id": company_id,
+        "journal_number": journal_number,
+        "entry_date": entry.entry_date,
+        "memo": entry.memo,
+        "reference_number": entry.reference,
+        "source": source,
+        "status": "posted",
+        "total_debit": total_debit,
+        "total_credit": total_credit
+    }
+
+    journal_response = supabase.table("journal_entries")\
+        .insert(journal_data)\
+        .execute()
+
+    if not journal_response.data:
+        raise HTTPException(status_code=400, detail="Failed to create journal entry")
+
+    journal_entry = journal_response.data[0]
+
+    # Create journal lines (one multi-row insert)
+    line_rows = _line_rows(journal_entry["id"], entry)
+    lines = bulk_insert("journal_lines", line_rows)
+    if not lines.ok:
+        # Don't leave a header without all of its lines (lines cascade on delete)
+        delete_parent("journal_entries", journal_entry["id"])
+        lines.raise_if_unavailable()
+        raise HTTPException(status_code=400, detail=f"Failed to create journal lines: {lines.summary()}")
+
+    # Update account balances
+    _apply_to_balances_postgrest(line_rows)
+
+    return journal_entry
+
 @router.patch("/{journal_id}")
 def update_journal_entry(
     journal_id: str,
@@ -217,28 +424,10 @@ def delete_journal_entry(journal_id: str, auth: Dict[str, str] = Depends(get_cur
     entry = get_journal_entry(journal_id, auth)
 
     # Reverse the account balances
-    for line in entry.get("journal_lines", []):
-        account_response = supabase.table("accounts")\
-            .select("current_balance, account_type")\
-            .eq("id", line["account_id"])\
-            .single()\
-            .execute()
-
-        if account_response.data:
-            account = account_response.data
-            current_balance = account.get("current_balance", 0) or 0
-            account_type = account.get("account_type", "")
-
-            # Reverse the transaction
-            if account_type in ["asset", "expense"]:
-                new_balance = current_balance - (line["debit"] or 0) + (line["credit"] or 0)
-            else:
-                new_balance = current_balance - (line["credit"] or 0) + (line["debit"] or 0)
-
-            supabase.table("accounts")\
-                .update({"current_balance": new_balance})\
-                .eq("id", line["account_id"])\
-                .execute()
+    if pg_enabled():
+        run_pg(_reverse_lines_direct, entry.get("journal_lines", []))
+    else:
+        _apply_to_balances_postgrest(entry.get("journal_lines", []), reverse=True)
 
     # Delete journal lines first
     supabase.table("journal_lines")\
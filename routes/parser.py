@@ -1,34 +1,55 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from smart_parser import smart_extract
-import os
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
 import json
+from lib import parse_batch, parse_cache, parse_jobs, uploads
+from middleware.auth import get_current_user_company
 
 router = APIRouter(prefix="/parse", tags=["Parser"])
 
+# OCR runs in parse worker processes (lib/parse_jobs.py), never in the request
+# handler, so a scanned PDF doesn't stall the event loop. The OCR stack
+# (easyocr/torch, pandas, pdfminer) only loads in those workers. Uploads are
+# streamed into a spool (memory when small, a unique temp file when large) and
+# capped at UPLOAD_MAX_MB (413).
 
-@router.post("/")
-async def parse_any_file(file: UploadFile = File(...)):
-    """Accepts image, PDF, or CSV and extracts text + structured info."""
+
+async def _submit(file: UploadFile, wait: bool = False, **kwargs):
+    """
+    Stream the upload into a spool (lib/uploads.py) and hand it to a parse job.
+    Returns the job, or with wait=True a future of the finished job (parse_jobs.run).
+    """
+    upload = await uploads.spool(file)
+    cache_key = parse_cache.cache_key(upload.sha256, upload.filename)
     try:
-        filename = file.filename
-        temp_path = f"temp_{filename}"
+        return await run_in_threadpool(
+            parse_jobs.run if wait else parse_jobs.submit, upload.detach(), upload.filename,
+            cache_key=cache_key, **kwargs
+        )
+    finally:
+        upload.discard()
 
-        # Save file temporarily
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
 
-        # Run smart extraction
-        result = smart_extract(temp_path)
-        os.remove(temp_path)
+async def _parse_now(file: UploadFile, ai: bool) -> Dict:
+    """Run a parse job (or answer from the parse cache) and wait for it without blocking the event loop."""
+    done = await _submit(file, wait=True, ai=ai)
+    job = await parse_jobs.wait(done)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    return job["result"]
 
-        return {
-            "filename": filename,
-            "parsed_fields": result["parsed_fields"],
-            "sample_text": result["raw_text"][:500]  # preview first 500 chars
-        }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.post("/")
+async def parse_any_file(file: UploadFile = File(...)):
+    """Accepts image, PDF, or CSV and extracts text + structured info."""
+    result = await _parse_now(file, ai=False)
+    return {
+        "filename": file.filename,
+        "parsed_fields": result["parsed_fields"],
+        "sample_text": result["raw_text"][:500],  # preview first 500 chars
+        "cached": result.get("cached", False),
+    }
 
 
 @router.post("/ai")
@@ -37,101 +58,115 @@ async def parse_with_ai(file: UploadFile = File(...)):
     AI-enhanced receipt parsing: OCR + OpenAI for intelligent field extraction.
     Returns cleaned, categorized, and validated expense data in one step.
     """
+    result = await _parse_now(file, ai=True)
+    raw_text = result["raw_text"]
+    ocr_fields = result["parsed_fields"]
+
+    if result.get("ai_error"):
+        # If AI fails, return OCR results with error message
+        return {
+            "filename": file.filename,
+            "parsed_fields": ocr_fields,
+            "sample_text": raw_text[:500],
+            "ai_enhanced": False,
+            "cached": result.get("cached", False),
+            "message": f"AI enhancement failed: {result['ai_error']}. Returning OCR-only results."
+        }
+
+    if result.get("ai_fields") and result["ai_fields"].get("ai_skipped"):
+        # OCR fields were confident enough (PARSE_AI_MIN_CONFIDENCE): the same shape as an
+        # AI result (amount, category, memo), with only the category and memo from OpenAI
+        return {
+            "filename": file.filename,
+            "parsed_fields": result["ai_fields"],
+            "ocr_fields": ocr_fields,
+            "sample_text": raw_text[:500],
+            "ai_enhanced": False,
+            "cached": result.get("cached", False),
+            "message": parse_batch.skipped_message(result["ai_fields"])
+        }
+
+    if result.get("ai_fields") is None:
+        # Fallback: Return OCR-only results
+        return {
+            "filename": file.filename,
+            "parsed_fields": ocr_fields,
+            "sample_text": raw_text[:500],
+            "ai_enhanced": False,
+            "cached": result.get("cached", False),
+            "message": "OpenAI not configured. Returning OCR-only results."
+        }
+
+    return {
+        "filename": file.filename,
+        "parsed_fields": result["ai_fields"],
+        "ocr_fields": ocr_fields,
+        "sample_text": raw_text[:500],
+        "ai_enhanced": True,
+        "cached": result.get("cached", False),
+        "message": "Receipt successfully parsed and enhanced with AI"
+    }
+
+
+@router.post("/batch")
+async def parse_files_batch(
+    files: List[UploadFile] = File(...),
+    ai: bool = Form(False),
+    auth: Dict[str, str] = Depends(get_current_user_company),
+):
+    """
+    Parse many receipts (or zip archives of them) in one request. Results stream
+    back as NDJSON, one line per file in completion order ({"index", "filename",
+    "status", ...} like /parse/ or /parse/ai), then a {"done": true, ...} summary.
+    """
+    if len(files) > parse_batch.PARSE_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {parse_batch.PARSE_BATCH_MAX_FILES} files per batch")
+    spooled = []
     try:
-        filename = file.filename
-        temp_path = f"temp_{filename}"
-
-        # Save file temporarily
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
-
-        # Step 1: Run OCR extraction
-        ocr_result = smart_extract(temp_path)
-        os.remove(temp_path)
-
-        raw_text = ocr_result["raw_text"]
-        ocr_fields = ocr_result["parsed_fields"]
-
-        # Step 2: Check if OpenAI is configured
-        openai_key = os.getenv("OPENAI_API_KEY", "")
-
-        if not openai_key:
-            # Fallback: Return OCR-only results
-            return {
-                "filename": filename,
-                "parsed_fields": ocr_fields,
-                "sample_text": raw_text[:500],
-                "ai_enhanced": False,
-                "message": "OpenAI not configured. Returning OCR-only results."
-            }
-
-        # Step 3: Use OpenAI to enhance and validate OCR output
-        try:
-            from openai import OpenAI
-            client = OpenAI(api_key=openai_key)
-
-            prompt = f"""You are an expert at analyzing receipt text and extracting structured expense data.
-
-Raw OCR Text:
-{raw_text[:1000]}
-
-OCR Extracted Fields (may be incomplete or messy):
-- Vendor: {ocr_fields.get('vendor', 'Not found')}
-- Date: {ocr_fields.get('date', 'Not found')}
-- Amount: {ocr_fields.get('total', 'Not found')}
-- Description: {ocr_fields.get('description', 'Not found')}
-
-Your task: Analyze the receipt and return clean, structured expense data.
-
-Return a JSON object with:
-{{
-  "vendor": "Clean vendor name (standardized, no store numbers)",
-  "date": "Date in YYYY-MM-DD format",
-  "amount": "Amount as number (no $ or currency symbols)",
-  "description": "Short, professional description of the purchase",
-  "category": "Expense category (e.g., Office Supplies, Travel, Meals & Entertainment, Software & Services, Utilities, etc.)",
-  "memo": "Professional memo for accounting records",
-  "confidence": "high|medium|low based on OCR text quality"
-}}
-
-Rules:
-- Normalize vendor names (e.g., "WALMART STORE #1234" → "Walmart")
-- Use YYYY-MM-DD date format
-- Extract only the numeric amount (e.g., "123.45")
-- Infer category from vendor name and items purchased
-- Be conservative: if unsure about any field, use confidence: "low"
-"""
-
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a receipt analysis expert. Extract and clean expense data from OCR text. Always respond with valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
-
-            ai_fields = json.loads(response.choices[0].message.content)
-
-            return {
-                "filename": filename,
-                "parsed_fields": ai_fields,
-                "ocr_fields": ocr_fields,
-                "sample_text": raw_text[:500],
-                "ai_enhanced": True,
-                "message": "Receipt successfully parsed and enhanced with AI"
-            }
-
-        except Exception as ai_error:
-            # If AI fails, return OCR results with error message
-            return {
-                "filename": filename,
-                "parsed_fields": ocr_fields,
-                "sample_text": raw_text[:500],
-                "ai_enhanced": False,
-                "message": f"AI enhancement failed: {str(ai_error)}. Returning OCR-only results."
-            }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        for file in files:
+            is_zip = (file.filename or "").lower().endswith(".zip")
+            max_bytes = parse_batch.PARSE_BATCH_MAX_BYTES if is_zip else uploads.UPLOAD_MAX_BYTES
+            spooled.append(await uploads.spool(file, max_bytes=max_bytes))
+    except BaseException:
+        for upload in spooled:
+            upload.discard()
+        raise
+    items = await run_in_threadpool(parse_batch.expand, spooled)
+
+    async def ndjson():
+        async for line in parse_batch.run(items, ai=ai):
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.post("/jobs", status_code=202)
+async def create_parse_job(
+    file: UploadFile = File(...),
+    ai: bool = Form(False),
+    document_id: Optional[str] = Form(None),
+    auth: Dict[str, str] = Depends(get_current_user_company),
+):
+    """
+    Queue a parse and return its job id right away (202). Poll GET /parse/jobs/{id}.
+    With document_id, the document's ocr_status and extracted fields are updated when the job finishes.
+    """
+    job = await _submit(file, company_id=auth["company_id"], ai=ai, document_id=document_id)
+    # A parse cache hit is already completed
+    status_code = 200 if job["status"] == "completed" else 202
+    return JSONResponse(status_code=status_code, content=job, headers={"Location": f"/parse/jobs/{job['id']}"})
+
+
+@router.get("/jobs/{job_id}")
+async def get_parse_job(job_id: str, auth: Dict[str, str] = Depends(get_current_user_company)):
+    """Job status: queued (with queue_position), running, completed (with result) or failed (with error)."""
+    job = parse_jobs.lookup(job_id)
+    if not job or job.pop("company_id") != auth["company_id"]:
+        raise HTTPException(status_code=404, detail="Parse job not found")
+    return job
+
+
+@router.get("/metrics")
+def parse_metrics(auth: Dict[str, str] = Depends(get_current_user_company)):
+    """Parse workers: queue depth, parse/queue-wait latency, each worker's OCR timings, and parse cache hits."""
+    return parse_jobs.stats()
@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from typing import Optional, Dict, List
 from database import supabase
 from middleware.auth import get_current_user_company
+from middleware.idempotency import idempotent
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
@@ -33,7 +34,7 @@ async def list_payments(auth: Dict[str, str] = Depends(get_current_user_company)
     return r.data or []
 
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(idempotent)])
 async def create_payment(
     body: PaymentCreate,
     auth: Dict[str, str] = Depends(get_current_user_company),
@@ -1,15 +1,30 @@
 """
 Reports: P&L, Balance Sheet, Cash Flow (Step 10).
 Uses views: trial_balance_view, account_balances_view; and journal_entries.
+P&L and Balance Sheet sum per account type in Postgres when the direct pool is up.
 """
 
 from fastapi import APIRouter, HTTPException, Depends
 from typing import Optional, Dict
-from database import supabase
+from database import supabase, pg_enabled, hot_fetch
 from collections import defaultdict
 from middleware.auth import get_current_user_company
+from middleware.read_routing import replica_reads
 
-router = APIRouter(prefix="/reports", tags=["Reports"])
+router = APIRouter(prefix="/reports", tags=["Reports"], dependencies=[Depends(replica_reads)])
+
+
+async def _totals_by_type(cid: str) -> Dict[str, float]:
+    """Sum of current_balance per account_type for the company."""
+    totals = defaultdict(float)
+    if pg_enabled():
+        for row in await hot_fetch("account_totals_by_type", cid):
+            totals[row["account_type"]] += row["total"]
+        return totals
+    r = supabase.table("accounts").select("account_type, current_balance").eq("company_id", cid).execute()
+    for a in (r.data or []):
+        totals[a.get("account_type", "other")] += a.get("current_balance") or 0
+    return totals
 
 
 @router.get("/profit-loss")
@@ -20,10 +35,9 @@ async def profit_loss(
 ):
     """Profit & Loss: revenue - expenses. Uses accounts by type (revenue, expense)."""
     cid = auth["company_id"]
-    r = supabase.table("accounts").select("id, account_code, account_name, account_type, current_balance").eq("company_id", cid).execute()
-    accounts = r.data or []
-    revenue = sum(a.get("current_balance") or 0 for a in accounts if a.get("account_type") == "revenue")
-    expense = sum(a.get("current_balance") or 0 for a in accounts if a.get("account_type") == "expense")
+    totals = await _totals_by_type(cid)
+    revenue = totals.get("revenue", 0)
+    expense = totals.get("expense", 0)
     return {
         "company_id": cid,
         "revenue_total": revenue,
@@ -41,14 +55,10 @@ async def balance_sheet(
 ):
     """Balance Sheet: assets = liabilities + equity. Uses account balances by type."""
     cid = auth["company_id"]
-    r = supabase.table("accounts").select("id, account_code, account_name, account_type, current_balance").eq("company_id", cid).execute()
-    accounts = r.data or []
-    by_type = defaultdict(list)
-    for a in accounts:
-        by_type[a.get("account_type", "other")].append(a)
-    assets = sum(a.get("current_balance") or 0 for a in by_type.get("asset", []))
-    liabilities = sum(a.get("current_balance") or 0 for a in by_type.get("liability", []))
-    equity = sum(a.get("current_balance") or 0 for a in by_type.get("equity", []))
+    totals = await _totals_by_type(cid)
+    assets = totals.get("asset", 0)
+    liabilities = totals.get("liability", 0)
+    equity = totals.get("equity", 0)
     return {
         "company_id": cid,
         "assets": assets,
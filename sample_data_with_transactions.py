@@ -14,10 +14,10 @@ def get_or_create_company():
     # Check if company exists
     companies = requests.get(f"{API_BASE}/companies/").json()
 
-    if companies.get("data") and len(companies["data", "")) > 0:
-        company = companies["data", "")[0]
+    if companies.get("data") and len(companies["data"]) > 0:
+        company = companies["data"][0]
         print(f"Using existing company: {company['name']} ({company['id']})")
-        return company["id", "")
+        return company["id"]
 
     # Create new company
     company_data = {
@@ -33,9 +33,9 @@ def get_or_create_company():
     }
 
     response = requests.post(f"{API_BASE}/companies/", json=company_data)
-    company = response.json()["data", "")[0]
+    company = response.json()["data"][0]
     print(f"Created company: {company['name']} ({company['id']})")
-    return company["id", "")
+    return company["id"]
 
 
 # Complete Chart of Accounts for a tech startup
@@ -85,18 +85,21 @@ def create_chart_of_accounts(company_id):
     ]
 
     created_accounts = {}
-    for account in accounts:
-        account["company_id", "") = company_id
-        try:
-            response = requests.post(f"{API_BASE}/accounts/", json=account)
-            if response.status_code == 200:
-                created = response.json()
-                created_accounts[account["account_code", "")] = created["id", "")
-                print(f"  ✓ {account['account_code']} - {account['account_name']}")
-            else:
-                print(f"  ✗ Failed to create {account['account_code']}: {response.status_code} - {response.text[:100]}")
-        except Exception as e:
-            print(f"  ✗ Failed to create {account['account_code']}: {e}")
+    # One request for the whole chart; upsert so re-running doesn't fail on existing codes
+    try:
+        response = requests.post(f"{API_BASE}/accounts/bulk", params={"upsert": "true"}, json=accounts)
+        if response.status_code == 200:
+            result = response.json()
+            for created in result["created"]:
+                created_accounts[created["account_code"]] = created["id"]
+                print(f"  ✓ {created['account_code']} - {created['account_name']}")
+            for failure in result["failed"]:
+                account = accounts[failure["index"]]
+                print(f"  ✗ Failed to create {account['account_code']}: {failure['error'][:100]}")
+        else:
+            print(f"  ✗ Failed to create accounts: {response.status_code} - {response.text[:100]}")
+    except Exception as e:
+        print(f"  ✗ Failed to create accounts: {e}")
 
     print(f"\n  📝 Successfully created {len(created_accounts)} accounts")
     return created_accounts
@@ -107,7 +110,7 @@ def create_demo_journal_entries(company_id, accounts):
     print("\n📝 Creating Demo Journal Entries...")
 
     # Check if we have all required accounts
-    required = ["1010", "3000", "1510", "1200", "2100", "4100", "6100", "6200", "6300", "6500", "")
+    required = ["1010", "3000", "1510", "1200", "2100", "4100", "6100", "6200", "6300", "6500"]
     missing = [code for code in required if code not in accounts]
     if missing:
         print(f"  ⚠️  Missing required accounts: {', '.join(missing)}")
@@ -320,23 +323,33 @@ def create_demo_journal_entries(company_id, accounts):
         },
     ]
 
+    to_post = []  # (entry number, entry)
     for idx, entry in enumerate(journal_entries, 1):
-        entry["company_id", "") = company_id
-
         # Skip entries that reference missing accounts
-        required_accounts = [line["account_id", "") for line in entry["lines", "")]
+        required_accounts = [line["account_id"] for line in entry["lines"]]
         if any(acc_id is None or acc_id == "" for acc_id in required_accounts):
             print(f"  ⏭️  Entry {idx} skipped (missing account IDs)")
             continue
+        to_post.append((idx, entry))
+
+    if not to_post:
+        return
 
-        try:
-            response = requests.post(f"{API_BASE}/journals/", json=entry)
-            if response.status_code == 200:
-                print(f"  ✓ Entry {idx}: {entry['memo']}")
-            else:
-                print(f"  ✗ Entry {idx} failed: {response.status_code} - {entry['memo']}")
-        except Exception as e:
-            print(f"  ✗ Entry {idx} failed: {e}")
+    # All entries in one request (headers, lines and balances are written in bulk)
+    try:
+        response = requests.post(f"{API_BASE}/journals/bulk", json=[entry for _, entry in to_post])
+        if response.status_code != 200:
+            print(f"  ✗ Journal entries failed: {response.status_code} - {response.text[:100]}")
+            return
+        result = response.json()
+        for created in result["created"]:
+            idx, entry = to_post[created["index"]]
+            print(f"  ✓ Entry {idx}: {entry['memo']}")
+        for failure in result["failed"]:
+            idx, entry = to_post[failure["index"]]
+            print(f"  ✗ Entry {idx} failed: {entry['memo']} - {failure['error'][:100]}")
+    except Exception as e:
+        print(f"  ✗ Journal entries failed: {e}")
 
 
 def main():
@@ -178,16 +178,17 @@ if "7100" in accounts and "1010" in accounts:
 
 print(f"📝 Creating {len(entries)} journal entries...\n")
 
-for idx, entry in enumerate(entries, 1):
-    entry["company_id"] = company_id
-    try:
-        api_post("/journals/", entry)
-        print(f"  ✓ Entry {idx}: {entry['memo']}")
-    except error.HTTPError as exc:
-        body = exc.read().decode()
-        print(f"  ✗ Entry {idx} failed ({exc.code}): {body}")
-    except Exception as exc:
-        print(f"  ✗ Entry {idx} failed: {exc}")
+try:
+    result = api_post("/journals/bulk", entries)
+    for created in result["created"]:
+        print(f"  ✓ Entry {created['index'] + 1}: {entries[created['index']]['memo']}")
+    for failure in result["failed"]:
+        print(f"  ✗ Entry {failure['index'] + 1} failed: {failure['error']}")
+except error.HTTPError as exc:
+    body = exc.read().decode()
+    print(f"  ✗ Journal entries failed ({exc.code}): {body}")
+except Exception as exc:
+    print(f"  ✗ Journal entries failed: {exc}")
 
 print("\n✅ Done! Check http://localhost:3000/new-dashboard")
 print("💬 Try the AI at http://localhost:3000/ai")
@@ -1,106 +1,424 @@
+import io
+import json
 import os
 import re
-import pandas as pd
-from pdfminer.high_level import extract_text
-from pdf2image import convert_from_path
-import easyocr
-from PIL import Image
+import textwrap
+import time
+from contextlib import contextmanager
+
+from lib import image_prep, pdf_text, receipt_fields
+
+# pandas, pdfminer, pdf2image and easyocr (which pulls in torch) are imported
+# inside the extractors that need them, so importing this module is cheap and
+# the app can start without the OCR stack loaded (see requirements-ocr.txt).
+# EasyOCR readers come from lib/ocr_pool.py, which loads the models once per process.
+#
+# Extractors take a `source`: a file path, or the file's bytes (small uploads
+# stay in memory, see lib/uploads.py).
+
+# Part of the parse cache key (lib/parse_cache.py): bump when extraction output changes
+PARSER_VERSION = "5"
+
+# Scanned PDFs: pages are rendered at a dpi that puts the page's long side at
+# about PDF_OCR_TARGET_PX pixels (clamped to PDF_OCR_MIN_DPI..PDF_OCR_MAX_DPI)
+PDF_OCR_TARGET_PX = int(os.getenv("PDF_OCR_TARGET_PX", "2400"))
+PDF_OCR_MIN_DPI = int(os.getenv("PDF_OCR_MIN_DPI", "150"))
+PDF_OCR_MAX_DPI = int(os.getenv("PDF_OCR_MAX_DPI", "300"))
+# Stop rendering/OCRing pages once a page with the totals line has been read
+PDF_OCR_STOP_AT_TOTAL = os.getenv("PDF_OCR_STOP_AT_TOTAL", "1").lower() in ("1", "true", "yes")
+
+# Text PDFs: stop reading pages once vendor, date and total are all found with
+# at least this confidence (a labelled total; see lib/receipt_fields.py)
+PDF_TEXT_STOP_CONFIDENCE = float(os.getenv("PDF_TEXT_STOP_CONFIDENCE", "0.5"))
+
+# /parse/ai skips the OpenAI extraction when vendor, date and total were all
+# read with at least this confidence (lib/receipt_fields.py) and only asks it
+# for the category and memo; 1.1 = always run the full extraction
+PARSE_AI_MIN_CONFIDENCE = float(os.getenv("PARSE_AI_MIN_CONFIDENCE", "0.8"))
+
+# Timing hook for benchmarks/bench_parser.py: when set, it is called as
+# stage_hook(stage, seconds) for each "render", "preprocess", "ocr",
+# "text_layer", "csv" and "fields" step (OCR pages run on several threads)
+stage_hook = None
+
+TOTAL_RE = re.compile(r"(?i)(?:total|amount\s+due|balance)[:\s\$€£₹]*([\d,]+\.\d{2})")
 
 
 def extract_fields(text: str):
-    """Extract vendor, date, total, and description from text using regex."""
-    fields = {
-        "vendor": None,
-        "date": None,
-        "total": None,
-        "description": None
-    }
+    """
+    Extract vendor, date, total, and description from plain text, plus
+    field_confidence per field (see lib/receipt_fields.py).
+    """
+    return receipt_fields.extract(receipt_fields.lines_from_text(text))
 
-    # Vendor extraction
-    vendor_match = re.search(r"(?i)(?:from|vendor|supplier)[:\s]+([A-Za-z0-9& ,.'-]+)", text)
 
-    # Date extraction
-    date_match = re.search(r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", text)
+@contextmanager
+def _stage(name: str):
+    if stage_hook is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_hook(name, time.perf_counter() - started)
 
-    # Total extraction (supports $, €, £, ₹)
-    total_match = re.search(r"(?i)(?:total|amount\s+due|balance)[:\s\$€£₹]*([\d,]+\.\d{2})", text)
 
-    # Description extraction (explicit)
-    description_match = re.search(r"(?i)(?:description|item|details)[:\s\-]+(.{5,80})", text)
+def _is_bytes(source) -> bool:
+    return isinstance(source, (bytes, bytearray, memoryview))
 
-    # Fallback description: line before "Total" or "Amount"
-    if not description_match:
-        lines = text.splitlines()
-        for i, line in enumerate(lines):
-            if re.search(r"(?i)(total|amount|balance)", line):
-                if i > 0 and not re.search(r"\d", lines[i - 1]):
-                    fields["description"] = lines[i - 1].strip()
-                break
 
-    # Assign found values
-    if vendor_match:
-        fields["vendor"] = vendor_match.group(1).strip()
-    if date_match:
-        fields["date"] = date_match.group(1)
-    if total_match:
-        fields["total"] = total_match.group(1)
-    if description_match:
-        fields["description"] = description_match.group(1).strip()
+def _ocr_input(source, exif: bool = True):
+    """
+    What readtext gets: the image rotated, cropped, deskewed and scaled by
+    lib/image_prep.py, or the original when OCR_PREPROCESS is off or that fails.
+    """
+    if image_prep.OCR_PREPROCESS:
+        try:
+            with _stage("preprocess"):
+                return image_prep.prepare(source, exif=exif)
+        except Exception as exc:
+            print(f"⚠️ Image preprocessing failed, using the original: {exc}")
+    if _is_bytes(source):
+        return bytes(source)
+    if isinstance(source, str):
+        return source
+    import numpy as np
+    return np.asarray(source)
 
-    return fields
 
+def _image_lines(source):
+    """EasyOCR boxes of an image, grouped into printed rows."""
+    from lib import ocr_pool
+    image = _ocr_input(source)
+    with _stage("ocr"):
+        boxes = ocr_pool.readtext(image, detail=1)
+    return receipt_fields.lines_from_boxes(boxes)
 
-def extract_from_image(filepath: str):
+
+def extract_from_image(source):
     """Extract text from image using EasyOCR."""
-    reader = easyocr.Reader(['en'])
-    result = reader.readtext(filepath, detail=0)
-    return "\n".join(result)
+    return receipt_fields.text_of(_image_lines(source))
 
 
-def extract_from_pdf(filepath: str):
-    """Extract text from PDF (text-based or scanned)."""
+def _pdf_lines(source):
+    """
+    (text, lines) of a PDF: its text layer, or OCR for scanned PDFs.
+    The text layer is read a page at a time from both ends (lib/pdf_text.py)
+    until vendor, date and total are found or PDF_TEXT_MAX_PAGES pages are read.
+    """
+    def found(text):
+        fields = receipt_fields.extract(receipt_fields.lines_from_text(text))
+        return receipt_fields.confident(fields, PDF_TEXT_STOP_CONFIDENCE)
+
     # Try text-based first
-    text = extract_text(filepath)
+    with _stage("text_layer"):
+        text = pdf_text.join(pdf_text.read(source, done=found))
     if len(text.strip()) > 50:
-        return text
+        return text, receipt_fields.lines_from_text(text)
 
     # Fallback to OCR for scanned PDFs
-    pages = convert_from_path(filepath, dpi=300)
-    reader = easyocr.Reader(['en'])
-    full_text = ""
-    for i, page in enumerate(pages):
-        img_path = f"temp_page_{i}.png"
-        page.save(img_path, "PNG")
-        result = reader.readtext(img_path, detail=0)
-        full_text += "\n".join(result)
-        os.remove(img_path)
-    return full_text
-
-
-def extract_from_csv(filepath: str):
+    lines = _ocr_scanned_pdf_lines(source)
+    return receipt_fields.text_of(lines), lines
+
+
+def extract_from_pdf(source):
+    """Extract text from PDF (text-based or scanned)."""
+    return _pdf_lines(source)[0]
+
+
+def _pdf_dpi(source):
+    """Page count and render dpi (from the page size in the PDF's info)."""
+    from pdf2image import pdfinfo_from_bytes, pdfinfo_from_path
+    info = pdfinfo_from_bytes(bytes(source)) if _is_bytes(source) else pdfinfo_from_path(source)
+    size = re.match(r"\s*([\d.]+)\s*x\s*([\d.]+)", str(info.get("Page size", "")))
+    dpi = PDF_OCR_MAX_DPI
+    if size:
+        long_side_in = max(float(size.group(1)), float(size.group(2))) / 72
+        if long_side_in > 0:
+            dpi = int(max(PDF_OCR_MIN_DPI, min(PDF_OCR_MAX_DPI, PDF_OCR_TARGET_PX / long_side_in)))
+    return int(info.get("Pages", 0)), dpi
+
+
+def ocr_scanned_pdf(source):
+    """OCR text of a scanned PDF (see _ocr_scanned_pdf_lines)."""
+    return receipt_fields.text_of(_ocr_scanned_pdf_lines(source))
+
+
+def _ocr_scanned_pdf_lines(source):
+    """
+    OCR a scanned PDF page by page: each page is rendered on its own (grayscale,
+    no temp files), deskewed and scaled (lib/image_prep.py) and handed to OCR
+    as an array while the next one renders.
+    Pages are OCRed in parallel on the reader pool's readers; at most one page
+    per reader is held in memory. With PDF_OCR_STOP_AT_TOTAL, pages after the
+    first one with a totals line are skipped.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    from pdf2image import convert_from_bytes, convert_from_path
+    from lib import ocr_pool
+
+    with _stage("render"):
+        page_count, dpi = _pdf_dpi(source)
+    workers = ocr_pool.pool.size
+    pages = {}
+    last_page = page_count  # lowered to the totals page once found
+
+    def ocr_page(number, image):
+        array = _ocr_input(image, exif=False)
+        with _stage("ocr"):
+            boxes = ocr_pool.readtext(array, detail=1)
+        image.close()
+        return number, receipt_fields.lines_from_boxes(boxes)
+
+    def collect(done):
+        nonlocal last_page
+        for future in done:
+            number, lines = future.result()
+            pages[number] = lines
+            if PDF_OCR_STOP_AT_TOTAL and TOTAL_RE.search(receipt_fields.text_of(lines)):
+                last_page = min(last_page, number)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for number in range(1, page_count + 1):
+            if number > last_page:
+                break
+            if len(in_flight) >= workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+                if number > last_page:
+                    break
+            render = convert_from_bytes if _is_bytes(source) else convert_from_path
+            with _stage("render"):
+                image = render(source, dpi=dpi, first_page=number, last_page=number, grayscale=True)[0]
+            in_flight.add(executor.submit(ocr_page, number, image))
+        collect(wait(in_flight).done)
+
+    return receipt_fields.stack_pages([pages[n] for n in sorted(pages) if n <= last_page])
+
+
+def extract_from_csv(source):
     """Convert CSV content to readable text."""
-    df = pd.read_csv(filepath)
-    return df.to_string(index=False)
+    import pandas as pd
+    with _stage("csv"):
+        if _is_bytes(source):
+            df = pd.read_csv(io.BytesIO(source))
+        else:
+            df = pd.read_csv(source, memory_map=True)
+        return df.to_string(index=False)
+
+
+_AI_FIELDS = '''  "vendor": "Clean vendor name (standardized, no store numbers)",
+  "date": "Date in YYYY-MM-DD format",
+  "amount": "Amount as number (no $ or currency symbols)",
+  "description": "Short, professional description of the purchase",
+  "category": "Expense category (e.g., Office Supplies, Travel, Meals & Entertainment, Software & Services, Utilities, etc.)",
+  "memo": "Professional memo for accounting records",
+  "confidence": "high|medium|low based on OCR text quality"'''
+
+_AI_RULES = '''Rules:
+- Normalize vendor names (e.g., "WALMART STORE #1234" → "Walmart")
+- Use YYYY-MM-DD date format
+- Extract only the numeric amount (e.g., "123.45")
+- Infer category from vendor name and items purchased
+- Be conservative: if unsure about any field, use confidence: "low"'''
+
+_AI_SYSTEM = "You are a receipt analysis expert. Extract and clean expense data from OCR text. Always respond with valid JSON."
+
+
+def _ai_receipt(raw_text: str, fields: dict) -> str:
+    return f"""Raw OCR Text:
+{raw_text[:1000]}
+
+OCR Extracted Fields (may be incomplete or messy):
+- Vendor: {fields.get('vendor', 'Not found')}
+- Date: {fields.get('date', 'Not found')}
+- Amount: {fields.get('total', 'Not found')}
+- Description: {fields.get('description', 'Not found')}"""
+
+
+def _ai_complete(prompt: str, operation: str = "parse_receipt") -> dict:
+    # Runs in parse workers and threads, off the event loop: the shared per-process sync client
+    from lib import openai_client
+    response = openai_client.chat_sync(
+        [
+            {"role": "system", "content": _AI_SYSTEM},
+            {"role": "user", "content": prompt}
+        ],
+        operation,
+        model="gpt-4o-mini",
+        temperature=0.3,
+        response_format={"type": "json_object"}
+    )
+    return json.loads(response.choices[0].message.content)
+
+
+def _without_ai(fields: dict):
+    """
+    enhance_with_ai's result built from the OCR fields, when those are confident
+    enough to skip the OpenAI extraction (category and memo are filled in by _categorize).
+    """
+    if not receipt_fields.confident(fields, PARSE_AI_MIN_CONFIDENCE):
+        return None
+    return {
+        "vendor": fields["vendor"],
+        "date": fields["date"],
+        "amount": fields["total"],
+        "description": fields.get("description"),
+        "category": None,
+        "memo": None,
+        "confidence": "high",
+        "ai_skipped": True,
+    }
+
+
+def _categorize(items):
+    """
+    Category and memo for receipts whose vendor, date and amount came from OCR:
+    items is [(raw_text, _without_ai result)]; fills them in place with one short
+    OpenAI call. A failure leaves category and memo empty, the OCR fields stand.
+    """
+    receipts = "\n\n".join(
+        f"### Receipt {n}\nVendor: {fields['vendor']}\nAmount: {fields['amount']}\n"
+        f"Description: {fields.get('description') or 'Not found'}\nText:\n{raw_text[:300]}"
+        for n, (raw_text, fields) in enumerate(items)
+    )
+    prompt = f"""Below are {len(items)} receipts, numbered from 0. Vendor, date and amount are already known.
+
+{receipts}
+
+Return a JSON object with:
+{{
+  "results": [
+    {{
+      "index": "The receipt number",
+      "category": "Expense category (e.g., Office Supplies, Travel, Meals & Entertainment, Software & Services, Utilities, etc.)",
+      "memo": "Professional memo for accounting records"
+    }}
+  ]
+}}
+
+Infer the category from the vendor name and items purchased."""
+    try:
+        entries = _ai_complete(prompt, "categorize_receipt").get("results") or []
+    except Exception as exc:
+        print(f"⚠️ Receipt categorization failed: {exc}")
+        return
+    for entry in entries:
+        try:
+            index = int(entry.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < len(items):
+            items[index][1].update(category=entry.get("category"), memo=entry.get("memo"))
+
+
+def enhance_with_ai(raw_text: str, fields: dict):
+    """
+    Clean up OCR output with OpenAI (vendor, date, amount, category, memo, confidence).
+    When the OCR fields are already confident (PARSE_AI_MIN_CONFIDENCE) they are
+    kept (ai_skipped: true) and OpenAI is only asked for the category and memo.
+    Returns None when OPENAI_API_KEY isn't set and the fields aren't confident.
+    """
+    local = _without_ai(fields)
+    if local is not None:
+        if os.getenv("OPENAI_API_KEY", ""):
+            _categorize([(raw_text, local)])
+        return local
+    if not os.getenv("OPENAI_API_KEY", ""):
+        return None
+
+    prompt = f"""You are an expert at analyzing receipt text and extracting structured expense data.
+
+{_ai_receipt(raw_text, fields)}
+
+Your task: Analyze the receipt and return clean, structured expense data.
+
+Return a JSON object with:
+{{
+{_AI_FIELDS}
+}}
+
+{_AI_RULES}
+"""
+    return _ai_complete(prompt)
+
+
+def enhance_batch_with_ai(items):
+    """
+    enhance_with_ai for several receipts in one OpenAI call.
+    items: [(raw_text, fields)]; returns one dict (or None if the model skipped it) per item,
+    or None when OPENAI_API_KEY isn't set. Receipts with confident OCR fields are only
+    categorized (one more, short call for all of them).
+    """
+    results = [_without_ai(fields) for _, fields in items]
+    pending = [i for i, result in enumerate(results) if result is None]
+    if not os.getenv("OPENAI_API_KEY", ""):
+        return None if len(pending) == len(items) else results
+    confident = [(items[i][0], result) for i, result in enumerate(results) if result is not None]
+    if confident:
+        _categorize(confident)
+    if not pending:
+        return results
+
+    receipts = "\n\n".join(
+        f"### Receipt {n}\n{_ai_receipt(*items[i])}" for n, i in enumerate(pending)
+    )
+    prompt = f"""You are an expert at analyzing receipt text and extracting structured expense data.
+Below are {len(pending)} separate receipts, numbered from 0.
+
+{receipts}
+
+Your task: Analyze each receipt on its own and return clean, structured expense data for every one.
+
+Return a JSON object with:
+{{
+  "results": [
+    {{
+      "index": "The receipt number",
+{textwrap.indent(_AI_FIELDS, "    ")}
+    }}
+  ]
+}}
+
+{_AI_RULES}
+"""
+    for entry in _ai_complete(prompt, "parse_receipt_batch").get("results") or []:
+        try:
+            index = int(entry.pop("index"))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(pending):
+            results[pending[index]] = entry
+    return results
 
 
-def smart_extract(filepath: str):
-    """Automatically detect file type and extract text + structured fields."""
-    ext = os.path.splitext(filepath)[1].lower()
+def smart_extract(source, filename: str = None):
+    """
+    Automatically detect file type and extract text + structured fields.
+    `source` is a path or the file's bytes; the type comes from `filename` (default: the path).
+    Images and scanned PDFs keep their OCR layout, which the field extraction uses.
+    """
+    ext = os.path.splitext(filename or (source if isinstance(source, str) else ""))[1].lower()
 
     if ext in [".jpg", ".jpeg", ".png"]:
         print("📸 Image detected — using EasyOCR...")
-        text = extract_from_image(filepath)
+        lines = _image_lines(source)
+        text = receipt_fields.text_of(lines)
 
     elif ext == ".pdf":
         print("📄 PDF detected — auto-selecting method...")
-        text = extract_from_pdf(filepath)
+        text, lines = _pdf_lines(source)
 
     elif ext == ".csv":
         print("🧾 CSV detected — parsing content...")
-        text = extract_from_csv(filepath)
+        text = extract_from_csv(source)
+        lines = receipt_fields.lines_from_text(text)
 
     else:
         raise ValueError("Unsupported file type")
 
-    fields = extract_fields(text)
+    with _stage("fields"):
+        fields = receipt_fields.extract(lines)
     return {"raw_text": text, "parsed_fields": fields}
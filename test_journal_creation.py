@@ -1,16 +1,23 @@
-"""Test journal entry creation"""
-import requests
+"""Test journal entry creation (pass --offline to run against the in-memory backend)"""
+import sys
 import json
 
-API_BASE = "http://localhost:8000"
+if "--offline" in sys.argv:
+    # Real app + in-memory database with a seeded demo company (benchmarks/offline.py)
+    from benchmarks.offline import offline_client
+    http, _ = offline_client()
+    API_BASE = ""
+else:
+    import requests as http
+    API_BASE = "http://localhost:8000"
 
 # Use first company
-companies = requests.get(f"{API_BASE}/companies/").json()
+companies = http.get(f"{API_BASE}/companies/").json()
 company_id = companies["data"][0]["id"]
 print(f"Using company: {companies['data'][0]['name']} ({company_id})")
 
 # Get accounts
-accounts_resp = requests.get(f"{API_BASE}/accounts/company/{company_id}").json()
+accounts_resp = http.get(f"{API_BASE}/accounts/company/{company_id}").json()
 print(f"\nFound {len(accounts_resp)} accounts")
 
 # Get first two accounts
@@ -43,7 +50,7 @@ if len(accounts_resp) >= 2:
     }
 
     try:
-        response = requests.post(f"{API_BASE}/journals/", json=journal_data)
+        response = http.post(f"{API_BASE}/journals/", json=journal_data)
         print(f"Status: {response.status_code}")
 
         if response.status_code == 200:
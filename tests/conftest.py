@@ -0,0 +1,40 @@
+"""
+Shared fixtures: the real app on the in-memory backend (see benchmarks/offline.py).
+
+The backend and the JWT secret are read from the environment when `database`
+and `middleware.auth` are imported, so they are set here before any test
+module imports them.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.offline import OFFLINE_JWT_SECRET, offline_client  # noqa: E402
+
+os.environ["DB_BACKEND"] = "memory"
+os.environ["SUPABASE_JWT_SECRET"] = OFFLINE_JWT_SECRET
+os.environ.setdefault("DB_NPLUS1_THRESHOLD", "1000000")
+
+
+@pytest.fixture
+def offline():
+    """(TestClient authenticated as the owner of a freshly seeded company, seeded ids and the database)."""
+    import database
+    db = database.get_client().db
+    db.reset()
+    db.set_faults()
+    yield offline_client()
+    db.set_faults()
+
+
+@pytest.fixture(autouse=True)
+def parse_cache_dir(tmp_path, monkeypatch):
+    """Parse results go to a per-test directory, not the checkout's data/parse_cache."""
+    from lib import parse_cache
+    monkeypatch.setattr(parse_cache, "cache", parse_cache.ParseCache(directory=str(tmp_path / "parse_cache")))
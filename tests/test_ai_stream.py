@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from lib import openai_client
+from routes.ai_overlook import StreamCleaner
+
+
+def clean(*pieces):
+    cleaner = StreamCleaner()
+    return "".join(cleaner.feed(piece) for piece in pieces) + cleaner.flush()
+
+
+def test_cleaner_strips_markdown_citations_and_extra_whitespace():
+    assert clean("## Summary\n\n**Revenue** is up [1] this   month.\n• Costs flat [2]") == \
+        "Summary Revenue is up this month. - Costs flat"
+
+
+def test_cleaner_holds_back_markers_split_across_pieces():
+    cleaner = StreamCleaner()
+    assert cleaner.feed("Margins grew [") == "Margins grew"
+    assert cleaner.feed("3] and ") == " and"
+    assert cleaner.feed("#") == ""
+    assert cleaner.feed("# Next") == " Next"
+    assert cleaner.flush() == ""
+
+
+def test_cleaner_keeps_brackets_and_hashes_that_are_text():
+    assert clean("Item #4 ", "[note]") == "Item #4 [note]"
+    assert clean("ends with [") == "ends with ["
+
+
+def events(body):
+    out = []
+    for block in body.strip().split("\n\n"):
+        lines = block.split("\n")
+        if lines[0].startswith(":"):
+            continue
+        out.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return out
+
+
+@pytest.fixture
+def openai_fallback(monkeypatch):
+    """/ai/query without Perplexity, so answers come from openai_client (replaced by the test)."""
+    monkeypatch.delenv("PERPLEXITY_API_KEY", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    def answer_with(pieces, error=None):
+        async def chat_stream(messages, operation, **kwargs):
+            for piece in pieces:
+                yield piece
+            if error:
+                raise error
+        monkeypatch.setattr(openai_client, "chat_stream", chat_stream)
+
+    return answer_with
+
+
+def test_streamed_answer_events(offline, openai_fallback):
+    client, _ = offline
+    openai_fallback(["**Cash** is ", "healthy[", "1]. Keep ", "saving."])
+    response = client.post("/ai/query", json={"question": "How is my cash?", "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith(": stream open\n\n")
+
+    received = events(response.text)
+    names = [name for name, _ in received]
+    assert names[-2:] == ["citations", "done"]
+    assert set(names[:-2]) == {"token"}
+    tokens = "".join(data["text"] for name, data in received if name == "token")
+    assert tokens == "Cash is healthy. Keep saving."
+    done = received[-1][1]
+    assert done["answer"] == tokens
+    assert done["cached"] is False
+    assert done["account_count"] > 0
+
+
+def test_accept_header_also_streams(offline, openai_fallback):
+    client, _ = offline
+    openai_fallback(["Fine."])
+    response = client.post("/ai/query", json={"question": "Status?"}, headers={"Accept": "text/event-stream"})
+    assert [name for name, _ in events(response.text)] == ["token", "citations", "done"]
+
+
+def test_failure_mid_stream_ends_with_an_error_event(offline, openai_fallback):
+    client, _ = offline
+    openai_fallback(["Partial "], error=RuntimeError("upstream closed"))
+    response = client.post("/ai/query", json={"question": "How is my cash?", "stream": True})
+    received = events(response.text)
+    assert received[0] == ("token", {"text": "Partial"})
+    assert received[-1] == ("error", {"detail": "upstream closed"})
+    assert "done" not in [name for name, _ in received]
+
+
+def test_failed_research_call_cancels_the_context_build(offline, monkeypatch):
+    import asyncio
+
+    from lib import perplexity_client
+    from routes import ai_overlook
+
+    _, ctx = offline
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    state = {"cancelled": False}
+
+    async def slow_context(company_id, company, location):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    class Unavailable:
+        async def query(self, **kwargs):
+            await asyncio.sleep(0)  # the context build has started
+            raise RuntimeError("Perplexity is down")
+
+    monkeypatch.setattr(ai_overlook, "build_financial_context", slow_context)
+    monkeypatch.setattr(perplexity_client, "get_client", Unavailable)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await ai_overlook.answer_question(ctx["company_id"], "Any tips for my shop?")
+        await asyncio.sleep(0)  # let the cancellation land
+        return state["cancelled"]  # before asyncio.run() cancels whatever is left
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 2))
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from database import DatabaseUnavailable
+from middleware import auth
+
+
+def current_company(user_id):
+    return asyncio.run(auth.get_current_user_company(authorization=None, user_id=user_id))
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    auth._last_known_company.clear()
+    yield
+    auth._last_known_company.clear()
+
+
+def test_outage_uses_the_recent_scoping(offline):
+    _, ctx = offline
+    assert current_company(ctx["user_id"])["company_id"] == ctx["company_id"]
+    ctx["db"].set_faults(error_rate=1.0)
+    assert current_company(ctx["user_id"])["role"] == "admin"
+
+
+def test_outage_without_a_recent_scoping_is_a_503(offline):
+    _, ctx = offline
+    ctx["db"].set_faults(error_rate=1.0)
+    with pytest.raises(DatabaseUnavailable):
+        current_company(ctx["user_id"])
+
+
+def test_scoping_expires(offline, monkeypatch):
+    _, ctx = offline
+    current_company(ctx["user_id"])
+    monkeypatch.setattr(auth, "AUTH_OUTAGE_TTL_S", 0.0)
+    ctx["db"].set_faults(error_rate=1.0)
+    with pytest.raises(DatabaseUnavailable):
+        current_company(ctx["user_id"])
+    assert ctx["user_id"] not in auth._last_known_company
+
+
+def test_scoping_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_OUTAGE_MAX_USERS", 3)
+    for n in range(5):
+        auth._remember_company(f"user-{n}", {"user_id": f"user-{n}", "company_id": "c"})
+    assert list(auth._last_known_company) == ["user-2", "user-3", "user-4"]
+    assert auth._recent_company("user-0") is None
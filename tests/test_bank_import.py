@@ -0,0 +1,125 @@
+import math
+
+import pytest
+from fastapi import HTTPException
+
+import database
+from lib import bank_import
+
+CHASE = b"""Details,Posting Date,Description,Amount,Type,Balance,Check or Slip #
+DEBIT,03/02/2026,COFFEE SHOP,-4.50,DEBIT_CARD,995.50,
+CREDIT,03/01/2026,CLIENT PAYMENT,1000.00,ACH_CREDIT,1000.00,
+"""
+
+CAPITAL_ONE = b"""Transaction Date,Posted Date,Card No.,Description,Category,Debit,Credit
+2026-03-01,2026-03-02,1234,HARDWARE STORE,Merchandise,25.10,
+"""
+
+GENERIC_WITH_SUMMARY = b"""Account statement
+Opening balance,500.00
+
+Booking Date,Narrative,Money Out,Money In
+01/03/2026,Rent,800.00,
+"""
+
+WELLS_FARGO = b""""03/01/2026","-42.00","*","","GAS STATION"
+"""
+
+
+@pytest.fixture
+def pandas():
+    return pytest.importorskip("pandas")
+
+
+@pytest.mark.parametrize("source, profile, fields", [
+    (CHASE, "chase", {"date", "description", "amount", "reference"}),
+    (CAPITAL_ONE, "capital_one", {"date", "description", "debit", "credit"}),
+    (WELLS_FARGO, "wells_fargo", {"date", "amount", "reference", "description"}),
+])
+def test_auto_detects_the_bank_profile(source, profile, fields):
+    name, index, positions, has_header = bank_import.detect(source)
+    assert name == profile
+    assert index == 0
+    assert set(positions) == fields
+    assert has_header == (profile != "wells_fargo")
+
+
+def test_generic_profile_skips_summary_lines_above_the_header():
+    name, index, positions, has_header = bank_import.detect(GENERIC_WITH_SUMMARY)
+    assert (name, index, has_header) == ("generic", 3, True)
+    assert positions == {"date": 0, "description": 1, "debit": 2, "credit": 3}
+
+
+def test_generic_prefers_a_signed_amount_over_debit_and_credit():
+    _, _, positions, _ = bank_import.detect(b"Date,Description,Amount,Debit,Credit\n", "generic")
+    assert positions == {"date": 0, "description": 1, "amount": 2}
+
+
+def test_explicit_profile_must_match():
+    with pytest.raises(HTTPException) as err:
+        bank_import.detect(CHASE, "amex")
+    assert err.value.status_code == 400
+
+
+def test_unknown_profile_and_unrecognised_layout_are_rejected():
+    with pytest.raises(HTTPException, match="Unknown profile"):
+        bank_import.detect(CHASE, "monzo")
+    with pytest.raises(HTTPException, match="pass profile="):
+        bank_import.detect(b"When,What,How much\n")
+
+
+def test_amounts_parse_currency_separators_and_negatives(pandas):
+    values = pandas.Series(["$1,234.56", "(12.34)", "12.34-", "-7", "", "n/a"])
+    amounts = bank_import._amounts(values).tolist()
+    assert amounts[:4] == [1234.56, -12.34, -12.34, -7.0]
+    assert all(math.isnan(a) for a in amounts[4:])
+
+
+def test_debit_and_credit_columns_become_a_signed_amount(pandas):
+    chunk = pandas.DataFrame({
+        "date": ["2026-03-01", "2026-03-02", "2026-03-03"],
+        "description": ["Fee", "Refund", "Nothing"],
+        "debit": ["25.10", "", ""],
+        "credit": ["", "5.00", ""],
+    })
+    frame = bank_import._normalize(chunk, bank_import.PROFILES["capital_one"])
+    assert frame["amount"].tolist()[:2] == [-25.10, 5.00]
+    assert frame["error"].tolist() == [None, None, "Invalid amount"]
+
+
+def test_dedupe_ids_are_stable_and_count_identical_rows(pandas):
+    chunk = pandas.DataFrame({
+        "date": ["03/01/2026", "03/01/2026", "03/01/2026"],
+        "description": ["Coffee", "Coffee", "Tea"],
+        "amount": ["-4.50", "-4.50", "-4.50"],
+    })
+    frame = bank_import._normalize(chunk, bank_import.PROFILES["bank_of_america"])
+
+    first = bank_import._Deduper("acct-1").ids(frame)
+    assert first[0] != first[1]
+    assert len(set(first)) == 3
+    assert all(i.startswith("csv:") for i in first)
+    assert bank_import._Deduper("acct-1").ids(frame) == first
+    assert bank_import._Deduper("acct-2").ids(frame) != first
+
+    # Chunks of one file keep counting: a repeat in a later chunk is a new row
+    deduper = bank_import._Deduper("acct-1")
+    deduper.ids(frame.iloc[:1])
+    assert deduper.ids(frame.iloc[1:]) == first[1:]
+
+
+def test_reimporting_a_statement_skips_existing_rows(offline, pandas):
+    client, ctx = offline
+    account = database.get_client().table("bank_accounts").insert(
+        {"company_id": ctx["company_id"], "name": "Checking"}
+    ).execute().data[0]
+    url = f"/bank/accounts/{account['id']}/import"
+
+    first = client.post(url, files={"file": ("chase.csv", CHASE, "text/csv")})
+    assert first.status_code == 200
+    assert first.json()["profile"] == "chase"
+    assert (first.json()["imported"], first.json()["duplicates"]) == (2, 0)
+
+    again = client.post(url, files={"file": ("chase.csv", CHASE, "text/csv")})
+    assert (again.json()["imported"], again.json()["duplicates"]) == (0, 2)
+    assert len(ctx["db"].dump()["bank_transactions"]) == 2
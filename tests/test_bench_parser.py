@@ -0,0 +1,55 @@
+import pytest
+
+from benchmarks import bench_parser, corpus
+
+
+def summary(p50=20.0, text_layer=10.0, total=1.0, pages_per_s=50.0):
+    return {"text_pdf": {
+        "docs": 4, "pages": 4, "pages_per_s": pages_per_s, "doc_ms_p50": p50, "doc_ms_p95": p50,
+        "stages_ms": {"text_layer": text_layer}, "accuracy": {"total": total}, "errors": [],
+    }}
+
+
+def test_corpus_is_reproducible_and_kinds_are_independent():
+    first = corpus.build(seed=3, per_kind=2, kinds=("text_pdf", "csv"))
+    again = corpus.build(seed=3, per_kind=2, kinds=("csv",))
+    assert [d["data"] for d in first if d["kind"] == "csv"] == [d["data"] for d in again]
+    assert corpus.build(seed=4, per_kind=2, kinds=("csv",))[0]["data"] != again[0]["data"]
+    assert [d["pages"] for d in first if d["kind"] == "text_pdf"] == [1, 3]
+
+
+def test_unknown_kind_is_refused():
+    with pytest.raises(ValueError):
+        corpus.build(per_kind=1, kinds=("fax",))
+
+
+def test_run_reports_speed_stages_and_accuracy():
+    pytest.importorskip("pdfminer")
+    pytest.importorskip("pandas")
+    docs = corpus.build(seed=7, per_kind=2, kinds=("text_pdf", "csv"))
+    result = bench_parser.run(docs)
+    assert set(result) == {"text_pdf", "csv"}
+    text_pdf = result["text_pdf"]
+    assert text_pdf["docs"] == 2 and text_pdf["pages"] == 4
+    assert text_pdf["pages_per_s"] > 0
+    assert "text_layer" in text_pdf["stages_ms"]
+    assert text_pdf["accuracy"] == {"vendor": 1.0, "date": 1.0, "total": 1.0}
+    assert "vendor" not in result["csv"]["accuracy"]  # not printed in the file
+    assert not text_pdf["errors"] and not result["csv"]["errors"]
+
+
+@pytest.mark.parametrize("current, expected", [
+    (summary(), []),
+    (summary(p50=40.0), ["text_pdf median per document"]),
+    (summary(text_layer=30.0), ["text_pdf text_layer"]),
+    (summary(total=0.75), ["text_pdf total accuracy"]),
+    (summary(p50=24.0, text_layer=14.0), []),  # within 5 ms: noise
+    (summary(pages_per_s=10.0), ["text_pdf pages/s"]),
+])
+def test_regressions_against_the_baseline(current, expected):
+    found = bench_parser.regressions(current, {"kinds": summary()}, tolerance=0.25)
+    assert [line.split(":")[0] for line in found] == expected
+
+
+def test_kinds_missing_from_the_baseline_are_not_compared():
+    assert bench_parser.regressions(summary(p50=400.0), {"kinds": {}}, tolerance=0.25) == []
@@ -0,0 +1,106 @@
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+import database
+from database import DatabaseUnavailable
+from lib import bulk_writer
+from lib.bulk_writer import bulk_insert, bulk_upsert
+
+
+class FlakyTable:
+    """database.table() stand-in: the first `failures` requests raise `error` (wrapped like the request policy does)."""
+
+    def __init__(self, error, failures=1):
+        self.error = error
+        self.failures = failures
+        self.requests = []
+
+    def __call__(self, name):
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.rows = rows
+        return self
+
+    upsert = insert
+
+    def execute(self):
+        self.requests.append(len(self.rows))
+        if len(self.requests) <= self.failures:
+            try:
+                raise self.error
+            except Exception as exc:
+                if database.is_transient_error(exc):
+                    raise DatabaseUnavailable(exc) from exc
+                raise
+
+        class Response:
+            data = [dict(row) for row in self.rows]
+        return Response()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bulk_writer, "BULK_RETRY_BACKOFF_S", 0.0)
+
+
+def rows(n):
+    return [{"n": i} for i in range(n)]
+
+
+def test_insert_is_retried_after_a_connect_error(monkeypatch):
+    fake = FlakyTable(httpx.ConnectError("connection refused"))
+    monkeypatch.setattr(bulk_writer, "table", fake)
+    result = bulk_insert("journal_lines", rows(500))
+    assert result.ok
+    assert fake.requests == [500, 500]
+    assert result.retries == 1
+
+
+def test_insert_is_not_resent_after_a_timeout(monkeypatch):
+    fake = FlakyTable(httpx.ReadTimeout("read timed out"))
+    monkeypatch.setattr(bulk_writer, "table", fake)
+    result = bulk_insert("journal_lines", rows(500))
+    assert fake.requests == [500]  # no retry, no bisection
+    assert len(result.failures) == 500
+    assert result.unavailable
+    with pytest.raises(DatabaseUnavailable):
+        result.raise_if_unavailable()
+
+
+def test_insert_is_not_resent_after_a_503(monkeypatch):
+    fake = FlakyTable(APIError({"code": "503", "message": "Service Unavailable"}))
+    monkeypatch.setattr(bulk_writer, "table", fake)
+    result = bulk_insert("journal_lines", rows(10))
+    assert fake.requests == [10]
+    assert len(result.failures) == 10
+
+
+def test_upsert_is_retried_after_a_timeout(monkeypatch):
+    fake = FlakyTable(httpx.ReadTimeout("read timed out"))
+    monkeypatch.setattr(bulk_writer, "table", fake)
+    result = bulk_upsert("accounts", rows(10), on_conflict="company_id,account_code")
+    assert result.ok
+    assert fake.requests == [10, 10]
+
+
+def test_rows_are_chunked_and_returned_in_order(offline):
+    _, ctx = offline
+    result = bulk_insert("contacts", [
+        {"company_id": ctx["company_id"], "contact_type": "vendor", "display_name": f"Vendor {i}"} for i in range(25)
+    ], chunk_size=10, concurrency=3)
+    assert result.ok
+    assert result.requests == 3
+    assert [row["display_name"] for row in result.rows] == [f"Vendor {i}" for i in range(25)]
+
+
+def test_bad_rows_are_isolated_and_the_rest_written(offline):
+    _, ctx = offline
+    batch = [{"company_id": ctx["company_id"], "contact_type": "vendor", "display_name": f"Vendor {i}"} for i in range(8)]
+    batch[5]["company_id"] = "00000000-0000-0000-0000-000000000000"  # foreign key violation
+    result = bulk_insert("contacts", batch)
+    assert [f.index for f in result.failures] == [5]
+    assert not result.unavailable
+    result.raise_if_unavailable()  # data errors are left to the caller
+    assert len(result.rows) == 7
@@ -0,0 +1,17 @@
+ORIGIN = "http://localhost:3000"
+
+
+def test_upload_limit_rejection_carries_cors_headers(offline):
+    client, _ = offline
+    response = client.post("/parse", content=b"x", headers={"Origin": ORIGIN, "Content-Length": str(10 ** 10)})
+    assert response.status_code == 413
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+
+
+def test_server_timing_is_exposed_to_the_browser(offline):
+    client, _ = offline
+    response = client.get("/accounts/", headers={"Origin": ORIGIN})
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    assert "server-timing" in response.headers["access-control-expose-headers"].lower()
+    assert "server-timing" in response.headers
@@ -0,0 +1,136 @@
+import time
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+import database
+from database import DatabaseTimeout, DatabaseUnavailable, is_transient_error
+from lib import db_trace
+
+
+class FakeBuilder:
+    """Stands in for a postgrest query builder: each execute() takes the next outcome (the last one repeats)."""
+
+    def __init__(self, *outcomes, delays=(0,)):
+        self.outcomes = outcomes
+        self.delays = delays
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        time.sleep(self.delays[min(self.calls, len(self.delays)) - 1])
+        outcome = self.outcomes[min(self.calls, len(self.outcomes)) - 1]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def api_error(code):
+    return APIError({"code": code, "message": f"error {code}"})
+
+
+@pytest.fixture(autouse=True)
+def fast_policy(monkeypatch):
+    monkeypatch.setattr(database, "DB_RETRY_BASE_MS", 0.0)
+    db_trace.stats.reset()
+
+
+def events(table, op="select"):
+    return db_trace.stats.snapshot()["tables"][f"{table} {op}"]
+
+
+def test_transient_errors_are_classified():
+    assert is_transient_error(api_error("503"))
+    assert is_transient_error(api_error("40P01"))
+    assert is_transient_error(httpx.ConnectError("refused"))
+    assert not is_transient_error(api_error("23505"))
+    assert not is_transient_error(DatabaseTimeout("spent"))
+
+
+def test_wrapped_connect_error_stays_transient():
+    builder = FakeBuilder(httpx.ConnectError("connection refused"))
+    with pytest.raises(DatabaseUnavailable) as error:
+        database._execute_with_policy(builder, "journal_lines", "insert")
+    assert error.value.code is None
+    assert is_transient_error(error.value)
+
+
+def test_reads_are_retried_on_transient_errors():
+    builder = FakeBuilder(api_error("503"), api_error("503"), "rows")
+    assert database._execute_with_policy(builder, "accounts", "select") == "rows"
+    assert builder.calls == 3
+    assert events("accounts")["retries"] == 2
+
+
+def test_reads_give_up_after_the_retries():
+    builder = FakeBuilder(api_error("503"))
+    with pytest.raises(DatabaseUnavailable):
+        database._execute_with_policy(builder, "accounts", "select", retries=1)
+    assert builder.calls == 2
+
+
+def test_data_errors_are_not_retried():
+    builder = FakeBuilder(api_error("23505"))
+    with pytest.raises(APIError):
+        database._execute_with_policy(builder, "accounts", "select")
+    assert builder.calls == 1
+
+
+def test_writes_are_not_retried():
+    builder = FakeBuilder(api_error("503"), "rows")
+    with pytest.raises(DatabaseUnavailable):
+        database._execute_with_policy(builder, "accounts", "insert")
+    assert builder.calls == 1
+
+
+def test_reads_stop_waiting_at_the_deadline():
+    token = database.set_request_deadline(50)
+    try:
+        started = time.monotonic()
+        with pytest.raises(DatabaseTimeout):
+            database._execute_with_policy(FakeBuilder("rows", delays=(0.5,)), "accounts", "select")
+        assert time.monotonic() - started < 0.4
+    finally:
+        database.reset_request_deadline(token)
+    assert events("accounts")["timeouts"] == 1
+
+
+def test_spent_budget_fails_before_the_call():
+    token = database.set_request_deadline(1)
+    try:
+        time.sleep(0.01)
+        builder = FakeBuilder("rows")
+        with pytest.raises(DatabaseTimeout):
+            database._execute_with_policy(builder, "accounts", "insert")
+        assert builder.calls == 0
+    finally:
+        database.reset_request_deadline(token)
+
+
+def test_slow_read_is_hedged(monkeypatch):
+    monkeypatch.setattr(database, "_hedge_delay", lambda table_name: 0.02)
+    builder = FakeBuilder("slow", "hedged", delays=(0.5, 0))
+    started = time.monotonic()
+    assert database._execute_with_policy(builder, "accounts", "select") == "hedged"
+    assert time.monotonic() - started < 0.4
+    assert events("accounts")["hedges"] == 1
+    assert events("accounts")["hedge_wins"] == 1
+
+
+def test_outage_returns_503_with_retry_after(offline):
+    client, ctx = offline
+    ctx["db"].set_faults(error_rate=1.0)
+    response = client.get("/accounts/")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_request_timeout_header_returns_504(offline):
+    client, ctx = offline
+    ctx["db"].set_latency(200)
+    try:
+        response = client.get("/accounts/", headers={"X-Request-Timeout": "50"})
+    finally:
+        ctx["db"].set_latency(0)
+    assert response.status_code == 504
@@ -0,0 +1,116 @@
+import re
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import database
+from lib import db_trace
+from middleware.db_trace import DbTraceMiddleware
+from routes import debug
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    db_trace.stats.reset()
+    yield
+    db_trace.stats.reset()
+
+
+def traced(fn):
+    token = db_trace.start_request_trace()
+    trace = db_trace.current_trace()
+    try:
+        fn()
+    finally:
+        db_trace.end_request_trace(token, "TEST /")
+    return trace
+
+
+def test_shape_keeps_columns_and_drops_values(offline):
+    _, ctx = offline
+    trace = traced(lambda: database.table("accounts").select("id").eq("company_id", ctx["company_id"])
+                   .order("account_code").limit(5).execute())
+    (table, op, shape, duration_ms, failed), = trace.calls
+    assert (table, op, shape, failed) == ("accounts", "select", "select eq:company_id order:account_code limit", False)
+    assert ctx["company_id"] not in shape
+    assert duration_ms >= 0
+
+
+def test_loop_of_lookups_is_reported_as_repeated(offline):
+    _, ctx = offline
+    ids = list(ctx["accounts"].values())[:4]
+
+    def lookups():
+        for account_id in ids:
+            database.table("accounts").select("*").eq("id", account_id).execute()
+        database.table("companies").select("*").eq("id", ctx["company_id"]).execute()
+
+    trace = traced(lookups)
+    assert trace.repeated_shapes(threshold=3) == [{"table": "accounts", "shape": "select eq:id", "count": 4}]
+    assert trace.repeated_shapes(threshold=4) == []
+
+    db_trace.stats.add_request("GET /loop", trace, trace.repeated_shapes(threshold=3))
+    snapshot = db_trace.stats.snapshot()
+    assert snapshot["routes"]["GET /loop"]["nplus1_requests"] == 1
+    assert snapshot["recent_nplus1"][0]["repeated"][0]["count"] == 4
+
+
+def test_failed_calls_are_counted(offline):
+    with pytest.raises(Exception):
+        traced(lambda: database.table("accounts").select("no_such_column").execute())
+    assert db_trace.stats.snapshot()["tables"]["accounts select"]["errors"] == 1
+
+
+def test_server_timing_and_route_stats(offline):
+    client, _ = offline
+    response = client.get("/accounts/")
+    match = re.fullmatch(r'db;dur=([\d.]+);desc="(\d+) queries"', response.headers["server-timing"])
+    assert match and int(match.group(2)) >= 1
+
+    stats = client.get("/debug/db-stats").json()
+    route = stats["routes"]["GET /accounts/"]
+    assert route["requests"] == 1
+    assert route["db_calls"] == int(match.group(2))
+    assert "accounts select" in stats["tables"]
+
+
+def test_db_stats_reset_and_auth(offline, monkeypatch):
+    client, _ = offline
+    client.get("/accounts/")
+    assert client.get("/debug/db-stats", params={"reset": "true"}).status_code == 403
+    assert "GET /accounts/" in client.get("/debug/db-stats").json()["routes"]
+    monkeypatch.setattr(debug, "DEBUG_STATS_RESET", True)
+    assert client.get("/debug/db-stats", params={"reset": "true"}).json()["routes"]
+    assert "GET /accounts/" not in client.get("/debug/db-stats").json()["routes"]
+    client.headers.pop("Authorization")
+    assert client.get("/debug/db-stats").status_code in (401, 403)
+
+
+def test_streamed_responses_get_no_server_timing():
+    app = FastAPI()
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"data: 1\n\n"]), media_type="text/event-stream")
+
+    @app.get("/plain")
+    def plain():
+        return {"ok": True}
+
+    app.add_middleware(DbTraceMiddleware)
+    client = TestClient(app)
+    assert "server-timing" not in client.get("/stream").headers
+    assert client.get("/plain").headers["server-timing"].startswith("db;dur=")
+
+
+def test_histogram_quantiles_are_bucket_bounds():
+    histogram = db_trace.LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    for duration_ms in [0.5] * 90 + [40] * 9 + [20000]:
+        histogram.observe(duration_ms)
+    assert histogram.quantile(0.5) == 1
+    assert histogram.quantile(0.95) == 50
+    assert histogram.quantile(1.0) == float("inf")
+    assert histogram.to_dict()["buckets"] == {"le_1": 90, "le_50": 9, "inf": 1}
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from lib import financial_summary
+
+
+@pytest.fixture
+def summaries(offline):
+    financial_summary.clear()
+    for name in financial_summary.counts:
+        financial_summary.counts[name] = 0
+    yield offline
+    financial_summary.clear()
+
+
+def get(company_id):
+    return asyncio.run(financial_summary.get(company_id))
+
+
+def ledger_version(ctx):
+    rows = [r for r in ctx["db"].dump().get("ledger_versions", []) if r["company_id"] == ctx["company_id"]]
+    return rows[0]["version"] if rows else 0
+
+
+def post_entry(client, ctx, amount=50.0):
+    response = client.post("/journals/", json={
+        "entry_date": "2026-03-01",
+        "memo": "Supplies",
+        "lines": [
+            {"account_id": ctx["accounts"]["6000"], "debit": amount, "credit": 0},
+            {"account_id": ctx["accounts"]["1010"], "debit": 0, "credit": amount},
+        ],
+    })
+    assert response.status_code == 200
+
+
+def test_ledger_writes_bump_the_counter_not_the_company_row(summaries):
+    client, ctx = summaries
+    company = next(c for c in ctx["db"].dump()["companies"] if c["id"] == ctx["company_id"])
+    before = ledger_version(ctx)
+    post_entry(client, ctx)
+    assert ledger_version(ctx) > before
+    after = next(c for c in ctx["db"].dump()["companies"] if c["id"] == ctx["company_id"])
+    assert after == company
+
+
+def test_repeat_lookup_is_a_memory_hit(summaries):
+    _, ctx = summaries
+    first = get(ctx["company_id"])
+    assert get(ctx["company_id"]) is first
+    assert financial_summary.counts == {"memory_hits": 1, "db_hits": 0, "rebuilds": 1}
+
+
+def test_another_worker_reads_the_stored_summary(summaries):
+    _, ctx = summaries
+    first = get(ctx["company_id"])
+    financial_summary.clear()
+    assert get(ctx["company_id"]) == first
+    assert financial_summary.counts["db_hits"] == 1
+    assert financial_summary.counts["rebuilds"] == 1
+
+
+def test_ledger_write_rebuilds_once(summaries):
+    client, ctx = summaries
+    get(ctx["company_id"])
+    post_entry(client, ctx)
+    summary = get(ctx["company_id"])
+    assert summary["journal_count"] == 1
+    get(ctx["company_id"])
+    assert financial_summary.counts == {"memory_hits": 1, "db_hits": 0, "rebuilds": 2}
+    stored = ctx["db"].dump()["financial_summaries"][0]
+    assert stored["ledger_version"] == ledger_version(ctx)
+
+
+def test_older_version_never_replaces_a_newer_summary(summaries):
+    client, ctx = summaries
+    post_entry(client, ctx)
+    newer = get(ctx["company_id"])
+    version = ledger_version(ctx)
+
+    # A worker that read a lagging replica builds for an older version
+    financial_summary._save(ctx["company_id"], version - 1, {**newer, "journal_count": 0, "built_at": "old"})
+    stored = ctx["db"].dump()["financial_summaries"][0]
+    assert stored["ledger_version"] == version
+    assert stored["summary"]["journal_count"] == 1
+
+    financial_summary._save(ctx["company_id"], version + 1, {**newer, "built_at": "new"})
+    assert ctx["db"].dump()["financial_summaries"][0]["ledger_version"] == version + 1
+
+
+def test_lagging_version_uses_the_newer_stored_summary(summaries, monkeypatch):
+    client, ctx = summaries
+    post_entry(client, ctx)
+    get(ctx["company_id"])
+    financial_summary.clear()
+    monkeypatch.setattr(financial_summary, "_version", lambda company_id: ledger_version(ctx) - 1)
+    get(ctx["company_id"])
+    assert financial_summary.counts["db_hits"] == 1
+    assert financial_summary.counts["rebuilds"] == 1
+
+
+def test_metrics_need_authentication(summaries):
+    client, _ = summaries
+    assert "rebuilds" in client.get("/ai/context/metrics").json()
+    client.headers.pop("Authorization")
+    assert client.get("/ai/context/metrics").status_code in (401, 403)
@@ -0,0 +1,117 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from lib import idempotency, memory_backend
+
+
+def entry(ctx, amount=80.0, memo="Software subscription"):
+    return {
+        "entry_date": "2026-03-01",
+        "memo": memo,
+        "lines": [
+            {"account_id": ctx["accounts"]["6000"], "debit": amount, "credit": 0},
+            {"account_id": ctx["accounts"]["1010"], "debit": 0, "credit": amount},
+        ],
+    }
+
+
+def journal_count(ctx):
+    return len(ctx["db"].dump().get("journal_entries", []))
+
+
+def keys(ctx):
+    return ctx["db"].dump().get("idempotency_keys", [])
+
+
+def test_repeat_with_the_same_key_replays_the_response(offline):
+    client, ctx = offline
+    headers = {"Idempotency-Key": "create-1"}
+    first = client.post("/journals/", json=entry(ctx), headers=headers)
+    second = client.post("/journals/", json=entry(ctx), headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers.get("Idempotent-Replayed") == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert journal_count(ctx) == 1
+    assert [k["status"] for k in keys(ctx)] == ["completed"]
+
+
+def test_without_a_key_every_request_creates(offline):
+    client, ctx = offline
+    client.post("/journals/", json=entry(ctx))
+    client.post("/journals/", json=entry(ctx))
+    assert journal_count(ctx) == 2
+    assert keys(ctx) == []
+
+
+def test_same_key_for_a_different_body_is_rejected(offline):
+    client, ctx = offline
+    headers = {"Idempotency-Key": "create-2"}
+    assert client.post("/journals/", json=entry(ctx), headers=headers).status_code == 200
+    response = client.post("/journals/", json=entry(ctx, amount=90.0), headers=headers)
+    assert response.status_code == 422
+    assert journal_count(ctx) == 1
+
+
+def test_keys_are_scoped_to_the_path(offline):
+    client, ctx = offline
+    headers = {"Idempotency-Key": "create-3"}
+    client.post("/journals/", json=entry(ctx), headers=headers)
+    response = client.post("/journals/?draft=1", json=entry(ctx), headers=headers)
+    assert response.status_code == 422
+
+
+def test_client_errors_are_stored_and_replayed(offline):
+    client, ctx = offline
+    headers = {"Idempotency-Key": "create-4"}
+    body = entry(ctx)
+    body["lines"][1]["credit"] = 10.0
+    first = client.post("/journals/", json=body, headers=headers)
+    second = client.post("/journals/", json=body, headers=headers)
+    assert first.status_code == second.status_code == 400
+    assert second.headers.get("Idempotent-Replayed") == "true"
+
+
+def test_server_errors_release_the_key(offline, monkeypatch):
+    client, ctx = offline
+    original = memory_backend.MemoryQuery.execute
+
+    def execute(self, simulate_latency=True):
+        if self._table == "journal_lines" and self._op == "insert":
+            raise APIError({"code": "PGRST001", "message": "injected"})
+        return original(self, simulate_latency)
+
+    headers = {"Idempotency-Key": "create-5"}
+    monkeypatch.setattr(memory_backend.MemoryQuery, "execute", execute)
+    assert client.post("/journals/", json=entry(ctx), headers=headers).status_code == 503
+    assert keys(ctx) == []
+
+    monkeypatch.setattr(memory_backend.MemoryQuery, "execute", original)
+    retry = client.post("/journals/", json=entry(ctx), headers=headers)
+    assert retry.status_code == 200
+    assert "Idempotent-Replayed" not in retry.headers
+    assert journal_count(ctx) == 1
+
+
+def test_overlong_key_is_rejected(offline):
+    client, ctx = offline
+    response = client.post("/journals/", json=entry(ctx), headers={"Idempotency-Key": "k" * 256})
+    assert response.status_code == 400
+    assert journal_count(ctx) == 0
+
+
+def test_fingerprint_separates_its_parts():
+    assert idempotency.request_fingerprint("POST", "/a", "", b"bc") != \
+        idempotency.request_fingerprint("POST", "/ab", "", b"c")
+    assert idempotency.request_fingerprint("POST", "/a", "", b"x") == \
+        idempotency.request_fingerprint("POST", "/a", "", b"x")
+
+
+@pytest.mark.parametrize("status", ["completed", "failed"])
+def test_claim_returns_the_finished_row(offline, status):
+    _, ctx = offline
+    assert idempotency.claim(ctx["company_id"], "direct", "POST /journals/", "abc") is None
+    idempotency.finish(ctx["company_id"], "direct", status, {"id": "x"}, 201)
+    row = idempotency.claim(ctx["company_id"], "direct", "POST /journals/", "abc")
+    assert row["status"] == status
+    assert row["response"] == {"id": "x"}
@@ -0,0 +1,66 @@
+import io
+import random
+
+import pytest
+
+import smart_parser
+from benchmarks.corpus import _draw, photo, receipt
+from lib import image_prep
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def phone_photo(sideways):
+    """(jpeg bytes, applied skew) of a synthetic receipt photo, stored sideways with EXIF or not."""
+    for seed in range(50):
+        rng = random.Random(seed)
+        lines, _ = receipt(rng)
+        data, skew = photo(rng, lines)
+        with Image.open(io.BytesIO(data)) as image:
+            if (image.getexif().get(0x0112) == 6) == sideways:
+                return data, skew
+    raise AssertionError("no synthetic photo with that orientation")
+
+
+def test_photo_is_rotated_cropped_deskewed_and_scaled():
+    data, skew = phone_photo(sideways=True)
+    plan = {}
+    array = image_prep.prepare(data, stats=plan)
+    assert array.ndim == 2 and str(array.dtype) == "uint8"
+    assert array.shape[0] > array.shape[1]  # EXIF rotation applied: portrait like the receipt
+    assert array.size < 3024 * 4032 / 5
+    assert plan["box"] is not None
+    assert abs(plan["angle"] + skew) < 0.5
+    assert plan["text_px"] * plan["scale"] == pytest.approx(image_prep.OCR_TARGET_TEXT_PX, rel=0.3)
+
+
+def test_exif_rotation_can_be_skipped():
+    data, _ = phone_photo(sideways=True)
+    assert image_prep.prepare(data, exif=False).shape[1] > image_prep.prepare(data).shape[1]
+
+
+def test_small_clean_scan_is_left_alone():
+    lines, _ = receipt(random.Random(1))
+    image = _draw(lines, 20, 20 * 17)
+    plan = {}
+    array = image_prep.prepare(image, stats=plan)
+    assert plan["box"] is None  # the paper fills the picture
+    assert plan["angle"] == 0.0
+    assert plan["scale"] == 1.0  # never upscaled
+    assert array.shape == (image.height, image.width)
+
+
+def test_long_side_is_capped(monkeypatch):
+    monkeypatch.setattr(image_prep, "OCR_MAX_SIDE", 500)
+    data, _ = phone_photo(sideways=False)
+    assert max(image_prep.prepare(data).shape) <= 500
+
+
+def test_ocr_falls_back_to_the_original_image(monkeypatch):
+    def broken(source, exif=True):
+        raise OSError("cannot identify image file")
+
+    monkeypatch.setattr(image_prep, "prepare", broken)
+    assert smart_parser._ocr_input(b"\xff\xd8 jpeg") == b"\xff\xd8 jpeg"
+    monkeypatch.setattr(image_prep, "OCR_PREPROCESS", False)
+    assert smart_parser._ocr_input("receipt.jpg") == "receipt.jpg"
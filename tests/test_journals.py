@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+from postgrest.exceptions import APIError
+
+from lib import memory_backend
+
+
+def entry(ctx, amount=125.0, debit="6000", credit="1010"):
+    return {
+        "entry_date": "2026-03-01",
+        "memo": "Office rent",
+        "lines": [
+            {"account_id": ctx["accounts"][debit], "debit": amount, "credit": 0},
+            {"account_id": ctx["accounts"][credit], "debit": 0, "credit": amount},
+        ],
+    }
+
+
+def journal_count(ctx):
+    return len(ctx["db"].dump().get("journal_entries", []))
+
+
+@pytest.fixture
+def failing_lines(monkeypatch):
+    """Make inserts into journal_lines fail with the given PostgREST error code."""
+    original = memory_backend.MemoryQuery.execute
+
+    def fail_with(code):
+        def execute(self, simulate_latency=True):
+            if self._table == "journal_lines" and self._op == "insert":
+                raise APIError({"code": code, "message": f"injected {code}"})
+            return original(self, simulate_latency)
+        monkeypatch.setattr(memory_backend.MemoryQuery, "execute", execute)
+
+    return fail_with
+
+
+def test_create_posts_lines_and_balances(offline):
+    client, ctx = offline
+    response = client.post("/journals/", json=entry(ctx))
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["journal_lines"]) == 2
+    balances = {a["id"]: a["current_balance"] for a in ctx["db"].dump()["accounts"]}
+    assert balances[ctx["accounts"]["6000"]] == 125.0
+    assert balances[ctx["accounts"]["1010"]] == -125.0
+
+
+def test_unbalanced_entry_is_rejected(offline):
+    client, ctx = offline
+    body = entry(ctx)
+    body["lines"][1]["credit"] = 100.0
+    response = client.post("/journals/", json=body)
+    assert response.status_code == 400
+    assert journal_count(ctx) == 0
+
+
+def test_transient_line_failure_returns_503_and_removes_the_header(offline, failing_lines):
+    client, ctx = offline
+    failing_lines("503")
+    response = client.post("/journals/", json=entry(ctx), headers={"Idempotency-Key": "rent-1"})
+    assert response.status_code == 503
+    assert journal_count(ctx) == 0
+
+
+def test_retry_after_a_transient_failure_is_not_answered_from_the_stored_response(offline, failing_lines, monkeypatch):
+    client, ctx = offline
+    failing_lines("503")
+    assert client.post("/journals/", json=entry(ctx), headers={"Idempotency-Key": "rent-2"}).status_code == 503
+    monkeypatch.undo()
+    response = client.post("/journals/", json=entry(ctx), headers={"Idempotency-Key": "rent-2"})
+    assert response.status_code == 200
+    assert journal_count(ctx) == 1
+
+
+def test_rejected_lines_return_400_and_remove_the_header(offline, failing_lines):
+    client, ctx = offline
+    failing_lines("23503")
+    response = client.post("/journals/", json=entry(ctx))
+    assert response.status_code == 400
+    assert journal_count(ctx) == 0
+
+
+def test_unknown_account_is_rejected(offline):
+    client, ctx = offline
+    body = entry(ctx)
+    body["lines"][0]["account_id"] = str(uuid.uuid4())
+    response = client.post("/journals/", json=body)
+    assert response.status_code == 400
+    assert journal_count(ctx) == 0
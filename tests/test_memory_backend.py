@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+from postgrest.exceptions import APIError
+
+from benchmarks.offline import seed_demo_company
+from lib.memory_backend import MemoryClient, MemoryDatabase
+
+
+@pytest.fixture(scope="module")
+def schema():
+    return MemoryDatabase().schema
+
+
+@pytest.fixture
+def seeded(schema):
+    client = MemoryClient(MemoryDatabase(schema))
+    ctx = seed_demo_company(client.db, entries=20)
+    return client, ctx
+
+
+def test_embeds_follow_foreign_keys_both_ways(seeded):
+    client, ctx = seeded
+    entries = client.table("journal_entries").select("id, journal_lines(debit, credit, accounts(account_code))")\
+        .eq("company_id", ctx["company_id"]).limit(1).execute().data
+    lines = entries[0]["journal_lines"]
+    assert len(lines) == 2
+    assert all(isinstance(line["accounts"]["account_code"], str) for line in lines)
+
+
+def test_count_exact_ignores_limit(seeded):
+    client, ctx = seeded
+    response = client.table("journal_entries").select("id", count="exact")\
+        .eq("company_id", ctx["company_id"]).limit(1).execute()
+    assert response.count == 20
+    assert len(response.data) == 1
+
+
+def test_unique_violation_raises_23505(seeded):
+    client, ctx = seeded
+    with pytest.raises(APIError) as error:
+        client.table("users").insert({"id": str(uuid.uuid4()), "company_id": ctx["company_id"],
+                                      "email": ctx["email"], "full_name": "Twin"}).execute()
+    assert error.value.code == "23505"
+
+
+def test_foreign_key_violation_raises_23503(seeded):
+    client, _ = seeded
+    with pytest.raises(APIError) as error:
+        client.table("journal_lines").insert({"journal_entry_id": str(uuid.uuid4()),
+                                              "account_id": str(uuid.uuid4()), "line_number": 1,
+                                              "debit": 1, "credit": 0}).execute()
+    assert error.value.code == "23503"
+
+
+def test_upsert_on_conflict_updates_in_place(seeded):
+    client, ctx = seeded
+    account_id = ctx["accounts"]["6000"]
+    client.table("accounts").upsert({"id": account_id, "company_id": ctx["company_id"], "account_code": "6000",
+                                     "account_name": "Office Rent", "account_type": "expense"},
+                                    on_conflict="id").execute()
+    rows = client.table("accounts").select("account_name").eq("id", account_id).execute().data
+    assert rows == [{"account_name": "Office Rent"}]
+
+
+def test_delete_cascades_to_lines(seeded):
+    client, ctx = seeded
+    entry_id = client.table("journal_entries").select("id").eq("company_id", ctx["company_id"])\
+        .limit(1).execute().data[0]["id"]
+    client.table("journal_entries").delete().eq("id", entry_id).execute()
+    assert client.table("journal_lines").select("id").eq("journal_entry_id", entry_id).execute().data == []
+
+
+def test_single_with_no_rows_raises_pgrst116(seeded):
+    client, _ = seeded
+    with pytest.raises(APIError) as error:
+        client.table("companies").select("*").eq("id", str(uuid.uuid4())).single().execute()
+    assert error.value.code == "PGRST116"
+
+
+def test_injected_faults_fail_before_touching_data(seeded):
+    client, ctx = seeded
+    client.db.set_faults(error_rate=1.0)
+    with pytest.raises(APIError) as error:
+        client.table("accounts").delete().eq("company_id", ctx["company_id"]).execute()
+    assert error.value.code == "503"
+    client.db.set_faults()
+    assert len(client.table("accounts").select("id").eq("company_id", ctx["company_id"]).execute().data) == 12
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from lib.ocr_pool import ReaderPool
+
+
+class FakeReader:
+    """Counts readtext calls; `hold` keeps a call running until released."""
+
+    def __init__(self, hold=None):
+        self.hold = hold
+        self.calls = 0
+
+    def readtext(self, image, **kwargs):
+        self.calls += 1
+        if self.hold is not None:
+            self.hold.wait(5)
+        return [f"text of {image}", kwargs]
+
+
+def fake_pool(size, hold=None, fail_first=False):
+    pool = ReaderPool(size=size, langs=["en"], gpu=False)
+    loaded = []
+
+    def load():
+        if fail_first and not loaded and pool.load_errors == 0:
+            pool.load_errors += 1
+            raise RuntimeError("model download failed")
+        reader = FakeReader(hold)
+        loaded.append(reader)
+        pool.loads.append(1.0)
+        return reader
+
+    pool._load = load
+    return pool, loaded
+
+
+def test_reader_is_loaded_once_and_reused():
+    pool, loaded = fake_pool(size=2)
+    assert pool.readtext("a.png", detail=0) == ["text of a.png", {"detail": 0}]
+    pool.readtext("b.png")
+    assert len(loaded) == 1
+    assert loaded[0].calls == 2
+    stats = pool.stats()
+    assert stats["readers_loaded"] == 1
+    assert stats["readers_idle"] == 1
+    assert stats["inference"]["count"] == 2
+
+
+def test_concurrent_requests_grow_the_pool_up_to_its_size():
+    hold = threading.Event()
+    pool, loaded = fake_pool(size=2, hold=hold)
+    threads = [threading.Thread(target=pool.readtext, args=(f"{i}.png",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while len(loaded) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert len(loaded) == 2  # the third request waits for a reader instead of loading one
+    hold.set()
+    for thread in threads:
+        thread.join(5)
+    assert sum(reader.calls for reader in loaded) == 3
+    assert pool.stats()["readers_idle"] == 2
+    assert pool.stats()["wait_for_reader"]["buckets"]
+
+
+def test_failed_load_can_be_retried():
+    pool, loaded = fake_pool(size=1, fail_first=True)
+    with pytest.raises(RuntimeError):
+        pool.readtext("a.png")
+    assert pool.stats()["readers_loaded"] == 0
+    pool.readtext("a.png")
+    assert len(loaded) == 1
+    assert pool.stats()["load"]["errors"] == 1
+
+
+def test_warm_loads_every_reader_once():
+    pool, loaded = fake_pool(size=3)
+    pool.warm()
+    assert len(loaded) == 3
+    pool.warm()
+    assert len(loaded) == 3
+    assert pool.stats()["readers_idle"] == 3
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+
+from lib import openai_client
+
+openai = pytest.importorskip("openai")
+
+BASE_URL = "http://openai.test/v1"
+MESSAGES = [{"role": "user", "content": "Summarise March"}]
+
+
+def completion(content="Revenue grew 4%"):
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    }
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Fresh shared clients and stats; install(handler) points both clients at a mock transport."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(openai_client, "_async", None)
+    monkeypatch.setattr(openai_client, "_sync", None)
+    monkeypatch.setattr(openai_client, "_limit", None)
+    monkeypatch.setattr(openai_client, "call_stats", openai_client.CallStats())
+
+    def install(handler, sync_handler=None):
+        monkeypatch.setattr(openai_client, "_async", openai.AsyncOpenAI(
+            base_url=BASE_URL, max_retries=0, http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        ))
+        if sync_handler:
+            monkeypatch.setattr(openai_client, "_sync_pid", os.getpid())
+            monkeypatch.setattr(openai_client, "_sync", openai.OpenAI(
+                base_url=BASE_URL, max_retries=0, http_client=httpx.Client(transport=httpx.MockTransport(sync_handler)),
+            ))
+
+    yield install
+    asyncio.run(openai_client.close())
+
+
+def test_one_async_client_per_process(api):
+    assert openai_client.async_client() is openai_client.async_client()
+
+
+def test_chat_returns_the_completion_and_is_timed(api):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=completion())
+
+    api(handler)
+    response = asyncio.run(openai_client.chat(MESSAGES, "format_dashboard", model="gpt-4o-mini", temperature=0.2))
+    assert response.choices[0].message.content == "Revenue grew 4%"
+    assert requests == [{"messages": MESSAGES, "model": "gpt-4o-mini", "temperature": 0.2}]
+    stats = openai_client.stats()
+    assert stats["operations"]["format_dashboard"]["calls"] == 1
+    assert stats["operations"]["format_dashboard"]["errors"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_failed_calls_are_counted(api):
+    api(lambda request: httpx.Response(400, json={"error": {"message": "bad model"}}))
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(openai_client.chat(MESSAGES, "ai_query", model="gpt-nope"))
+    assert openai_client.stats()["operations"]["ai_query"]["errors"] == 1
+    assert openai_client.stats()["in_flight"] == 0
+
+
+def test_concurrent_calls_are_capped(api, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_CONCURRENCY", 2)
+    state = {"open": 0, "max_open": 0}
+
+    async def handler(request):
+        state["open"] += 1
+        state["max_open"] = max(state["max_open"], state["open"])
+        await asyncio.sleep(0.02)
+        state["open"] -= 1
+        return httpx.Response(200, json=completion())
+
+    api(handler)
+
+    async def scenario():
+        await asyncio.gather(*(openai_client.chat(MESSAGES, "ai_query", model="gpt-4o-mini") for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert state["max_open"] == 2
+    assert openai_client.stats()["operations"]["ai_query"]["calls"] == 6
+
+
+def test_chat_stream_yields_the_text_as_it_arrives(api):
+    chunks = [{"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini",
+               "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+              for text in ("Cash is ", "healthy.")]
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    api(lambda request: httpx.Response(200, text=body, headers={"content-type": "text/event-stream"}))
+
+    async def scenario():
+        return [text async for text in openai_client.chat_stream(MESSAGES, "ai_query", model="gpt-4o-mini")]
+
+    assert asyncio.run(scenario()) == ["Cash is ", "healthy."]
+    assert openai_client.stats()["operations"]["ai_query"]["calls"] == 1
+
+
+def test_chat_sync_for_parse_workers(api):
+    api(lambda request: httpx.Response(500), sync_handler=lambda request: httpx.Response(200, json=completion("{}")))
+    response = openai_client.chat_sync(MESSAGES, "parse_receipt", model="gpt-4o-mini")
+    assert response.choices[0].message.content == "{}"
+    assert openai_client.stats()["operations"]["parse_receipt"]["calls"] == 1
+
+
+def test_close_releases_the_pool(api):
+    api(lambda request: httpx.Response(200, json=completion()))
+    shared = openai_client.async_client()
+    assert openai_client.stats()["pool"]["open"] is True
+    asyncio.run(openai_client.close())
+    assert shared.is_closed()
+    assert openai_client.stats()["pool"]["open"] is False
+
+
+def test_metrics_route_needs_authentication(offline, api):
+    client, _ = offline
+    response = client.get("/ai/openai/metrics")
+    assert response.status_code == 200
+    assert response.json()["max_concurrency"] == openai_client.OPENAI_MAX_CONCURRENCY
+    client.headers.pop("Authorization")
+    assert client.get("/ai/openai/metrics").status_code in (401, 403)
@@ -0,0 +1,44 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from lib import parse_batch
+
+CSV = b"date,vendor,amount\n2026-03-04,Blue Bottle Coffee,12.50\n"
+
+
+def test_batch_requires_authentication(offline):
+    client, _ = offline
+    anonymous = TestClient(client.app)
+    response = anonymous.post("/parse/batch", files=[("files", ("a.csv", CSV, "text/csv"))])
+    assert response.status_code == 401
+
+
+def test_batch_streams_one_line_per_file(offline):
+    client, _ = offline
+    response = client.post("/parse/batch", files=[
+        ("files", ("a.csv", CSV, "text/csv")),
+        ("files", ("b.csv", CSV.replace(b"12.50", b"8.00"), "text/csv")),
+    ])
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["filename"] for line in lines[:-1]) == ["a.csv", "b.csv"]
+    assert lines[-1]["done"] is True
+
+
+def test_batch_file_limit(offline, monkeypatch):
+    from lib import parse_batch
+    client, _ = offline
+    monkeypatch.setattr(parse_batch, "PARSE_BATCH_MAX_FILES", 1)
+    response = client.post("/parse/batch", files=[("files", ("a.csv", CSV, "text/csv"))] * 2)
+    assert response.status_code == 400
+
+
+def test_skipped_ai_line_carries_the_expense_fields():
+    ai_fields = {"vendor": "ACME", "date": "2026-03-01", "amount": "5.00", "description": None,
+                 "category": "Office Supplies", "memo": "Pens", "confidence": "high", "ai_skipped": True}
+    result = {"raw_text": "ACME TOTAL 5.00", "parsed_fields": {"vendor": "ACME", "total": "5.00"}, "ai_fields": ai_fields}
+    line = parse_batch._line(0, "r.jpg", result, ai=True)
+    assert line["parsed_fields"] == ai_fields
+    assert line["ocr_fields"] == result["parsed_fields"]
+    assert line["message"] == "Fields read with high confidence. AI used for the category only."
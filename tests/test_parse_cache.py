@@ -0,0 +1,67 @@
+import os
+
+import smart_parser
+from lib import parse_cache
+from lib.parse_cache import ParseCache
+
+ENTRY = {"raw_text": "ACME\nTotal 5.00", "parsed_fields": {"vendor": "ACME", "total": "5.00"}}
+CSV = b"date,vendor,amount\n2026-03-04,Blue Bottle Coffee,12.50\n"
+
+
+def test_key_covers_content_type_and_parser_version():
+    key = parse_cache.cache_key("ab" * 32, "Receipt.JPG")
+    assert key == f"{'ab' * 32}-jpg-v{smart_parser.PARSER_VERSION}"
+    assert parse_cache.cache_key("ab" * 32, "receipt.pdf") != key
+    assert parse_cache.cache_key("ab" * 32, None).endswith(f"-bin-v{smart_parser.PARSER_VERSION}")
+
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = ParseCache(directory=str(tmp_path))
+    assert cache.get("k" * 10) is None
+    cache.put("k" * 10, ENTRY)
+    entry = cache.get("k" * 10)
+    assert entry["parsed_fields"] == ENTRY["parsed_fields"]
+    assert "cached_at" in entry
+    assert (cache.stats()["hits"], cache.stats()["misses"], cache.stats()["writes"]) == (1, 1, 1)
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".tmp")]
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ParseCache(directory=str(tmp_path))
+    cache.put("broken", ENTRY)
+    with open(cache._path("broken"), "w") as f:
+        f.write("{not json")
+    assert cache.get("broken") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ParseCache(directory=str(tmp_path))
+    for i in range(3):
+        cache.put(f"key{i}", ENTRY)
+        os.utime(cache._path(f"key{i}"), (1000 + i, 1000 + i))
+    cache.max_bytes = int(os.path.getsize(cache._path("key0")) * 3.5)  # room for three entries
+    os.utime(cache._path("key0"), (2000, 2000))  # read recently
+    cache.put("key3", ENTRY)
+    assert cache.get("key1") is None
+    assert cache.get("key0") is not None
+    assert cache.get("key3") is not None
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["size_bytes"] <= cache.max_bytes
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ParseCache(directory=str(tmp_path), enabled=False)
+    cache.put("k", ENTRY)
+    assert cache.get("k") is None
+    assert not os.listdir(tmp_path)
+
+
+def test_repeat_upload_is_served_from_the_cache(offline):
+    client, _ = offline
+    first = client.post("/parse/", files={"file": ("a.csv", CSV, "text/csv")})
+    assert first.status_code == 200
+    again = client.post("/parse/", files={"file": ("b.csv", CSV, "text/csv")})
+    assert again.json()["parsed_fields"] == first.json()["parsed_fields"]
+    assert parse_cache.stats()["hits"] == 1
+    assert parse_cache.stats()["writes"] == 1
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import HTTPException
+
+from lib import parse_cache, parse_jobs
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Replace the worker-process parse with one that waits for `release` and records its calls."""
+    state = {"release": threading.Event(), "calls": [], "error": None}
+    state["release"].set()
+
+    def parse_file(source, filename, ai, ocr=None):
+        state["calls"].append({"source": source, "filename": filename, "ai": ai, "ocr": ocr})
+        state["release"].wait(5)
+        if state["error"]:
+            raise state["error"]
+        result = ocr.copy() if ocr else {"raw_text": f"text of {filename}", "parsed_fields": {"total": "9.99"}}
+        if ai:
+            result["ai_fields"] = {"vendor": "Acme"}
+        result["parse_ms"] = 1.0
+        return result
+
+    monkeypatch.setattr(parse_jobs, "_parse_file", parse_file)
+    return state
+
+
+@pytest.fixture
+def jobs():
+    """One worker, room for one waiting job; threads instead of processes."""
+    queue = parse_jobs.ParseJobs(workers=1, queue_max=1)
+    queue._executor = ThreadPoolExecutor(max_workers=1)
+    yield queue
+    queue.stop()
+
+
+def wait(jobs, done):
+    return asyncio.run(asyncio.wait_for(jobs.wait(done), 5))
+
+
+def test_job_completes_with_its_result(jobs, worker):
+    job = wait(jobs, jobs.run(b"bytes", "receipt.jpg", company_id="c1"))
+    assert job["status"] == "completed"
+    public = jobs.lookup(job["id"])
+    assert public["result"]["parsed_fields"] == {"total": "9.99"}
+    assert public["company_id"] == "c1"
+    assert jobs.stats()["completed"] == 1
+
+
+def test_queue_is_bounded_and_ordered(jobs, worker):
+    worker["release"].clear()
+    first = jobs.submit(b"1", "a.jpg")
+    second = jobs.run(b"2", "b.jpg")
+    assert jobs.lookup(first["id"])["status"] == "running"
+    second_id = next(job["id"] for job in jobs.jobs.values() if job["filename"] == "b.jpg")
+    assert jobs.lookup(second_id)["queue_position"] == 1
+    with pytest.raises(HTTPException) as err:
+        jobs.submit(b"3", "c.jpg")
+    assert err.value.status_code == 503
+    assert err.value.headers["Retry-After"] == "5"
+
+    worker["release"].set()
+    assert wait(jobs, second)["status"] == "completed"
+    assert [call["filename"] for call in worker["calls"]] == ["a.jpg", "b.jpg"]
+    assert jobs.stats()["rejected"] == 1
+
+
+def test_failure_is_reported_on_the_job(jobs, worker):
+    worker["error"] = ValueError("unreadable image")
+    job = wait(jobs, jobs.run(b"x", "bad.jpg"))
+    assert job["status"] == "failed"
+    assert jobs.lookup(job["id"])["error"] == "ValueError: unreadable image"
+    assert jobs.stats()["failed"] == 1
+
+
+def test_temp_file_is_removed_when_the_job_finishes(jobs, worker, tmp_path):
+    path = tmp_path / "upload.jpg"
+    path.write_bytes(b"x")
+    wait(jobs, jobs.run(str(path), "upload.jpg"))
+    assert not path.exists()
+
+
+def test_cache_hit_completes_without_a_worker(jobs, worker):
+    parse_cache.put("k1", {"raw_text": "cached", "parsed_fields": {"total": "1.00"}})
+    job = jobs.submit(b"x", "r.jpg", cache_key="k1")
+    assert job["status"] == "completed"
+    assert job["result"]["cached"] is True
+    assert worker["calls"] == []
+
+
+def test_ai_on_a_cached_ocr_result_runs_only_the_ai_step(jobs, worker):
+    parse_cache.put("k2", {"raw_text": "cached", "parsed_fields": {"total": "1.00"}})
+    done = wait(jobs, jobs.run(b"x", "r.jpg", ai=True, cache_key="k2"))
+    assert done["result"]["ai_fields"] == {"vendor": "Acme"}
+    assert worker["calls"][0]["ocr"]["raw_text"] == "cached"
+    assert parse_cache.get("k2")["ai_fields"] == {"vendor": "Acme"}
+
+
+def test_finished_parse_is_cached(jobs, worker):
+    wait(jobs, jobs.run(b"x", "r.jpg", cache_key="k3"))
+    assert parse_cache.get("k3")["parsed_fields"] == {"total": "9.99"}
+
+
+def test_document_follows_the_job(offline, jobs, worker):
+    import database
+    _, ctx = offline
+    document = database.get_client().table("documents").insert({
+        "company_id": ctx["company_id"], "file_name": "r.jpg", "file_url": "uploads/r.jpg",
+    }).execute().data[0]
+    wait(jobs, jobs.run(b"x", "r.jpg", company_id=ctx["company_id"], ai=True, document_id=document["id"]))
+    stored = next(d for d in ctx["db"].dump()["documents"] if d["id"] == document["id"])
+    assert stored["ocr_status"] == "completed"
+    assert stored["extracted_amount"] == 9.99
+    assert stored["extracted_vendor"] == "Acme"
+
+
+def test_jobs_are_private_to_their_company(offline, monkeypatch, jobs, worker):
+    client, _ = offline
+    monkeypatch.setattr(parse_jobs, "jobs", jobs)
+    job = jobs.submit(b"x", "r.jpg", company_id="someone-else")
+    assert client.get(f"/parse/jobs/{job['id']}").status_code == 404
+
+
+def test_result_outlives_trimming(jobs, worker, monkeypatch):
+    monkeypatch.setattr(parse_jobs, "PARSE_JOBS_KEEP", 0)
+    job = wait(jobs, jobs.run(b"x", "r.jpg"))
+    assert job["id"] not in jobs.jobs  # already trimmed
+    assert job["result"]["parsed_fields"] == {"total": "9.99"}
+
+
+def test_late_broken_pool_failure_keeps_the_fresh_pool(jobs):
+    broken = jobs._executor
+    fresh = ThreadPoolExecutor(max_workers=1)
+    jobs._executor = fresh  # the first failure already replaced the broken pool
+    job = {"id": "j1", "filename": "r.jpg", "source": None, "document_id": None, "cache_key": None,
+           "done": Future()}
+    jobs._running = 1
+    jobs._finish(job, None, BrokenProcessPool("worker died"), executor=broken)
+    assert jobs._executor is fresh
+    assert job["status"] == "failed"
+    jobs._retire(fresh)
+    assert jobs._executor is None
+    broken.shutdown()
+
+
+def test_metrics_need_authentication(offline):
+    client, _ = offline
+    assert client.get("/parse/metrics").json()["workers"] >= 1
+    client.headers.pop("Authorization")
+    assert client.get("/parse/metrics").status_code in (401, 403)
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+import smart_parser
+from benchmarks.corpus import statement, text_pdf
+from lib import pdf_text
+
+
+@pytest.fixture
+def laid_out(monkeypatch):
+    """A fresh page cache; returns the page indexes laid out by pdfminer, in order."""
+    pytest.importorskip("pdfminer")
+    monkeypatch.setattr(pdf_text, "cache", pdf_text.PageCache())
+    calls = []
+    text = pdf_text._Document.text
+
+    def counting(self, index):
+        calls.append(index)
+        return text(self, index)
+
+    monkeypatch.setattr(pdf_text._Document, "text", counting)
+    return calls
+
+
+def numbered(count):
+    return text_pdf([[f"Page {n} of {count}"] for n in range(1, count + 1)])
+
+
+@pytest.mark.parametrize("count, budget, order", [
+    (5, 4, [0, 4, 1, 3]),
+    (3, 0, [0, 2, 1]),
+    (1, 4, [0]),
+    (0, 4, []),
+])
+def test_pages_are_taken_from_both_ends(count, budget, order):
+    assert list(pdf_text.page_order(count, budget)) == order
+
+
+def test_only_the_page_budget_is_laid_out(laid_out):
+    texts = pdf_text.read(numbered(10), budget=4)
+    assert list(texts) == [0, 1, 8, 9]
+    assert "Page 10 of 10" in texts[9]
+    assert sorted(laid_out) == [0, 1, 8, 9]
+
+
+def test_reading_stops_once_done(laid_out):
+    seen = []
+
+    def done(text):
+        seen.append(text)
+        return "Page 3 of 3" in text
+
+    texts = pdf_text.read(numbered(3), done=done, budget=0)
+    assert list(texts) == [0, 2]
+    assert laid_out == [0, 2]
+    assert len(seen) == 2  # after 1 and 2 pages
+    assert seen[-1].index("Page 1") < seen[-1].index("Page 3")
+
+
+def test_pages_are_cached_per_document(laid_out, tmp_path):
+    pdf = numbered(6)
+    first = pdf_text.read(pdf, budget=2)
+    path = tmp_path / "statement.pdf"
+    path.write_bytes(pdf)
+    assert pdf_text.read(str(path), budget=2) == first
+    assert laid_out == [0, 5]
+    pdf_text.read(pdf, budget=3)
+    assert laid_out == [0, 5, 1]
+    assert pdf_text.cache.hits >= 3
+
+
+def test_long_statement_fields_come_from_its_first_and_last_page(laid_out):
+    pages, truth = statement(random.Random(2), 12)
+    fields = smart_parser.extract_fields(smart_parser.extract_from_pdf(text_pdf(pages)))
+    assert {name: fields[name] for name in truth} == truth
+    assert laid_out == [0, 11]
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from lib import perplexity_client
+
+PAYLOAD = {"model": "sonar-pro", "messages": [{"role": "user", "content": "SaaS benchmarks"}]}
+
+
+@pytest.fixture
+def perplexity(monkeypatch):
+    """A fresh shared client and call stats; install(handler) routes the pool to a mock transport."""
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setattr(perplexity_client, "_client", None)
+    monkeypatch.setattr(perplexity_client, "_http", None)
+    monkeypatch.setattr(perplexity_client, "call_stats", perplexity_client.CallStats())
+    requests = []
+
+    def install(handler):
+        def record(request):
+            requests.append(request)
+            return handler(request)
+
+        perplexity_client._http = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        return requests
+
+    yield install
+    asyncio.run(perplexity_client.close())
+
+
+def completion(request):
+    return httpx.Response(200, json={"choices": [{"message": {"content": "Median churn is 5%"}}],
+                                     "citations": ["https://example.com/churn"]})
+
+
+def test_one_client_per_process(perplexity):
+    assert perplexity_client.get_client() is perplexity_client.get_client()
+
+
+def test_missing_api_key_is_an_error(perplexity, monkeypatch):
+    monkeypatch.delenv("PERPLEXITY_API_KEY")
+    with pytest.raises(ValueError):
+        perplexity_client.get_client()
+
+
+def test_calls_share_the_pool_and_are_timed(perplexity):
+    requests = perplexity(completion)
+    pooled = perplexity_client.http_client()
+
+    async def scenario():
+        client = perplexity_client.get_client()
+        return [await client._post(PAYLOAD, "industry_benchmarks") for _ in range(2)]
+
+    results = asyncio.run(scenario())
+    assert results[0]["answer"] == "Median churn is 5%"
+    assert results[0]["citations"] == ["https://example.com/churn"]
+    assert perplexity_client.http_client() is pooled
+    assert requests[0].headers["authorization"] == "Bearer pplx-test"
+    assert json.loads(requests[0].content)["model"] == "sonar-pro"
+    stats = perplexity_client.stats()
+    assert stats["calls"] == 2
+    assert stats["operations"]["industry_benchmarks"]["calls"] == 2
+    assert stats["operations"]["industry_benchmarks"]["errors"] == 0
+    assert stats["http_versions"] == {"HTTP/1.1": 2}
+    assert stats["pool"]["open"] is True
+
+
+def test_api_errors_are_reported_and_counted(perplexity):
+    perplexity(lambda request: httpx.Response(429, text="rate limited"))
+
+    async def scenario():
+        await perplexity_client.get_client()._post(PAYLOAD, "query")
+
+    with pytest.raises(Exception, match=r"Perplexity API error \(429\): rate limited"):
+        asyncio.run(scenario())
+    assert perplexity_client.stats()["operations"]["query"]["errors"] == 1
+
+
+def test_streamed_answer_is_passed_on_as_it_arrives(perplexity):
+    events = [
+        {"choices": [{"delta": {"content": "Median "}}]},
+        {"choices": [{"delta": {"content": "churn is 5%"}}], "citations": ["https://example.com/churn"]},
+    ]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+    requests = perplexity(lambda request: httpx.Response(200, text=body))
+    tokens = []
+
+    result = asyncio.run(perplexity_client.get_client()._post(PAYLOAD, "query", on_token=tokens.append))
+    assert tokens == ["Median ", "churn is 5%"]
+    assert result["answer"] == "Median churn is 5%"
+    assert result["citations"] == ["https://example.com/churn"]
+    assert json.loads(requests[0].content)["stream"] is True
+
+
+def test_pool_opens_at_startup_and_closes_at_shutdown(perplexity, monkeypatch):
+    monkeypatch.delenv("PERPLEXITY_API_KEY")
+    asyncio.run(perplexity_client.start())
+    assert perplexity_client._http is None  # research is not configured
+
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    asyncio.run(perplexity_client.start())
+    pooled = perplexity_client._http
+    assert pooled is not None and not pooled.is_closed
+    perplexity_client.get_client()
+    asyncio.run(perplexity_client.close())
+    assert pooled.is_closed
+    assert perplexity_client._client is None
+    assert perplexity_client.stats()["pool"]["open"] is False
+
+
+def test_metrics_route_needs_authentication(offline, perplexity):
+    client, _ = offline
+    response = client.get("/ai/research/metrics")
+    assert response.status_code == 200
+    assert set(response.json()) >= {"pool", "calls", "new_connections", "operations", "cache"}
+    client.headers.pop("Authorization")
+    assert client.get("/ai/research/metrics").status_code in (401, 403)
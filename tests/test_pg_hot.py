@@ -0,0 +1,128 @@
+import asyncio
+import re
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+import pytest
+
+import database
+from lib import db_trace
+
+
+class FakeConnection:
+    """Stands in for an asyncpg connection: records calls, returns canned results."""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = []
+
+    async def _call(self, method, sql, *args, **kwargs):
+        self.calls.append((method, sql, args, kwargs))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    async def fetch(self, sql, *args, **kwargs):
+        return await self._call("fetch", sql, *args, **kwargs)
+
+    async def fetchval(self, sql, *args, **kwargs):
+        return await self._call("fetchval", sql, *args, **kwargs)
+
+    async def executemany(self, sql, *args, **kwargs):
+        return await self._call("executemany", sql, *args, **kwargs)
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Install a fake primary pool; returns its connection."""
+    def install(result=None, error=None):
+        conn = FakeConnection(result, error)
+        monkeypatch.setattr(database, "_pg_pool", FakePool(conn))
+        return conn
+    db_trace.stats.reset()
+    return install
+
+
+def table_stats(name):
+    return db_trace.stats.snapshot()["tables"][f"pg:{name} hot"]
+
+
+def test_disabled_without_database_url():
+    assert not database.pg_enabled()
+    asyncio.run(database.init_pg_pool())
+    assert not database.pg_enabled()
+
+
+def test_hot_queries_number_their_parameters_from_one():
+    for name, sql in database.HOT_QUERIES.items():
+        used = {int(n) for n in re.findall(r"\$(\d+)", sql)}
+        assert used == set(range(1, len(used) + 1)), name
+
+
+def test_fetch_runs_the_declared_sql_and_converts_numerics(pool):
+    conn = pool(result=[{"id": "a", "current_balance": Decimal("12.50")}])
+    rows = asyncio.run(database.hot_fetch("summary_account_balances", "company-1"))
+    assert rows == [{"id": "a", "current_balance": 12.5}]
+    method, sql, args, _ = conn.calls[0]
+    assert (method, sql, args) == ("fetch", database.HOT_QUERIES["summary_account_balances"], ("company-1",))
+    assert table_stats("summary_account_balances")["calls"] == 1
+
+
+def test_fetchrow_and_fetchval(pool):
+    pool(result=[])
+    assert asyncio.run(database.hot_fetchrow("summary_account_balances", "company-1")) is None
+    pool(result=Decimal("3"))
+    assert asyncio.run(database.hot_fetchval("journal_entry_count", "company-1")) == 3.0
+
+
+def test_request_deadline_becomes_the_statement_timeout(pool):
+    conn = pool(result=0)
+    token = database.set_request_deadline(500)
+    try:
+        asyncio.run(database.hot_fetchval("journal_entry_count", "company-1"))
+    finally:
+        database.reset_request_deadline(token)
+    timeout = conn.calls[0][3]["timeout"]
+    assert 0 < timeout <= 0.5
+
+
+def test_statement_timeout_is_a_database_timeout(pool):
+    pool(error=asyncio.TimeoutError())
+    with pytest.raises(database.DatabaseTimeout):
+        asyncio.run(database.hot_fetchval("journal_entry_count", "company-1"))
+    stats = table_stats("journal_entry_count")
+    assert stats["timeouts"] == 1
+    assert stats["errors"] == 1
+
+
+def test_transaction_connection_is_used_as_given(pool):
+    pooled = pool(result=0)
+    own = FakeConnection(result=7)
+    assert asyncio.run(database.hot_fetchval("journal_entry_count", "company-1", conn=own)) == 7
+    assert len(own.calls) == 1
+    assert pooled.calls == []
+
+
+def test_transaction_requires_the_pool():
+    async def open_transaction():
+        async with database.pg_transaction():
+            pass
+
+    with pytest.raises(RuntimeError, match="not initialized"):
+        asyncio.run(open_transaction())
+
+
+def test_pg_numeric_avoids_float_noise():
+    assert database.pg_numeric(19.99) == Decimal("19.99")
+    assert Decimal(19.99) != Decimal("19.99")
+    assert database.pg_numeric(None) == Decimal("0")
@@ -0,0 +1,92 @@
+import httpx
+import pytest
+
+import database
+from lib import db_trace
+
+
+class UnreachableReplica:
+    """A replica client whose every query fails to connect."""
+
+    def table(self, name):
+        return self
+
+    def __getattr__(self, attr):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        raise httpx.ConnectError("replica unreachable")
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    """Two read replicas (memory clients sharing the primary's data)."""
+    monkeypatch.setattr(database, "SUPABASE_REPLICA_URLS", ["http://replica-1", "http://replica-2"])
+    monkeypatch.setattr(database, "_replicas", None)
+    monkeypatch.setattr(database, "_replica_down_until", [])
+    monkeypatch.setattr(database, "_last_write", {})
+    db_trace.stats.reset()
+    yield
+    db_trace.stats.reset()
+
+
+def accounts_stats():
+    return db_trace.stats.snapshot()["tables"].get("accounts select", {})
+
+
+def entry(ctx):
+    return {
+        "entry_date": "2026-03-01",
+        "memo": "Rent",
+        "lines": [
+            {"account_id": ctx["accounts"]["6000"], "debit": 100.0, "credit": 0},
+            {"account_id": ctx["accounts"]["1010"], "debit": 0, "credit": 100.0},
+        ],
+    }
+
+
+def test_reporting_reads_go_to_a_replica(offline, replicas):
+    client, _ = offline
+    response = client.get("/reports/profit-loss")
+    assert response.status_code == 200
+    assert accounts_stats()["replica_reads"] >= 1
+
+
+def test_other_routers_read_the_primary(offline, replicas):
+    client, _ = offline
+    assert client.get("/accounts/").status_code == 200
+    assert accounts_stats()["replica_reads"] == 0
+
+
+def test_no_replicas_configured_means_primary(offline):
+    client, _ = offline
+    db_trace.stats.reset()
+    client.get("/reports/profit-loss")
+    assert accounts_stats()["replica_reads"] == 0
+
+
+def test_reads_after_a_write_stick_to_the_primary(offline, replicas):
+    client, ctx = offline
+    assert client.post("/journals/", json=entry(ctx)).status_code == 200
+    response = client.get("/reports/profit-loss")
+    assert response.json()["expense_total"] == 100.0
+    stats = accounts_stats()
+    assert stats["replica_reads"] == 0
+    assert stats["sticky_primary"] >= 1
+    assert ctx["company_id"] in database._last_write
+
+
+def test_failed_replica_falls_back_and_is_skipped(offline, replicas, monkeypatch):
+    client, _ = offline
+    clients = database._replica_clients()
+    monkeypatch.setattr(database, "_replicas", [UnreachableReplica(), clients[1]])
+    monkeypatch.setattr(database, "_replica_turn", 1)  # the next pick is replica 0
+
+    response = client.get("/reports/profit-loss")
+    assert response.status_code == 200
+    assert accounts_stats()["replica_fallbacks"] == 1
+    assert database._replica_down_until[0] > 0
+
+    # Replica 0 is marked down: the next reads use replica 1 only
+    client.get("/reports/profit-loss")
+    assert accounts_stats()["replica_fallbacks"] == 1
@@ -0,0 +1,178 @@
+from datetime import date
+
+import pytest
+
+from lib import receipt_fields
+
+
+def box(text, x0, y0, x1, y1, conf=0.95):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, conf
+
+
+# readtext(detail=1) of a grocery receipt: labels on the left, amounts on the right
+RECEIPT = [
+    box("TRADER JOE'S", 100, 20, 500, 70),
+    box("123 Main St", 150, 90, 450, 110),
+    box("03/14/2026 10:22", 100, 130, 400, 150),
+    box("BANANAS", 40, 200, 200, 220), box("1.99", 500, 201, 560, 221),
+    box("COFFEE", 40, 230, 200, 250), box("19.01", 500, 231, 560, 251),
+    box("SUBTOTAL", 40, 300, 220, 320), box("21.00", 500, 301, 560, 321),
+    box("TAX", 40, 330, 120, 350), box("2.10", 500, 331, 560, 351),
+    box("TOTAL", 40, 380, 160, 400), box("23.10", 500, 382, 560, 402),
+    box("VISA", 40, 420, 120, 440), box("23.10", 500, 421, 560, 441),
+]
+
+
+def test_boxes_are_grouped_into_printed_rows():
+    lines = receipt_fields.lines_from_boxes(RECEIPT)
+    assert [line.text for line in lines] == [
+        "TRADER JOE'S", "123 Main St", "03/14/2026 10:22", "BANANAS 1.99", "COFFEE 19.01",
+        "SUBTOTAL 21.00", "TAX 2.10", "TOTAL 23.10", "VISA 23.10",
+    ]
+    assert lines[0].top == 20 / 441
+    assert lines[-1].right == 1.0
+
+
+def test_layout_fields_are_confident_enough_to_skip_the_ai_step():
+    fields = receipt_fields.extract(receipt_fields.lines_from_boxes(RECEIPT))
+    assert (fields["vendor"], fields["date"], fields["total"]) == ("TRADER JOE'S", "2026-03-14", "23.10")
+    assert receipt_fields.confident(fields, 0.8)
+
+
+def test_plain_text_scores_the_vendor_lower():
+    lines = receipt_fields.lines_from_boxes(RECEIPT)
+    from_boxes = receipt_fields.extract(lines)["field_confidence"]
+    fields = receipt_fields.extract(receipt_fields.lines_from_text(receipt_fields.text_of(lines)))
+    assert fields["vendor"] == "TRADER JOE'S"
+    assert fields["field_confidence"]["vendor"] < from_boxes["vendor"]
+    assert not receipt_fields.confident(fields, 0.8)
+
+
+def test_subtotal_and_tax_lose_to_the_total():
+    lines = receipt_fields.lines_from_text("Corner Cafe\nSubtotal 40.00\nTax 3.20\nTotal 43.20\nCash 50.00\nChange 6.80")
+    total, confidence = receipt_fields._total(lines)
+    assert total == "43.20"
+    assert confidence >= 0.6
+
+
+def test_label_printed_above_the_amount():
+    lines = receipt_fields.lines_from_text("Corner Cafe\nAmount Due\n12.50")
+    assert receipt_fields._total(lines)[0] == "12.50"
+
+
+def test_close_competing_totals_lower_the_confidence():
+    clear = receipt_fields._total(receipt_fields.lines_from_text("Shop\nTotal 10.00"))[1]
+    contested = receipt_fields._total(receipt_fields.lines_from_text("Shop\nTotal 10.00\nTotal 12.00"))[1]
+    assert contested < clear
+
+
+def test_dates_in_several_formats():
+    assert receipt_fields._dates("2026-03-14")[0] == (date(2026, 3, 14), True)
+    assert receipt_fields._dates("14/03/2026")[0] == (date(2026, 3, 14), True)
+    assert receipt_fields._dates("14 March 2026")[0][0] == date(2026, 3, 14)
+    assert receipt_fields._dates("Mar 14th, 26")[0][0] == date(2026, 3, 14)
+    # Month first when it could be either, and flagged as ambiguous
+    assert receipt_fields._dates("03/04/2026") == [(date(2026, 3, 4), False)]
+    assert receipt_fields._dates("13/13/2026 1999-01-01") == []
+
+
+def test_ambiguous_date_scores_lower():
+    clear = receipt_fields._date(receipt_fields.lines_from_text("Date: 03/14/2026"))
+    ambiguous = receipt_fields._date(receipt_fields.lines_from_text("Date: 03/04/2026"))
+    assert clear[0] == "2026-03-14"
+    assert ambiguous[0] == "2026-03-04"
+    assert ambiguous[1] < clear[1]
+
+
+def test_vendor_skips_addresses_phones_and_greetings():
+    lines = receipt_fields.lines_from_text(
+        "Welcome!\n(555) 123-4567\n42 Elm Street\nBlue Bottle Coffee #123\n"
+        "Latte 4.50\nMuffin 3.25\nScone 3.00\nCookie 2.00\nWater 1.50\nTea 2.75\nTax 1.36\nTotal 18.36"
+    )
+    assert receipt_fields._vendor(lines, receipt_fields.text_of(lines))[0] == "Blue Bottle Coffee"
+
+
+def test_labelled_vendor_and_description():
+    fields = receipt_fields.extract(receipt_fields.lines_from_text(
+        "Invoice\nVendor: Acme Supplies\nDescription: Printer paper, 10 reams\nTotal 54.00"
+    ))
+    assert (fields["vendor"], fields["field_confidence"]["vendor"]) == ("Acme Supplies", 0.9)
+    assert fields["description"] == "Printer paper, 10 reams"
+
+
+def test_missing_field_is_never_confident():
+    fields = receipt_fields.extract(receipt_fields.lines_from_text("ACME\nTotal 5.00"))
+    assert fields["date"] is None
+    assert fields["field_confidence"]["date"] == 0.0
+    assert not receipt_fields.confident(fields, 0.0)
+
+
+CONFIDENT = {"vendor": "TRADER JOE'S", "date": "2026-03-14", "total": "23.10", "description": None,
+             "field_confidence": {"vendor": 0.9, "date": 0.95, "total": 0.95}}
+UNSURE = {**CONFIDENT, "field_confidence": {"vendor": 0.4, "date": 0.95, "total": 0.95}}
+
+
+@pytest.fixture
+def openai_calls(monkeypatch):
+    """Replaces the OpenAI call; returns the (operation, prompt) of each call."""
+    import smart_parser
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    calls = []
+
+    def complete(prompt, operation="parse_receipt"):
+        calls.append((operation, prompt))
+        if operation == "categorize_receipt":
+            return {"results": [{"index": 0, "category": "Meals & Entertainment", "memo": "Groceries"}]}
+        if operation == "parse_receipt_batch":
+            return {"results": [{"index": 0, "vendor": "Trader Joe's", "amount": 23.1, "category": "Meals"}]}
+        return {"vendor": "Trader Joe's", "amount": 23.1, "category": "Meals", "confidence": "medium"}
+
+    monkeypatch.setattr(smart_parser, "_ai_complete", complete)
+    return calls
+
+
+def test_confident_fields_are_kept_and_only_categorized(openai_calls):
+    import smart_parser
+    fields = smart_parser.enhance_with_ai("TRADER JOE'S ... TOTAL 23.10", CONFIDENT)
+    assert fields["ai_skipped"] is True
+    assert (fields["vendor"], fields["date"], fields["amount"]) == ("TRADER JOE'S", "2026-03-14", "23.10")
+    assert (fields["category"], fields["memo"]) == ("Meals & Entertainment", "Groceries")
+    assert [operation for operation, _ in openai_calls] == ["categorize_receipt"]
+
+
+def test_failed_categorization_keeps_the_ocr_fields(openai_calls, monkeypatch):
+    import smart_parser
+
+    def unavailable(prompt, operation="parse_receipt"):
+        raise RuntimeError("rate limited")
+
+    monkeypatch.setattr(smart_parser, "_ai_complete", unavailable)
+    fields = smart_parser.enhance_with_ai("TOTAL 23.10", CONFIDENT)
+    assert fields["amount"] == "23.10"
+    assert fields["category"] is None
+
+
+def test_batch_extracts_the_unsure_and_categorizes_the_confident(openai_calls):
+    import smart_parser
+    results = smart_parser.enhance_batch_with_ai([("TOTAL 23.10", CONFIDENT), ("T0TAL 23.1O", UNSURE)])
+    assert results[0]["ai_skipped"] and results[0]["category"] == "Meals & Entertainment"
+    assert results[1]["vendor"] == "Trader Joe's" and "ai_skipped" not in results[1]
+    assert sorted(operation for operation, _ in openai_calls) == ["categorize_receipt", "parse_receipt_batch"]
+
+
+def test_skipped_ai_response_has_the_expense_draft_fields(offline, monkeypatch):
+    import smart_parser
+    from routes import parser
+    client, _ = offline
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    ai_fields = smart_parser.enhance_with_ai("TOTAL 23.10", CONFIDENT)
+
+    async def parse_now(file, ai):
+        return {"raw_text": "TOTAL 23.10", "parsed_fields": CONFIDENT, "ai_fields": ai_fields}
+
+    monkeypatch.setattr(parser, "_parse_now", parse_now)
+    body = client.post("/parse/ai", files={"file": ("r.jpg", b"jpeg", "image/jpeg")}).json()
+    assert body["parsed_fields"]["amount"] == "23.10"
+    assert set(body["parsed_fields"]) >= {"vendor", "date", "amount", "category", "memo"}
+    assert body["ocr_fields"] == CONFIDENT
+    assert body["message"] == "Fields read with high confidence. AI enhancement skipped."
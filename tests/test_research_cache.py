@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from lib import perplexity_client, research_cache
+from lib.research_cache import ResearchCache, cache_key
+
+TTL_S = 3600.0
+STALE_S = 1800.0
+
+
+def make_cache():
+    return ResearchCache(ttls={"industry_benchmarks": TTL_S}, stale_s=STALE_S, persist=False, enabled=True)
+
+
+class Fetcher:
+    def __init__(self, answer="fresh answer", delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"answer": f"{self.answer} {self.calls}", "citations": []}
+
+
+def age(cache, key, seconds):
+    cache._entries[key]["fetched_ts"] -= seconds
+
+
+def test_key_ignores_case_and_whitespace():
+    a = {"model": "sonar-pro", "messages": [{"role": "user", "content": "Benchmarks  for SaaS"}]}
+    b = {"model": "sonar-pro", "messages": [{"role": "user", "content": "benchmarks for saas "}]}
+    assert cache_key(a) == cache_key(b)
+
+
+def test_fresh_answers_come_from_memory():
+    async def scenario():
+        cache, fetch = make_cache(), Fetcher()
+        first = await cache.get_or_fetch("k", "industry_benchmarks", fetch)
+        second = await cache.get_or_fetch("k", "industry_benchmarks", fetch)
+        return first, second, fetch.calls
+
+    first, second, calls = asyncio.run(scenario())
+    assert calls == 1
+    assert not first["cached"]
+    assert second["cached"] and not second["stale"]
+    assert second["answer"] == first["answer"]
+
+
+def test_stale_answer_is_served_and_refreshed_in_the_background():
+    async def scenario():
+        cache, fetch, refresh = make_cache(), Fetcher(), Fetcher("refreshed")
+        await cache.get_or_fetch("k", "industry_benchmarks", fetch)
+        age(cache, "k", TTL_S + 1)
+        stale = await cache.get_or_fetch("k", "industry_benchmarks", fetch, refresh=refresh)
+        await asyncio.sleep(0.01)
+        fresh = await cache.get_or_fetch("k", "industry_benchmarks", fetch)
+        return stale, fresh, fetch.calls, refresh.calls
+
+    stale, fresh, fetch_calls, refresh_calls = asyncio.run(scenario())
+    assert stale["stale"] and stale["answer"] == "fresh answer 1"
+    assert (fetch_calls, refresh_calls) == (1, 1)
+    assert fresh["answer"] == "refreshed 1" and not fresh["stale"]
+
+
+def test_expired_answer_is_fetched_again():
+    async def scenario():
+        cache, fetch = make_cache(), Fetcher()
+        await cache.get_or_fetch("k", "industry_benchmarks", fetch)
+        age(cache, "k", TTL_S + STALE_S + 1)
+        result = await cache.get_or_fetch("k", "industry_benchmarks", fetch)
+        return result, fetch.calls
+
+    result, calls = asyncio.run(scenario())
+    assert calls == 2
+    assert not result["cached"]
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def scenario():
+        cache, fetch = make_cache(), Fetcher(delay=0.05)
+        results = await asyncio.gather(*(cache.get_or_fetch("k", "industry_benchmarks", fetch) for _ in range(5)))
+        return results, fetch.calls, cache.counts["shared_fetches"]
+
+    results, calls, shared = asyncio.run(scenario())
+    assert calls == 1 and shared == 4
+    assert len({r["answer"] for r in results}) == 1
+
+
+def test_operations_without_a_ttl_are_not_cached():
+    async def scenario():
+        cache, fetch = make_cache(), Fetcher()
+        await cache.get_or_fetch("k", "query", fetch)
+        await cache.get_or_fetch("k", "query", fetch)
+        return fetch.calls
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_background_refresh_does_not_stream_into_the_finished_request(monkeypatch):
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setattr(research_cache, "cache", make_cache())
+    posts = []
+
+    async def fake_post(self, payload, operation, on_token=None):
+        posts.append(on_token)
+        if on_token:
+            on_token("streamed")
+        return {"answer": f"answer {len(posts)}", "citations": []}
+
+    monkeypatch.setattr(perplexity_client.PerplexityClient, "_post", fake_post)
+
+    async def scenario():
+        client = perplexity_client.PerplexityClient()
+        first_tokens, second_tokens = [], []
+        await client.query("SaaS benchmarks", operation="industry_benchmarks", on_token=first_tokens.append)
+        research_cache.cache._entries[next(iter(research_cache.cache._entries))]["fetched_ts"] -= TTL_S + 1
+        stale = await client.query("SaaS benchmarks", operation="industry_benchmarks", on_token=second_tokens.append)
+        await asyncio.sleep(0.01)
+        return first_tokens, second_tokens, stale
+
+    first_tokens, second_tokens, stale = asyncio.run(scenario())
+    assert first_tokens == ["streamed"]
+    assert stale["stale"]
+    assert second_tokens == []
+    assert posts[1] is None  # the refresh was sent without the request's callback
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+pdf2image = pytest.importorskip("pdf2image")
+
+import smart_parser  # noqa: E402
+from lib import ocr_pool  # noqa: E402
+from lib.ocr_pool import ReaderPool  # noqa: E402
+
+
+class Page:
+    """A rendered page; OCR of it returns `text` (the tests skip real rasterising)."""
+
+    def __init__(self, number, text):
+        self.number = number
+        self.text = text
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Reader:
+    def readtext(self, page, detail=1):
+        return [([[0, 10 * i], [100, 10 * i], [100, 10 * i + 8], [0, 10 * i + 8]], line, 0.99)
+                for i, line in enumerate(page.text.splitlines())]
+
+
+@pytest.fixture
+def scanned(monkeypatch):
+    """A scanned PDF with the given page texts; records renders and pages held in memory."""
+    state = {"renders": [], "open": 0, "max_open": 0, "lock": threading.Lock()}
+
+    def make(texts, readers=1, page_size="612 x 792 pts (letter)"):
+        def pdfinfo_from_bytes(source):
+            return {"Pages": len(texts), "Page size": page_size}
+
+        def convert_from_bytes(source, dpi, first_page, last_page, grayscale):
+            state["renders"].append((first_page, last_page, dpi, grayscale))
+            with state["lock"]:
+                state["open"] += 1
+                state["max_open"] = max(state["max_open"], state["open"])
+            return [Page(first_page, texts[first_page - 1])]
+
+        def ocr_input(page, exif=True):
+            return page
+
+        def readtext(page, **kwargs):
+            lines = pool.readtext(page, **kwargs)
+            with state["lock"]:
+                state["open"] -= 1
+            return lines
+
+        pool = ReaderPool(size=readers)
+        pool._load = Reader
+        monkeypatch.setattr(pdf2image, "pdfinfo_from_bytes", pdfinfo_from_bytes)
+        monkeypatch.setattr(pdf2image, "convert_from_bytes", convert_from_bytes)
+        monkeypatch.setattr(smart_parser, "_ocr_input", ocr_input)
+        monkeypatch.setattr(ocr_pool, "pool", pool)
+        monkeypatch.setattr(ocr_pool, "readtext", readtext)
+        return state
+
+    return make
+
+
+@pytest.mark.parametrize("page_size, dpi", [
+    ("612 x 792 pts (letter)", 218),    # 11 in: 2400 px / 11 in
+    ("2384 x 3370 pts (A0)", 150),      # large pages are clamped to PDF_OCR_MIN_DPI
+    ("226 x 400 pts", 300),             # receipts are clamped to PDF_OCR_MAX_DPI
+])
+def test_render_dpi_follows_the_page_size(scanned, page_size, dpi):
+    scanned(["page"], page_size=page_size)
+    assert smart_parser._pdf_dpi(b"%PDF") == (1, dpi)
+
+
+def test_pages_are_rendered_one_at_a_time_in_grayscale(scanned, monkeypatch):
+    monkeypatch.setattr(smart_parser, "PDF_OCR_STOP_AT_TOTAL", False)
+    state = scanned(["ACME\nINVOICE", "Widgets 10.00", "Thank you"])
+    text = smart_parser.ocr_scanned_pdf(b"%PDF")
+    assert text == "ACME\nINVOICE\nWidgets 10.00\nThank you"
+    assert [(first, last, grayscale) for first, last, _, grayscale in state["renders"]] == \
+        [(1, 1, True), (2, 2, True), (3, 3, True)]
+
+
+def test_pages_after_the_totals_page_are_skipped(scanned):
+    state = scanned(["ACME", "Widgets 10.00\nTotal: 12.00", "Terms", "Terms", "Terms"])
+    assert smart_parser.ocr_scanned_pdf(b"%PDF") == "ACME\nWidgets 10.00\nTotal: 12.00"
+    assert [render[0] for render in state["renders"]] == [1, 2]
+
+
+def test_pages_in_memory_are_bounded_by_the_readers(scanned, monkeypatch):
+    monkeypatch.setattr(smart_parser, "PDF_OCR_STOP_AT_TOTAL", False)
+    state = scanned([f"page {n}" for n in range(1, 9)], readers=2)
+    text = smart_parser.ocr_scanned_pdf(b"%PDF")
+    assert text.splitlines() == [f"page {n}" for n in range(1, 9)]
+    assert state["max_open"] <= 2
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+HEAVY = ("easyocr", "torch", "pandas", "pdfminer", "pdf2image", "openai", "supabase", "asyncpg")
+
+
+def run_fresh(code, **env):
+    """Run `code` in a fresh interpreter (nothing imported yet) and return its JSON output."""
+    environ = {k: v for k, v in os.environ.items() if not k.startswith(("SUPABASE_", "DB_BACKEND"))}
+    environ.update(env)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=environ, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_importing_the_app_loads_no_heavy_modules():
+    loaded = run_fresh(
+        f"import json, sys, main; print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))",
+        SUPABASE_URL="http://127.0.0.1:54321", SUPABASE_KEY="dummy",
+    )
+    assert loaded == []
+
+
+def test_missing_credentials_fail_on_first_use_not_at_import():
+    result = run_fresh(
+        "import json, database\n"
+        "imported = database._client is None\n"
+        "try:\n"
+        "    database.table('accounts')\n"
+        "    error = None\n"
+        "except ValueError as exc:\n"
+        "    error = str(exc)\n"
+        "print(json.dumps([imported, error]))",
+        SUPABASE_URL="", SUPABASE_KEY="",  # set, so a developer's .env can't fill them in
+    )
+    imported, error = result
+    assert imported is True
+    assert error is not None and "Supabase credentials" in error
+
+
+def test_memory_backend_client_is_built_once():
+    result = run_fresh(
+        "import json, database\n"
+        "print(json.dumps([database.get_client() is database.get_client(), type(database.get_client()).__name__]))",
+        DB_BACKEND="memory",
+    )
+    assert result == [True, "MemoryClient"]
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from lib import uploads
+from middleware.upload_limit import UploadLimitMiddleware
+
+
+@pytest.fixture
+def small_limits(tmp_path, monkeypatch):
+    """Spool to disk past 1 KB, into a per-test temp dir."""
+    monkeypatch.setattr(uploads, "UPLOAD_SPOOL_BYTES", 1024)
+    monkeypatch.setattr(uploads, "UPLOAD_TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(uploads, "_CHUNK", 256)
+    return tmp_path
+
+
+def spool(data, filename="receipt.pdf", max_bytes=uploads.UPLOAD_MAX_BYTES):
+    return asyncio.run(uploads.spool(UploadFile(io.BytesIO(data), filename=filename), max_bytes=max_bytes))
+
+
+def test_small_upload_stays_in_memory(small_limits):
+    upload = spool(b"%PDF small")
+    assert upload.source == b"%PDF small"
+    assert upload.path is None
+    assert upload.size == 10
+    assert upload.sha256 == hashlib.sha256(b"%PDF small").hexdigest()
+    assert not os.listdir(small_limits)
+
+
+def test_large_upload_rolls_over_to_a_temp_file(small_limits):
+    data = os.urandom(5000)
+    upload = spool(data)
+    assert upload.source == upload.path
+    assert upload.path.startswith(str(small_limits)) and upload.path.endswith(".pdf")
+    with open(upload.path, "rb") as f:
+        assert f.read() == data
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    upload.discard()
+    assert not os.listdir(small_limits)
+
+
+def test_same_filename_gets_unique_temp_files(small_limits):
+    first = spool(b"a" * 2000)
+    second = spool(b"b" * 2000)
+    assert first.path != second.path
+    assert len(os.listdir(small_limits)) == 2
+
+
+def test_upload_past_the_limit_is_refused_and_cleaned_up(small_limits):
+    with pytest.raises(HTTPException) as exc:
+        spool(b"x" * 5000, max_bytes=3000)
+    assert exc.value.status_code == 413
+    assert not os.listdir(small_limits)
+
+
+def test_detach_hands_the_temp_file_over(small_limits):
+    upload = spool(b"x" * 2000)
+    path = upload.detach()
+    upload.discard()
+    assert os.path.exists(path)  # now owned by the caller (a parse job)
+
+
+def limited_app(max_bytes):
+    app = FastAPI()
+
+    @app.post("/parse/")
+    async def parse(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.post("/journals/")
+    async def journals(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(UploadLimitMiddleware, limits={"/parse": max_bytes})
+    return TestClient(app)
+
+
+def test_declared_length_over_the_limit_is_refused():
+    client = limited_app(1000)
+    response = client.post("/parse/", content=b"x" * 2000)
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+    assert client.post("/parse/", content=b"x" * 500).json() == {"size": 500}
+
+
+def test_streamed_body_is_cut_off_at_the_limit():
+    client = limited_app(1000)
+    response = client.post("/parse/", content=iter([b"x" * 600, b"x" * 600]))
+    assert response.status_code == 413
+
+
+def test_other_paths_are_not_limited():
+    client = limited_app(1000)
+    assert client.post("/journals/", content=b"x" * 2000).json() == {"size": 2000}
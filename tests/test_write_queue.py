@@ -0,0 +1,152 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import database
+from lib import memory_backend, write_queue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    q = write_queue.WriteQueue(str(tmp_path))
+    assert q.open()
+    monkeypatch.setattr(write_queue, "queue", q)
+    yield q
+    q.stop()
+
+
+@pytest.fixture
+def failing_inserts(monkeypatch):
+    """Make inserts into `table` raise `error` until the returned undo() is called."""
+    original = memory_backend.MemoryQuery.execute
+
+    def fail(table, error):
+        def execute(self, simulate_latency=True):
+            if self._table == table and self._op == "insert":
+                raise error
+            return original(self, simulate_latency)
+        monkeypatch.setattr(memory_backend.MemoryQuery, "execute", execute)
+        return lambda: monkeypatch.setattr(memory_backend.MemoryQuery, "execute", original)
+
+    return fail
+
+
+def entry(ctx, amount=80.0, memo="Software"):
+    return {
+        "entry_date": "2026-04-02",
+        "memo": memo,
+        "lines": [
+            {"account_id": ctx["accounts"]["6100"], "debit": amount, "credit": 0},
+            {"account_id": ctx["accounts"]["1010"], "debit": 0, "credit": amount},
+        ],
+    }
+
+
+def memos(ctx):
+    return sorted(e["memo"] for e in ctx["db"].dump().get("journal_entries", []))
+
+
+def replay_all(q):
+    while q.pending:
+        assert q._replay_one(next(iter(q.pending.values())))
+
+
+def test_unreachable_database_queues_the_write(offline, queue, failing_inserts):
+    client, ctx = offline
+    failing_inserts("journal_entries", httpx.ConnectError("connection refused"))
+    response = client.post("/journals/", json=entry(ctx))
+    assert response.status_code == 202
+    assert len(queue.pending) == 1
+
+
+def test_timed_out_write_is_not_queued(offline, queue, failing_inserts):
+    client, ctx = offline
+    failing_inserts("journal_entries", httpx.ReadTimeout("read timed out"))
+    response = client.post("/journals/", json=entry(ctx))
+    assert response.status_code == 503
+    assert not queue.pending
+
+
+def test_bad_entries_are_rejected_instead_of_queued(offline, queue, failing_inserts):
+    client, ctx = offline
+    failing_inserts("journal_entries", httpx.ConnectError("connection refused"))
+    assert client.post("/journals/", json=entry(ctx)).status_code == 202
+
+    unbalanced = entry(ctx)
+    unbalanced["lines"][1]["credit"] = 1.0
+    assert client.post("/journals/", json=unbalanced).status_code == 400
+
+    unknown = entry(ctx)
+    unknown["lines"][0]["account_id"] = "00000000-0000-0000-0000-000000000000"
+    assert client.post("/journals/", json=unknown).status_code == 400
+
+    bad_date = entry(ctx)
+    bad_date["entry_date"] = "02/04/2026"
+    assert client.post("/journals/", json=bad_date).status_code == 400
+    assert len(queue.pending) == 1
+
+
+def test_queued_writes_replay_in_order(offline, queue, failing_inserts):
+    client, ctx = offline
+    undo = failing_inserts("journal_entries", httpx.ConnectError("connection refused"))
+    assert client.post("/journals/", json=entry(ctx, memo="first")).status_code == 202
+    undo()
+    # Queued behind the first one although the database is back
+    assert client.post("/journals/", json=entry(ctx, memo="second")).status_code == 202
+    ids = list(queue.pending)
+    replay_all(queue)
+    assert memos(ctx) == ["first", "second"]
+    assert [queue.lookup(i)["status"] for i in ids] == ["completed", "completed"]
+
+
+def test_server_errors_keep_the_write_queued(offline, queue):
+    _, ctx = offline
+    calls = []
+
+    @write_queue.operation("test.flaky")
+    def flaky(company_id, user_id, payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise HTTPException(status_code=500, detail="no event loop")
+        return {"ok": True}
+
+    item = queue.enqueue("test.flaky", ctx["company_id"], ctx["user_id"], {"n": 1})
+    assert not queue._replay_one(queue.pending[item["id"]])
+    assert item["id"] in queue.pending
+    assert queue._replay_one(queue.pending[item["id"]])
+    assert queue.lookup(item["id"])["status"] == "completed"
+
+
+def test_rejected_writes_are_marked_failed(offline, queue):
+    _, ctx = offline
+
+    @write_queue.operation("test.rejected")
+    def rejected(company_id, user_id, payload):
+        raise HTTPException(status_code=404, detail="Transaction not found")
+
+    item = queue.enqueue("test.rejected", ctx["company_id"], ctx["user_id"], {})
+    assert queue._replay_one(queue.pending[item["id"]])
+    assert queue.lookup(item["id"])["status"] == "failed"
+
+
+def test_run_pg_works_from_a_plain_thread(monkeypatch):
+    loop = asyncio.new_event_loop()
+    runner = threading.Thread(target=loop.run_forever, daemon=True)
+    runner.start()
+    monkeypatch.setattr(database, "_pg_loop", loop)
+
+    async def on_loop(value):
+        assert asyncio.get_running_loop() is loop
+        return value * 2
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(database.run_pg(on_loop, 21)))
+    worker.start()
+    worker.join(5)
+    loop.call_soon_threadsafe(loop.stop)
+    runner.join(5)
+    loop.close()
+    assert results == [42]
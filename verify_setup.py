@@ -3,11 +3,14 @@
 Verify Supabase setup and environment configuration
 """
 
-from database import supabase
+from database import supabase, DB_BACKEND
 import os
 
 def verify_setup():
     print("🔍 Verifying Supabase Setup...\n")
+    if DB_BACKEND == "memory":
+        # Offline: checks 1-2 run against newschema.sql + migrations/ loaded in memory
+        print("   (DB_BACKEND=memory: using the in-memory backend, no Supabase project needed)\n")
 
     all_good = True
 